@@ -1,20 +1,39 @@
-from flask import request, jsonify, send_from_directory
-from typing import Optional
+from flask import request, jsonify, send_from_directory, g, Response,\
+    stream_with_context, after_this_request
+from typing import Optional, Callable, Iterator, Tuple
+from werkzeug.wsgi import ClosingIterator
 from website import app
+from website.prometheus import Registry, Counter, Gauge, Histogram,\
+    CONTENT_TYPE
 
 from os import path
 from pathlib import Path
+from time import perf_counter
+from hmac import compare_digest
+from uuid import uuid4
 
 from threading import Lock
-import shutil
+
+import json
 
 from core.configuration import from_json_string, ArrheniusConfig, InvalidConfigError
-from core.output_config import ReportDatatype, default_output_config
+from core.output_config import ReportDatatype, Metrics, default_output_config
+from core.solvers import SOLVERS
 from runner import ModelRun
-
-from data.display import OUTPUT_FULL_PATH, save_from_dataset,\
-    image_file_name, get_image_directory
+from precompute import read_slice, validate_slice, resolve_slice,\
+    slice_configs, plan_precompute, start_precompute, SLICE_VARIABLES,\
+    SLICE_LIMIT
+
+import data.resources as resources
+from data.access_log import default_access_log
+from data.archive import iter_zip
+from data.display import save_from_dataset, read_dataset_variable,\
+    iter_image_files, image_file_name, image_path, get_image_directory
 from data.provider import PROVIDERS
+from data.result_store import default_result_store
+from data.slices import SliceQuery, InvalidSliceError, FORMAT_BINARY,\
+    read_variable_slice
+from data.snapshots import default_snapshot_registry
 
 
 # A lock that protects the image file system from concurrent access.
@@ -24,6 +43,41 @@ from data.provider import PROVIDERS
 # concurrency.
 img_fs_lock = Lock()
 
+# The background process started by the most recent precompute request,
+# and a lock that prevents two from being started at once.
+precompute_job = None
+precompute_lock = Lock()
+
+# Operational metrics for the server process, reported by the /metrics
+# endpoint.
+metrics_registry = Registry()
+request_latency = metrics_registry.register(Histogram(
+    "arrhenius_http_request_duration_seconds",
+    "Time taken to respond to HTTP requests.",
+    ("route", "method", "status")))
+model_run_duration = metrics_registry.register(Histogram(
+    "arrhenius_model_run_duration_seconds",
+    "Time taken by model runs launched by the server.",
+    ("absorbance_src", "grid"),
+    buckets=(1.0, 5.0, 15.0, 30.0, 60.0, 120.0, 300.0, 600.0, 1800.0,
+             3600.0, 7200.0)))
+cache_lookups = metrics_registry.register(Counter(
+    "arrhenius_cache_lookups_total",
+    "Requests for model results or images, by whether they were already"
+    " on disk (hit) or had to be produced (created).",
+    ("cache", "result")))
+img_lock_waiting = metrics_registry.register(Gauge(
+    "arrhenius_image_lock_waiting",
+    "Requests waiting to acquire the image file system lock."))
+output_disk_usage = metrics_registry.register(Gauge(
+    "arrhenius_output_disk_bytes",
+    "Disk space used by stored model output.",
+    callback=lambda: default_result_store().total_size()))
+shared_data_size = metrics_registry.register(Gauge(
+    "arrhenius_shared_data_bytes",
+    "Memory used by climate data shared between running model runs.",
+    callback=lambda: default_snapshot_registry().total_size()))
+
 var_name_to_output_type = {
     output_type.value: output_type for output_type in ReportDatatype
 }
@@ -43,13 +97,17 @@ example_config = {
         "repr": ["count", "width"]
     },
     "layers": "<int >= 1>",
-    "iters": "<int >= 0>",
+    "iters": ["<int >= 0>", {"max": "<int >= 0>", "tol": "<number > 0>"}],
+    "solver": [solver_name for solver_name in SOLVERS],
+    "precision": ["float32", "float64"],
+    "kernel": ["python", "numpy", "numba"],
     "aggregate_lat": ["before", "after", "none"],
     "aggregate_level": ["before", "after", "none"],
     "temp_src": [func_name for func_name in PROVIDERS['temperature']],
     "humidity_src": [func_name for func_name in PROVIDERS['humidity']],
     "albedo_src": [func_name for func_name in PROVIDERS['albedo']],
     "pressure_src": [func_name for func_name in PROVIDERS['pressure']],
+    "mask_src": ["none"] + [func_name for func_name in PROVIDERS['mask']],
     "absorbance_src": ["table", "modern", "multilayer"],
     "CO2_weight": ["closest", "low", "high", "mean"],
     "H2O_weight": ["closest", "low", "high", "mean"],
@@ -57,6 +115,65 @@ example_config = {
 }
 
 
+def _grid_label(config: 'ArrheniusConfig') -> str:
+    """
+    Returns a label describing the grid of a model run with configuration
+    config, in the form "<latitude cells>x<longitude cells>".
+
+    :param config:
+        Configuration for the model run
+    :return:
+        A label for the run's grid size
+    """
+    return "{}x{}".format(*config.grid().dims_by_count())
+
+
+def _run_time_handler(config: 'ArrheniusConfig') -> Callable:
+    """
+    Returns an output handler for Metrics.RUN_TIME that records the
+    duration of a model run with configuration config.
+
+    :param config:
+        Configuration for the model run
+    :return:
+        A handler function for model run durations
+    """
+    def record_run_time(elapsed: float,
+                        label: Optional[str] = None) -> None:
+        model_run_duration.observe(elapsed,
+                                   absorbance_src=config.model_mode(),
+                                   grid=_grid_label(config))
+
+    return record_run_time
+
+
+def _response_pin(run_id: str) -> str:
+    """
+    Returns a name under which the stored output of model run run_id may be
+    pinned for the current request. The pin is released once the response
+    has been sent in full, including any body streamed after the view
+    function returns, so that the output cannot be evicted while the
+    response is reading it.
+
+    :param run_id:
+        The ID of a model run
+    :return:
+        A pin name unique to the current request
+    """
+    pin = uuid4().hex
+
+    @after_this_request
+    def release_when_sent(response: 'Response') -> 'Response':
+        # Files are passed straight through to the server, bypassing the
+        # response's own close callbacks, so the body is wrapped instead.
+        response.response = ClosingIterator(
+            response.response,
+            lambda: default_result_store().unpin(run_id, pin))
+        return response
+
+    return pin
+
+
 def ensure_model_results(config: 'ArrheniusConfig') -> (str, bool):
     """
     Guarantee that the model run with configuration options given by config
@@ -72,6 +189,11 @@ def ensure_model_results(config: 'ArrheniusConfig') -> (str, bool):
     before, or their results erased from disk, then the model run may be
     very time-intensive.
 
+    Newly-created results are recorded in the result store, which may evict
+    the output of older model runs to stay within its disk budget. The
+    results are pinned in the result store until the current response has
+    been sent, so that they are not evicted while they are being read.
+
     :param config:
         Configuration for the model run
     :return:
@@ -79,19 +201,25 @@ def ensure_model_results(config: 'ArrheniusConfig') -> (str, bool):
         whether the model output was not already on disk.
     """
     run_id = str(config.run_id())
-    dataset_parent = path.join(OUTPUT_FULL_PATH, run_id)
+    store = default_result_store()
+    pin = _response_pin(run_id)
+    dataset_parent = store.lookup(run_id, pin)
     created = False
 
-    if not Path(dataset_parent).exists():
+    if dataset_parent is None:
         # Model run on the provided configuration options has not been run;
         # run it, producing the output directory as well as image files for
         # the requested variable.
         output_center = default_output_config()
+        output_center.enable_output_type(Metrics.RUN_TIME,
+                                         handler=_run_time_handler(config))
 
         run = ModelRun(config, output_center)
         run.run_model()
+        dataset_parent = store.record(run_id, pin)
         created = True
 
+    cache_lookups.inc(cache="model", result="created" if created else "hit")
     return dataset_parent, created
 
 
@@ -129,9 +257,40 @@ def ensure_image_output(ds_parent: str,
     img_parent = get_image_directory(ds_parent, config.run_id(), var_name,
                                      config.colorbar(), create=False)
 
+    if created:
+        # Account for the new image files in the size of stored output.
+        default_result_store().record(config.run_id())
+
+    cache_lookups.inc(cache="image", result="created" if created else "hit")
     return img_parent, created
 
 
+def _locked_images(images: Iterator[Tuple[str, bool]])\
+        -> Iterator[Tuple[str, bool]]:
+    """
+    Returns a generator over the image files produced by images, holding
+    the image file system lock only while each one is being produced, so
+    that other requests may use the file system between images.
+
+    :param images:
+        A generator of image file paths and whether each was created
+    :return:
+        The same image file paths and flags
+    """
+    while True:
+        img_lock_waiting.inc()
+        img_fs_lock.acquire()
+        img_lock_waiting.dec()
+        try:
+            image = next(images, None)
+        finally:
+            img_fs_lock.release()
+
+        if image is None:
+            return
+        yield image
+
+
 @app.route('/model/help', methods=['GET'])
 def config_options():
     """
@@ -165,6 +324,7 @@ def scientific_dataset():
     config = from_json_string(request.data.decode("utf-8"))
     run_id = str(config.run_id())
     dataset_name = run_id + ".nc"
+    default_access_log().record(run_id)
 
     # Check to make sure the requested dataset is available on disk,
     # create it if necessary.
@@ -175,6 +335,47 @@ def scientific_dataset():
     return send_from_directory(dataset_parent, dataset_name), response_code
 
 
+@app.route('/model/<varname>/slice', methods=['POST'])
+def model_data_slice(varname: str):
+    """
+    Returns a response to an HTTP request for part of variable varname from
+    the dataset produced by a run of the Arrhenius model.
+
+    If the request is a POST request, a configuration dictionary is expected
+    in the request body in the form of a JSON string, and the part of the
+    variable to return is selected by the query string, as described by
+    SliceQuery.from_args: for instance, ?time=0:1&lat=-30:30&bands=1
+    selects the mean of each latitude band between 30 degrees south and 30
+    degrees north, over the first two time segments.
+
+    Only the selected part of the dataset is read. The response holds the
+    selection as JSON, or as a raw array of little-endian numbers described
+    by its headers if the query includes format=binary.
+
+    :param varname:
+        The name of the variable to select from
+    :return:
+        An HTTP response containing the selected values
+    """
+    # Decode JSON string from request body.
+    config = from_json_string(request.data.decode("utf-8"))
+    run_id = str(config.run_id())
+    query = SliceQuery.from_args(request.args)
+    default_access_log().record(run_id, varname)
+
+    dataset_parent, created = ensure_model_results(config)
+    dataset_path = path.join(dataset_parent, run_id + ".nc")
+    variable_slice = read_variable_slice(dataset_path, varname, query)
+
+    response_code = 201 if created else 200
+    if query.fmt == FORMAT_BINARY:
+        return Response(variable_slice.to_bytes(), status=response_code,
+                        mimetype="application/octet-stream",
+                        headers=variable_slice.headers())
+    else:
+        return jsonify(variable_slice.to_json()), response_code
+
+
 @app.route('/model/<varname>/<time_seg>', methods=['POST'])
 def single_model_data(varname: str, time_seg: str):
     """
@@ -201,14 +402,19 @@ def single_model_data(varname: str, time_seg: str):
     """
     # Decode JSON string from request body.
     config = from_json_string(request.data.decode("utf-8"))
+    default_access_log().record(config.run_id(), varname)
 
     parent_dir, model_created = ensure_model_results(config)
 
     # Find and access the requested image file, or create it if necessary.
+    img_lock_waiting.inc()
     img_fs_lock.acquire()
-    download_path, img_created = ensure_image_output(parent_dir, varname,
-                                                     int(time_seg), config)
-    img_fs_lock.release()
+    img_lock_waiting.dec()
+    try:
+        download_path, img_created = ensure_image_output(parent_dir, varname,
+                                                         int(time_seg), config)
+    finally:
+        img_fs_lock.release()
 
     # Get the file's name and path in preparation for sending to the client.
     base_name = varname + "_" + str(time_seg)
@@ -231,6 +437,12 @@ def multi_model_data(varname: str):
     response that contains all image maps that are overlaid with variable
     varname.
 
+    The archive is streamed to the client as it is built, and is never
+    stored on disk. Missing images are rendered one at a time as the
+    archive reaches them, so the response begins before the last image is
+    rendered. Images are stored in the archive without compression, since
+    they are compressed already.
+
     :param varname:
         The name of the variable that is overlaid on the map
     :return:
@@ -239,28 +451,204 @@ def multi_model_data(varname: str):
     # Decode JSON string from request body.
     config = from_json_string(request.data.decode("utf-8"))
     run_id = str(config.run_id())
+    default_access_log().record(run_id, varname)
 
-    # This series of zip-file-related variables makes the purpose of each
-    # expression more recognizable, but they are not really necessary.
     scale_suffix = "[{}x{}]".format(*config.colorbar())
-    scale_dir_name = "_".join([run_id, scale_suffix])
-    archive_name = "_".join([run_id, varname, scale_suffix])
+    archive_name = "_".join([run_id, varname, scale_suffix]) + ".zip"
 
     ds_parent, model_created = ensure_model_results(config)
-    archive_path = path.join(ds_parent, scale_dir_name, archive_name)
+    data = read_dataset_variable(ds_parent, varname, config)
+
+    # The response code is sent before any images are rendered, so decide
+    # in advance whether any will be.
+    img_dir = get_image_directory(ds_parent, run_id, varname,
+                                  config.colorbar(), create=False)
+    img_created = not all(Path(image_path(img_dir, varname, i, config))
+                          .is_file() for i in range(len(data) + 1))
+    cache_lookups.inc(cache="image",
+                      result="created" if img_created else "hit")
+
+    def archive_chunks() -> Iterator[bytes]:
+        images = _locked_images(iter_image_files(data, ds_parent, varname,
+                                                 config))
+        yield from iter_zip((img_path, path.basename(img_path))
+                            for img_path, _ in images)
+
+        if img_created:
+            # Account for the new image files in the size of stored output.
+            default_result_store().record(run_id)
 
-    img_created = False
-    if not Path(archive_path + ".zip").is_file():
-        # The zip file has not been made yet: create all image files
-        # for all time units with the requested variable and zip them.
-        archive_src, img_created = ensure_image_output(ds_parent, varname,
-                                                       None, config)
-        shutil.make_archive(archive_path, 'zip', archive_src)
-
-    # Send the zip file attached to the HTTP response.
     response_code = 201 if model_created or img_created else 200
-    return send_from_directory(ds_parent, archive_name + ".zip"),\
-        response_code
+    return Response(stream_with_context(archive_chunks()),
+                    status=response_code, mimetype="application/zip",
+                    headers={"Content-Disposition":
+                             "attachment; filename=\"{}\""
+                             .format(archive_name)})
+
+
+@app.route('/metrics', methods=['GET'])
+def operational_metrics():
+    """
+    Returns a response to an HTTP request for operational metrics of this
+    server process, in the Prometheus text exposition format.
+
+    Metrics include latency of requests to each route, durations of model
+    runs by absorbance mode and grid size, counts of cached versus newly
+    created results, the number of requests waiting on the image file
+    system lock, and disk space used by model output.
+
+    :return:
+        An HTTP response containing the current metrics
+    """
+    return metrics_registry.expose(), 200, {"Content-Type": CONTENT_TYPE}
+
+
+def _admin_authorized() -> bool:
+    """
+    Returns True iff the current request carries the administrative token
+    configured in the environment variable named by
+    data.resources.ADMIN_TOKEN_VAR. If no token is configured, no request
+    is authorized, and administrative endpoints are disabled.
+
+    :return:
+        Whether the request may use administrative endpoints
+    """
+    token = resources.ADMIN_TOKEN
+    if not token:
+        return False
+
+    given = request.headers.get("Authorization", "")
+    return compare_digest(given.encode("utf-8"),
+                          "Bearer {}".format(token).encode("utf-8"))
+
+
+def _precompute_status() -> dict:
+    """
+    Returns a dictionary describing the most recently started precompute
+    job, including whether it is still running.
+
+    :return:
+        The status of the precompute job
+    """
+    if precompute_job is None:
+        return {"running": False}
+
+    process, plan = precompute_job
+    return {
+        "running": process.is_alive(),
+        "pid": process.pid,
+        "exitcode": process.exitcode,
+        "plan": [{"run_id": run_id, "requests": requests}
+                 for run_id, requests in plan],
+    }
+
+
+@app.route('/admin/precompute', methods=['POST'])
+def start_precompute_job():
+    """
+    Returns a response to an HTTP request to prepare model results and
+    images ahead of requests for them.
+
+    If the request is a POST request, a slice declaration may be given in
+    the request body in the form of a JSON string, as described in
+    precompute.py; otherwise the default slice is used. The configurations
+    in the slice are ranked by how often they have been requested, and are
+    prepared in that order by a background process at low priority. The
+    response describes the job, and is sent without waiting for it.
+
+    The request must carry the administrative token in its Authorization
+    header. Only one job runs at a time. A request body that is not a valid
+    slice declaration is answered with an error, and starts no job.
+
+    :return:
+        An HTTP response describing the precompute job
+    """
+    global precompute_job
+
+    if not _admin_authorized():
+        return error_template("Forbidden", "A valid administrative token is"
+                              " required to use this endpoint."), 403
+
+    try:
+        body = request.data.decode("utf-8")
+        if body.strip():
+            slice_options = json.loads(body)
+            validate_slice(slice_options)
+            slice_options = resolve_slice(slice_options)
+        else:
+            slice_options = read_slice()
+
+        configs = slice_configs(slice_options)
+    except InvalidConfigError:
+        raise
+    except (ValueError, TypeError) as err:
+        # Malformed JSON and text that is not UTF-8 raise ValueErrors too.
+        return error_template("Invalid Slice Declaration", str(err)), 400
+    except FileNotFoundError:
+        return error_template("Invalid Slice Declaration",
+                              "A base configuration file named in the"
+                              " slice does not exist"), 400
+
+    plan = plan_precompute(configs, slice_options.get(SLICE_LIMIT))
+
+    with precompute_lock:
+        if precompute_job is not None and precompute_job[0].is_alive():
+            return jsonify(_precompute_status()), 409
+
+        process = start_precompute(plan,
+                                   slice_options.get(SLICE_VARIABLES, []))
+        precompute_job = (process, [
+            (from_json_string(json.dumps(options)).run_id(), requests)
+            for options, requests in plan])
+
+        return jsonify(_precompute_status()), 202
+
+
+@app.route('/admin/precompute', methods=['GET'])
+def precompute_job_status():
+    """
+    Returns a response to an HTTP request for the status of the most
+    recently started precompute job. The request must carry the
+    administrative token in its Authorization header.
+
+    :return:
+        An HTTP response describing the precompute job
+    """
+    if not _admin_authorized():
+        return error_template("Forbidden", "A valid administrative token is"
+                              " required to use this endpoint."), 403
+
+    with precompute_lock:
+        return jsonify(_precompute_status()), 200
+
+
+@app.before_request
+def start_request_timer() -> None:
+    """
+    Record the time at which handling of the current request began.
+    """
+    g.request_start = perf_counter()
+
+
+@app.after_request
+def record_request_latency(response):
+    """
+    Record the time taken to handle the current request, by route, method,
+    and response status.
+
+    :param response:
+        The response to the current request
+    :return:
+        The same response, unchanged
+    """
+    if "request_start" in g:
+        route = "<unmatched>" if request.url_rule is None \
+            else request.url_rule.rule
+        request_latency.observe(perf_counter() - g.request_start,
+                                route=route, method=request.method,
+                                status=str(response.status_code))
+
+    return response
 
 
 def error_template(title: str,
@@ -305,6 +693,21 @@ def handle_invalid_config(err: InvalidConfigError):
     return error_template("Invalid Configuration", str(err)), 400
 
 
+@app.errorhandler(InvalidSliceError)
+def handle_invalid_slice(err: InvalidSliceError):
+    """
+    Handler for InvalidSliceError, producing an HTML page whenever an API
+    endpoint is asked for part of a dataset that cannot be selected. This
+    page reports why the selection was invalid.
+
+    :param err:
+        The InvalidSliceError that triggered the handler
+    :return:
+        An HTTP response to send to the client
+    """
+    return error_template("Invalid Slice", str(err)), 400
+
+
 @app.errorhandler(IOError)
 def handle_enomem(err: IOError):
     """
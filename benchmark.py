@@ -0,0 +1,550 @@
+from data.display import output_directory
+from data.resources import MAIN_PATH
+from data.synthetic import use_synthetic_providers
+
+import core.configuration as cnf
+import core.output_config as out_cnf
+from core.metrics import stage_times
+import runner
+
+from os import path
+from pathlib import Path
+from shutil import rmtree
+from time import perf_counter, time
+from typing import Optional, List, Dict, Tuple
+from sys import argv, executable, exit
+from getopt import gnu_getopt, GetoptError
+
+import json
+import platform
+import resource
+import subprocess
+import tempfile
+import warnings
+
+"""
+A benchmark suite for the Arrhenius model, which runs the trial
+configurations in core/trial_configs at several grid resolutions and
+iteration counts, and keeps a history of the results so that the
+performance of two commits can be compared.
+
+Each benchmark case runs in a fresh Python process, so that its peak memory
+usage can be measured in isolation and so that no data cached by one case
+affects the timing of another. For each case, total wall time, time spent
+in each stage of the model run as reported under the Metrics output
+category, and peak resident set size are recorded.
+
+Where a dataset required by a configuration is not present on disk, its
+provider is replaced with a stub that produces synthetic data of the same
+shape, so that every configuration can be benchmarked on any machine.
+Results note which providers were synthetic.
+
+Usage:
+    python benchmark.py [-c <config_name>]... [-g <lat>x<lon>]...
+                        [-i <iterations>]... [-r <repeats>] [-o <history>]
+                        [--synthetic] [--images]
+    python benchmark.py --compare <commit> <commit> [-o <history>]
+    python benchmark.py --imports
+"""
+
+
+# Trial configurations that are benchmarked by default.
+BENCHMARK_CONFIGS = [
+    "arrhenius_replication",
+    "arrhenius_replication_fullgrid",
+    "arrhenius_modern",
+    "arrhenius_multilayer",
+    "arrhenius_modern_feedback8",
+    "arrhenius_multilayer_feedback8",
+    "arrhenius_cooling",
+]
+
+# Grid resolutions, in degrees of latitude and longitude per cell, that
+# every configuration is run at by default.
+BENCHMARK_GRIDS = [(20, 40), (10, 20)]
+# Numbers of feedback iterations that every configuration is run with by
+# default, in place of the configuration's own.
+BENCHMARK_ITERATIONS = [1, 4, 8]
+
+TRIAL_CONFIG_DIR = path.join(MAIN_PATH, 'core', 'trial_configs')
+DEFAULT_HISTORY_PATH = path.join(MAIN_PATH, 'benchmark_history.json')
+
+# Entry point modules whose import time is checked, with the greatest
+# cumulative import time in seconds that each is allowed.
+IMPORT_BUDGETS = {
+    "runner": 0.5,
+    "api": 1.0,
+}
+# Slow-loading dependencies that must only be imported when first used, and
+# never as a side effect of importing an entry point module.
+DEFERRED_MODULES = [
+    "netCDF4",
+    "pyresample",
+    "matplotlib",
+    "mpl_toolkits.basemap",
+    "lowtran",
+    "jsonschema",
+]
+
+
+def load_case_config(config_name: str,
+                     grid: Tuple[float, float],
+                     iterations: Optional[int]) -> 'ArrheniusConfig':
+    """
+    Returns the configuration for one benchmark case: the trial config named
+    config_name, with its grid replaced by one whose cells are grid[0]
+    degrees of latitude by grid[1] degrees of longitude, and its iteration
+    count replaced by iterations unless that is None.
+
+    :param config_name:
+        The name of a file in core/trial_configs, without extension
+    :param grid:
+        The width of grid cells in degrees latitude and longitude
+    :param iterations:
+        The number of iterations for the case, or None to keep the config's
+    :return:
+        The configuration for the benchmark case
+    """
+    config_path = path.join(TRIAL_CONFIG_DIR, config_name + ".json")
+    with open(config_path, "r") as config_file:
+        options = json.load(config_file)
+
+    options["grid"] = {
+        "dims": {"lat": grid[0], "lon": grid[1]},
+        "repr": "width",
+    }
+    if iterations is not None:
+        options["iters"] = iterations
+
+    return cnf.from_json_string(json.dumps(options))
+
+
+def run_case(config_name: str,
+             grid: Tuple[float, float],
+             iterations: Optional[int],
+             force_synthetic: bool = False,
+             images: bool = False) -> Dict:
+    """
+    Run a single benchmark case in the current process, and return its
+    measurements. The case's output files are deleted afterward.
+
+    :param config_name:
+        The name of a file in core/trial_configs, without extension
+    :param grid:
+        The width of grid cells in degrees latitude and longitude
+    :param iterations:
+        The number of iterations for the case, or None to keep the config's
+    :param force_synthetic:
+        Whether to use synthetic data even where real datasets are present
+    :param images:
+        Whether image files are rendered in addition to the dataset
+    :return:
+        Measurements for the benchmark case
+    """
+    synthetic = use_synthetic_providers(force_synthetic)
+    config = load_case_config(config_name, grid, iterations)
+
+    output_center = out_cnf.default_output_config()
+    if images:
+        for output_type in out_cnf.ReportDatatype:
+            output_center.enable_output_type(output_type,
+                                             out_cnf.IMAGES_PATH)
+
+    summaries = []
+    output_center.enable_output_type(out_cnf.Metrics.RUN_SUMMARY,
+                                     handler=summaries.append)
+    # Write output to a scratch directory of this case's own, so that
+    # nothing in the result store is overwritten or deleted.
+    output_root = tempfile.mkdtemp(prefix="benchmark_")
+    start = perf_counter()
+
+    try:
+        with output_directory(output_root):
+            model = runner.ModelRun(config, output_center)
+            model.run_model()
+    finally:
+        rmtree(output_root, ignore_errors=True)
+
+    wall_time = perf_counter() - start
+    # Linux reports maximum resident set size in kilobytes.
+    peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+    metrics = summaries[-1]
+
+    return {
+        "config": config_name,
+        "grid": list(grid),
+        "iters": config.iterations(),
+        "wall": wall_time,
+        "stages": stage_times(metrics),
+        "metrics": metrics,
+        "peak_rss_kb": peak_rss,
+        "synthetic": synthetic,
+    }
+
+
+def run_case_subprocess(config_name: str,
+                        grid: Tuple[float, float],
+                        iterations: Optional[int],
+                        force_synthetic: bool = False,
+                        images: bool = False) -> Dict:
+    """
+    Run a single benchmark case in a new Python process, and return its
+    measurements. See run_case for details.
+
+    :param config_name:
+        The name of a file in core/trial_configs, without extension
+    :param grid:
+        The width of grid cells in degrees latitude and longitude
+    :param iterations:
+        The number of iterations for the case, or None to keep the config's
+    :param force_synthetic:
+        Whether to use synthetic data even where real datasets are present
+    :param images:
+        Whether image files are rendered in addition to the dataset
+    :return:
+        Measurements for the benchmark case
+    """
+    case = {
+        "config": config_name,
+        "grid": list(grid),
+        "iters": iterations,
+        "synthetic": force_synthetic,
+        "images": images,
+    }
+
+    with tempfile.NamedTemporaryFile("r", suffix=".json") as result_file:
+        command = [executable, path.abspath(__file__),
+                   "--case", json.dumps(case), "--result", result_file.name]
+        subprocess.run(command, check=True, cwd=MAIN_PATH,
+                       stdout=subprocess.DEVNULL)
+        return json.load(result_file)
+
+
+def current_commit() -> Tuple[str, bool]:
+    """
+    Returns the hash of the git commit checked out in the repository, and
+    whether the working tree has uncommitted changes.
+
+    :return:
+        The current commit hash and whether the tree is dirty
+    """
+    commit = subprocess.run(["git", "rev-parse", "HEAD"], cwd=MAIN_PATH,
+                            stdout=subprocess.PIPE, check=True)
+    status = subprocess.run(["git", "status", "--porcelain",
+                             "--untracked-files=no"], cwd=MAIN_PATH,
+                            stdout=subprocess.PIPE, check=True)
+
+    return commit.stdout.decode().strip(), len(status.stdout.strip()) > 0
+
+
+def read_history(history_path: str) -> List[Dict]:
+    """
+    Returns the list of benchmark sessions recorded in the history file at
+    history_path, or an empty list if the file does not exist.
+
+    :param history_path:
+        A path to a benchmark history file
+    :return:
+        Previously recorded benchmark sessions, oldest first
+    """
+    if not Path(history_path).is_file():
+        return []
+
+    with open(history_path, "r") as history_file:
+        return json.load(history_file)
+
+
+def run_benchmarks(config_names: List[str],
+                   grids: List[Tuple[float, float]],
+                   iteration_counts: List[Optional[int]],
+                   repeats: int = 1,
+                   force_synthetic: bool = False,
+                   images: bool = False,
+                   history_path: str = DEFAULT_HISTORY_PATH) -> Dict:
+    """
+    Run every combination of configuration, grid, and iteration count,
+    each repeats times, and append the results to the history file at
+    history_path as a new session tagged with the current git commit.
+    The fastest repeat of each case is kept. Returns the new session.
+
+    :param config_names:
+        Names of files in core/trial_configs, without extension
+    :param grids:
+        Widths of grid cells in degrees latitude and longitude
+    :param iteration_counts:
+        Numbers of iterations, where None uses each config's own
+    :param repeats:
+        The number of times each case is run
+    :param force_synthetic:
+        Whether to use synthetic data even where real datasets are present
+    :param images:
+        Whether image files are rendered in addition to the dataset
+    :param history_path:
+        A path to the benchmark history file
+    :return:
+        The benchmark session that was recorded
+    """
+    commit, dirty = current_commit()
+    cases = []
+
+    for config_name in config_names:
+        for grid in grids:
+            for iterations in iteration_counts:
+                results = [run_case_subprocess(config_name, grid, iterations,
+                                               force_synthetic, images)
+                           for _ in range(repeats)]
+                best = min(results, key=lambda result: result["wall"])
+                best["repeats"] = [result["wall"] for result in results]
+                cases.append(best)
+
+                print("{:<32} {:>9} iters={:<3} {:8.3f}s {:>8} KB"
+                      .format(config_name, _format_grid(grid),
+                              best["iters"], best["wall"],
+                              best["peak_rss_kb"]))
+
+    session = {
+        "commit": commit,
+        "dirty": dirty,
+        "timestamp": time(),
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "cases": cases,
+    }
+
+    history = read_history(history_path)
+    history.append(session)
+    with open(history_path, "w") as history_file:
+        json.dump(history, history_file, indent=2)
+
+    return session
+
+
+def _latest_session(history: List[Dict],
+                    commit: str) -> Dict:
+    """
+    Returns the most recent session in history for commit, which may be any
+    name that git recognizes, or a prefix of a commit hash that git does not.
+    Raises LookupError if there is no such session.
+    """
+    resolved = subprocess.run(["git", "rev-parse", "--verify", "--quiet",
+                               commit + "^{commit}"], cwd=MAIN_PATH,
+                              stdout=subprocess.PIPE)
+    if resolved.returncode == 0:
+        commit = resolved.stdout.decode().strip()
+
+    for session in reversed(history):
+        if session["commit"].startswith(commit):
+            return session
+
+    raise LookupError("No benchmark results for commit {}".format(commit))
+
+
+def compare_commits(base: str,
+                    other: str,
+                    history_path: str = DEFAULT_HISTORY_PATH) -> List[Dict]:
+    """
+    Compare the most recent benchmark results for commit base against those
+    for commit other, for every case the two have in common. Prints a table
+    of the comparison, and returns one entry per case with the wall time
+    and peak memory under each commit and the ratio of their wall times.
+
+    Commits may be given by any name git recognizes, such as a branch name
+    or a prefix of their hash.
+
+    :param base:
+        The commit to compare against
+    :param other:
+        The commit being compared
+    :param history_path:
+        A path to the benchmark history file
+    :return:
+        The comparison for each case in common
+    """
+    history = read_history(history_path)
+    base_session = _latest_session(history, base)
+    other_session = _latest_session(history, other)
+
+    def case_key(case: Dict) -> Tuple:
+        return case["config"], tuple(case["grid"]), case["iters"]
+
+    base_cases = {case_key(case): case for case in base_session["cases"]}
+    comparison = []
+
+    for case in other_session["cases"]:
+        key = case_key(case)
+        if key not in base_cases:
+            continue
+
+        base_case = base_cases[key]
+        comparison.append({
+            "config": key[0],
+            "grid": list(key[1]),
+            "iters": key[2],
+            "base_wall": base_case["wall"],
+            "other_wall": case["wall"],
+            "ratio": case["wall"] / base_case["wall"],
+            "base_peak_rss_kb": base_case["peak_rss_kb"],
+            "other_peak_rss_kb": case["peak_rss_kb"],
+        })
+
+    print("{:<32} {:>9} {:>5} {:>9} {:>9} {:>7}"
+          .format("config", "grid", "iters", base[:9], other[:9], "ratio"))
+    for entry in comparison:
+        print("{:<32} {:>9} {:>5} {:8.3f}s {:8.3f}s {:6.2f}x"
+              .format(entry["config"], _format_grid(entry["grid"]),
+                      entry["iters"], entry["base_wall"],
+                      entry["other_wall"], entry["ratio"]))
+
+    return comparison
+
+
+def measure_import(module: str) -> Tuple[float, List[Tuple[str, float]],
+                                          List[str]]:
+    """
+    Import module in a fresh Python process with import timing enabled.
+    Returns the cumulative time taken to import module, in seconds, a list
+    of every module imported along the way paired with the time spent
+    importing it, excluding its own imports, and the names of any deferred
+    modules that were loaded.
+
+    :param module:
+        The name of the module to import
+    :return:
+        The module's import time, the time taken by each module imported,
+        and the deferred modules that were imported
+    """
+    check = "import sys, json; import {}; " \
+            "print(json.dumps([name for name in {} if name in sys.modules]))"\
+        .format(module, json.dumps(DEFERRED_MODULES))
+    completed = subprocess.run([executable, "-X", "importtime", "-c", check],
+                               cwd=MAIN_PATH, stdout=subprocess.PIPE,
+                               stderr=subprocess.PIPE,
+                               universal_newlines=True, check=True)
+
+    total = 0.0
+    module_times = []
+    for line in completed.stderr.splitlines():
+        # Lines have the form "import time: <self> | <cumulative> | <name>",
+        # where times are in microseconds and name is indented by depth.
+        if not line.startswith("import time:") or "[us]" in line:
+            continue
+
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        module_times.append((name.strip(), int(self_us) / 1e6))
+        if name.strip() == module:
+            total = int(cumulative_us) / 1e6
+
+    loaded = json.loads(completed.stdout.splitlines()[-1])
+    return total, module_times, loaded
+
+
+def check_imports(repeats: int = 3,
+                  top: int = 10) -> bool:
+    """
+    Measure the import time of each entry point module in IMPORT_BUDGETS,
+    taking the fastest of several imports, and print the modules that took
+    longest to load. Returns False if any entry point exceeds its budget or
+    imports a deferred module.
+
+    :param repeats:
+        The number of times each module is imported
+    :param top:
+        The number of slowest-loading modules to print for each entry point
+    :return:
+        True if every entry point is within its budget
+    """
+    passed = True
+
+    for module, budget in IMPORT_BUDGETS.items():
+        measurements = [measure_import(module) for _ in range(repeats)]
+        total, module_times, loaded = min(measurements,
+                                          key=lambda result: result[0])
+
+        print("import {}: {:.3f}s (budget {:.3f}s)"
+              .format(module, total, budget))
+        for name, elapsed in sorted(module_times, key=lambda pair: pair[1],
+                                    reverse=True)[:top]:
+            print("    {:>8.3f}s  {}".format(elapsed, name))
+
+        if total > budget:
+            print("FAIL: import {} exceeds its budget".format(module))
+            passed = False
+        if loaded:
+            print("FAIL: import {} loads deferred modules: {}"
+                  .format(module, ", ".join(loaded)))
+            passed = False
+
+    return passed
+
+
+def _format_grid(grid: List[float]) -> str:
+    """
+    Returns a string of the form "<lat>x<lon>" describing grid cell widths.
+    """
+    return "{:g}x{:g}".format(*grid)
+
+
+def _parse_grid(grid_str: str) -> Tuple[float, float]:
+    """
+    Returns the grid cell widths given by a string of the form
+    "<lat>x<lon>", such as "10x20".
+    """
+    lat, lon = grid_str.lower().split("x")
+    return float(lat), float(lon)
+
+
+USAGE = "Usage: python benchmark.py [-c <config>]... [-g <lat>x<lon>]..." \
+        " [-i <iters>]... [-r <repeats>] [-o <history>]" \
+        " [--synthetic] [--images]\n" \
+        "       python benchmark.py --compare <commit> <commit>" \
+        " [-o <history>]\n" \
+        "       python benchmark.py --imports"
+
+
+if __name__ == '__main__':
+    try:
+        options, args = gnu_getopt(argv[1:], "c:g:i:r:o:",
+                               ["synthetic", "images", "compare",
+                                "imports", "case=", "result="])
+    except GetoptError:
+        print(USAGE)
+        exit(1)
+
+    options_map = {}
+    for option, value in options:
+        options_map.setdefault(option, []).append(value)
+    history_path = options_map.get("-o", [DEFAULT_HISTORY_PATH])[-1]
+
+    if "--case" in options_map:
+        # Run a single case on behalf of a parent benchmark process.
+        warnings.simplefilter("ignore", FutureWarning)
+        case = json.loads(options_map["--case"][-1])
+        result = run_case(case["config"], tuple(case["grid"]), case["iters"],
+                          case["synthetic"], case["images"])
+
+        with open(options_map["--result"][-1], "w") as result_file:
+            json.dump(result, result_file)
+    elif "--imports" in options_map:
+        exit(0 if check_imports() else 1)
+    elif "--compare" in options_map:
+        if len(args) != 2:
+            print(USAGE)
+            exit(1)
+
+        compare_commits(args[0], args[1], history_path)
+    else:
+        config_names = options_map.get("-c", BENCHMARK_CONFIGS)
+        try:
+            grids = [_parse_grid(grid) for grid in options_map["-g"]] \
+                if "-g" in options_map else BENCHMARK_GRIDS
+            iteration_counts = [int(iters) for iters in options_map["-i"]] \
+                if "-i" in options_map else BENCHMARK_ITERATIONS
+            repeats = int(options_map.get("-r", [1])[-1])
+        except (ValueError, IndexError):
+            print(USAGE)
+            exit(1)
+
+        run_benchmarks(config_names, grids, iteration_counts, repeats,
+                       "--synthetic" in options_map,
+                       "--images" in options_map, history_path)
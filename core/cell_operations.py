@@ -1,7 +1,6 @@
 import numpy as np
 from core.configuration import WeightFunc
 
-from lowtran import userhoriztrans
 from typing import Dict, Tuple
 
 
@@ -196,6 +195,8 @@ def calculate_modern_transparency(co2: float, temp: float,
         Optional parameter. The pressure of the atmosphere in millibars.
         Defaults to the Lowtran default of 949.0 if not explicitly specified.
     """
+    from lowtran import userhoriztrans
+
     h2o = calculate_water_vapor(temp, relative_humidity)
     p = calculate_mean_path(co2, h2o)
 
@@ -243,6 +244,8 @@ def modern_transparency_dict(temp: float, height: float, dist: float, pressure:
     :return:
         A Dict of transparency values with keys of co2 and h2o pairings/tuples
     """
+    from lowtran import userhoriztrans
+
     co2_values = [1.0, 1.2, 1.5, 2.0, 2.5, 3.0, 4.0, 6.0, 10.0, 20.0, 40.0]
     h2o_values = [.3, .5, 1.0, 1.5, 2.0, 3.0, 4.0, 6.0, 10.0]
     parameters = {'h1': height,
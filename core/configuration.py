@@ -1,18 +1,19 @@
-from typing import Union, Optional, Tuple, Dict, Callable
+from typing import Union, Optional, Tuple, Dict, Callable, Sequence
 from threading import local
 from os import path
 
-from frozendict import frozendict
 from datetime import datetime
 
+import copy
 import json
-from jsonschema import validate
-from jsonschema.exceptions import ValidationError
+import hashlib
 import xml.etree.ElementTree as ETree
+import numpy as np
 
 from data.resources import MAIN_PATH
 from data.provider import PROVIDERS
 from data.grid import GridDimensions
+from core.solvers import SOLVERS
 
 # Type aliases
 Config = 'ArrheniusConfig'
@@ -36,6 +37,10 @@ CO2_INIT = "from"
 CO2_FINAL = "to"
 NUM_LAYERS = "layers"
 NUM_ITERS = "iters"
+CONVERGENCE_TOL = "tol"
+SOLVER = "solver"
+PRECISION = "precision"
+KERNEL = "kernel"
 AGGREGATE_LAT = "aggregate_lat"
 AGGREGATE_LEVEL = "aggregate_level"
 COLORBAR_SCALE = "scale"
@@ -45,6 +50,7 @@ HUMIDITY_SRC = "humidity_src"
 ALBEDO_SRC = "albedo_src"
 ABSORBANCE_SRC = "absorbance_src"
 PRESSURE_SRC = "pressure_src"
+MASK_SRC = "mask_src"
 CO2_WEIGHT = "CO2_weight"
 H2O_WEIGHT = "H2O_weight"
 
@@ -54,6 +60,10 @@ GRID_TYPE = "repr"
 GRID_FORMAT_LAT = "lat"
 GRID_FORMAT_LON = "lon"
 
+# Keys for iteration specification substructure.
+ITERS_MAX = "max"
+ITERS_TOL = "tol"
+
 AGGREGATE_BEFORE = "before"
 AGGREGATE_AFTER = "after"
 AGGREGATE_NONE = "none"
@@ -62,6 +72,35 @@ ABS_SRC_TABLE = "table"
 ABS_SRC_MODERN = "modern"
 ABS_SRC_MULTILAYER = "multilayer"
 
+# Mask option under which every grid cell is computed.
+MASK_NONE = "none"
+
+# Backends for table-mode cell calculations, described in core.kernels.
+KERNEL_PYTHON = "python"
+KERNEL_NUMPY = "numpy"
+KERNEL_NUMBA = "numba"
+KERNELS = [KERNEL_PYTHON, KERNEL_NUMPY, KERNEL_NUMBA]
+
+# Floating-point types in which grid data may be stored, by name.
+PRECISIONS = {
+    "float32": np.float32,
+    "float64": np.float64,
+}
+
+# Number of hexadecimal digits in an auto-generated run ID.
+RUN_ID_LENGTH = 16
+
+# Default values of options introduced after run IDs were first derived
+# from configuration options. An option left at its default is left out of
+# the run ID, so that adding an option does not change the ID, and discard
+# the stored results, of every existing configuration.
+ADDED_OPTION_DEFAULTS = {
+    SOLVER: "picard",
+    PRECISION: "float64",
+    KERNEL: KERNEL_PYTHON,
+    MASK_SRC: MASK_NONE,
+}
+
 
 def weight_by_closest(lower_val: float,
                       upper_val: float,
@@ -209,29 +248,31 @@ JSON_SCHEMA_FILE = path.join(MAIN_PATH, 'core', 'config_schema.json')
 json_schema = json.loads(open(JSON_SCHEMA_FILE, "r").read())
 
 
-def freeze_dict(mutable_dict: Dict) -> frozendict:
+def canonical_json(options: Dict) -> str:
     """
-    Translates the standard Python dict mutable_dict into immutable form,
-    including any other dictionaries that are values in the dict. Returns
-    this immutable form of the dict.
-
-    Note: Mutable objects, such as user-defined classes, cannot be converted
-    into immutable form in the same way as other types. Therefore mutable_dict
-    must not contain any user-defined classes as values.
-
-    Additionally, list conversion is not supported yet, so mutable_dict must
-    not contain any lists as values.
-
-    :param mutable_dict:
-        A standard Python dict
+    Returns a canonical JSON encoding of the configuration dictionary
+    options, which is the same for any two dictionaries with equal contents.
+    Keys are sorted at every level of nesting, insignificant whitespace is
+    omitted, and floats with integral values are written as integers so that
+    options such as 2 and 2.0 are encoded identically.
+
+    :param options:
+        A configuration dictionary, containing only JSON-compatible values
     :return:
-        The original dict in immutable form
+        A canonical JSON string representing the dictionary
     """
-    for k, v in mutable_dict.items():
-        if isinstance(v, dict):
-            mutable_dict[k] = freeze_dict(v)
+    def normalize(value: object) -> object:
+        if isinstance(value, dict):
+            return {k: normalize(v) for k, v in value.items()}
+        elif isinstance(value, (list, tuple)):
+            return [normalize(v) for v in value]
+        elif isinstance(value, float) and value.is_integer():
+            return int(value)
+        else:
+            return value
 
-    return frozendict(mutable_dict)
+    return json.dumps(normalize(options), sort_keys=True,
+                      separators=(",", ":"))
 
 
 class InvalidConfigError(ValueError):
@@ -340,6 +381,14 @@ class ArrheniusConfig:
 
 
         attempt_load(self.set_layers, ("layers", lambda: 1))
+        attempt_load(self.set_solver,
+                     (SOLVER, lambda: ADDED_OPTION_DEFAULTS[SOLVER]))
+        attempt_load(self.set_precision,
+                     (PRECISION, lambda: ADDED_OPTION_DEFAULTS[PRECISION]))
+        attempt_load(self.set_kernel,
+                     (KERNEL, lambda: ADDED_OPTION_DEFAULTS[KERNEL]))
+        attempt_load(self.set_mask,
+                     (MASK_SRC, lambda: ADDED_OPTION_DEFAULTS[MASK_SRC]))
         attempt_load(self.set_colorbar, ("scale", lambda: (-8, 8)))
         attempt_load(self.set_year, ("year", lambda: datetime.now().year))
 
@@ -387,22 +436,96 @@ class ArrheniusConfig:
     def _generate_run_id(self: 'ArrheniusConfig') -> str:
         """
         Returns an auto-generated ID for a model run with this configuration
-        set. ID's for different model runs are most likely going to be unique,
-        although that property is not enforced.
+        set. The ID is a prefix of the SHA-256 digest of the configuration's
+        canonical JSON form, so configuration sets with the same options
+        always produce the same ID, across processes and Python versions.
+
+        Options that do not affect model results, such as the colorbar scale
+        and the kernel backend, are left out of the ID, as are options in
+        ADDED_OPTION_DEFAULTS that are set to their defaults.
 
         :return:
             An auto-generated ID for the configuration set
         """
-        # Remove any keys from the dictionary that do not affect ID.
-        to_remove = [COLORBAR_SCALE]
-        for ignored_key in to_remove:
-            if ignored_key in self._basis:
-                del self._basis[ignored_key]
-        config_hash_val = abs(freeze_dict(self._basis).__hash__())
+        # Leave out any keys from the dictionary that do not affect ID.
+        ignored_keys = {COLORBAR_SCALE, KERNEL, "run_id"}
+        id_basis = {k: v for k, v in self._basis.items()
+                    if k not in ignored_keys
+                    and not (k in ADDED_OPTION_DEFAULTS
+                             and v == ADDED_OPTION_DEFAULTS[k])}
+
+        digest = hashlib.sha256(canonical_json(id_basis).encode("utf-8"))
+        return digest.hexdigest()[:RUN_ID_LENGTH]
+
+    def transient_run_id(self: 'ArrheniusConfig',
+                         co2_path: Dict[int, float]) -> str:
+        """
+        Returns the ID of a transient model run under this configuration
+        that follows co2_path, a mapping from each year of the run to the
+        final CO2 multiplier for that year. The ID is this configuration's
+        run ID followed by a prefix of the SHA-256 digest of the path's
+        canonical JSON form, so that transient runs along different paths
+        never share output with each other or with the regular model run.
+
+        :param co2_path:
+            The final CO2 concentration multiplier for each year
+        :return:
+            An ID for the transient model run
+        """
+        path_json = canonical_json({str(year): float(co2)
+                                    for year, co2 in co2_path.items()})
+        digest = hashlib.sha256(path_json.encode("utf-8"))
+        return "{}_transient_{}".format(self.run_id(),
+                                        digest.hexdigest()[:RUN_ID_LENGTH])
+
+    def ensemble_run_id(self: 'ArrheniusConfig',
+                        perturbations: Sequence['Perturbation'],
+                        percentiles: Sequence[float]) -> str:
+        """
+        Returns the ID of an ensemble model run under this configuration,
+        whose members are perturbed by each of perturbations in turn and
+        whose results are summarized by the given percentiles. As for
+        transient_run_id, the ID is this configuration's run ID followed by
+        a prefix of the SHA-256 digest of the ensemble's canonical JSON
+        form, made from the seed and noise scales of every member, so that
+        different ensembles never share output with each other or with the
+        regular model run.
+
+        :param perturbations:
+            The perturbation of each ensemble member's input data
+        :param percentiles:
+            Percentiles of temperature change summarized over the members
+        :return:
+            An ID for the ensemble model run
+        """
+        ensemble_json = canonical_json({
+            "members": [{"seed": int(perturbation.seed),
+                         "scales": {var_name: float(scale)
+                                    for var_name, scale
+                                    in perturbation.scales.items()}}
+                        for perturbation in perturbations],
+            "percentiles": [float(percentile) for percentile in percentiles]
+        })
+        digest = hashlib.sha256(ensemble_json.encode("utf-8"))
+        return "{}_ensemble_{}".format(self.run_id(),
+                                       digest.hexdigest()[:RUN_ID_LENGTH])
+
+    def with_run_id(self: 'ArrheniusConfig',
+                    run_id: str) -> 'ArrheniusConfig':
+        """
+        Returns a copy of this configuration set with the run ID run_id,
+        leaving this configuration set unchanged.
 
-        # Convert to hexadecimal for compaction and remove the 0x
-        # from the front.
-        return hex(config_hash_val)[2:]
+        :param run_id:
+            The ID of the copy's model run
+        :return:
+            A copy of this configuration set
+        """
+        config = copy.copy(self)
+        config._settings = dict(self._settings)
+        config._basis = dict(self._basis)
+        config.set_run_id(run_id)
+        return config
 
     def set_run_id(self: 'ArrheniusConfig',
                    run_id: str) -> None:
@@ -493,7 +616,9 @@ class ArrheniusConfig:
                    layers: int) -> None:
         """
         Sets the number of layers that should be used in a multilayer model
-        run. This option is disregarded in any single layer model run.
+        run. Atmospheric levels are merged down to this many layers only if
+        level aggregation is enabled. This option is disregarded in any
+        single layer model run.
 
         :param layers:
             The number of layers in a multilayer model
@@ -506,29 +631,133 @@ class ArrheniusConfig:
         self._basis["layers"] = layers
 
     def set_iters(self: 'ArrheniusConfig',
-                  iters: int) -> None:
+                  iters: Union[int, Dict[str, float]]) -> None:
         """
         Sets the number of calculation iterations for the humidity-
         transparency feedback effect.
 
+        iters may be a fixed number of iterations, or a dictionary with keys
+        "max" and "tol". In the latter case, the feedback calculation for a
+        grid cell stops as soon as one iteration changes its temperature by
+        less than "tol" Kelvin, or after "max" iterations, whichever comes
+        first.
+
         :param iters:
-            The number of humidity recalculations per grid cell
+            The number of humidity recalculations per grid cell, or the
+            maximum number of recalculations and a convergence tolerance
         """
-        if iters < 0:
-            raise InvalidConfigError("Number of feedback iterations must be"
-                                     " non-negative (is {})".format(iters))
+        if isinstance(iters, dict):
+            max_iters = iters[ITERS_MAX]
+            tolerance = iters[ITERS_TOL]
+        else:
+            max_iters = iters
+            tolerance = None
 
-        self._settings[NUM_ITERS] = iters
+        if max_iters < 0:
+            raise InvalidConfigError("Number of feedback iterations must be"
+                                     " non-negative (is {})"
+                                     .format(max_iters))
+        elif tolerance is not None and tolerance <= 0:
+            raise InvalidConfigError("Convergence tolerance must be positive"
+                                     " (is {})".format(tolerance))
+
+        self._settings[NUM_ITERS] = max_iters
+        self._settings[CONVERGENCE_TOL] = tolerance
         self._basis["iters"] = iters
 
+    def set_solver(self: 'ArrheniusConfig',
+                   solver: str) -> None:
+        """
+        Sets the fixed-point solver used for the humidity-transparency
+        feedback loop, by its name in core.solvers.SOLVERS.
+
+        :param solver:
+            The name of the feedback solver
+        """
+        if solver not in SOLVERS:
+            options = list(SOLVERS.keys())
+            example = "\"" + "\", \"".join(options[:-1]) \
+                      + "\", and \"" + options[-1] + "\""
+            raise InvalidConfigError("Feedback solver must be one of "
+                                     + example + " (is \"{}\")."
+                                     .format(solver))
+
+        self._settings[SOLVER] = SOLVERS[solver]
+        self._basis["solver"] = solver
+
+    def set_precision(self: 'ArrheniusConfig',
+                      precision: str) -> None:
+        """
+        Sets the floating-point type, "float32" or "float64", in which
+        gridded data is stored throughout the model run.
+
+        :param precision:
+            The name of the floating-point type for grid data
+        """
+        if precision not in PRECISIONS:
+            raise InvalidConfigError("Precision must be one of \"float32\""
+                                     " and \"float64\" (is \"{}\")."
+                                     .format(precision))
+
+        self._settings[PRECISION] = np.dtype(PRECISIONS[precision])
+        self._basis["precision"] = precision
+
+    def set_kernel(self: 'ArrheniusConfig',
+                   kernel: str) -> None:
+        """
+        Sets the backend for table-mode cell calculations: "python" to
+        compute one cell at a time, or "numpy" or "numba" to compute whole
+        grids at once. The numba backend falls back to the numpy backend if
+        numba is not installed. All backends give the same results, up to
+        floating-point rounding.
+
+        :param kernel:
+            The name of the kernel backend
+        """
+        if kernel not in KERNELS:
+            raise InvalidConfigError("Kernel must be one of \"python\","
+                                     " \"numpy\", and \"numba\""
+                                     " (is \"{}\").".format(kernel))
+
+        self._settings[KERNEL] = kernel
+        self._basis["kernel"] = kernel
+
+    def set_mask(self: 'ArrheniusConfig',
+                 mask: str) -> None:
+        """
+        Sets the mask provider that selects which grid cells are computed,
+        by its key, or "none" to compute every grid cell. Cells outside the
+        mask are left out of model calculations, and have missing values in
+        the model's output.
+
+        :param mask:
+            The key for a mask provider function, or "none"
+        """
+        mask_options = PROVIDERS["mask"]
+
+        if mask == MASK_NONE:
+            self._settings[MASK_SRC] = None
+        elif mask in mask_options:
+            self._settings[MASK_SRC] = mask_options[mask]
+        else:
+            options = [MASK_NONE] + list(mask_options.keys())
+            example = "\"" + "\", \"".join(options[:-1]) \
+                      + "\", and \"" + options[-1] + "\""
+            raise InvalidConfigError("Mask must be one of "
+                                     + example + " (is \"{}\")."
+                                     .format(mask))
+
+        self._basis["mask_src"] = mask
+
     def set_aggregations(self: 'ArrheniusConfig',
                          agg_lat: Optional[str] = None,
                          agg_level: Optional[str] = None) -> None:
         """
         Sets one or both of agg_lat and agg_level configuration options,
         whichever one(s) is/are not None. These options control conversion
-        of model output into an equivalent representation with one latitude
-        layer or one atmospheric layer, respectively.
+        of model data into an equivalent representation with one longitude
+        cell in each latitude band, or with adjacent atmospheric levels
+        merged into the configured number of layers, respectively.
 
         :param agg_lat:
             A key representing the setting of the aggregate latitude option
@@ -766,13 +995,58 @@ class ArrheniusConfig:
     def iterations(self: 'ArrheniusConfig') -> int:
         """
         Returns the number of calculation iterations for the humidity-
-        transparency feedback effect.
+        transparency feedback effect. If a convergence tolerance is set,
+        this is the maximum number of iterations.
 
         :return:
             The number of humidity recalculations per grid cell
         """
         return self._settings[NUM_ITERS]
 
+    def convergence_tolerance(self: 'ArrheniusConfig') -> Optional[float]:
+        """
+        Returns the change in temperature, in Kelvin, below which the
+        humidity-transparency feedback calculation for a grid cell is
+        considered to have converged, or None if every grid cell runs for
+        the full number of iterations.
+
+        :return:
+            The convergence tolerance for feedback iterations
+        """
+        return self._settings[CONVERGENCE_TOL]
+
+    def solver(self: 'ArrheniusConfig') -> 'Solver':
+        """
+        Returns the fixed-point solver used for the humidity-transparency
+        feedback loop, as described in core.solvers.
+
+        :return:
+            The feedback solver function
+        """
+        return self._settings[SOLVER]
+
+    def precision(self: 'ArrheniusConfig') -> np.dtype:
+        """
+        Returns the floating-point type in which gridded data is stored
+        throughout the model run. Transparency and temperature calculations
+        for each grid cell are carried out in double precision, and their
+        results are stored in this type.
+
+        :return:
+            The floating-point type of grid data
+        """
+        return self._settings[PRECISION]
+
+    def kernel(self: 'ArrheniusConfig') -> str:
+        """
+        Returns the name of the backend for table-mode cell calculations,
+        as described in core.kernels.
+
+        :return:
+            The name of the kernel backend
+        """
+        return self._settings[KERNEL]
+
     def aggregate_latitude(self: 'ArrheniusConfig') -> Optional[str]:
         """
         Returns the settings for latitude aggregation, specifying when/whether
@@ -787,8 +1061,9 @@ class ArrheniusConfig:
     def aggregate_level(self: 'ArrheniusConfig') -> Optional[str]:
         """
         Returns the settings for level aggregation in a multilayer model,
-        specifying when/whether to convert the multilayer data into a
-        single-layer version.
+        specifying when/whether to merge adjacent atmospheric levels into
+        as many layers as the layers option allows, using means weighted by
+        the pressure thickness of each level.
 
         :return:
             The aggregate level option's setting
@@ -854,6 +1129,17 @@ class ArrheniusConfig:
         except KeyError:
             raise AttributeError("No value specified for pressure_provider")
 
+    def mask_provider(self: 'ArrheniusConfig') -> Optional[Callable]:
+        """
+        Returns the mask provider function for the upcoming model run, or
+        None if every grid cell is to be computed. That function returns a
+        boolean array on its grid parameter, True for each cell to compute.
+
+        :return:
+            A mask provider function, or None
+        """
+        return self._settings[MASK_SRC]
+
     def table_auxiliaries(self: 'ArrheniusConfig') -> (Callable, Callable):
         """
         Returns additional functions used in original Arrhenius data mode.
@@ -899,6 +1185,10 @@ def from_json_string(json_data: str) -> Config:
     :return:
         A configuration object based on the JSON data
     """
+    # jsonschema is slow to import, so it is only loaded once needed.
+    from jsonschema import validate
+    from jsonschema.exceptions import ValidationError
+
     options = json.loads(json_data)
     try:
         validate(options, json_schema)
@@ -0,0 +1,54 @@
+from core.configuration import global_config
+from core.output_config import global_output_center
+
+"""
+This module defines the context of a model run: the configuration and output
+controller that every stage of the run depends on.
+
+A model run passes its context explicitly to each part of the model that
+needs it, instead of making it the thread's global configuration and output
+center. A model run is therefore not tied to the thread that started it, and
+any number of model runs may share one thread, one thread pool, or one
+process pool.
+
+Contexts can be pickled, and sent to worker processes, as long as every
+output handler in the output controller can be pickled. Handlers that are
+module-level functions, such as those in the standard output controllers,
+can always be pickled; lambdas and nested functions cannot.
+
+The thread-global configuration and output center remain for compatibility
+with code that does not receive a context, which can retrieve them as a
+context through current_context.
+"""
+
+
+class RunContext:
+    """
+    The configuration and output controller for a single model run.
+    """
+
+    def __init__(self: 'RunContext',
+                 config: 'ArrheniusConfig',
+                 output_center: 'OutputController') -> None:
+        """
+        Instantiate a new RunContext for a model run configured by config,
+        whose output is controlled by output_center.
+
+        :param config:
+            Configuration options for the model run
+        :param output_center:
+            The output controller for the model run
+        """
+        self.config = config
+        self.output_center = output_center
+
+
+def current_context() -> 'RunContext':
+    """
+    Returns a context made from the thread's global configuration and output
+    center, for use by code that was not given a context of its own.
+
+    :return:
+        The thread-global run context
+    """
+    return RunContext(global_config(), global_output_center())
@@ -0,0 +1,207 @@
+from typing import List, Dict, Sequence
+
+import numpy as np
+
+"""
+Perturbation specifications and statistics for ensemble model runs.
+
+An ensemble run repeats a table-mode model run for many members, each of
+which starts from the model's input data with random noise added to it.
+Noise is Gaussian, with a standard deviation given separately for each
+perturbed variable, and is drawn from a generator seeded by the member's
+seed and the time segment, so that every member is reproducible. Perturbed
+values are clipped to the range allowed for their variable.
+
+All members of a time segment are computed together, by stacking them
+along an ensemble axis in front of the grid's cells and passing the
+flattened array to a single call of a whole-grid kernel from core.kernels.
+The results are then summarized over the ensemble axis by their mean,
+spread, and percentiles.
+"""
+
+# Perturbed variables, in the order in which their noise is drawn.
+PERTURB_TEMPERATURE = "temperature"
+PERTURB_HUMIDITY = "humidity"
+PERTURB_ALBEDO = "albedo"
+
+PERTURBED_VARIABLES = [PERTURB_TEMPERATURE, PERTURB_HUMIDITY,
+                       PERTURB_ALBEDO]
+
+# The smallest and greatest values allowed for each perturbed variable.
+# Temperatures, in Kelvin, may take any value.
+VARIABLE_BOUNDS = {
+    PERTURB_TEMPERATURE: (None, None),
+    PERTURB_HUMIDITY: (0.0, 100.0),
+    PERTURB_ALBEDO: (0.0, 1.0),
+}
+
+# Percentiles of ensemble results written when none are requested.
+DEFAULT_PERCENTILES = (5, 50, 95)
+
+ENSEMBLE_MEAN = "mean"
+ENSEMBLE_SPREAD = "spread"
+
+
+class Perturbation:
+    """
+    The random noise added to the input data of one member of an ensemble
+    model run: a standard deviation for the noise in each perturbed
+    variable, and a seed for the random generator that draws it.
+    """
+
+    def __init__(self: 'Perturbation',
+                 seed: int,
+                 temperature: float = 0.0,
+                 humidity: float = 0.0,
+                 albedo: float = 0.0) -> None:
+        """
+        Instantiate a new Perturbation. A perturbation with no noise in any
+        variable leaves the input data unchanged, and so stands for the
+        unperturbed model run.
+
+        :param seed:
+            The seed of the member's random generator
+        :param temperature:
+            The standard deviation of noise in temperature, in Kelvin
+        :param humidity:
+            The standard deviation of noise in relative humidity, in percent
+        :param albedo:
+            The standard deviation of noise in surface albedo
+        """
+        scales = {PERTURB_TEMPERATURE: temperature,
+                  PERTURB_HUMIDITY: humidity,
+                  PERTURB_ALBEDO: albedo}
+
+        for var_name, scale in scales.items():
+            if scale < 0:
+                raise ValueError("Noise scale for {} must be non-negative"
+                                 " (is {})".format(var_name, scale))
+
+        self.seed = seed
+        self.scales = scales
+
+    def apply(self: 'Perturbation',
+              segment: int,
+              values: Dict[str, np.ndarray]) -> Dict[str, np.ndarray]:
+        """
+        Returns a copy of values, which maps each perturbed variable to an
+        array of its values in a time segment's grid cells, with this
+        perturbation's noise added. Noise depends only on the seed, the
+        time segment's index, and the number of cells.
+
+        :param segment:
+            The index of the time segment whose values are perturbed
+        :param values:
+            Arrays of values for each perturbed variable, all of one length
+        :return:
+            Arrays of perturbed values for each variable
+        """
+        rng = np.random.default_rng([self.seed, segment])
+        perturbed = {}
+
+        for var_name in PERTURBED_VARIABLES:
+            data = values[var_name]
+            noise = rng.standard_normal(len(data))
+            lower, upper = VARIABLE_BOUNDS[var_name]
+            perturbed[var_name] = \
+                np.clip(data + self.scales[var_name] * noise, lower, upper)
+
+        return perturbed
+
+
+def ensemble_members(count: int,
+                     seed: int = 0,
+                     temperature: float = 0.0,
+                     humidity: float = 0.0,
+                     albedo: float = 0.0) -> List['Perturbation']:
+    """
+    Returns perturbations for count ensemble members, all with the same
+    noise scales, and with consecutive seeds starting from seed.
+
+    :param count:
+        The number of ensemble members
+    :param seed:
+        The seed of the first member's random generator
+    :param temperature:
+        The standard deviation of noise in temperature, in Kelvin
+    :param humidity:
+        The standard deviation of noise in relative humidity, in percent
+    :param albedo:
+        The standard deviation of noise in surface albedo
+    :return:
+        A perturbation for each ensemble member
+    """
+    if count <= 0:
+        raise ValueError("Ensemble must have at least one member"
+                         " (has {})".format(count))
+
+    return [Perturbation(seed + member, temperature, humidity, albedo)
+            for member in range(count)]
+
+
+def perturb_members(perturbations: Sequence['Perturbation'],
+                    segment: int,
+                    values: Dict[str, np.ndarray]) -> Dict[str, np.ndarray]:
+    """
+    Returns the values of each perturbed variable for every ensemble member,
+    as arrays with an ensemble axis of one row per member in front of the
+    cell axis of values.
+
+    :param perturbations:
+        The perturbation of each ensemble member
+    :param segment:
+        The index of the time segment whose values are perturbed
+    :param values:
+        Arrays of values for each perturbed variable, all of one length
+    :return:
+        Arrays of perturbed values, of shape (members, cells)
+    """
+    members = [perturbation.apply(segment, values)
+               for perturbation in perturbations]
+
+    return {var_name: np.stack([member[var_name] for member in members])
+            for var_name in PERTURBED_VARIABLES}
+
+
+def percentile_name(percentile: float) -> str:
+    """
+    Returns the name under which a percentile of ensemble results is
+    stored, such as "p5" or "p97.5".
+
+    :param percentile:
+        A percentile, from 0 to 100
+    :return:
+        The name of the percentile
+    """
+    return "p{:g}".format(percentile)
+
+
+def ensemble_statistics(results: np.ndarray,
+                        percentiles: Sequence[float] = DEFAULT_PERCENTILES)\
+        -> Dict[str, np.ndarray]:
+    """
+    Summarize results, an array with an ensemble axis of one row per member
+    in front of any other axes, over its ensemble axis. Returns the mean and
+    spread (sample standard deviation) of the members, and each of the
+    requested percentiles, named by percentile_name.
+
+    :param results:
+        An array of results for each ensemble member
+    :param percentiles:
+        Percentiles of the results to compute, from 0 to 100
+    :return:
+        Arrays of statistics with the shape of one member's results
+    """
+    ddof = 1 if len(results) > 1 else 0
+    statistics = {
+        ENSEMBLE_MEAN: np.mean(results, axis=0),
+        ENSEMBLE_SPREAD: np.std(results, axis=0, ddof=ddof),
+    }
+
+    if len(percentiles) > 0:
+        values = np.percentile(results, percentiles, axis=0)
+        for percentile, value in zip(percentiles, values):
+            statistics[percentile_name(percentile)] = value
+
+    return statistics
+
@@ -0,0 +1,555 @@
+import numpy as np
+
+from importlib.util import find_spec
+from typing import Optional, Tuple, Callable
+
+from core.cell_operations import TRANSPARENCY, MEAN_PATH, \
+    CONST_A, CONST_B, CONST_C
+from core.configuration import KERNEL_PYTHON, KERNEL_NUMPY, KERNEL_NUMBA, \
+    WeightFunc, weight_by_mean, weight_by_closest, weight_by_lowest, \
+    weight_by_highest
+
+"""
+Whole-array kernels for the humidity-transparency feedback loop in table
+mode, which compute every grid cell of a grid in one call instead of
+calling the scalar functions in core.cell_operations and runner once per
+cell and feedback pass.
+
+Two backends are available. The numpy backend works on arrays of cells,
+narrowing them to the cells that have not yet converged after each pass.
+The numba backend compiles a single loop over cells, fusing water vapor,
+mean path, table lookup, and temperature calculations, and is used only if
+numba is installed; otherwise the numpy backend takes its place. numba is
+slow to import, so it is only imported when the loop is first compiled.
+
+Both backends give the same results as the scalar functions, up to
+floating-point rounding: table lookups choose the same table entries and
+weights, and each cell is solved by plain (Picard) iteration, stopping
+after the same number of passes as it would on its own. Inputs outside the
+range of the tables raise an AttributeError, as the scalar functions do.
+"""
+
+
+# Results of the feedback loop for an array of cells: final temperatures,
+# initial and final transparencies, and the number of passes for each cell.
+FeedbackResult = Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]
+TableKernel = Callable[..., FeedbackResult]
+
+# Table weighting modes, standing in for weight functions inside kernels.
+WEIGHT_MEAN = 0
+WEIGHT_CLOSEST = 1
+WEIGHT_LOWER = 2
+
+# Weighting modes of the weight functions that kernels support. Weighting
+# by highest value gives the same weights as weighting by lowest value.
+_WEIGHT_MODES = {
+    weight_by_mean: WEIGHT_MEAN,
+    weight_by_closest: WEIGHT_CLOSEST,
+    weight_by_lowest: WEIGHT_LOWER,
+    weight_by_highest: WEIGHT_LOWER,
+}
+
+
+def _table_axes(table: dict) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Returns the distinct values of the first and second parts of the keys
+    of table, each in order of first appearance.
+    """
+    first = list(dict.fromkeys(key[0] for key in table))
+    second = list(dict.fromkeys(key[1] for key in table))
+    return np.array(first, dtype=np.float64), np.array(second,
+                                                       dtype=np.float64)
+
+
+def _table_values(table: dict,
+                  first: np.ndarray,
+                  second: np.ndarray) -> np.ndarray:
+    """
+    Returns the values of table as a two-dimensional array indexed by the
+    positions of each key's parts in first and second, with NaN for keys
+    missing from the table.
+    """
+    return np.array([[table.get((x, y), np.nan) for y in second]
+                     for x in first], dtype=np.float64)
+
+
+TABLE_CO2, TABLE_H2O = _table_axes(TRANSPARENCY)
+TABLE_VALUES = _table_values(TRANSPARENCY, TABLE_CO2, TABLE_H2O)
+
+MEAN_PATH_CO2, MEAN_PATH_H2O = _table_axes(MEAN_PATH)
+MEAN_PATH_VALUES = _table_values(MEAN_PATH, MEAN_PATH_CO2, MEAN_PATH_H2O)
+
+
+def weight_mode(weight_func: WeightFunc) -> Optional[int]:
+    """
+    Returns the kernel weighting mode equivalent to weight_func, or None if
+    kernels do not support the weight function.
+
+    :param weight_func:
+        A function that weights neighbouring transparency table entries
+    :return:
+        The equivalent weighting mode
+    """
+    return _WEIGHT_MODES.get(weight_func)
+
+
+def mean_path_row(co2: float) -> np.ndarray:
+    """
+    Returns the mean path for co2 against each water vapor value in
+    MEAN_PATH_H2O, with NaN where the table has no entry. Raises an
+    AttributeError if co2 is not in the mean path table.
+
+    :param co2:
+        The amount of CO2 in the atmosphere in Arrhenius' units
+    :return:
+        A row of the mean path table
+    """
+    rows = np.flatnonzero(MEAN_PATH_CO2 == co2)
+    if co2 < 0 or len(rows) == 0:
+        raise AttributeError
+    return MEAN_PATH_VALUES[rows[0]]
+
+
+def water_vapor(temperature: np.ndarray,
+                relative_humidity: np.ndarray) -> np.ndarray:
+    """
+    Returns the water vapor in Arrhenius' units over cells with the given
+    temperatures, in Kelvin, and relative humidities, as calculated by
+    calculate_water_vapor.
+
+    :param temperature:
+        The temperature of each cell
+    :param relative_humidity:
+        The relative humidity of each cell
+    :return:
+        The water vapor traversed by a vertical ray over each cell
+    """
+    if np.any((temperature < 0) | (relative_humidity < 0)
+              | (relative_humidity > 100)):
+        raise AttributeError
+
+    pressure_saturation = 10 ** (CONST_A - (CONST_B / (temperature + CONST_C)))
+    pressure_saturation = pressure_saturation * 100000
+    pressure_water_vapor = relative_humidity / 100 * pressure_saturation
+
+    absolute_humidity = 2.16679 * pressure_water_vapor / temperature
+    return absolute_humidity / 10
+
+
+def _bracket(axis: np.ndarray,
+             values: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Returns the positions in axis of the greatest entry below each of
+    values, and of the next entry, both clamped to the ends of axis.
+    """
+    below = np.searchsorted(axis, values, side="left")
+    # Missing values select the first entry, as no comparison holds.
+    below = np.where(np.isnan(values), 0, below)
+    return np.clip(below - 1, 0, len(axis) - 1), \
+        np.clip(below, 0, len(axis) - 1)
+
+
+def _weights(lower: np.ndarray,
+             upper: np.ndarray,
+             actual: np.ndarray,
+             mode: int) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Returns the weights of the lower and upper table entries around each
+    of actual, under the weighting mode mode.
+    """
+    if mode == WEIGHT_MEAN:
+        total_diff = upper - lower
+        same = total_diff == 0
+        with np.errstate(divide="ignore", invalid="ignore"):
+            lower_weight = 1 - ((actual - lower) / total_diff)
+            upper_weight = 1 - ((upper - actual) / total_diff)
+        return np.where(same, 1.0, lower_weight), \
+            np.where(same, 0.0, upper_weight)
+    elif mode == WEIGHT_CLOSEST:
+        upper_closer = upper - actual < actual - lower
+        return np.where(upper_closer, 0.0, 1.0), \
+            np.where(upper_closer, 1.0, 0.0)
+    else:
+        return np.ones_like(actual), np.zeros_like(actual)
+
+
+def transparency(co2: float,
+                 path_row: np.ndarray,
+                 temperature: np.ndarray,
+                 relative_humidity: np.ndarray,
+                 co2_mode: int,
+                 h2o_mode: int) -> np.ndarray:
+    """
+    Returns the transparency over cells with the given temperatures, in
+    Kelvin, and relative humidities, as calculated by
+    calculate_transparency.
+
+    :param co2:
+        The amount of CO2 in the atmosphere
+    :param path_row:
+        The row of the mean path table for co2, from mean_path_row
+    :param temperature:
+        The temperature of each cell
+    :param relative_humidity:
+        The relative humidity of each cell
+    :param co2_mode:
+        The weighting mode for CO2 table entries
+    :param h2o_mode:
+        The weighting mode for water vapor table entries
+    :return:
+        The transparency over each cell
+    """
+    h2o = water_vapor(temperature, relative_humidity)
+
+    # The mean path is taken at the closest water vapor in its table.
+    nearest = np.argmin(np.abs(h2o[:, np.newaxis]
+                               - MEAN_PATH_H2O[np.newaxis, :]), axis=1)
+    p = path_row[nearest]
+    if np.any(np.isnan(p)):
+        raise AttributeError
+
+    co2_path = p * co2
+    h2o_path = p * h2o
+
+    lower_co2, upper_co2 = _bracket(TABLE_CO2, co2_path)
+    lower_h2o, upper_h2o = _bracket(TABLE_H2O, h2o_path)
+
+    lower_co2_weight, upper_co2_weight = \
+        _weights(TABLE_CO2[lower_co2], TABLE_CO2[upper_co2], co2_path,
+                 co2_mode)
+    lower_h2o_weight, upper_h2o_weight = \
+        _weights(TABLE_H2O[lower_h2o], TABLE_H2O[upper_h2o], h2o_path,
+                 h2o_mode)
+
+    return TABLE_VALUES[lower_co2, lower_h2o] \
+        * (lower_co2_weight * lower_h2o_weight) \
+        + TABLE_VALUES[lower_co2, upper_h2o] \
+        * (lower_co2_weight * upper_h2o_weight) \
+        + TABLE_VALUES[upper_co2, lower_h2o] \
+        * (upper_co2_weight * lower_h2o_weight) \
+        + TABLE_VALUES[upper_co2, upper_h2o] \
+        * (upper_co2_weight * upper_h2o_weight)
+
+
+def numpy_table_feedback(init_co2: float,
+                         new_co2: float,
+                         temperature: np.ndarray,
+                         relative_humidity: np.ndarray,
+                         albedo: np.ndarray,
+                         co2_mode: int,
+                         h2o_mode: int,
+                         max_passes: int,
+                         tolerance: Optional[float] = None,
+                         start: Optional[np.ndarray] = None)\
+        -> FeedbackResult:
+    """
+    Solve the feedback loop for an array of cells with initial
+    temperatures temperature, in Kelvin, after changing from init_co2 to
+    new_co2, with the numpy backend. Each cell is solved by plain
+    iteration, as by calculate_arr_cell_temperature with the picard
+    solver, using at most max_passes passes and stopping early once a pass
+    changes its temperature by less than tolerance.
+
+    Iteration begins from the initial temperatures, or from start if it is
+    given. A start close to the final temperatures, such as the results of
+    a similar earlier run, lets cells converge in fewer passes.
+
+    :param init_co2:
+        A multiplier of atmospheric CO2 concentration for initial state
+    :param new_co2:
+        A multiplier of atmospheric CO2 concentration for final state
+    :param temperature:
+        The initial temperature of each cell
+    :param relative_humidity:
+        The relative humidity of each cell
+    :param albedo:
+        The surface albedo of each cell
+    :param co2_mode:
+        The weighting mode for CO2 table entries
+    :param h2o_mode:
+        The weighting mode for water vapor table entries
+    :param max_passes:
+        The greatest number of feedback passes for each cell
+    :param tolerance:
+        The convergence tolerance, or None to use every pass
+    :param start:
+        The temperature of each cell from which iteration begins
+    :return:
+        Final temperatures, initial and final transparencies, and passes
+    """
+    temperature = np.asarray(temperature, dtype=np.float64)
+    relative_humidity = np.asarray(relative_humidity, dtype=np.float64)
+    nu = 1 - np.asarray(albedo, dtype=np.float64)
+
+    init_transparency = transparency(init_co2, mean_path_row(init_co2),
+                                     temperature, relative_humidity,
+                                     co2_mode, h2o_mode)
+    k = temperature ** 4 * (1 + nu * init_transparency)
+    new_path_row = mean_path_row(new_co2)
+
+    final = temperature.copy() if start is None \
+        else np.array(start, dtype=np.float64)
+    new_transparency = init_transparency.copy()
+    passes = np.zeros(len(temperature), dtype=np.int64)
+    active = np.arange(len(temperature))
+
+    for _ in range(max_passes):
+        if len(active) == 0:
+            break
+
+        previous = final[active]
+        pass_transparency = transparency(new_co2, new_path_row, previous,
+                                         relative_humidity[active],
+                                         co2_mode, h2o_mode)
+        current = (k[active] / (1 + nu[active] * pass_transparency)) \
+            ** (1 / 4)
+
+        final[active] = current
+        new_transparency[active] = pass_transparency
+        passes[active] += 1
+
+        if tolerance is not None:
+            active = active[np.abs(current - previous) >= tolerance]
+
+    return final, init_transparency, new_transparency, passes
+
+
+def _cell_transparency(co2: float,
+                       path_row: np.ndarray,
+                       temperature: float,
+                       relative_humidity: float,
+                       co2_mode: int,
+                       h2o_mode: int,
+                       table_co2: np.ndarray,
+                       table_h2o: np.ndarray,
+                       table_values: np.ndarray,
+                       path_h2o: np.ndarray) -> float:
+    """
+    Returns the transparency over one cell, as calculated by transparency,
+    or -1 if the cell's data is outside the range of the tables. Written
+    in the subset of Python that numba compiles.
+    """
+    if temperature < 0 or relative_humidity < 0 or relative_humidity > 100:
+        return -1.0
+
+    pressure_saturation = 10 ** (CONST_A - (CONST_B / (temperature + CONST_C)))
+    pressure_saturation = pressure_saturation * 100000
+    pressure_water_vapor = relative_humidity / 100 * pressure_saturation
+    h2o = 2.16679 * pressure_water_vapor / temperature / 10
+
+    nearest = 0
+    for j in range(1, len(path_h2o)):
+        if abs(h2o - path_h2o[j]) < abs(h2o - path_h2o[nearest]):
+            nearest = j
+    p = path_row[nearest]
+    if np.isnan(p):
+        return -1.0
+
+    co2_path = p * co2
+    h2o_path = p * h2o
+
+    lower = np.zeros(2, dtype=np.int64)
+    upper = np.zeros(2, dtype=np.int64)
+    weights = np.zeros(4)
+    for axis in range(2):
+        table_axis = table_co2 if axis == 0 else table_h2o
+        actual = co2_path if axis == 0 else h2o_path
+        mode = co2_mode if axis == 0 else h2o_mode
+
+        below = 0
+        for j in range(len(table_axis)):
+            if table_axis[j] < actual:
+                below = j + 1
+        lower[axis] = max(below - 1, 0)
+        upper[axis] = min(below, len(table_axis) - 1)
+
+        lower_val = table_axis[lower[axis]]
+        upper_val = table_axis[upper[axis]]
+        if mode == WEIGHT_MEAN and lower_val != upper_val:
+            total_diff = upper_val - lower_val
+            weights[2 * axis] = 1 - ((actual - lower_val) / total_diff)
+            weights[2 * axis + 1] = 1 - ((upper_val - actual) / total_diff)
+        elif mode == WEIGHT_CLOSEST and upper_val - actual < actual - lower_val:
+            weights[2 * axis] = 0.0
+            weights[2 * axis + 1] = 1.0
+        else:
+            weights[2 * axis] = 1.0
+            weights[2 * axis + 1] = 0.0
+
+    return table_values[lower[0], lower[1]] * (weights[0] * weights[2]) \
+        + table_values[lower[0], upper[1]] * (weights[0] * weights[3]) \
+        + table_values[upper[0], lower[1]] * (weights[1] * weights[2]) \
+        + table_values[upper[0], upper[1]] * (weights[1] * weights[3])
+
+
+def _loop_table_feedback(init_co2: float,
+                         new_co2: float,
+                         init_path_row: np.ndarray,
+                         new_path_row: np.ndarray,
+                         temperature: np.ndarray,
+                         relative_humidity: np.ndarray,
+                         albedo: np.ndarray,
+                         start: np.ndarray,
+                         co2_mode: int,
+                         h2o_mode: int,
+                         max_passes: int,
+                         tolerance: float,
+                         table_co2: np.ndarray,
+                         table_h2o: np.ndarray,
+                         table_values: np.ndarray,
+                         path_h2o: np.ndarray) -> Tuple:
+    """
+    Solve the feedback loop for each cell in turn, as numpy_table_feedback
+    does for all cells at once, with a tolerance of NaN standing for no
+    tolerance. Returns the same results, followed by False if any cell's
+    data is outside the range of the tables. Written in the subset of
+    Python that numba compiles.
+    """
+    count = len(temperature)
+    final = np.empty(count)
+    init_transparency = np.empty(count)
+    new_transparency = np.empty(count)
+    passes = np.zeros(count, dtype=np.int64)
+
+    for i in range(count):
+        nu = 1 - albedo[i]
+        cell_transparency = _cell_transparency(init_co2, init_path_row,
+                                               temperature[i],
+                                               relative_humidity[i],
+                                               co2_mode, h2o_mode, table_co2,
+                                               table_h2o, table_values,
+                                               path_h2o)
+        if cell_transparency < 0:
+            return final, init_transparency, new_transparency, passes, False
+
+        k = temperature[i] ** 4 * (1 + nu * cell_transparency)
+        init_transparency[i] = cell_transparency
+
+        current = start[i]
+        while passes[i] < max_passes:
+            previous = current
+            cell_transparency = _cell_transparency(new_co2, new_path_row,
+                                                   previous,
+                                                   relative_humidity[i],
+                                                   co2_mode, h2o_mode,
+                                                   table_co2, table_h2o,
+                                                   table_values, path_h2o)
+            if cell_transparency < 0:
+                return final, init_transparency, new_transparency, passes, \
+                    False
+
+            current = (k / (1 + nu * cell_transparency)) ** (1 / 4)
+            passes[i] += 1
+
+            if not np.isnan(tolerance) \
+                    and not abs(current - previous) >= tolerance:
+                break
+
+        final[i] = current
+        new_transparency[i] = cell_transparency
+
+    return final, init_transparency, new_transparency, passes, True
+
+
+# The compiled version of _loop_table_feedback, once it has been compiled.
+_compiled_loop = None
+
+
+def compiled_loop() -> Callable:
+    """
+    Returns _loop_table_feedback compiled by numba, compiling it on the
+    first call. Compiled code is cached on disk, so that later processes
+    load it instead of compiling it again.
+
+    :return:
+        The compiled feedback loop
+    """
+    global _cell_transparency, _compiled_loop
+
+    if _compiled_loop is None:
+        import numba
+
+        # The loop calls _cell_transparency through this module's globals,
+        # so it must be compiled first.
+        _cell_transparency = numba.njit(cache=True)(_cell_transparency)
+        _compiled_loop = numba.njit(cache=True)(_loop_table_feedback)
+
+    return _compiled_loop
+
+
+def numba_table_feedback(init_co2: float,
+                         new_co2: float,
+                         temperature: np.ndarray,
+                         relative_humidity: np.ndarray,
+                         albedo: np.ndarray,
+                         co2_mode: int,
+                         h2o_mode: int,
+                         max_passes: int,
+                         tolerance: Optional[float] = None,
+                         start: Optional[np.ndarray] = None)\
+        -> FeedbackResult:
+    """
+    Solve the feedback loop for an array of cells, as numpy_table_feedback
+    does, with a single loop over cells compiled by numba. Requires numba
+    to be installed.
+
+    :param init_co2:
+        A multiplier of atmospheric CO2 concentration for initial state
+    :param new_co2:
+        A multiplier of atmospheric CO2 concentration for final state
+    :param temperature:
+        The initial temperature of each cell
+    :param relative_humidity:
+        The relative humidity of each cell
+    :param albedo:
+        The surface albedo of each cell
+    :param co2_mode:
+        The weighting mode for CO2 table entries
+    :param h2o_mode:
+        The weighting mode for water vapor table entries
+    :param max_passes:
+        The greatest number of feedback passes for each cell
+    :param tolerance:
+        The convergence tolerance, or None to use every pass
+    :param start:
+        The temperature of each cell from which iteration begins
+    :return:
+        Final temperatures, initial and final transparencies, and passes
+    """
+    *result, valid = compiled_loop()(
+        float(init_co2), float(new_co2), mean_path_row(init_co2),
+        mean_path_row(new_co2),
+        np.ascontiguousarray(temperature, dtype=np.float64),
+        np.ascontiguousarray(relative_humidity, dtype=np.float64),
+        np.ascontiguousarray(albedo, dtype=np.float64),
+        np.ascontiguousarray(temperature if start is None else start,
+                             dtype=np.float64),
+        co2_mode, h2o_mode, max_passes,
+        np.nan if tolerance is None else float(tolerance),
+        TABLE_CO2, TABLE_H2O, TABLE_VALUES, MEAN_PATH_H2O)
+
+    if not valid:
+        raise AttributeError
+    return tuple(result)
+
+
+def table_kernel(name: str) -> Optional[TableKernel]:
+    """
+    Returns the table-mode feedback kernel for the backend named name, or
+    None for the python backend, under which cells are computed one at a
+    time by the scalar functions. The numba backend falls back to the
+    numpy backend if numba is not installed.
+
+    :param name:
+        The name of a kernel backend
+    :return:
+        A function solving the feedback loop for an array of cells
+    """
+    if name == KERNEL_NUMBA and find_spec("numba") is not None:
+        return numba_table_feedback
+    elif name in (KERNEL_NUMBA, KERNEL_NUMPY):
+        return numpy_table_feedback
+    elif name == KERNEL_PYTHON:
+        return None
+    else:
+        raise ValueError("Unknown kernel backend: {}".format(name))
@@ -0,0 +1,273 @@
+from contextlib import contextmanager
+from time import perf_counter
+from typing import Optional, Dict, Iterator, Tuple
+
+import numpy as np
+
+from core.output_config import Metrics, global_output_center
+
+"""
+This module provides timing and counting instrumentation for model runs.
+
+Measurements are reported through an OutputController under the Metrics
+output category, in the same way as any other model output, so that they
+can be printed, logged, or collected by whichever handlers are enabled. If
+no Metrics output types are enabled, measurements are still taken but are
+discarded; taking them costs one clock read per stage, and one addition per
+grid cell for call counts.
+
+Per-cell debug information can also be traced into preallocated arrays,
+which is far cheaper than formatting a report for every grid cell.
+"""
+
+# Fields recorded for each grid cell by a CellTrace.
+TRACE_DTYPE = np.dtype([
+    ("delta_t", np.float64),
+    ("delta_transparency", np.float64),
+    ("passes", np.int32),
+])
+
+# Timed stages within a model run, each made up of one or more types of
+# metrics reported by the model.
+STAGES = {
+    "load": [Metrics.PROVIDER_TIME, Metrics.GRID_BUILD_TIME],
+    "compute": [Metrics.SEGMENT_TIME, Metrics.AGGREGATION_TIME],
+    "output": [Metrics.DATASET_WRITE_TIME, Metrics.IMAGE_RENDER_TIME],
+    "stats": [Metrics.STATISTICS_TIME],
+}
+
+
+class MetricsRecorder:
+    """
+    Accumulates timings and call counts over the course of a model run.
+
+    Timings are submitted to the output controller as soon as each one is
+    taken. Counts are accumulated, since they are incremented in the
+    innermost loops of the model, and are submitted together with a summary
+    of all measurements when the model run is finished.
+
+    Measurements are accumulated under keys formed by the value of their
+    Metrics type, followed by their label if they have one, separated by
+    a period. For example, time spent loading temperature data is stored
+    under "provider_time.temperature".
+    """
+
+    def __init__(self: 'MetricsRecorder',
+                 output_controller: Optional['OutputController'] = None)\
+            -> None:
+        """
+        Instantiate a new MetricsRecorder, which reports measurements to
+        output_controller, or to the active output controller at the time
+        of each measurement if output_controller is None.
+
+        :param output_controller:
+            The output controller to which measurements are submitted
+        """
+        self._output_controller = output_controller
+        self.reset()
+
+    def reset(self: 'MetricsRecorder') -> None:
+        """
+        Discard all measurements, and restart the clock for the total
+        time of the model run.
+        """
+        self._timings = {}
+        self._counts = {}
+        self._start = perf_counter()
+
+    def _output(self: 'MetricsRecorder') -> 'OutputController':
+        """
+        Returns the output controller to which measurements are submitted.
+        """
+        if self._output_controller is None:
+            return global_output_center()
+        else:
+            return self._output_controller
+
+    @staticmethod
+    def _key(metric: 'Metrics',
+             label: Optional[str]) -> str:
+        """
+        Returns the key under which measurements of type metric with the
+        given label are accumulated.
+        """
+        return metric.value if label is None \
+            else "{}.{}".format(metric.value, label)
+
+    @contextmanager
+    def time(self: 'MetricsRecorder',
+             metric: 'Metrics',
+             label: Optional[str] = None) -> Iterator[None]:
+        """
+        Returns a context manager that measures the time spent inside its
+        block, adds it to the total for metric and label, and submits it as
+        output of type metric.
+
+        :param metric:
+            The type of timing being measured
+        :param label:
+            An optional name distinguishing this timing from others of the
+            same type
+        """
+        start = perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = perf_counter() - start
+            self.add_time(metric, elapsed, label)
+
+    def add_time(self: 'MetricsRecorder',
+                 metric: 'Metrics',
+                 elapsed: float,
+                 label: Optional[str] = None) -> None:
+        """
+        Add elapsed seconds to the total for metric and label, and submit
+        it as output of type metric.
+
+        :param metric:
+            The type of timing being measured
+        :param elapsed:
+            The time taken, in seconds
+        :param label:
+            An optional name distinguishing this timing from others of the
+            same type
+        """
+        key = MetricsRecorder._key(metric, label)
+        self._timings[key] = self._timings.get(key, 0.0) + elapsed
+        self._output().submit_output(metric, elapsed, key)
+
+    def count(self: 'MetricsRecorder',
+              metric: 'Metrics',
+              amount: int = 1,
+              label: Optional[str] = None) -> None:
+        """
+        Add amount to the count for metric and label. Counts are not
+        submitted as output until report is called.
+
+        :param metric:
+            The type of event being counted
+        :param amount:
+            The number of events that occurred
+        :param label:
+            An optional name distinguishing this count from others of the
+            same type
+        """
+        key = MetricsRecorder._key(metric, label)
+        self._counts[key] = self._counts.get(key, 0) + amount
+
+    def summary(self: 'MetricsRecorder') -> Dict[str, Dict]:
+        """
+        Returns all measurements taken so far, as a dictionary with the keys
+        "timings" and "counts", each of which maps measurement keys to their
+        accumulated values. Timings include the total time since this
+        recorder was created or last reset, under the key "run_time".
+
+        :return:
+            All accumulated measurements
+        """
+        timings = dict(self._timings)
+        timings[Metrics.RUN_TIME.value] = perf_counter() - self._start
+
+        return {
+            "timings": timings,
+            "counts": dict(self._counts),
+        }
+
+    def report(self: 'MetricsRecorder') -> Dict[str, Dict]:
+        """
+        Submit the total time of the model run, every accumulated count,
+        and a summary of all measurements as output. Returns the summary,
+        as described under the summary method.
+
+        :return:
+            All accumulated measurements
+        """
+        output_center = self._output()
+        summary = self.summary()
+
+        output_center.submit_output(Metrics.RUN_TIME,
+                                    summary["timings"][Metrics.RUN_TIME.value],
+                                    Metrics.RUN_TIME.value)
+        for key, count in summary["counts"].items():
+            metric = Metrics(key.split(".")[0])
+            output_center.submit_output(metric, count, key)
+
+        output_center.submit_output(Metrics.RUN_SUMMARY, summary)
+        return summary
+
+
+def stage_times(metrics: Dict) -> Dict[str, float]:
+    """
+    Returns the total time spent in each stage named in STAGES, from the
+    run summary of a model run as reported under Metrics.RUN_SUMMARY.
+
+    :param metrics:
+        The run summary of a model run
+    :return:
+        The time spent in each stage, in seconds
+    """
+    stages = {}
+    for stage, stage_metrics in STAGES.items():
+        names = [metric.value for metric in stage_metrics]
+        stages[stage] = sum(elapsed for key, elapsed
+                            in metrics["timings"].items()
+                            if key.split(".")[0] in names)
+
+    return stages
+
+
+class CellTrace:
+    """
+    A record of the calculations for every grid cell in a grid, held in a
+    structured array with one entry per cell in row-major order, with the
+    fields given by TRACE_DTYPE. Cells that were not computed keep missing
+    (nan) values, and -1 feedback passes.
+    """
+
+    def __init__(self: 'CellTrace',
+                 shape: Tuple[int, int]) -> None:
+        """
+        Instantiate a new CellTrace for a grid with the given numbers of
+        latitude and longitude cells.
+
+        :param shape:
+            The dimensions of the grid, by count of cells
+        """
+        self.shape = tuple(shape)
+        self.records = np.empty(self.shape[0] * self.shape[1], TRACE_DTYPE)
+        self.records["delta_t"] = np.nan
+        self.records["delta_transparency"] = np.nan
+        self.records["passes"] = -1
+
+    def record(self: 'CellTrace',
+               index: int,
+               delta_t: float,
+               delta_transparency: float,
+               passes: int) -> None:
+        """
+        Record the results of the calculation for the grid cell at position
+        index, in row-major order.
+
+        :param index:
+            The position of the grid cell within the grid
+        :param delta_t:
+            The cell's change in temperature
+        :param delta_transparency:
+            The change in transparency of the atmosphere over the cell
+        :param passes:
+            The number of feedback passes used for the cell
+        """
+        self.records[index] = (delta_t, delta_transparency, passes)
+
+    def field(self: 'CellTrace',
+              name: str) -> np.ndarray:
+        """
+        Returns the values of one field for every grid cell, in an array
+        with the dimensions of the grid.
+
+        :param name:
+            The name of a field in TRACE_DTYPE
+        :return:
+            A latitude by longitude array of the field's values
+        """
+        return self.records[name].reshape(self.shape)
@@ -74,10 +74,56 @@ class Debug(OutputConfig):
     GRID_CELL_DELTA_TEMP = auto()
     # Prints grid cells along with the transparency change over the model run.
     GRID_CELL_DELTA_TRANSPARENCY = auto()
+    # Prints grid cells along with the number of feedback passes they used.
+    GRID_CELL_FEEDBACK_PASSES = auto()
+    # Records the temperature change, transparency change, and feedback
+    # passes of every grid cell in arrays, submitted as a CellTrace once
+    # each grid has been computed.
+    GRID_CELL_TRACE = auto()
     # Prints progress information at important stages in the model run.
     PRINT_NOTICES = auto()
 
 
+class Metrics(OutputConfig):
+    """
+    An output category for performance measurements of a model run, such
+    as the time spent in each of its stages and the number of calls made to
+    expensive calculations.
+
+    Timings are reported in seconds and counts as integers. Each output is
+    accompanied by a label naming the measurement, such as the data type for
+    provider timings.
+    """
+    # Time spent loading data from each provider function.
+    PROVIDER_TIME = "provider_time"
+    # Time spent building grids from provider data.
+    GRID_BUILD_TIME = "grid_build_time"
+    # Time spent averaging grid values over latitude bands.
+    AGGREGATION_TIME = "aggregation_time"
+    # Time spent on model calculations for each time segment.
+    SEGMENT_TIME = "segment_time"
+    # Time spent computing statistics over model results.
+    STATISTICS_TIME = "statistics_time"
+    # Time spent writing model results to the NetCDF dataset.
+    DATASET_WRITE_TIME = "dataset_write_time"
+    # Time spent rendering model results to image files.
+    IMAGE_RENDER_TIME = "image_render_time"
+    # Number of transparency calculations using Arrhenius' tables.
+    TRANSPARENCY_CALLS = "transparency_calls"
+    # Number of transparency calculations using LOWTRAN.
+    LOWTRAN_CALLS = "lowtran_calls"
+    # Number of grid cells that used each number of feedback passes, labelled
+    # by that number of passes.
+    FEEDBACK_PASSES = "feedback_passes"
+    # Number of grid cells left out of model calculations because they have
+    # no valid data or lie outside the mask.
+    SKIPPED_CELLS = "skipped_cells"
+    # Time spent on the whole model run.
+    RUN_TIME = "run_time"
+    # A dictionary of all measurements above, once the model run finishes.
+    RUN_SUMMARY = "run_summary"
+
+
 def prefix_print(data: object,
                  prefix: Optional[str] = None) -> None:
     """
@@ -234,6 +280,45 @@ class OutputController:
             handler = self._output_tree[output_type]
             handler(data, *bonus_args)
 
+    def is_enabled(self: 'OutputController',
+                   output_type: 'OutputConfig') -> bool:
+        """
+        Returns True iff output_type is enabled at the top level of the
+        collection hierarchy, that is, iff data submitted for it would be
+        passed to a handler.
+
+        Calculations that exist only to produce output, such as formatting
+        a report, can be skipped when this returns False, so that disabled
+        output costs nothing beyond this check.
+
+        :param output_type:
+            The type of output in question
+        :return:
+            Whether output of that type is allowed
+        """
+        return output_type in self._output_tree
+
+    def submit_lazy_output(self: 'OutputController',
+                           output_type: 'OutputConfig',
+                           producer: Callable[[], object],
+                           *bonus_args) -> None:
+        """
+        Submit data for output in the same way as submit_output, except that
+        the data is produced by calling producer, which is only called if
+        output_type is enabled. Suited to data that is expensive to build,
+        such as formatted reports.
+
+        :param output_type:
+            The type of output the data is associated with
+        :param producer:
+            A function taking no arguments that returns the data
+        :param bonus_args:
+            A series of any other arguments that will be passed into the
+            handler function, in order of passing
+        """
+        if output_type in self._output_tree:
+            self._output_tree[output_type](producer(), *bonus_args)
+
     def register_collection(self: 'OutputController',
                             collection_name: str,
                             supercollections: Tuple[str, ...] = (),
@@ -282,6 +367,27 @@ class OutputController:
         if handler is not None:
             collection[COLLECTION_HANDLERS] = handler
 
+    def collection_controller(self: 'OutputController',
+                              collection_path: Tuple[str, ...])\
+            -> 'OutputController':
+        """
+        Returns a new output controller whose top level is the contents of
+        the collection described by the collection path argument. This is
+        the same controller that is made active while a collection handler
+        runs, and can be used by objects that produce collection output
+        over a longer period than a single handler call.
+
+        Changes to the returned controller's output types and handlers do
+        not affect this controller.
+
+        :param collection_path:
+            A path to the collection in question through its ancestors
+        :return:
+            An output controller for the contents of the collection
+        """
+        collection = self._navigate_collection_path(collection_path)
+        return _output_controller_from_dict(collection)
+
     def submit_collection_output(self: 'OutputController',
                                  collection_path: Tuple[str, ...],
                                  data: object,
@@ -312,13 +418,19 @@ class OutputController:
         if COLLECTION_HANDLERS in collection:
             handler = collection[COLLECTION_HANDLERS]
 
-            parent_output_center = globals.output
-            subcollection_output_center = _output_controller_from_dict(collection)
-            globals.output = subcollection_output_center
-
-            handler(data, *bonus_args)
-
-            globals.output = parent_output_center
+            # Handlers that still read the thread's global output controller
+            # see the collection's controller while they run. Threads that
+            # never set a global controller are left without one afterwards.
+            parent_output_center = getattr(globals, "output", None)
+            globals.output = _output_controller_from_dict(collection)
+
+            try:
+                handler(data, *bonus_args)
+            finally:
+                if parent_output_center is None:
+                    del globals.output
+                else:
+                    globals.output = parent_output_center
         else:
             raise LookupError("No handler function loaded for collection"
                               "{}".format(collection_path))
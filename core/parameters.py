@@ -0,0 +1,96 @@
+import core.configuration as cnf
+
+from itertools import product
+from typing import List, Dict, Tuple
+
+import copy
+import json
+
+"""
+Parameter grids over the configuration space of the Arrhenius model.
+
+A parameter is a dotted path into a configuration, such as co2.to, paired
+with a list of values. Expanding configurations over a list of parameters
+produces one configuration for every combination of their values. Grids
+of this kind are shared by the sweep runner and the precompute service.
+"""
+
+
+def parse_parameter(parameter: str) -> Tuple[str, List[object]]:
+    """
+    Returns the key and values of a parameter given in the form
+    "<key>=<value>[,<value>]...". Each value is parsed as JSON if possible,
+    and is otherwise kept as a string. Grid values may be given in the
+    form "<lat>x<lon>", as cell widths in degrees.
+
+    :param parameter:
+        A parameter from the command line
+    :return:
+        The parameter's dotted key, and its list of values
+    """
+    key, value_list = parameter.split("=", 1)
+    values = []
+
+    for value in value_list.split(","):
+        try:
+            values.append(json.loads(value))
+        except ValueError:
+            values.append(value)
+
+    if key == cnf.GRID:
+        values = [_parse_grid(value) if isinstance(value, str) else value
+                  for value in values]
+
+    return key, values
+
+
+def _parse_grid(grid_str: str) -> Dict:
+    """
+    Returns grid options for cells of the widths given by a string of the
+    form "<lat>x<lon>", such as "10x20".
+    """
+    lat, lon = grid_str.lower().split("x")
+    return {
+        cnf.GRID_DIMS: {cnf.GRID_FORMAT_LAT: float(lat),
+                        cnf.GRID_FORMAT_LON: float(lon)},
+        cnf.GRID_TYPE: "width",
+    }
+
+
+def expand_parameters(configs: List[Dict],
+                      parameters: List[Tuple[str, List[object]]])\
+        -> List[Dict]:
+    """
+    Returns a list of configuration options with one entry for every
+    configuration in configs combined with every combination of parameter
+    values. Each parameter replaces the option at its dotted key, so that
+    the key co2.to sets the "to" option inside the "co2" option. Any run ID
+    in configs is dropped when there are parameters, so that each
+    combination is given its own run ID.
+
+    :param configs:
+        A list of configuration options
+    :param parameters:
+        A list of dotted keys, each paired with the values it takes
+    :return:
+        A list of configuration options over the parameter grid
+    """
+    expanded = []
+    keys = [key for key, _ in parameters]
+
+    for options in configs:
+        for values in product(*[values for _, values in parameters]):
+            point = copy.deepcopy(options)
+            if parameters:
+                point.pop("run_id", None)
+
+            for key, value in zip(keys, values):
+                *parents, last = key.split(".")
+                parent = point
+                for part in parents:
+                    parent = parent.setdefault(part, {})
+                parent[last] = value
+
+            expanded.append(point)
+
+    return expanded
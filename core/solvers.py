@@ -0,0 +1,415 @@
+from typing import Optional, Union, Tuple, Callable, Dict
+
+import numpy as np
+
+"""
+Fixed-point solvers for the humidity-transparency feedback loop.
+
+Each pass of the feedback loop recomputes transparency from the current
+temperatures, then solves for new temperatures under that transparency.
+The final temperatures of a grid cell, or of an atmospheric column, are a
+fixed point of this pass. Every pass costs one transparency calculation per
+layer, which in modern and multilayer modes is an expensive LOWTRAN call,
+so solvers that reach the fixed point in fewer passes save the most time.
+
+Every solver has the same signature. It is given a feedback function that
+performs one pass, mapping temperatures to new temperatures, along with the
+initial temperatures, the greatest number of passes allowed, and an
+optional convergence tolerance. Temperatures may be a single value or an
+array, such as a column of layers; array elements are accelerated
+independently, except by Anderson acceleration. Solvers return the final
+temperatures and the number of passes used.
+
+All solvers share one convergence criterion: they stop as soon as a pass
+changes no temperature by the tolerance or more, as decided by
+has_converged. Without a tolerance, every solver uses all of its passes.
+Each accelerated step is kept only if the pass that follows it changes the
+temperatures by less than the plain pass before it. No solver uses more
+than max_passes passes; accelerated solvers that do not converge within
+them give the output of the pass that changed its input the least.
+"""
+
+Temperature = Union[float, np.ndarray]
+FeedbackFunc = Callable[[Temperature], Temperature]
+Solver = Callable[[FeedbackFunc, Temperature, int, Optional[float]],
+                  Tuple[Temperature, int]]
+
+# The number of earlier passes combined by Anderson acceleration.
+ANDERSON_MEMORY = 3
+
+
+def has_converged(previous: Temperature,
+                  current: Temperature,
+                  tolerance: Optional[float]) -> bool:
+    """
+    Returns True if a feedback pass that changed temperatures from previous
+    to current has converged, meaning no temperature changed by tolerance
+    or more. Missing (NaN) temperatures are never updated, and so do not
+    prevent convergence. If tolerance is None, feedback passes never
+    converge early.
+
+    :param previous:
+        Temperatures before the feedback pass, for one cell or a column
+    :param current:
+        Temperatures after the feedback pass, parallel to previous
+    :param tolerance:
+        The greatest change in temperature that counts as converged
+    :return:
+        Whether no further feedback passes are necessary
+    """
+    if tolerance is None:
+        return False
+
+    change = np.abs(np.subtract(current, previous))
+    return not np.any(change >= tolerance)
+
+
+def picard(feedback: FeedbackFunc,
+           initial: Temperature,
+           max_passes: int,
+           tolerance: Optional[float] = None) -> Tuple[Temperature, int]:
+    """
+    Find a fixed point of feedback by plain (Picard) iteration, feeding the
+    temperatures from each pass into the next.
+
+    :param feedback:
+        A function performing one feedback pass
+    :param initial:
+        Temperatures before the first pass
+    :param max_passes:
+        The greatest number of feedback passes allowed
+    :param tolerance:
+        The convergence tolerance, or None to use every pass
+    :return:
+        The final temperatures, and the number of passes used
+    """
+    temperature = initial
+    passes = 0
+
+    while passes < max_passes:
+        previous = temperature
+        temperature = feedback(temperature)
+        passes += 1
+
+        if has_converged(previous, temperature, tolerance):
+            break
+
+    return temperature, passes
+
+
+def _residual_norm(inputs: Temperature,
+                   outputs: Temperature) -> float:
+    """
+    Returns the greatest change in temperature made by a feedback pass from
+    inputs to outputs, ignoring missing (NaN) temperatures.
+    """
+    change = np.abs(np.subtract(outputs, inputs))
+    finite = change[np.isfinite(change)]
+    return float(np.max(finite)) if finite.size else 0.0
+
+
+def _accelerated(estimate: Temperature,
+                 fallback: Temperature,
+                 denominator: Temperature) -> Temperature:
+    """
+    Returns estimate wherever it is finite and its denominator is nonzero,
+    and fallback elsewhere, so that an accelerated step is never worse than
+    a plain feedback pass.
+    """
+    usable = np.isfinite(estimate) & (denominator != 0)
+    result = np.where(usable, estimate, fallback)
+    return result if np.ndim(result) else float(result)
+
+
+class _BestIterate:
+    """
+    The output of the feedback pass that changed its input the least, among
+    the passes made by an accelerated solver.
+
+    Where the feedback loop has no fixed point, such as where a table
+    lookup jumps between entries, no solver converges and the final
+    temperatures depend on where iteration stops. Accelerated solvers give
+    this output there, as the closest they came to a fixed point, without
+    spending further passes.
+    """
+
+    def __init__(self: '_BestIterate',
+                 initial: Temperature) -> None:
+        """
+        Start with the temperatures before the first pass, which are given
+        if no pass is made.
+        """
+        self.temperature = initial
+        self._residual = np.inf
+
+    def update(self: '_BestIterate',
+               inputs: Temperature,
+               outputs: Temperature) -> None:
+        """
+        Record the feedback pass from inputs to outputs, keeping outputs if
+        the pass changed its input less than any earlier pass.
+        """
+        residual = _residual_norm(inputs, outputs)
+        if residual < self._residual:
+            self.temperature = outputs
+            self._residual = residual
+
+
+def aitken(feedback: FeedbackFunc,
+           initial: Temperature,
+           max_passes: int,
+           tolerance: Optional[float] = None) -> Tuple[Temperature, int]:
+    """
+    Find a fixed point of feedback using Aitken's delta-squared process
+    (Steffensen's method). After every two plain passes, the temperatures
+    are extrapolated to the limit of the sequence they form. The next pass
+    starts from the extrapolated temperatures if that pass changes them
+    by less than the last plain pass changed its input, and otherwise from
+    the temperatures of the last plain pass.
+
+    Without a tolerance, the result is that of Picard iteration. If the
+    feedback passes do not converge within max_passes, the result is the
+    output of the pass that changed its input the least.
+
+    :param feedback:
+        A function performing one feedback pass
+    :param initial:
+        Temperatures before the first pass
+    :param max_passes:
+        The greatest number of feedback passes allowed
+    :param tolerance:
+        The convergence tolerance, or None to use every pass
+    :return:
+        The final temperatures, and the number of passes used
+    """
+    if tolerance is None:
+        return picard(feedback, initial, max_passes, tolerance)
+
+    start = initial
+    first = None
+    best = _BestIterate(initial)
+    passes = 0
+
+    while passes < max_passes:
+        if first is None:
+            first = feedback(start)
+            passes += 1
+            best.update(start, first)
+            if has_converged(start, first, tolerance):
+                return first, passes
+            elif passes >= max_passes:
+                break
+
+        second = feedback(first)
+        passes += 1
+        best.update(first, second)
+        if has_converged(first, second, tolerance):
+            return second, passes
+        elif passes >= max_passes:
+            break
+
+        step = np.subtract(second, first)
+        denominator = step - np.subtract(first, start)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            estimate = second - step * step / denominator
+        estimate = _accelerated(estimate, second, denominator)
+
+        trial = feedback(estimate)
+        passes += 1
+        best.update(estimate, trial)
+        if has_converged(estimate, trial, tolerance):
+            return trial, passes
+
+        if _residual_norm(estimate, trial) < _residual_norm(first, second):
+            start, first = estimate, trial
+        else:
+            # The extrapolation moved away from the fixed point, so continue
+            # from the last plain pass instead.
+            start, first = second, None
+
+    return best.temperature, passes
+
+
+def secant(feedback: FeedbackFunc,
+           initial: Temperature,
+           max_passes: int,
+           tolerance: Optional[float] = None) -> Tuple[Temperature, int]:
+    """
+    Find a fixed point of feedback using the secant method on the residual
+    of each pass, the difference between a pass's output and its input.
+    The first pass is a plain feedback pass, and each later pass starts
+    from the root of the line through the residuals of the last two. If a
+    pass from such a root changes its input by no less than the pass
+    before it, the root is discarded, and the solver continues with a
+    plain pass from the previous pass's output.
+
+    Without a tolerance, the result is that of Picard iteration. If the
+    feedback passes do not converge within max_passes, the result is the
+    output of the pass that changed its input the least.
+
+    :param feedback:
+        A function performing one feedback pass
+    :param initial:
+        Temperatures before the first pass
+    :param max_passes:
+        The greatest number of feedback passes allowed
+    :param tolerance:
+        The convergence tolerance, or None to use every pass
+    :return:
+        The final temperatures, and the number of passes used
+    """
+    if tolerance is None:
+        return picard(feedback, initial, max_passes, tolerance)
+
+    # The input, residual, and output of the last pass that was kept.
+    previous = None
+    previous_residual = None
+    previous_result = None
+
+    current = initial
+    accelerated = False
+    best = _BestIterate(initial)
+    passes = 0
+
+    while passes < max_passes:
+        result = feedback(current)
+        passes += 1
+        best.update(current, result)
+        if has_converged(current, result, tolerance):
+            return result, passes
+
+        residual = np.subtract(result, current)
+        if accelerated and _residual_norm(current, result) \
+                >= _residual_norm(previous, previous_result):
+            # The secant step moved away from the fixed point, so continue
+            # from the output of the last pass that was kept.
+            current = previous_result
+            previous = None
+            accelerated = False
+            continue
+
+        if previous is None:
+            previous, previous_residual, previous_result = \
+                current, residual, result
+            current = result
+            continue
+
+        denominator = residual - previous_residual
+        with np.errstate(divide="ignore", invalid="ignore"):
+            estimate = current - residual * np.subtract(current, previous) \
+                / denominator
+
+        previous, previous_residual, previous_result = \
+            current, residual, result
+        current = _accelerated(estimate, result, denominator)
+        accelerated = True
+
+    return best.temperature, passes
+
+
+def anderson(feedback: FeedbackFunc,
+             initial: Temperature,
+             max_passes: int,
+             tolerance: Optional[float] = None,
+             memory: int = ANDERSON_MEMORY) -> Tuple[Temperature, int]:
+    """
+    Find a fixed point of feedback using Anderson acceleration. Each pass
+    starts from the combination of the outputs of up to memory + 1 recent
+    passes whose residuals, the differences between each pass's output and
+    its input, combine to the smallest residual by least squares. Unlike
+    the other accelerated solvers, which accelerate each temperature of a
+    column independently, Anderson acceleration accounts for the coupling
+    between layers of a column.
+
+    If a pass from such a combination changes its input by no less than
+    the pass before it, the combination is discarded, along with the
+    solver's memory of earlier passes, and the solver continues with a
+    plain pass from the previous pass's output. Without a tolerance, the
+    result is that of Picard iteration. If the feedback passes do not
+    converge within max_passes, the result is the output of the pass that
+    changed its input the least.
+
+    :param feedback:
+        A function performing one feedback pass
+    :param initial:
+        Temperatures before the first pass
+    :param max_passes:
+        The greatest number of feedback passes allowed
+    :param tolerance:
+        The convergence tolerance, or None to use every pass
+    :param memory:
+        The greatest number of earlier passes combined with the latest
+    :return:
+        The final temperatures, and the number of passes used
+    """
+    if tolerance is None:
+        return picard(feedback, initial, max_passes, tolerance)
+
+    # Inputs and outputs of recent passes, as flat arrays.
+    inputs = []
+    outputs = []
+
+    current = initial
+    accelerated = False
+    best = _BestIterate(initial)
+    passes = 0
+
+    while passes < max_passes:
+        result = feedback(current)
+        passes += 1
+        best.update(current, result)
+        if has_converged(current, result, tolerance):
+            return result, passes
+
+        if accelerated and _residual_norm(current, result) \
+                >= _residual_norm(inputs[-1], outputs[-1]):
+            # The combined step moved away from the fixed point, so continue
+            # from the output of the last pass that was kept.
+            current = _reshaped(outputs[-1], initial)
+            inputs, outputs = [], []
+            accelerated = False
+            continue
+
+        inputs = (inputs + [np.ravel(current).astype(float)])[-memory - 1:]
+        outputs = (outputs + [np.ravel(result).astype(float)])[-memory - 1:]
+
+        if len(inputs) == 1:
+            current = result
+            continue
+
+        # Missing temperatures are never updated, so they are left out of
+        # the least squares problem.
+        finite = np.isfinite(outputs[-1] - inputs[-1])
+        residuals = np.array([output - value for value, output
+                              in zip(inputs, outputs)])[:, finite]
+        residual_steps = np.diff(residuals, axis=0).T
+        output_steps = np.diff(np.array(outputs), axis=0).T
+
+        weights = np.linalg.lstsq(residual_steps, residuals[-1],
+                                  rcond=None)[0]
+        combined = outputs[-1].copy()
+        combined[finite] -= output_steps[finite] @ weights
+
+        current = _reshaped(combined, initial)
+        accelerated = True
+
+    return best.temperature, passes
+
+
+def _reshaped(values: np.ndarray,
+              like: Temperature) -> Temperature:
+    """
+    Returns the flat array values in the shape of like, as a single value
+    if like is one.
+    """
+    return values.reshape(np.shape(like)) if np.ndim(like) \
+        else float(values[0])
+
+
+# Solvers by the names used to select them in configuration.
+SOLVERS: Dict[str, Solver] = {
+    "picard": picard,
+    "aitken": aitken,
+    "secant": secant,
+    "anderson": anderson,
+}
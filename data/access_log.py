@@ -0,0 +1,155 @@
+import json
+
+from collections import Counter
+from os import path
+from pathlib import Path
+from time import time
+from typing import Optional, Dict
+from fcntl import flock, LOCK_EX, LOCK_UN
+
+from data.resources import OUTPUT_REL_PATH
+
+"""
+This module records which model runs are requested from the server, so that
+the most popular configurations can be found and their results prepared
+before they are next requested.
+
+Each request for model results or images appends one line to a log file in
+the output directory, holding the time of the request, the run ID of the
+requested model run, and the requested variable, if any. Unlike the result
+store's count of cache hits, the log outlives the output it refers to, so
+the popularity of a model run is still known after its output is evicted.
+
+The log is shared between all processes that use the same output directory,
+and is only ever changed while holding an exclusive lock on it.
+"""
+
+
+# The name of the log file inside the output directory.
+LOG_FILE_NAME = ".access_log.jsonl"
+
+# Keys in log entries.
+ENTRY_TIME = "time"
+ENTRY_RUN_ID = "run_id"
+ENTRY_VARIABLE = "var"
+
+
+class AccessLog:
+    """
+    An append-only log of requests for model run output, which counts how
+    often each model run has been requested.
+    """
+
+    def __init__(self: 'AccessLog',
+                 root: str = OUTPUT_REL_PATH) -> None:
+        """
+        Instantiate a new AccessLog, kept inside the output directory root.
+
+        :param root:
+            The directory containing one output directory per model run
+        """
+        self._root = root
+        self._log_path = path.join(root, LOG_FILE_NAME)
+
+    def record(self: 'AccessLog',
+               run_id: str,
+               var_name: Optional[str] = None) -> None:
+        """
+        Record a request for the output of model run run_id, or for images
+        of its variable var_name if var_name is not None.
+
+        :param run_id:
+            The ID of the requested model run
+        :param var_name:
+            The name of the requested variable, if any
+        """
+        entry = {ENTRY_TIME: time(), ENTRY_RUN_ID: run_id,
+                 ENTRY_VARIABLE: var_name}
+
+        Path(self._root).mkdir(parents=True, exist_ok=True)
+        with open(self._log_path, "a") as log_file:
+            flock(log_file, LOCK_EX)
+            try:
+                log_file.write(json.dumps(entry) + "\n")
+            finally:
+                flock(log_file, LOCK_UN)
+
+    def popularity(self: 'AccessLog',
+                   since: Optional[float] = None) -> Dict[str, int]:
+        """
+        Returns the number of requests recorded for each model run, by run
+        ID. If since is not None, only requests made at or after the time
+        since, in seconds since the epoch, are counted. Lines that cannot be
+        parsed, such as one left partly written by a crashed process, are
+        skipped.
+
+        :param since:
+            The earliest time from which to count requests
+        :return:
+            A mapping from run IDs to their number of requests
+        """
+        counts = Counter()
+
+        try:
+            log_file = open(self._log_path, "r")
+        except OSError:
+            return {}
+
+        with log_file:
+            for line in log_file:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    continue
+
+                if since is None or entry[ENTRY_TIME] >= since:
+                    counts[entry[ENTRY_RUN_ID]] += 1
+
+        return dict(counts)
+
+    def prune(self: 'AccessLog',
+              before: float) -> None:
+        """
+        Remove all requests recorded before the time before, in seconds
+        since the epoch, so that the log does not grow without bound.
+
+        :param before:
+            The time before which requests are forgotten
+        """
+        if not Path(self._log_path).is_file():
+            return
+
+        with open(self._log_path, "r+") as log_file:
+            flock(log_file, LOCK_EX)
+            try:
+                kept = []
+                for line in log_file:
+                    try:
+                        if json.loads(line)[ENTRY_TIME] >= before:
+                            kept.append(line)
+                    except ValueError:
+                        continue
+
+                log_file.seek(0)
+                log_file.writelines(kept)
+                log_file.truncate()
+            finally:
+                flock(log_file, LOCK_UN)
+
+
+_default_log = None
+
+
+def default_access_log() -> 'AccessLog':
+    """
+    Returns the AccessLog kept in the standard output directory.
+
+    :return:
+        The access log for standard model output
+    """
+    global _default_log
+
+    if _default_log is None:
+        _default_log = AccessLog(OUTPUT_REL_PATH)
+
+    return _default_log
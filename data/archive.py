@@ -0,0 +1,63 @@
+from typing import Iterable, Iterator, List, Tuple
+from zipfile import ZipFile, ZIP_STORED
+
+"""
+This module writes zip archives as a stream of bytes, which can be sent to a
+client as they are produced instead of being written to disk first.
+
+Entries are stored without compression, since the files archived by the
+model, such as PNG images, are already compressed. Each file is added to the
+archive only when it is reached, so files may still be in the process of
+being produced while earlier parts of the archive are sent.
+"""
+
+
+class _StreamBuffer:
+    """
+    A write-only file object that holds the bytes written to it until they
+    are drained. Since it cannot seek, a ZipFile writing to it records the
+    size and checksum of each entry after the entry's data.
+    """
+
+    def __init__(self: '_StreamBuffer') -> None:
+        self._chunks: List[bytes] = []
+
+    def write(self: '_StreamBuffer',
+              data: bytes) -> int:
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self: '_StreamBuffer') -> None:
+        pass
+
+    def drain(self: '_StreamBuffer') -> bytes:
+        """
+        Returns all bytes written since the last drain, and forgets them.
+        """
+        data = b"".join(self._chunks)
+        self._chunks = []
+        return data
+
+
+def iter_zip(entries: Iterable[Tuple[str, str]]) -> Iterator[bytes]:
+    """
+    Returns a generator of the bytes of a zip archive containing the files
+    in entries, each given by its path on disk and its name in the archive.
+    The bytes for each file are yielded as soon as the file has been added,
+    and entries is advanced only as the generator is, so the entries may
+    themselves be produced lazily.
+
+    :param entries:
+        Pairs of file paths and names within the archive
+    :return:
+        A generator of consecutive chunks of the archive
+    """
+    buffer = _StreamBuffer()
+
+    with ZipFile(buffer, "w", ZIP_STORED) as archive:
+        for file_path, archive_name in entries:
+            archive.write(file_path, archive_name)
+            yield buffer.drain()
+
+    # The archive's central directory is written once it is closed.
+    yield buffer.drain()
@@ -1,9 +1,21 @@
 from typing import Optional, List, Tuple, Callable
+from concurrent.futures import ThreadPoolExecutor, wait
 from data.grid import LatLongGrid, GridCell, GridDimensions
 
 from data.provider import REQUIRE_TEMP_DATA_INPUT
+from core.metrics import MetricsRecorder
+from core.output_config import Metrics
 import numpy as np
 
+# Approximate memory, in bytes, taken by one GridCell object along with the
+# values it holds, used to decide how many rows of cells fit in a budget.
+GRID_CELL_BYTES = 200
+
+# Provider data for one year, as temperature, humidity, and albedo arrays,
+# layer pressures, and the number of atmospheric layers.
+ProviderData = Tuple[np.ndarray, np.ndarray, np.ndarray,
+                     Optional[np.ndarray], int]
+
 
 class ClimateDataCollector:
     """
@@ -32,13 +44,157 @@ class ClimateDataCollector:
         self._albedo_source = None
         self._absorbance_source = None
         self._pressure_source = None
+        self._mask_source = None
 
         # Cached data from the above sources.
-        self._grid_data = None
+        self._provider_data = None
+        self._provider_year = None
         self._pressure_data = None
+        # Provider data for a later year that is being loaded in the
+        # background, with that year, or None if no year is prefetched.
+        self._prefetched = None
         self._absorbance_data = None
 
+        # A registry through which provider data is shared with other
+        # collectors, and the key of the snapshot this collector holds.
+        self._snapshots = None
+        self._snapshot_key = None
+
         self._grid = grid
+        self._dtype = np.dtype(np.float64)
+        self._metrics = MetricsRecorder()
+
+    def use_metrics_recorder(self: 'ClimateDataCollector',
+                             metrics: 'MetricsRecorder')\
+            -> 'ClimateDataCollector':
+        """
+        Load a new metrics recorder, which measures the time taken to load
+        data from each provider and to build grids. Returns the collector
+        object, so that repeated builder method calls can be continued.
+        :param metrics:
+            A new metrics recorder
+        :return:
+            This ClimateDataCollector
+        """
+        self._metrics = metrics
+        return self
+
+    def use_snapshot_registry(self: 'ClimateDataCollector',
+                              registry: Optional['SnapshotRegistry'])\
+            -> 'ClimateDataCollector':
+        """
+        Load a registry of shared data snapshots, or None to keep provider
+        data private to this collector. With a registry, provider data is
+        shared as a read-only snapshot with any other collector using the
+        same registry, providers, grid, precision, and year, and is loaded
+        only by whichever of them needs it first. Returns the collector
+        object, so that repeated builder method calls can be continued.
+        Calling this function voids any previously cached grid data.
+        :param registry:
+            A registry of shared data snapshots, or None
+        :return:
+            This ClimateDataCollector
+        """
+        self.release_data()
+        self._snapshots = registry
+        return self
+
+    def release_data(self: 'ClimateDataCollector') -> None:
+        """
+        Drop any cached or prefetched provider data, releasing it to the
+        snapshot registry if it is shared, so that it can be freed once no
+        other collector holds it. The data is loaded again if it is needed
+        later.
+        """
+        self.wait_for_prefetch()
+        self._prefetched = None
+        self._release_provider_data()
+
+    def _release_provider_data(self: 'ClimateDataCollector') -> None:
+        """
+        Drop any cached provider data, as release_data does, but keep any
+        provider data that is being prefetched.
+        """
+        if self._snapshot_key is not None:
+            self._snapshots.release(self._snapshot_key)
+            self._snapshot_key = None
+
+        self._provider_data = None
+
+    def prefetch(self: 'ClimateDataCollector',
+                 year: int = None) -> None:
+        """
+        Begin loading provider data for year in a background thread, so that
+        it is ready by the time it is next requested. Provider data for the
+        following year of a multi-year model run can then be read while the
+        current year is being computed. Data for only one year is prefetched
+        at a time, and prefetched data is kept until it is requested, until
+        another year is prefetched, or until the data is released.
+
+        NetCDF files may not be accessed by more than one thread at once, so
+        the caller must not read or write any NetCDF file until
+        wait_for_prefetch has returned.
+
+        :param year:
+            The year of data to be loaded
+        """
+        if self._prefetched is not None and self._prefetched[0] == year:
+            return
+        self.wait_for_prefetch()
+
+        executor = ThreadPoolExecutor(max_workers=1)
+        self._prefetched = (year,
+                            executor.submit(self._load_provider_data, year))
+        # The loading thread finishes its work once the executor is shut
+        # down, without the caller having to wait for it.
+        executor.shutdown(wait=False)
+
+    def wait_for_prefetch(self: 'ClimateDataCollector') -> None:
+        """
+        Wait until any provider data being prefetched has finished loading.
+        Errors raised while loading are not raised until the prefetched data
+        is requested.
+        """
+        if self._prefetched is not None:
+            wait([self._prefetched[1]])
+
+    def _load_or_take_prefetched(self: 'ClimateDataCollector',
+                                 year: int = None) -> ProviderData:
+        """
+        Returns provider data for year, taken from the data prefetched for
+        year if there is any, or otherwise loaded now. Data prefetched for
+        any other year is discarded.
+        :param year:
+            The year of data to be loaded
+        :return:
+            Provider data arrays, layer pressures, and layer count
+        """
+        prefetched, self._prefetched = self._prefetched, None
+
+        if prefetched is not None:
+            prefetched_year, future = prefetched
+            if prefetched_year == year:
+                return future.result()
+            wait([future])
+
+        return self._load_provider_data(year)
+
+    def use_precision(self: 'ClimateDataCollector',
+                      dtype: 'np.dtype') -> 'ClimateDataCollector':
+        """
+        Select a floating-point type in which temperature, humidity, and
+        albedo data are stored, both as provider arrays and in grid cells.
+        Returns the collector object, so that repeated builder method calls
+        can be continued.
+        Calling this function voids any previously cached grid data.
+        :param dtype:
+            A floating-point type, such as np.float32
+        :return:
+            This ClimateDataCollector
+        """
+        self._dtype = np.dtype(dtype)
+        self.release_data()
+        return self
 
     def load_grid(self: 'ClimateDataCollector',
                   grid: 'GridDimensions') -> 'ClimateDataCollector':
@@ -50,7 +206,7 @@ class ClimateDataCollector:
             The dimensions of the grid on which to place the data
         """
         self._grid = grid
-        self._grid_data = None
+        self.release_data()
         return self
 
     def use_temperature_source(self: 'ClimateDataCollector',
@@ -67,7 +223,7 @@ class ClimateDataCollector:
             This ClimateDataCollector
         """
         self._temp_source = temp_src
-        self._grid_data = None
+        self.release_data()
         return self
 
     def use_humidity_source(self: 'ClimateDataCollector',
@@ -84,7 +240,7 @@ class ClimateDataCollector:
             This ClimateDataCollector instance
         """
         self._humidity_source = r_hum_src
-        self._grid_data = None
+        self.release_data()
         return self
 
     def use_albedo_source(self: 'ClimateDataCollector',
@@ -101,7 +257,7 @@ class ClimateDataCollector:
             This ClimateDataCollector
         """
         self._albedo_source = albedo_src
-        self._grid_data = None
+        self.release_data()
         return self
 
     def use_absorbance_source(self: 'ClimateDataCollector',
@@ -124,6 +280,25 @@ class ClimateDataCollector:
                             pressure_src: Callable) -> 'ClimateDataCollector':
         self._pressure_source = pressure_src
         self._pressure_data = None
+        self.release_data()
+        return self
+
+    def use_mask_source(self: 'ClimateDataCollector',
+                        mask_src: Optional[Callable]) -> 'ClimateDataCollector':
+        """
+        Load a new mask provider function, which selects the grid cells
+        that are to be computed, or None to select every grid cell. Cells
+        outside the mask are given missing (nan) temperatures, so that they
+        are left out of model calculations. Returns the collector object, so
+        that repeated builder method calls can be continued.
+        Calling this function voids any previously cached grid data.
+        :param mask_src:
+            A new mask provider function, or None
+        :return:
+            This ClimateDataCollector
+        """
+        self._mask_source = mask_src
+        self.release_data()
         return self
 
     def get_gridded_data(self: 'ClimateDataCollector',
@@ -137,33 +312,172 @@ class ClimateDataCollector:
         dimensions, the first of which is time. It is expected that these two
         data have the same gradations of their time dimensions, e.g.
         temperature and humidity are both measured in 3-month segments.
+        Provider data is loaded only once for each year, until the grid or a
+        provider function changes, but new grids are built on every call,
+        so that grids changed by one model run are never reused by another.
         Raises an exception if not all of the required data providers have
         been loaded through builder methods.
         :return:
             An array of gridded surface data
         """
-        if self._grid_data is not None:
-            # A grid was constructed with the same grid and data sources,
-            # and nothing has changed since.
-            return self._grid_data
-        elif self._temp_source is None:
+        temp_data, r_hum_data, albedo_data, pressures, layers = \
+            self._cached_provider_data(year)
+
+        with self._metrics.time(Metrics.GRID_BUILD_TIME):
+            return self._build_time_segments(temp_data, r_hum_data,
+                                             albedo_data, pressures, layers)
+
+    def segment_count(self: 'ClimateDataCollector',
+                      year: int = None) -> int:
+        """
+        Returns the number of time segments in the provider data for year.
+        Provider data is loaded on the first call and kept for later calls.
+        :param year:
+            The year of data to be loaded
+        :return:
+            The number of time segments in the gridded data
+        """
+        return len(self._cached_provider_data(year)[0])
+
+    def chunk_rows(self: 'ClimateDataCollector',
+                   memory_budget: float,
+                   year: int = None) -> int:
+        """
+        Returns the greatest number of latitude rows of grid cells, across
+        the surface and every atmospheric layer of one time segment, that
+        fit within memory_budget bytes alongside the provider data for year.
+        At least one row is always allowed, so a budget smaller than the
+        provider data itself is not honoured exactly.
+        :param memory_budget:
+            The greatest memory, in bytes, to be used for gridded data
+        :param year:
+            The year of data to be loaded
+        :return:
+            The number of latitude rows to build at once
+        """
+        provider_data = self._cached_provider_data(year)
+        provider_bytes = sum(data.nbytes for data in provider_data[:3])
+
+        lat_count, lon_count = self._grid.dims_by_count()
+        grids = 1 if provider_data[0].ndim == 3 else provider_data[4] + 1
+        row_bytes = lon_count * grids * GRID_CELL_BYTES
+
+        rows = int((memory_budget - provider_bytes) // row_bytes)
+        return max(1, min(lat_count, rows))
+
+    def get_gridded_chunk(self: 'ClimateDataCollector',
+                          segment: int,
+                          rows: slice,
+                          year: int = None) -> List['LatLongGrid']:
+        """
+        Returns the grids for one time segment, limited to the latitude rows
+        selected by rows, for the surface followed by each atmospheric
+        layer in order of height. The grids are built in the same way as
+        those from get_gridded_data, but only a band of rows is held as
+        grid cells at once, so that high-resolution grids can be processed
+        piece by piece.
+        Raises an exception if not all of the required data providers have
+        been loaded through builder methods.
+        :param segment:
+            The index of the time segment
+        :param rows:
+            A slice of latitude row indices, from south to north
+        :param year:
+            The year of data to be loaded
+        :return:
+            A column of grids for part of the time segment
+        """
+        temp_data, r_hum_data, albedo_data, pressures, layers = \
+            self._cached_provider_data(year)
+
+        with self._metrics.time(Metrics.GRID_BUILD_TIME):
+            return self._build_time_segment(temp_data[segment][..., rows, :],
+                                            r_hum_data[segment][..., rows, :],
+                                            albedo_data[segment][..., rows, :],
+                                            pressures, layers)
+
+    def _cached_provider_data(self: 'ClimateDataCollector',
+                              year: int = None) -> ProviderData:
+        """
+        Returns provider data for year, loading it only if it has not been
+        loaded since the last change of grid or provider functions, and if
+        a snapshot registry is in use, only if no other collector holds it.
+        :param year:
+            The year of data to be loaded
+        :return:
+            Provider data arrays, layer pressures, and layer count
+        """
+        if self._provider_data is None or self._provider_year != year:
+            self._release_provider_data()
+
+            if self._snapshots is None:
+                self._provider_data = self._load_or_take_prefetched(year)
+            else:
+                key = self._data_key(year)
+                self._provider_data = self._snapshots.acquire(
+                    key, lambda: self._load_or_take_prefetched(year))
+                self._snapshot_key = key
+            self._provider_year = year
+
+        return self._provider_data
+
+    def _data_key(self: 'ClimateDataCollector',
+                  year: int = None) -> Tuple:
+        """
+        Returns a key identifying the provider data for year under the
+        current grid, precision, and provider functions, under which the
+        data is shared in a snapshot registry.
+        :param year:
+            The year of data to be loaded
+        :return:
+            A hashable key for the provider data
+        """
+        return (self._grid.dims_by_count(), self._dtype.str, year,
+                self._temp_source, self._humidity_source, self._albedo_source,
+                self._pressure_source, self._mask_source)
+
+    def _load_provider_data(self: 'ClimateDataCollector',
+                            year: int = None) -> ProviderData:
+        """
+        Loads temperature, relative humidity, albedo, and pressure data for
+        year from the current provider functions, on the current grid.
+        Raises an exception if not all of the required data providers have
+        been loaded through builder methods.
+        :param year:
+            The year of data to be loaded
+        :return:
+            Provider data arrays, layer pressures, and layer count
+        """
+        if self._temp_source is None:
             raise PermissionError("No temperature provider function selected")
         elif self._albedo_source is None:
             raise PermissionError("No albedo provider function selected")
 
-        temp_data = self._temp_source(self._grid, year)
-        r_hum_data = self._humidity_source(self._grid, year)
+        metrics = self._metrics
+
+        with metrics.time(Metrics.PROVIDER_TIME, "temperature"):
+            temp_data = self._convert(self._temp_source(self._grid, year))
+        with metrics.time(Metrics.PROVIDER_TIME, "humidity"):
+            r_hum_data = self._convert(self._humidity_source(self._grid,
+                                                             year))
 
         # if len(temp_data) != len(r_hum_data):
         #     raise ValueError("Temperature and humidity must have the same"
         #                      "time dimensions")
 
-        if self._albedo_source in REQUIRE_TEMP_DATA_INPUT:
-            albedo_data = self._albedo_source(temp_data, self._grid)
-        else:
-            albedo_data = self._albedo_source(self._grid)
-        self._grid_data = []
-        grid_dims = self._grid.dims_by_count()
+        with metrics.time(Metrics.PROVIDER_TIME, "albedo"):
+            if self._albedo_source in REQUIRE_TEMP_DATA_INPUT:
+                albedo_data = self._albedo_source(temp_data, self._grid)
+            else:
+                albedo_data = self._albedo_source(self._grid)
+            albedo_data = self._convert(albedo_data)
+
+        if self._mask_source is not None:
+            with metrics.time(Metrics.PROVIDER_TIME, "mask"):
+                mask = np.asarray(self._mask_source(self._grid), dtype=bool)
+            # The mask covers every time segment and atmospheric layer.
+            temp_data = np.where(mask, np.ma.filled(temp_data, np.nan),
+                                 np.nan).astype(self._dtype, copy=False)
 
         if len(temp_data.shape) == 3:
             layers = 1
@@ -173,35 +487,95 @@ class ClimateDataCollector:
         if self._pressure_source is None:
             pressures = None
         else:
-            pressures = self._pressure_source()
+            with metrics.time(Metrics.PROVIDER_TIME, "pressure"):
+                pressures = self._pressure_source()
 
-        # Start building a 2-D nested list structure for output, row by row.
-        for i in range(len(temp_data)):
-            temp_time_segment = temp_data[i]
-            r_hum_time_segment = r_hum_data[i]
-            albedo_time_segment = albedo_data[i]
+        return temp_data, r_hum_data, albedo_data, pressures, layers
 
-            time_segment_row = []
-            if temp_time_segment.ndim == 2:
-                time_segment_row.append(self._build_grid(grid_dims,
-                                                         temp_time_segment,
-                                                         albedo=albedo_time_segment,
-                                                         humidity=r_hum_time_segment))
-            else:
-                time_segment_row.append(self._build_grid(grid_dims,
-                                                         temp_time_segment[0, ...],
-                                                         albedo=albedo_time_segment))
+    def _convert(self: 'ClimateDataCollector',
+                 data: np.ndarray) -> np.ndarray:
+        """
+        Returns provider data in the collector's floating-point type. Masked
+        arrays keep their masks, and data already of the right type is not
+        copied.
+        :param data:
+            An array of data from a provider function
+        :return:
+            The same data in the collector's floating-point type
+        """
+        return np.asanyarray(data).astype(self._dtype, copy=False)
 
-                for m in range(layers):
-                    layer_pressure = None if pressures is None else pressures[m]
-                    time_segment_row.append(self._build_grid(grid_dims,
-                                                             temp_time_segment[m],
-                                                             humidity=r_hum_time_segment[m],
-                                                             pressure=layer_pressure))
+    def _build_time_segments(self: 'ClimateDataCollector',
+                             temp_data: np.ndarray,
+                             r_hum_data: np.ndarray,
+                             albedo_data: np.ndarray,
+                             pressures: Optional[np.ndarray],
+                             layers: int) -> List[List['LatLongGrid']]:
+        """
+        Returns a list of time segments, each of which is a list of grids
+        for the surface followed by each atmospheric layer in order of
+        height, built from provider data on the current grid.
+        :param temp_data:
+            Temperature data from the temperature provider
+        :param r_hum_data:
+            Relative humidity data from the humidity provider
+        :param albedo_data:
+            Albedo data from the albedo provider
+        :param pressures:
+            Pressures of each atmospheric layer, or None for a single layer
+        :param layers:
+            The number of atmospheric layers
+        :return:
+            A nested list of grids, by time segment and by layer
+        """
+        return [self._build_time_segment(temp_data[i], r_hum_data[i],
+                                         albedo_data[i], pressures, layers)
+                for i in range(len(temp_data))]
 
-            self._grid_data.append(time_segment_row)
+    def _build_time_segment(self: 'ClimateDataCollector',
+                            temp_time_segment: np.ndarray,
+                            r_hum_time_segment: np.ndarray,
+                            albedo_time_segment: np.ndarray,
+                            pressures: Optional[np.ndarray],
+                            layers: int) -> List['LatLongGrid']:
+        """
+        Returns a list of grids for the surface followed by each atmospheric
+        layer in order of height, built from provider data for a single
+        time segment. The grids cover as many latitude rows as the data.
+        :param temp_time_segment:
+            One time segment of temperature data
+        :param r_hum_time_segment:
+            One time segment of relative humidity data
+        :param albedo_time_segment:
+            One time segment of albedo data
+        :param pressures:
+            Pressures of each atmospheric layer, or None for a single layer
+        :param layers:
+            The number of atmospheric layers
+        :return:
+            A list of grids, by layer
+        """
+        grid_dims = temp_time_segment.shape[-2:]
+
+        time_segment_row = []
+        if temp_time_segment.ndim == 2:
+            time_segment_row.append(self._build_grid(grid_dims,
+                                                     temp_time_segment,
+                                                     albedo=albedo_time_segment,
+                                                     humidity=r_hum_time_segment))
+        else:
+            time_segment_row.append(self._build_grid(grid_dims,
+                                                     temp_time_segment[0, ...],
+                                                     albedo=albedo_time_segment))
+
+            for m in range(layers):
+                layer_pressure = None if pressures is None else pressures[m]
+                time_segment_row.append(self._build_grid(grid_dims,
+                                                         temp_time_segment[m],
+                                                         humidity=r_hum_time_segment[m],
+                                                         pressure=layer_pressure))
 
-        return self._grid_data
+        return time_segment_row
 
     def _build_grid(self,
                     dimensions: Tuple[int, int],
@@ -1,22 +1,22 @@
 from os import path
-from typing import Optional, List, Tuple
+from typing import Optional, List, Tuple, Iterator, Dict
 
 from data.resources import OUTPUT_REL_PATH
+from data.result_store import default_result_store
 from data.reader import NetCDFReader
-from data.writer import NetCDFWriter
+from data.writer import NetCDFWriter, StreamingNetCDFWriter
 from data.grid import LatLongGrid, GridDimensions,\
     extract_multidimensional_grid_variable
 
-from core.configuration import global_config, ArrheniusConfig
+from core.configuration import ArrheniusConfig
+from core.context import current_context
 from core.output_config import global_output_center, ReportDatatype, Debug,\
-    DATASET_VARS, IMAGES
+    Metrics, OutputController, DATASET_VARS, IMAGES, PRIMARY_OUTPUT_PATH
+from core.metrics import MetricsRecorder
 
+from contextlib import contextmanager
 from pathlib import Path
-from mpl_toolkits.basemap import Basemap
 
-import matplotlib
-matplotlib.use("agg")
-import matplotlib.pyplot as plt
 import numpy as np
 
 
@@ -70,6 +70,28 @@ VARIABLE_METADATA = {
     },
 }
 
+# Data describing values that label each time segment in a dataset, such as
+# the year of a time segment in a multi-year model run.
+SEGMENT_LABEL_METADATA = {
+    "year": {
+        VAR_TYPE: np.int32,
+        VAR_ATTRS: {
+            VAR_UNITS: "Year",
+            VAR_DESCRIPTION: "Year from which the time segment's data was"
+                             " taken"
+        }
+    },
+    "co2": {
+        VAR_TYPE: np.float32,
+        VAR_ATTRS: {
+            VAR_UNITS: "Multiple of CO2 concentration",
+            VAR_DESCRIPTION: "Final CO2 concentration of the time segment,"
+                             " as a multiple of the concentration at the"
+                             " time of its data"
+        }
+    },
+}
+
 
 def image_file_name(basename: str,
                     config: 'ArrheniusConfig') -> str:
@@ -95,6 +117,45 @@ def image_file_name(basename: str,
               .replace(".", ",")
 
 
+@contextmanager
+def output_directory(root: str) -> Iterator[str]:
+    """
+    Direct model output written by this process to the directory root, in
+    place of the standard output directory, for the duration of the
+    context. Output written there is not part of the result store, and is
+    never served by the web API.
+
+    :param root:
+        The directory in which each model run's output directory is made
+    :return:
+        The path to the output directory
+    """
+    global OUTPUT_FULL_PATH
+    previous = OUTPUT_FULL_PATH
+    OUTPUT_FULL_PATH = root
+
+    try:
+        yield root
+    finally:
+        OUTPUT_FULL_PATH = previous
+
+
+def record_output(run_id: str) -> None:
+    """
+    Record the complete output of model run run_id in the result store, if
+    it was written to the standard output directory. Output written to
+    another directory, through output_directory, is not recorded.
+
+    :param run_id:
+        The ID of the model run whose output is complete
+    """
+    store = default_result_store()
+    run_path = path.join(OUTPUT_FULL_PATH, run_id)
+
+    if path.abspath(store.run_path(run_id)) == path.abspath(run_path):
+        store.record(run_id)
+
+
 def get_image_directory(parent: str,
                         run_id: str,
                         var_name: str,
@@ -140,6 +201,23 @@ def get_image_directory(parent: str,
     return out_dir_path
 
 
+def _load_plotting() -> Tuple[type, object]:
+    """
+    Returns the Basemap class and the matplotlib.pyplot module, importing
+    them on first use. Both are slow to import, and are only needed when
+    images are rendered, so they are not imported with this module.
+
+    :return:
+        The Basemap class, followed by the pyplot module
+    """
+    import matplotlib
+    matplotlib.use("agg")
+    import matplotlib.pyplot as plt
+    from mpl_toolkits.basemap import Basemap
+
+    return Basemap, plt
+
+
 class ModelImageRenderer:
     """
     A converter between gridded climate data and image visualizations of the
@@ -198,6 +276,8 @@ class ModelImageRenderer:
             raise ValueError("Color grade boundaries must be given in a tuple"
                              "of length 2 (is length {})"
                              .format(len(min_max_grades)))
+        Basemap, plt = _load_plotting()
+
         # Create an empty world map in equirectangular projection.
         map = Basemap(llcrnrlat=-90, llcrnrlon=-180,
                       urcrnrlat=90, urcrnrlon=180)
@@ -261,7 +341,9 @@ class ModelImageRenderer:
 def write_image_type(data: np.ndarray,
                      parent_path: str,
                      data_type: str,
-                     config: 'ArrheniusConfig') -> bool:
+                     config: 'ArrheniusConfig',
+                     output_center: Optional['OutputController'] = None)\
+        -> bool:
     """
     Write out a category of output, given by the parameter data, to a
     directory with the name given by output_path. One image file will
@@ -273,6 +355,8 @@ def write_image_type(data: np.ndarray,
     represented by this set of images. The fourth parameter is a
     configuration set belonging to the model run the images will be
     based on. Configuration will determine the names of the output files.
+    Progress notices are submitted to output_center, or to the thread's
+    global output controller if none is given.
 
     :param data:
         A single-variable grid derived from Arrhenius model output
@@ -282,10 +366,54 @@ def write_image_type(data: np.ndarray,
         The name of the variable on which the data is based
     :param config:
         Configuration options for the previously-run model run
+    :param output_center:
+        The output controller that receives progress notices
     :return:
         True iff a new image file was produced
     """
-    output_center = global_output_center()
+    created = False
+
+    # Write an image file for each time segment.
+    for _, new_created in iter_image_files(data, parent_path, data_type,
+                                           config, output_center):
+        created = created or new_created
+
+    return created
+
+
+def iter_image_files(data: np.ndarray,
+                     parent_path: str,
+                     data_type: str,
+                     config: 'ArrheniusConfig',
+                     output_center: Optional['OutputController'] = None)\
+        -> Iterator[Tuple[str, bool]]:
+    """
+    Returns a generator that yields the path to each image file for the
+    variable data_type, whose data over all time segments is given by data,
+    along with whether that image was newly created. The image averaging
+    all time segments comes first, followed by one for each time segment.
+
+    Each image is rendered only if it is not already on disk, and only when
+    the generator reaches it, so earlier images may be used while later
+    ones are still to be rendered. Progress notices are submitted to
+    output_center, or to the thread's global output controller if none is
+    given.
+
+    :param data:
+        A single-variable grid derived from Arrhenius model output
+    :param parent_path:
+        The output directory of the model run
+    :param data_type:
+        The name of the variable on which the data is based
+    :param config:
+        Configuration options for the previously-run model run
+    :param output_center:
+        The output controller that receives progress notices
+    :return:
+        A generator of image file paths and whether each was created
+    """
+    if output_center is None:
+        output_center = global_output_center()
     output_center.submit_output(Debug.PRINT_NOTICES,
                                 "Preparing to write {} images"
                                 .format(data_type))
@@ -293,28 +421,78 @@ def write_image_type(data: np.ndarray,
     output_path = \
         get_image_directory(parent_path, config.run_id(), data_type,
                             config.colorbar(), create=True)
-    file_ext = '.png'
 
     annual_avg = np.array([np.mean(data, axis=0)])
     data = np.concatenate([annual_avg, data], axis=0)
 
-    created = False
-
-    # Write an image file for each time segment.
     for i in range(len(data)):
-        base_name = data_type + "_" + str(i)
-        img_name = image_file_name(base_name, config) + file_ext
-        img_path = path.join(output_path, img_name)
+        created = write_image_file(data[i], output_path, data_type, i,
+                                   config, output_center)
+        yield image_path(output_path, data_type, i, config), created
+
+
+def image_path(output_path: str,
+               data_type: str,
+               index: int,
+               config: 'ArrheniusConfig') -> str:
+    """
+    Returns the path to the index'th image of variable data_type, inside
+    the image directory output_path, whether or not the image exists.
+
+    :param output_path:
+        The directory where the image file is stored
+    :param data_type:
+        The name of the variable on which the image is based
+    :param index:
+        The number of the image among images of the same variable
+    :param config:
+        Configuration options for the model run
+    :return:
+        A path to the image file
+    """
+    base_name = data_type + "_" + str(index)
+    return path.join(output_path, image_file_name(base_name, config) + '.png')
+
+
+def write_image_file(data: np.ndarray,
+                     output_path: str,
+                     data_type: str,
+                     index: int,
+                     config: 'ArrheniusConfig',
+                     output_center: 'OutputController') -> bool:
+    """
+    Write a single image file rendering the two-dimensional grid data,
+    representing the index'th image of variable data_type, into the
+    directory given by output_path. Returns True iff a new image was
+    produced that was not already present on disk.
+
+    By convention, index 0 is reserved for an average over all time
+    segments, and index i for the (i - 1)'th time segment.
 
-        new_created = not Path(img_path).is_file()
+    :param data:
+        A single time segment of a single-variable grid
+    :param output_path:
+        The directory where the image file will be stored
+    :param data_type:
+        The name of the variable on which the data is based
+    :param index:
+        The number of the image among images of the same variable
+    :param config:
+        Configuration options for the model run
+    :param output_center:
+        The output controller that receives progress notices
+    :return:
+        True iff a new image file was produced
+    """
+    img_path = image_path(output_path, data_type, index, config)
+    created = not Path(img_path).is_file()
 
-        if new_created:
-            # Produce and save the image.
-            output_center.submit_output(Debug.PRINT_NOTICES,
-                                        "\tSaving image file {}...".format(i))
-            g = ModelImageRenderer(data[i])
-            g.save_image(img_path, config.colorbar())
-            created = True
+    if created:
+        # Produce and save the image.
+        output_center.submit_output(Debug.PRINT_NOTICES,
+                                    "\tSaving image file {}...".format(index))
+        g = ModelImageRenderer(data)
+        g.save_image(img_path, config.colorbar())
 
     return created
 
@@ -334,7 +512,9 @@ class ModelOutput:
     """
 
     def __init__(self: 'ModelOutput',
-                 data: List['LatLongGrid']) -> None:
+                 data: List['LatLongGrid'],
+                 output_center: Optional['OutputController'] = None)\
+            -> None:
         """
         Instantiate a new ModelOutput object.
 
@@ -342,14 +522,21 @@ class ModelOutput:
         grid objects. Each grid in the list represents a segment of time, such
         as a month or a season. All grids must have the same dimensions.
 
+        Output is submitted to output_center, or to the thread's global
+        output controller if none is given.
+
         :param data:
             A list of latitude-longitude grids of data
+        :param output_center:
+            The output controller for the model run
         """
         # Create output directory if it does not already exist.
         parent_out_dir = Path(OUTPUT_FULL_PATH)
         parent_out_dir.mkdir(exist_ok=True)
 
         self._data = data
+        self._output_center = global_output_center() \
+            if output_center is None else output_center
         self._grid = data[0].dimensions()
         self._dataset = NetCDFWriter()
 
@@ -367,7 +554,7 @@ class ModelOutput:
         (e.g. time, latitude, longitude) as well as variables including
         final temperature, temperature change, humidity, etc. according
         to which of the ReportDatatype output types are enabled in the
-        current output controller.
+        DATASET_VARS collection of this instance's output controller.
 
         :param data:
             Output from an Arrhenius model run
@@ -380,8 +567,10 @@ class ModelOutput:
         grid_by_count = self._grid.dims_by_count()
         output_path = path.join(dir_path, dataset_name)
 
-        global_output_center().submit_output(Debug.PRINT_NOTICES,
-                                             "Writing NetCDF dataset...")
+        output_controller = \
+            self._output_center.collection_controller((DATASET_VARS,))
+        output_controller.submit_output(Debug.PRINT_NOTICES,
+                                        "Writing NetCDF dataset...")
         self._dataset.global_attribute("description", "Output for an"
                                                       "Arrhenius model run.")\
             .dimension('time', np.int32, len(data), (0, len(data)))\
@@ -392,8 +581,8 @@ class ModelOutput:
             variable_data =\
                 extract_multidimensional_grid_variable(data,
                                                        output_type.value)
-            global_output_center().submit_output(output_type, variable_data,
-                                                 output_type.value)
+            output_controller.submit_output(output_type, variable_data,
+                                            output_type.value)
 
         self._dataset.write(output_path)
 
@@ -418,9 +607,11 @@ class ModelOutput:
             ['time', 'level', 'latitude', 'longitude']
         ]
 
-        global_output_center().submit_output(Debug.PRINT_NOTICES,
-                                             "Writing {} to dataset"
-                                             .format(data_type))
+        output_controller = \
+            self._output_center.collection_controller((DATASET_VARS,))
+        output_controller.submit_output(Debug.PRINT_NOTICES,
+                                        "Writing {} to dataset"
+                                        .format(data_type))
         variable_type = VARIABLE_METADATA[data_type][VAR_TYPE]
         self._dataset.variable(data_type, variable_type, dims_map[data.ndim])
 
@@ -440,8 +631,9 @@ class ModelOutput:
 
         One image will be produced per time segment per variable for which
         output is allowed by the output controller, based on which
-        ReportDatatype output types are enabled. Names of these image files
-        are based on variable and time unit, as well as config.
+        ReportDatatype output types are enabled in its IMAGES collection.
+        Names of these image files are based on variable and time unit, as
+        well as config.
 
         :param data:
             The output from an Arrhenius model run
@@ -450,7 +642,8 @@ class ModelOutput:
         :param config:
             Configuration options for the model run
         """
-        output_controller = global_output_center()
+        output_controller = \
+            self._output_center.collection_controller((IMAGES,))
 
         # Attempt to output images for each variable output type.
         for output_type in ReportDatatype:
@@ -460,7 +653,8 @@ class ModelOutput:
             output_controller.submit_output(output_type, variable,
                                             output_path,
                                             var_name,
-                                            config)
+                                            config,
+                                            output_controller)
 
     def write_output(self: 'ModelOutput',
                      config: 'ArrheniusConfig') -> None:
@@ -483,7 +677,7 @@ class ModelOutput:
         out_dir = Path(out_dir_path)
         out_dir.mkdir(exist_ok=True)
 
-        output_controller = global_output_center()
+        output_controller = self._output_center
         output_controller.submit_collection_output((DATASET_VARS,),
                                                    self._data,
                                                    out_dir_path,
@@ -494,6 +688,465 @@ class ModelOutput:
                                                    config)
 
 
+class ModelOutputStream:
+    """
+    An output center for model runs that produce their results one time
+    segment at a time. Produces the same NetCDF dataset and image files as
+    ModelOutput, but writes each time segment to disk as soon as it is
+    submitted, instead of waiting for the whole model run to finish.
+
+    The dataset's time dimension is unlimited, and grows by one index with
+    every time segment written. The file is synced after every segment, so
+    that partial results can be read while the model run is in progress.
+    Only one time segment's worth of output data is held in memory at once,
+    along with a running sum used for the annual average images. A time
+    segment may also be written in bands of latitude rows, through
+    write_rows and finish_segment, so that the model's grid cells need never
+    be held for a whole time segment at once.
+
+    Which variables are written to the dataset and rendered to images is
+    decided by the DATASET_VARS and IMAGES collections of the output
+    controller, as for ModelOutput.
+    """
+
+    def __init__(self: 'ModelOutputStream',
+                 config: 'ArrheniusConfig',
+                 output_center: 'OutputController',
+                 metrics: Optional['MetricsRecorder'] = None) -> None:
+        """
+        Instantiate a new ModelOutputStream, which will write output for a
+        model run configured by config into a directory named after the
+        run's ID. The output directory is created immediately, while the
+        dataset file is created when the first time segment is written.
+
+        Time spent writing the dataset and rendering images is measured by
+        the optional metrics recorder, or reported directly to output_center
+        if none is given.
+
+        :param config:
+            Configuration options for the model run
+        :param output_center:
+            The output controller for the model run, containing the standard
+            output collections
+        :param metrics:
+            A metrics recorder for the model run
+        """
+        self._config = config
+        self._metrics = MetricsRecorder(output_center) if metrics is None \
+            else metrics
+
+        # Create output directories if they do not already exist.
+        Path(OUTPUT_FULL_PATH).mkdir(exist_ok=True)
+        run_title = config.run_id()
+        self._out_dir_path = path.join(OUTPUT_FULL_PATH, run_title)
+        Path(self._out_dir_path).mkdir(exist_ok=True)
+        self._dataset_path = path.join(self._out_dir_path, run_title + ".nc")
+
+        primary_center = output_center.collection_controller(PRIMARY_OUTPUT_PATH)
+        self._dataset_center = \
+            primary_center.collection_controller((DATASET_VARS,))
+        self._image_center = primary_center.collection_controller((IMAGES,))
+
+        # Change output type handlers within each collection to write
+        # one time segment at a time.
+        for output_type in ReportDatatype:
+            self._dataset_center.change_handler_if_enabled(
+                output_type, handler=self.write_dataset_variable)
+            self._image_center.change_handler_if_enabled(
+                output_type, handler=self.write_image_variable)
+
+        self._dataset = None
+        self._dataset_vars = set()
+        self._segment_num = 0
+
+        # The latitude rows of the full grid, and the band of those rows,
+        # to which the variables currently being submitted belong.
+        self._lat_count = 0
+        self._rows = slice(None)
+
+        # Whole time segments of each rendered variable, assembled from
+        # bands of rows until the segment is finished.
+        self._segment_images = {}
+        # Running sums over time segments of each rendered variable, used to
+        # produce annual average images once all segments are written.
+        self._image_sums = {}
+        # The number of time segments the model run will write, if known.
+        self._segment_count = None
+
+    def _open_dataset(self: 'ModelOutputStream',
+                      grid: 'GridDimensions') -> None:
+        """
+        Create the output dataset file, with an unlimited time dimension
+        and latitude and longitude dimensions given by grid.
+
+        :param grid:
+            The dimensions of the grids that will be written
+        """
+        grid_by_count = grid.dims_by_count()
+
+        self._dataset_center.submit_output(Debug.PRINT_NOTICES,
+                                           "Opening NetCDF dataset...")
+        self._dataset = StreamingNetCDFWriter()
+        self._dataset.global_attribute("description", "Output for an"
+                                                      "Arrhenius model run.")\
+            .dimension('time', np.int32, None)\
+            .dimension('latitude', np.int32, grid_by_count[0], (-90, 90)) \
+            .dimension('longitude', np.int32, grid_by_count[1], (-180, 180))
+        self._dataset.open(self._dataset_path)
+
+    def expect_segments(self: 'ModelOutputStream',
+                        count: int) -> None:
+        """
+        Set the number of time segments that the model run will write in
+        all. Annual average images are only produced once this many time
+        segments have been written, so that a model run that stops early
+        leaves no average of only some of its time segments.
+
+        :param count:
+            The total number of time segments in the model run
+        """
+        self._segment_count = count
+
+    def write_segment(self: 'ModelOutputStream',
+                      grid: 'LatLongGrid',
+                      labels: Optional[Dict[str, float]] = None) -> None:
+        """
+        Write the output for one time segment, given by grid, to the dataset
+        and to image files, according to which variables are enabled in the
+        output controller. Any labels given are written to the dataset as
+        described under write_labels.
+
+        Time segments are numbered in the order in which they are written.
+
+        :param grid:
+            A single time segment of output from an Arrhenius model run
+        :param labels:
+            Values labelling the time segment, keyed by variable name
+        """
+        lat_count = grid.dimensions().dims_by_count()[0]
+
+        self.write_rows(grid, 0, lat_count)
+        if labels is not None:
+            self.write_labels(labels)
+        self.finish_segment()
+
+    def write_labels(self: 'ModelOutputStream',
+                     labels: Dict[str, float]) -> None:
+        """
+        Write values labelling the current time segment, such as the year
+        from which its data was taken, to the dataset. Each label is written
+        to a variable of its own along the time dimension, which is
+        described by SEGMENT_LABEL_METADATA. Labels must be written after
+        the first rows of the time segment, and before finish_segment is
+        called.
+
+        :param labels:
+            Values labelling the time segment, keyed by variable name
+        """
+        for var_name, value in labels.items():
+            metadata = SEGMENT_LABEL_METADATA[var_name]
+            if var_name not in self._dataset_vars:
+                self._dataset.variable(var_name, metadata[VAR_TYPE],
+                                       ['time'])
+                for attr, val in metadata[VAR_ATTRS].items():
+                    self._dataset.variable_attribute(var_name, attr, val)
+                self._dataset_vars.add(var_name)
+
+            with self._metrics.time(Metrics.DATASET_WRITE_TIME):
+                self._dataset.append(var_name, self._segment_num,
+                                     metadata[VAR_TYPE](value))
+
+    def write_rows(self: 'ModelOutputStream',
+                   grid: 'LatLongGrid',
+                   first_row: int,
+                   lat_count: int) -> None:
+        """
+        Write part of the output for the current time segment, given by grid,
+        which holds a band of latitude rows starting from row first_row of
+        a full grid with lat_count rows. Rows are written to the dataset
+        immediately, while images are rendered once the whole time segment
+        has been written and finish_segment is called.
+
+        :param grid:
+            A band of rows from one time segment of model output
+        :param first_row:
+            The index of the band's first row within the full grid
+        :param lat_count:
+            The number of latitude rows in the full grid
+        """
+        lon_count = grid.dimensions().dims_by_count()[1]
+        if self._dataset is None:
+            self._open_dataset(GridDimensions((lat_count, lon_count), "count"))
+
+        self._lat_count = lat_count
+        self._rows = slice(first_row,
+                           first_row + grid.dimensions().dims_by_count()[0])
+
+        for output_type in ReportDatatype:
+            var_name = output_type.value
+            variable = grid.extract_datapoint(var_name)
+
+            self._dataset_center.submit_output(output_type, variable,
+                                               var_name)
+            self._image_center.submit_output(output_type, variable,
+                                             var_name)
+
+    def finish_segment(self: 'ModelOutputStream') -> None:
+        """
+        Finish writing the current time segment, once all of its rows have
+        been written with write_rows. Renders the time segment's images,
+        flushes its records to the dataset file, and moves on to the next
+        time segment.
+        """
+        for data_type, data in self._segment_images.items():
+            output_path = \
+                get_image_directory(self._out_dir_path, self._config.run_id(),
+                                    data_type, self._config.colorbar(),
+                                    create=True)
+            with self._metrics.time(Metrics.IMAGE_RENDER_TIME):
+                write_image_file(data, output_path, data_type,
+                                 self._segment_num + 1, self._config,
+                                 self._image_center)
+
+            if data_type in self._image_sums:
+                self._image_sums[data_type] += data
+            else:
+                self._image_sums[data_type] = data
+
+        if self._dataset is not None:
+            with self._metrics.time(Metrics.DATASET_WRITE_TIME):
+                self._dataset.sync()
+
+        self._segment_images = {}
+        self._segment_num += 1
+
+    def write_dataset_variable(self: 'ModelOutputStream',
+                               data: np.ndarray,
+                               data_type: str) -> None:
+        """
+        Write data, the current band of rows of one time segment of the
+        variable named data_type, to this stream's NetCDF dataset. The
+        variable is registered, along with its type and attributes, the
+        first time it is written.
+
+        :param data:
+            A band of rows from a single-variable grid
+        :param data_type:
+            The name of the variable as it will appear in the dataset
+        """
+        if data_type not in self._dataset_vars:
+            variable_type = VARIABLE_METADATA[data_type][VAR_TYPE]
+            self._dataset.variable(data_type, variable_type,
+                                   ['time', 'latitude', 'longitude'])
+
+            for attr, val in VARIABLE_METADATA[data_type][VAR_ATTRS].items():
+                self._dataset.variable_attribute(data_type, attr, val)
+            self._dataset_vars.add(data_type)
+
+        self._dataset_center.submit_lazy_output(Debug.PRINT_NOTICES,
+                                                lambda: "Writing {} to dataset"
+                                                .format(data_type))
+        with self._metrics.time(Metrics.DATASET_WRITE_TIME):
+            self._dataset.append(data_type, self._segment_num, data,
+                                 (self._rows,))
+
+    def write_image_variable(self: 'ModelOutputStream',
+                             data: np.ndarray,
+                             data_type: str) -> None:
+        """
+        Store data, the current band of rows of one time segment of the
+        variable named data_type, to be rendered to an image file once the
+        time segment is finished. Rendered time segments are added to the
+        running sum for that variable's annual average image.
+
+        :param data:
+            A band of rows from a single-variable grid
+        :param data_type:
+            The name of the variable on which the data is based
+        """
+        if data_type not in self._segment_images:
+            self._segment_images[data_type] = \
+                np.full((self._lat_count,) + data.shape[1:], np.nan)
+
+        self._segment_images[data_type][self._rows] = data
+
+    def close(self: 'ModelOutputStream') -> None:
+        """
+        Finish writing output, producing the annual average image for each
+        rendered variable and closing the dataset file. Average images are
+        only produced if every time segment given to expect_segments was
+        written.
+        """
+        if self._segment_num != self._segment_count:
+            # The model run stopped early, so the sums cover only some of
+            # its time segments.
+            self._image_sums = {}
+
+        for data_type, total in self._image_sums.items():
+            output_path = \
+                get_image_directory(self._out_dir_path,
+                                    self._config.run_id(), data_type,
+                                    self._config.colorbar(), create=True)
+            with self._metrics.time(Metrics.IMAGE_RENDER_TIME):
+                write_image_file(total / self._segment_num, output_path,
+                                 data_type, 0, self._config,
+                                 self._image_center)
+        self._image_sums = {}
+
+        if self._dataset is not None:
+            with self._metrics.time(Metrics.DATASET_WRITE_TIME):
+                self._dataset.close()
+            self._dataset = None
+
+
+class EnsembleOutputStream:
+    """
+    An output center for ensemble model runs, which writes summary
+    statistics of every ensemble member's results to a NetCDF dataset, one
+    time segment at a time. The dataset is stored in the output directory
+    of the configured run ID, which identifies the ensemble as well as the
+    model run, in a file named after that ID with an "_ensemble" suffix.
+
+    Each statistic of each variable is written as its own variable in the
+    dataset, with a time dimension that grows by one index with every time
+    segment written, as in ModelOutputStream. For example, the ensemble
+    mean of temperature change is named delta_t_mean, and its 95th
+    percentile delta_t_p95.
+    """
+
+    def __init__(self: 'EnsembleOutputStream',
+                 config: 'ArrheniusConfig',
+                 output_center: 'OutputController',
+                 members: int,
+                 metrics: Optional['MetricsRecorder'] = None) -> None:
+        """
+        Instantiate a new EnsembleOutputStream, which will write statistics
+        over members ensemble members of a model run configured by config.
+        The output directory is created immediately, while the dataset file
+        is created when the first time segment is written.
+
+        :param config:
+            Configuration options for the model run
+        :param output_center:
+            The output controller for the model run
+        :param members:
+            The number of members in the ensemble
+        :param metrics:
+            A metrics recorder for the model run
+        """
+        self._output_center = output_center
+        self._metrics = MetricsRecorder(output_center) if metrics is None \
+            else metrics
+        self._members = members
+
+        Path(OUTPUT_FULL_PATH).mkdir(exist_ok=True)
+        run_title = config.run_id()
+        out_dir_path = path.join(OUTPUT_FULL_PATH, run_title)
+        Path(out_dir_path).mkdir(exist_ok=True)
+        self.dataset_path = path.join(out_dir_path,
+                                      run_title + "_ensemble.nc")
+
+        self._dataset = None
+        self._segment_num = 0
+
+    def _open_dataset(self: 'EnsembleOutputStream',
+                      statistics: Dict[str, Dict[str, np.ndarray]]) -> None:
+        """
+        Create the output dataset file, registering a variable for every
+        statistic of every variable in statistics, with latitude and
+        longitude dimensions given by the shape of their arrays.
+
+        :param statistics:
+            Arrays of each statistic, keyed by variable and statistic name
+        """
+        first = next(iter(next(iter(statistics.values())).values()))
+        lat_count, lon_count = first.shape
+
+        self._output_center.submit_output(Debug.PRINT_NOTICES,
+                                          "Opening ensemble NetCDF"
+                                          " dataset...")
+        self._dataset = StreamingNetCDFWriter()
+        self._dataset.global_attribute("description",
+                                       "Ensemble statistics over {} members"
+                                       " of an Arrhenius model run."
+                                       .format(self._members))\
+            .dimension('time', np.int32, None)\
+            .dimension('latitude', np.int32, lat_count, (-90, 90)) \
+            .dimension('longitude', np.int32, lon_count, (-180, 180))
+
+        for var_name, var_stats in statistics.items():
+            metadata = VARIABLE_METADATA[var_name]
+            for stat_name in var_stats:
+                stat_var = "_".join([var_name, stat_name])
+                self._dataset.variable(stat_var, metadata[VAR_TYPE],
+                                       ['time', 'latitude', 'longitude'])
+                self._dataset.variable_attribute(
+                    stat_var, VAR_UNITS, metadata[VAR_ATTRS][VAR_UNITS])
+                self._dataset.variable_attribute(
+                    stat_var, VAR_DESCRIPTION,
+                    "Ensemble {} of {} over {} members".format(
+                        stat_name, var_name, self._members))
+
+        self._dataset.open(self.dataset_path)
+
+    def write_segment(self: 'EnsembleOutputStream',
+                      statistics: Dict[str, Dict[str, np.ndarray]]) -> None:
+        """
+        Write the ensemble statistics for one time segment to the dataset.
+        Statistics map the name of each variable, such as delta_t, to its
+        statistics, each a latitude-longitude grid keyed by the name of the
+        statistic. Every time segment must have the same statistics.
+
+        :param statistics:
+            Arrays of each statistic, keyed by variable and statistic name
+        """
+        if self._dataset is None:
+            self._open_dataset(statistics)
+
+        with self._metrics.time(Metrics.DATASET_WRITE_TIME):
+            for var_name, var_stats in statistics.items():
+                for stat_name, data in var_stats.items():
+                    self._dataset.append("_".join([var_name, stat_name]),
+                                         self._segment_num, data)
+            self._dataset.sync()
+
+        self._segment_num += 1
+
+    def close(self: 'EnsembleOutputStream') -> None:
+        """
+        Finish writing output, closing the dataset file.
+        """
+        if self._dataset is not None:
+            with self._metrics.time(Metrics.DATASET_WRITE_TIME):
+                self._dataset.close()
+            self._dataset = None
+
+
+def read_dataset_variable(dataset_parent: str,
+                          var_name: str,
+                          config: 'ArrheniusConfig') -> np.ndarray:
+    """
+    Returns the values of variable var_name over all time segments, from
+    the dataset written to the directory dataset_parent by a previous model
+    run that used config as its configuration set.
+
+    :param dataset_parent:
+        A path to the directory containing the dataset
+    :param var_name:
+        The variable to be read from the dataset
+    :param config:
+        Configuration options for the previously-run model run
+    :return:
+        An array of the variable's values, by time segment
+    """
+    dataset_path = path.join(dataset_parent, config.run_id() + ".nc")
+    reader = NetCDFReader(dataset_path)
+    data = reader.collect_untimed_data(var_name)
+    reader.close()
+
+    return data
+
+
 def save_from_dataset(dataset_parent: str,
                       var_name: str,
                       time_seg: Optional[int],
@@ -530,10 +1183,7 @@ def save_from_dataset(dataset_parent: str,
     if time_seg is None:
         # Assume at least one image needs to be produced, and immediately
         # read in data in preparation for that.
-        dataset_path = path.join(dataset_parent, run_id + ".nc")
-        reader = NetCDFReader(dataset_path)
-        data = reader.collect_untimed_data(var_name)
-        reader.close()
+        data = read_dataset_variable(dataset_parent, var_name, config)
 
         # Write all images for variable var_name to the proper destination.
         return write_image_type(data, dataset_parent, var_name, config)
@@ -570,21 +1220,29 @@ def save_from_dataset(dataset_parent: str,
         return created
 
 
-def write_model_output(data: List['LatLongGrid']) -> None:
+def write_model_output(data: List['LatLongGrid'],
+                       context: Optional['RunContext'] = None) -> None:
     """
     Write the results of a model run (data) to disk, in the form of a
     NetCDF dataset and a series of image files.
 
-    Location and output specifications are given by thread-specific
-    global configurations, which can be accessed using the global_config
-    and set_configuration functions in the configuration module, and the
-    corresponding functions in output_config.
+    Location and output specifications are given by the configuration and
+    output controller of the model run's context. If no context is given,
+    the thread-specific global configurations are used instead, which can
+    be accessed using the global_config and set_configuration functions in
+    the configuration module, and the corresponding functions in
+    output_config.
 
     :param data:
         The output from an Arrhenius model run
+    :param context:
+        The context of the model run
     """
-    writer = ModelOutput(data)
-    controller = global_output_center()
+    if context is None:
+        context = current_context()
+
+    writer = ModelOutput(data, context.output_center)
+    controller = context.output_center
 
     # Upload collection handlers for dataset and image file collections.
     controller.register_collection(DATASET_VARS, handler=writer.write_dataset)
@@ -599,4 +1257,4 @@ def write_model_output(data: List['LatLongGrid']) -> None:
                                              (IMAGES,),
                                              write_image_type)
 
-    writer.write_output(global_config())
+    writer.write_output(context.config)
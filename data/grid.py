@@ -1,4 +1,5 @@
 import numpy as np
+from operator import attrgetter
 from typing import List, Tuple, Union
 
 
@@ -19,6 +20,10 @@ formats, and storing gridded data in a way that allows for efficient retrieval.
 # Type aliases.
 TupleGridDims = Tuple[Union[int, float], Union[int, float]]
 
+# Standard atmospheric pressure at sea level, in millibars, taken as the
+# pressure at the bottom of the lowest atmospheric layer.
+SEA_LEVEL_PRESSURE = 1013.25
+
 
 def convert_grid_format(grid: TupleGridDims) -> TupleGridDims:
     """
@@ -96,6 +101,70 @@ def extract_multidimensional_grid_variable(grids: Union[list, 'LatLongGrid'],
         return np.array(grid_values)
 
 
+def latitude_weights(lat_count: int) -> np.ndarray:
+    """
+    Returns the relative surface area of each latitude band in a grid with
+    lat_count bands of equal width, ordered from south to north. The area
+    of a band is proportional to the cosine of the latitude at its centre.
+
+    :param lat_count:
+        The number of latitude bands in the grid
+    :return:
+        The cosine of the central latitude of each band
+    """
+    band_width = 180 / lat_count
+    centres = -90 + band_width * (np.arange(lat_count) + 0.5)
+    return np.cos(np.radians(centres))
+
+
+def band_mean(data: np.ndarray,
+              axis: int = -1,
+              weights: Union[np.ndarray, None] = None) -> np.ndarray:
+    """
+    Returns the mean of data along one axis, ignoring missing values. Any
+    None, nan, or masked element of data is missing. Where every element
+    along the axis is missing, the mean is nan.
+
+    For example, the mean over each latitude band in a stack of grids with
+    axes (time, level, latitude, longitude) is taken along axis -1, and the
+    global mean of each grid, weighted by area, along axis -2 with weights
+    given by latitude_weights.
+
+    Means are accumulated in double precision.
+
+    :param data:
+        An array of numbers, which may include missing values
+    :param axis:
+        The axis along which to take the mean
+    :param weights:
+        Optional weights for each position along the axis
+    :return:
+        An array with the same shape as data, less the reduced axis
+    """
+    if np.ma.isMaskedArray(data):
+        data = np.ma.filled(data.astype(np.float64), np.nan)
+    values = np.asarray(data, dtype=np.float64)
+
+    valid = ~np.isnan(values)
+    if weights is None:
+        cell_weights = valid.astype(np.float64)
+    else:
+        # Align the weights with the reduced axis, for broadcasting.
+        shape = [1] * values.ndim
+        shape[axis] = -1
+        cell_weights = np.where(valid,
+                                np.reshape(np.asarray(weights,
+                                                      dtype=np.float64),
+                                           shape),
+                                0.0)
+
+    total = np.sum(np.where(valid, values, 0.0) * cell_weights, axis=axis)
+    weight_total = np.sum(cell_weights, axis=axis)
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return total / weight_total
+
+
 class GridDimensions:
     """
     A representation of dimensions in a flat latitude/longitude grid.
@@ -360,6 +429,14 @@ VAR_NAME_TO_EXTRACTOR = {
 }
 
 
+# Fast accessors for the attributes of many GridCells at once, used when
+# reading whole grids into arrays.
+_CELL_TEMPERATURE = attrgetter('_temperature')
+_CELL_DELTA_TEMP = attrgetter('_delta_temp')
+_CELL_HUMIDITY = attrgetter('_rel_humidity')
+_CELL_ALBEDO = attrgetter('_albedo')
+
+
 class LatLongGrid:
     """
     A full latitude-longitude grid, covering the surface of the Earth.
@@ -561,6 +638,22 @@ class LatLongGrid:
 
         return np.array(converted_data)
 
+    def valid_cells(self: 'LatLongGrid') -> np.ndarray:
+        """
+        Returns a boolean array with one element for each cell in the grid,
+        in the order in which the grid is iterated over, that is True where
+        the cell has a valid temperature. Empty cells and cells with missing
+        (nan or masked) temperatures are not valid.
+
+        :return:
+            A flat array marking which cells have valid temperatures
+        """
+        cells = [cell for row in self._data for cell in row]
+        temps = np.fromiter((np.nan if cell is None
+                             else _CELL_TEMPERATURE(cell) for cell in cells),
+                            np.float64, count=len(cells))
+        return ~np.isnan(temps)
+
     def latitude_bands(self: 'LatLongGrid') -> 'LatLongGrid':
         """
         Average out all values within each latitudinal band in the grid,
@@ -572,50 +665,234 @@ class LatLongGrid:
         Temperature, humidity, and albedo in each band are the means of the
         respective variables in each grid cell in the row. Temperature change
         is given by the difference between average final temperature and
-        average initial temperature over each cell in the band.
+        average initial temperature over each cell in the band. Empty cells
+        and cells with missing temperatures are left out of the means. A
+        band with no valid temperatures is given missing (nan) values, or is
+        replaced by an empty cell if all of its cells are empty. Variables
+        that the grid's cells do not hold, such as humidity at the surface
+        of a multilayer model, are left empty in every band.
 
         :return:
             A grid equivalent to this one, with one column of latitude.
         """
-        new_cells = []
+        cells = [cell for row in self._data for cell in row]
+        if None in cells:
+            present = np.array([cell is not None for cell in cells])
+            present_cells = [cell for cell in cells if cell is not None]
+            band_has_cells = present.reshape(len(self._data), -1).any(axis=1)
+        else:
+            present = slice(None)
+            present_cells = cells
+            band_has_cells = [True] * len(self._data)
+
+        if len(present_cells) == 0:
+            return LatLongGrid([[None] for _ in self._data], self._pressure)
+        first_cell = present_cells[0]
+
+        def read(getter: attrgetter) -> np.ndarray:
+            """
+            Returns an array of the same shape as this grid, containing the
+            value returned by getter for each cell, or nan for empty cells.
+            """
+            cell_values = np.full(len(cells), np.nan)
+            cell_values[present] = np.fromiter(map(getter, present_cells),
+                                               np.float64,
+                                               count=len(present_cells))
+            return cell_values.reshape(len(self._data), -1)
+
+        post_temps = read(_CELL_TEMPERATURE)
+        # Cells with no valid temperature do not count towards any mean.
+        invalid = np.isnan(post_temps)
+
+        def masked_mean(getter: attrgetter) -> np.ndarray:
+            """
+            Returns the mean of the values returned by getter over the cells
+            with valid temperatures in each latitude band.
+            """
+            cell_values = read(getter)
+            cell_values[invalid] = np.nan
+            return band_mean(cell_values)
+
+        means = {
+            "post_temp": band_mean(post_temps),
+            "pre_temp": band_mean(post_temps
+                                  - read(_CELL_DELTA_TEMP)),
+        }
+        means["humidity"] = [None] * len(self._data) \
+            if first_cell.get_relative_humidity() is None \
+            else masked_mean(_CELL_HUMIDITY)
+        means["albedo"] = [None] * len(self._data) \
+            if first_cell.get_albedo() is None \
+            else masked_mean(_CELL_ALBEDO)
+
+        # New cells keep the floating-point type of the original cells.
+        cell_type = type(first_cell.get_temperature())
+        if not issubclass(cell_type, np.floating):
+            cell_type = float
+
+        def convert(value: Union[float, None]) -> Union[float, None]:
+            return None if value is None else cell_type(value)
 
+        new_cells = []
         for lat_index in range(len(self._data)):
-            # Accumulator variables for initial temperature, final temperature
-            # and all other variables that the new latitude band will inherit.
-            pre_temp_sum = 0
-            post_temp_sum = 0
-            humidity_sum = 0
-            albedo_sum = 0
-
-            # Do no count null cells or those with missing values.
-            num_valid_cells = 0
-
-            for cell in self._data[lat_index]:
-                if cell is not None:
-                    # Add the current cell's variables to accumulators.
-                    post_temp_sum += cell.get_temperature()
-                    pre_temp_sum += cell.get_temperature()\
-                        - cell.get_temperature_change()
-                    humidity_sum += cell.get_relative_humidity()
-                    albedo_sum += cell.get_albedo()
-
-                    num_valid_cells += 1
-
-            # Protect from zero-division errors by filling a null value into
-            # the grid where no valid cells existed in the row.
-            if num_valid_cells > 0:
-                # Calculate means for every variable, and load into a
-                # grid cell.
-                combined_cell = GridCell(pre_temp_sum / num_valid_cells,
-                                           humidity_sum / num_valid_cells,
-                                           albedo_sum / num_valid_cells)
+            post_temp = means["post_temp"][lat_index]
+
+            if not band_has_cells[lat_index]:
+                new_cells.append([None])
+            else:
+                combined_cell = GridCell(convert(means["pre_temp"][lat_index]),
+                                         convert(means["humidity"][lat_index]),
+                                         convert(means["albedo"][lat_index]))
 
                 # Set the grid cell's temperature from its initial mean to
                 # the final mean, allowing the grid cell to record the
                 # temperature change.
-                combined_cell.set_temperature(post_temp_sum / num_valid_cells)
+                combined_cell.set_temperature(convert(post_temp))
                 new_cells.append([combined_cell])
-            else:
-                new_cells.append([None])
 
-        return LatLongGrid(new_cells)
+        return LatLongGrid(new_cells, self._pressure)
+
+
+def pressure_thickness(pressures: List[float]) -> np.ndarray:
+    """
+    Returns the thickness, in millibars, of each atmospheric layer in a
+    column whose layers are topped by pressures, in order of height. Each
+    layer starts at the top of the layer below it, and the lowest layer
+    starts at sea level pressure. Layers whose tops are not above their
+    bottoms are given no thickness.
+
+    :param pressures:
+        The pressure at the top of each layer, in millibars
+    :return:
+        The pressure thickness of each layer
+    """
+    tops = np.asarray(pressures, dtype=np.float64)
+    bottoms = np.concatenate(([SEA_LEVEL_PRESSURE], tops[:-1]))
+    return np.maximum(bottoms - tops, 0.0)
+
+
+def level_groups(level_count: int,
+                 layers: int) -> List[slice]:
+    """
+    Returns slices dividing level_count atmospheric levels, in order of
+    height, into layers groups of adjacent levels. Group sizes differ by at
+    most one level, with the larger groups nearest the surface. If there
+    are no more levels than layers, each level is a group of its own.
+
+    :param level_count:
+        The number of atmospheric levels
+    :param layers:
+        The number of groups into which to divide the levels
+    :return:
+        A slice of level indices for each group, from the surface up
+    """
+    groups = min(layers, level_count)
+    sizes = [level_count // groups + (1 if i < level_count % groups else 0)
+             for i in range(groups)]
+    bounds = np.concatenate(([0], np.cumsum(sizes)))
+
+    return [slice(int(bounds[i]), int(bounds[i + 1])) for i in range(groups)]
+
+
+def merge_levels(grids: List['LatLongGrid'],
+                 weights: List[float]) -> 'LatLongGrid':
+    """
+    Combine grids for adjacent atmospheric levels, in order of height, into
+    a single grid for one layer spanning all of them. The new grid has the
+    pressure of the highest grid, so that its layer tops out where the
+    highest level did.
+
+    Temperature, humidity, and albedo in each cell are the means of the
+    respective variables over the same cell in each grid, weighted by
+    weights, which are typically the pressure thickness of each level.
+    Temperature change is given by the difference between the weighted
+    means of final and initial temperature. As with latitude_bands, cells
+    with missing temperatures are left out of the means, cells with no
+    valid temperature on any level are given missing (nan) values, and
+    cells that are empty on every level stay empty.
+
+    :param grids:
+        Grids of equal dimensions for adjacent levels, in order of height
+    :param weights:
+        The weight of each grid in the means
+    :return:
+        A grid equivalent to the levels in grids, as a single layer
+    """
+    lat_count, lon_count = grids[0].dimensions().dims_by_count()
+    level_cells = [list(grid) for grid in grids]
+
+    present = np.array([[cell is not None for cell in cells]
+                        for cells in level_cells])
+    present_cells = [cell for cells in level_cells
+                     for cell in cells if cell is not None]
+
+    if len(present_cells) == 0:
+        return LatLongGrid([[None] * lon_count for _ in range(lat_count)],
+                           grids[-1].get_pressure())
+    first_cell = present_cells[0]
+
+    def read(getter: attrgetter) -> np.ndarray:
+        """
+        Returns an array with one row per level and one column per cell,
+        containing the value returned by getter for each cell, or nan for
+        empty cells.
+        """
+        cell_values = np.full(present.shape, np.nan)
+        cell_values[present] = np.fromiter(
+            (np.nan if value is None else value
+             for value in map(getter, present_cells)),
+            np.float64, count=len(present_cells))
+        return cell_values
+
+    post_temps = read(_CELL_TEMPERATURE)
+    # Cells with no valid temperature do not count towards any mean.
+    invalid = np.isnan(post_temps)
+
+    def masked_mean(getter: attrgetter) -> np.ndarray:
+        """
+        Returns the weighted mean of the values returned by getter over the
+        levels with valid temperatures in each cell.
+        """
+        cell_values = read(getter)
+        cell_values[invalid] = np.nan
+        return band_mean(cell_values, axis=0, weights=weights)
+
+    means = {
+        "post_temp": band_mean(post_temps, axis=0, weights=weights),
+        "pre_temp": band_mean(post_temps - read(_CELL_DELTA_TEMP),
+                              axis=0, weights=weights),
+    }
+    means["humidity"] = [None] * present.shape[1] \
+        if first_cell.get_relative_humidity() is None \
+        else masked_mean(_CELL_HUMIDITY)
+    means["albedo"] = [None] * present.shape[1] \
+        if first_cell.get_albedo() is None \
+        else masked_mean(_CELL_ALBEDO)
+
+    # New cells keep the floating-point type of the original cells.
+    cell_type = type(first_cell.get_temperature())
+    if not issubclass(cell_type, np.floating):
+        cell_type = float
+
+    def convert(value: Union[float, None]) -> Union[float, None]:
+        return None if value is None else cell_type(value)
+
+    cell_present = present.any(axis=0)
+    new_cells = []
+    for lat_index in range(lat_count):
+        row = []
+        for lon_index in range(lon_count):
+            index = lat_index * lon_count + lon_index
+
+            if not cell_present[index]:
+                row.append(None)
+            else:
+                combined_cell = GridCell(convert(means["pre_temp"][index]),
+                                         convert(means["humidity"][index]),
+                                         convert(means["albedo"][index]))
+                combined_cell.set_temperature(
+                    convert(means["post_temp"][index]))
+                row.append(combined_cell)
+        new_cells.append(row)
+
+    return LatLongGrid(new_cells, grids[-1].get_pressure())
@@ -1,9 +1,9 @@
 from data import custom_readers
 from data.grid import GridDimensions
+from data.regrid import conservative_regrid
 from typing import Union
 
 import numpy as np
-import pyresample
 
 """
 This module contains prebuilt and custom data providers, functions
@@ -30,44 +30,6 @@ STATIC_ATM_H2O = None
 STATIC_ATM_ABSORBANCE = 0.70
 
 
-def _adjust_latlong_grid(data_var: np.ndarray,
-                         grid: 'GridDimensions') -> np.ndarray:
-    """
-    Translate a latitude-longitude variable from its native grid to the
-    specified grid dimensions.
-    :param data_var:
-        The dataset variable that is to be regridded
-    :param grid:
-        The dimensions of the grid to which the data will be converted
-    :return:
-        The dataset variable, translated onto the specified grid
-    """
-    # Read latitude and longitude widths directly from the dataset
-    now_lat_size = len(data_var)
-    now_lon_size = len(data_var[0])
-
-    # AreaDefinitions represent latitude-longitude grids.
-    # Most of the values in this constructor are unimportant, except for
-    # the latitude and longitude dimensions.
-    now_grid = pyresample.geometry.AreaDefinition(
-        'blank', 'nothing', 'blank', {'proj': 'laea'},
-        now_lon_size, now_lat_size, [0, 0, 1, 1]
-    )
-
-    new_dims = grid.dims_by_count()
-    final_grid = pyresample.geometry.AreaDefinition(
-        'blank', 'nothing', 'blank', {'proj': 'laea'},
-        new_dims[1], new_dims[0], [0, 0, 1, 1]
-    )
-
-    # Regrid the data using nearest neighbor sampling.
-    now_img = pyresample.image.ImageContainerNearest(data_var, now_grid,
-                                                     radius_of_influence=32)
-    final_img = now_img.resample(final_grid)
-
-    return final_img.image_data
-
-
 def _regrid_netcdf_variable(data_var: np.ndarray,
                             grid: Union['GridDimensions', None],
                             dim_count: int = 2) -> np.ndarray:
@@ -78,6 +40,8 @@ def _regrid_netcdf_variable(data_var: np.ndarray,
     extra dimensions are present, specify how many total dimensions there are
     in the dim_count parameter to identify at what level the latitude/longitude
     data is found.
+    Regridding is conservative of area-weighted means, and every slice
+    along the extra dimensions is regridded at once.
     If the grid is None, then no action will be taken and the original
     data will be returned.
     Precondition:
@@ -95,81 +59,11 @@ def _regrid_netcdf_variable(data_var: np.ndarray,
         return data_var
     if dim_count < 2:
         raise ValueError("Grid inputs must have at least 2 dimensions")
-    else:
-        if dim_count == 2:
-            return _adjust_latlong_grid(data_var, grid)
-        else:
-            new_grid = []
-
-            # Temporary solution. Regrid each index separately and
-            # reform array.
-            for i in range(len(data_var)):
-                new_grid.append(_regrid_netcdf_variable(data_var[i], grid,
-                                                        dim_count - 1))
-
-            return np.array(new_grid)
-
-
-def _avg(data_var: np.ndarray) -> float:
-    """
-    Returns the average of the numeric element of the data array.
-    :param data_var:
-        An array of numeric elements
-    :return:
-        The average of the elements
-    """
-    total = 0
-    for row in data_var:
-        total += sum(row)
-
-    return total / (len(data_var) * len(data_var[0]))
-
-
-def _naive_regrid(data_var: np.ndarray,
-                  grid: 'GridDimensions') -> np.ndarray:
-    """
-    Regrid the given variable in the simplest way possible: by averaging the
-    values in the original grid that make up a cell in the new grid.
-    For this method to work, a single grid cell in the new grid must exactly
-    fit an integer number of cells from the original grid in both latitude
-    and longitude direction. That is, the width and height of a grid cell
-    in the new grid must be integer multiples of those in the original grid.
-    :param data_var:
-        A set of gridded data
-    :param grid:
-        The grid onto which to convert the data
-    :return:
-        The data converted naively to the new grid
-    """
-
-    new_dims = grid.dims_by_count()
-    if len(data_var) % new_dims[0] != 0:
-        raise ValueError("New grid latitude not an integer multiple of"
-                         "initial grid latitude")
-    elif len(data_var[0]) % new_dims[1] != 0:
-        raise ValueError("New grid longitude not an integer multiple of"
-                         "initial grid longitude")
-
-    lats_per_cell = int(len(data_var) / new_dims[0])
-    lons_per_cell = int(len(data_var[0]) / new_dims[1])
-
-    # Loop over groups of grid cells in the original grid that are to be
-    # combined into a single cell. Longitude order first, then latitude.
-    regridded_data = []
-    for i in range(0, 180, lats_per_cell):
-        orig_row = data_var[i:(i + lats_per_cell)]
-        regridded_row = []
-
-        for j in range(0, 360, lons_per_cell):
-            # Calculate the value for the new grid cell, which is the average
-            # of the smaller grid cells contained within it.
-            new_grid_cell = orig_row[:, j:(j + lons_per_cell)]
-            regridded_cell_val = _avg(new_grid_cell)
-            regridded_row.append(regridded_cell_val)
+    elif np.ndim(data_var) != dim_count:
+        raise ValueError("Data must have {} dimensions (has {})"
+                         .format(dim_count, np.ndim(data_var)))
 
-        regridded_data.append(regridded_row)
-
-    return np.array(regridded_data)
+    return conservative_regrid(data_var, grid)
 
 
 def arrhenius_temperature_data(grid: 'GridDimensions'
@@ -185,8 +79,7 @@ def arrhenius_temperature_data(grid: 'GridDimensions'
     Not all grid cells have values, especially in the Arctic and Antarctic
     circles. These missing values are present as NaN in the array returned.
     The data will default to a 10x20 degree grid, but can be converted to
-    other grid dimensions through the function parameter grid. Only grids
-    containing integer multiples of the original grid are supported.
+    other grid dimensions through the function parameter grid.
     :param grid:
         The dimensions of the grid onto which the data is to be converted
     :return:
@@ -214,8 +107,7 @@ def berkeley_temperature_data(grid: 'GridDimensions'
     with 0 being 90 and 179 being 90; the third index is longitude,
     specifications unknown.
     The data will default to a 1-by-1-degree grid, but can be converted to
-    other grid dimensions through the function parameter grid. Only grids
-    containing integer multiples of the original grid are supported.
+    other grid dimensions through the function parameter grid.
     :param grid:
         The dimensions of the grid onto which the data is to be converted
     :return:
@@ -232,21 +124,9 @@ def berkeley_temperature_data(grid: 'GridDimensions'
     # Translate data from the default, 1 by 1 grid to any specified grid.
     regridded_data = _regrid_netcdf_variable(data, grid, 3)
     regridded_clmt = _regrid_netcdf_variable(clmt, grid, 3)
-    grid_dims = grid.dims_by_count()
-
-    for i in range(0, 12):
-        # Store arrays locally to avoid repeatedly indexing dataset.
-        data_by_month = regridded_data[i]
-        clmt_by_month = regridded_clmt[i]
 
-        for j in range(0, grid_dims[0]):
-            data_by_lat = data_by_month[j]
-            clmt_by_lat = clmt_by_month[j]
-
-            for k in range(0, grid_dims[1]):
-                # Only one array index required per addition instead
-                # of three gives significant performance increases.
-                data_by_lat[k] += clmt_by_lat[k]
+    # Add the monthly climatology to each month's temperature anomaly.
+    regridded_data += regridded_clmt
 
     return regridded_data
 
@@ -264,8 +144,7 @@ def arrhenius_humidity_data(grid: 'GridDimensions'
     Not all grid cells have values, especially in the Arctic and Antarctic
     circles. These missing values are present as NaN in the array returned.
     The data will default to a 10x20 degree grid, but can be converted to
-    other grid dimensions through the two function parameters. Only grids
-    containing integer multiples of the original grid are supported.
+    other grid dimensions through the two function parameters.
     :param grid:
         The dimensions of the grid onto which the data will be converted
     :return:
@@ -290,8 +169,7 @@ def ncar_humidity_data(grid: 'GridDimensions'
     represents January, and index 9 is October. The second index is latitude,
     and the third is longitude.
     The data will default to a 1-by-1-degree grid, but can be converted to
-    other grid dimensions through the two function parameters. Only grids
-    containing integer multiples of the original grid are supported.
+    other grid dimensions through the two function parameters.
     :param grid:
         The dimensions of the grid onto which the data will be converted
     :return:
@@ -351,6 +229,22 @@ def ncar_pressure_levels() -> np.array:
     return dataset.pressure()
 
 
+def _land_fraction(grid: 'GridDimensions') -> np.ndarray:
+    """
+    Returns the fraction of each grid cell covered by land, from the Berkeley
+    Earth land mask, regridded to grid.
+
+    :param grid:
+        The dimensions of the grid onto which the data will be converted
+    :return:
+        The land fraction of each grid cell
+    """
+    dataset = custom_readers.BerkeleyEarthTemperatureReader()
+
+    land_coords = dataset.collect_untimed_data('land_mask')[:]
+    return _regrid_netcdf_variable(land_coords, grid, 2)
+
+
 def landmask_albedo_data(temp_data: np.ndarray,
                          grid: 'GridDimensions'
                          = GridDimensions((10, 20))) -> np.ndarray:
@@ -383,13 +277,9 @@ def landmask_albedo_data(temp_data: np.ndarray,
     :return:
         Surface albedo data by Arrhenius' scheme
     """
-    dataset = custom_readers.BerkeleyEarthTemperatureReader()
-
     # Berkeley Earth dataset includes variables indicating which 1-degree
     # latitude-longitude cells are primarily land.
-    land_coords = dataset.collect_untimed_data('land_mask')[:]
-    # Regrid the land/ocean variable to the specified grid, if necessary.
-    regridded_land_coords = _naive_regrid(land_coords, grid)
+    regridded_land_coords = _land_fraction(grid)
     grid_dims = grid.dims_by_count()
 
     # Create an array of the same size as the grid, in which to store
@@ -460,6 +350,36 @@ def constant_albedo_data(temp_data: np.ndarray,
     return np.zeros(grid_shape)
 
 
+def land_mask_data(grid: 'GridDimensions'
+                   = GridDimensions((10, 20))) -> np.ndarray:
+    """
+    A mask provider selecting grid cells that are mostly land, according to
+    the Berkeley Earth land mask. Cells outside the mask are left out of
+    model calculations, and have missing values in the model's output.
+
+    :param grid:
+        The dimensions of the grid onto which the data will be converted
+    :return:
+        A boolean array by latitude and longitude, True over land
+    """
+    return _land_fraction(grid) >= 0.5
+
+
+def ocean_mask_data(grid: 'GridDimensions'
+                    = GridDimensions((10, 20))) -> np.ndarray:
+    """
+    A mask provider selecting grid cells that are mostly ocean, according to
+    the Berkeley Earth land mask. Cells outside the mask are left out of
+    model calculations, and have missing values in the model's output.
+
+    :param grid:
+        The dimensions of the grid onto which the data will be converted
+    :return:
+        A boolean array by latitude and longitude, True over ocean
+    """
+    return _land_fraction(grid) < 0.5
+
+
 def static_absorbance_data() -> float:
     """
     A data provider that gives a single, global atmospheric heat absorbance
@@ -495,6 +415,10 @@ PROVIDERS = {
     "pressure": {
         "ncar": ncar_pressure_levels,
     },
+    "mask": {
+        "land": land_mask_data,
+        "ocean": ocean_mask_data,
+    },
 }
 
 
@@ -1,6 +1,6 @@
-from netCDF4 import Dataset
 from datetime import datetime
 from numpy import ndarray
+from typing import Tuple
 
 
 class NetCDFReader:
@@ -29,10 +29,11 @@ class NetCDFReader:
     def _open_dataset(self: 'NetCDFReader') -> None:
         """ Ensure the data reader's NetCDF dataset has been opened. """
         if self._data is None:
+            from netCDF4 import Dataset
             self._data = Dataset(self._file, self._file_mode,
                                  self._file_format)
 
-    def _dataset(self: 'NetCDFReader') -> Dataset:
+    def _dataset(self: 'NetCDFReader') -> 'Dataset':
         """ Returns the reader's underlying Dataset object. """
         return self._data
 
@@ -54,6 +55,50 @@ class NetCDFReader:
         var = data.variables[datapoint]
         return var[:]
 
+    def dimensions(self: 'NetCDFReader',
+                   datapoint: str) -> Tuple[str, ...]:
+        """
+        Returns the names of the dimensions of the variable under the
+        specified header, in order. Raises a KeyError if there is no such
+        variable.
+        :param datapoint:
+            The heading of the variable
+        :return:
+            The names of the variable's dimensions
+        """
+        self._open_dataset()
+        return self._dataset().variables[datapoint].dimensions
+
+    def dimension_size(self: 'NetCDFReader',
+                       dim_name: str) -> int:
+        """
+        Returns the number of entries in the dimension dim_name, including
+        entries written so far to a dimension of unlimited size.
+        :param dim_name:
+            The name of the dimension
+        :return:
+            The size of the dimension
+        """
+        self._open_dataset()
+        return len(self._dataset().dimensions[dim_name])
+
+    def collect_hyperslab(self: 'NetCDFReader',
+                          datapoint: str,
+                          index: Tuple[slice, ...]) -> ndarray:
+        """
+        Returns only the part of the data under the specified header that
+        is selected by index, which holds one slice for each of the
+        variable's dimensions. Only the selected part is read from the file.
+        :param datapoint:
+            The heading of the required data
+        :param index:
+            A slice along each of the variable's dimensions
+        :return:
+            The selected part of the data
+        """
+        self._open_dataset()
+        return self._dataset().variables[datapoint][index]
+
     def latitude(self: 'NetCDFReader') -> ndarray:
         """
         Returns the NetCDF data file's latitude variable values.
@@ -0,0 +1,301 @@
+import numpy as np
+
+from os import path, replace, getpid
+from pathlib import Path
+from threading import Lock
+from typing import Callable, Dict, Tuple
+
+from data.resources import REGRID_CACHE_PATH
+
+"""
+This module regrids gridded data conservatively, so that the area-weighted
+mean of the data over any region made up of whole cells is the same before
+and after regridding.
+
+Both the source and the target grid are taken to divide the globe into
+cells of equal width in latitude and in longitude, with rows spanning 90
+degrees south to 90 degrees north in either order, and columns spanning all
+360 degrees of longitude. Each target cell takes the mean of the source
+cells it overlaps, weighted by the area of each overlap. Cells on a sphere
+have area proportional to the difference of the sines of their bounding
+latitudes, times their width in longitude.
+
+The weights for a pair of grids form a sparse matrix, with one row for each
+target cell and one column for each source cell. The matrix is computed once
+for each pair of grid shapes and stored on disk, so that later processes can
+load it instead of computing it. Regridding any number of time or level
+slices of data is then a single sparse matrix product.
+
+Missing source values, given as NaN or as masked array elements, are left
+out, and the remaining weights of each target cell are renormalized. A
+target cell that overlaps only missing values is NaN.
+"""
+
+
+def _band_overlaps(src_count: int,
+                   dst_count: int,
+                   edges_of: Callable) -> Tuple[np.ndarray, np.ndarray,
+                                                np.ndarray]:
+    """
+    Returns the overlaps between src_count source bands and dst_count target
+    bands of equal width, each spanning the same interval, as three arrays:
+    the target band, the source band, and the measure of each overlap. Band
+    edges are transformed by edges_of before measuring, so that overlaps may
+    be measured by area rather than by width.
+    """
+    src_edges = np.linspace(0.0, 1.0, src_count + 1)
+    dst_edges = np.linspace(0.0, 1.0, dst_count + 1)
+
+    dst_bands = []
+    src_bands = []
+    measures = []
+    for i in range(dst_count):
+        low, high = dst_edges[i], dst_edges[i + 1]
+        first = np.searchsorted(src_edges, low, side="right") - 1
+        last = np.searchsorted(src_edges, high, side="left")
+
+        for j in range(max(first, 0), min(last, src_count)):
+            overlap_low = max(low, src_edges[j])
+            overlap_high = min(high, src_edges[j + 1])
+            # Skip overlaps that exist only through rounding of the edges.
+            if overlap_high - overlap_low > 1e-12:
+                measure = edges_of(overlap_high) - edges_of(overlap_low)
+                dst_bands.append(i)
+                src_bands.append(j)
+                measures.append(measure)
+
+    return np.array(dst_bands), np.array(src_bands), np.array(measures)
+
+
+def _latitude_edge(fraction: float) -> float:
+    """
+    Returns the sine of the latitude a given fraction of the way from the
+    south pole to the north pole, which measures area on a sphere.
+    """
+    return np.sin(np.radians(-90.0 + 180.0 * fraction))
+
+
+def _longitude_edge(fraction: float) -> float:
+    """
+    Returns the fraction itself, since area is proportional to longitude.
+    """
+    return fraction
+
+
+class RegridWeights:
+    """
+    A sparse matrix of conservative regridding weights from one grid shape
+    to another, stored in compressed sparse row form: the weights of target
+    cell i, and the source cells they apply to, are weights[indptr[i]:
+    indptr[i + 1]] and indices[indptr[i]:indptr[i + 1]]. Cells are numbered
+    in row-major order.
+    """
+
+    def __init__(self: 'RegridWeights',
+                 src_shape: Tuple[int, int],
+                 dst_shape: Tuple[int, int],
+                 indptr: np.ndarray,
+                 indices: np.ndarray,
+                 weights: np.ndarray) -> None:
+        """
+        Instantiate new RegridWeights from grids of shape src_shape to grids
+        of shape dst_shape, holding the given sparse matrix.
+
+        :param src_shape:
+            The number of latitude and longitude cells in the source grid
+        :param dst_shape:
+            The number of latitude and longitude cells in the target grid
+        :param indptr:
+            The start of each target cell's weights, and the end of the last
+        :param indices:
+            The source cell to which each weight applies
+        :param weights:
+            The weight of each overlap between a source and target cell
+        """
+        self.src_shape = tuple(src_shape)
+        self.dst_shape = tuple(dst_shape)
+        self.indptr = indptr
+        self.indices = indices
+        self.weights = weights
+
+    @classmethod
+    def compute(cls: type,
+                src_shape: Tuple[int, int],
+                dst_shape: Tuple[int, int]) -> 'RegridWeights':
+        """
+        Returns the conservative regridding weights from grids of shape
+        src_shape to grids of shape dst_shape.
+
+        Overlaps between cells are products of overlaps between latitude
+        bands and between longitude bands, which are found separately.
+
+        :param src_shape:
+            The number of latitude and longitude cells in the source grid
+        :param dst_shape:
+            The number of latitude and longitude cells in the target grid
+        :return:
+            The weights between the two grids
+        """
+        lat_dst, lat_src, lat_area = \
+            _band_overlaps(src_shape[0], dst_shape[0], _latitude_edge)
+        lon_dst, lon_src, lon_width = \
+            _band_overlaps(src_shape[1], dst_shape[1], _longitude_edge)
+
+        # Pair every latitude overlap with every longitude overlap, and sort
+        # the pairs by target cell.
+        dst = (lat_dst[:, np.newaxis] * dst_shape[1]
+               + lon_dst[np.newaxis, :]).ravel()
+        src = (lat_src[:, np.newaxis] * src_shape[1]
+               + lon_src[np.newaxis, :]).ravel()
+        area = (lat_area[:, np.newaxis] * lon_width[np.newaxis, :]).ravel()
+
+        order = np.argsort(dst, kind="stable")
+        dst, src, area = dst[order], src[order], area[order]
+
+        dst_count = dst_shape[0] * dst_shape[1]
+        indptr = np.zeros(dst_count + 1, dtype=np.int64)
+        np.cumsum(np.bincount(dst, minlength=dst_count), out=indptr[1:])
+
+        # Normalize so that the weights of each target cell sum to one.
+        totals = np.add.reduceat(area, indptr[:-1])
+        weights = area / np.repeat(totals, np.diff(indptr))
+
+        return cls(src_shape, dst_shape, indptr, src.astype(np.int64),
+                   weights)
+
+    @classmethod
+    def load(cls: type,
+             file_path: str) -> 'RegridWeights':
+        """
+        Returns the weights stored in the file file_path by save.
+
+        :param file_path:
+            The path to a file of stored weights
+        :return:
+            The stored weights
+        """
+        with np.load(file_path) as stored:
+            return cls(tuple(stored["src_shape"]), tuple(stored["dst_shape"]),
+                       stored["indptr"], stored["indices"], stored["weights"])
+
+    def save(self: 'RegridWeights',
+             file_path: str) -> None:
+        """
+        Store these weights in the file file_path. The file is replaced
+        atomically, so that other processes never read it partly written.
+
+        :param file_path:
+            The path of the file to be written
+        """
+        Path(path.dirname(file_path)).mkdir(parents=True, exist_ok=True)
+
+        temp_path = "{}.{}.npz".format(file_path, getpid())
+        np.savez(temp_path, src_shape=np.array(self.src_shape),
+                 dst_shape=np.array(self.dst_shape), indptr=self.indptr,
+                 indices=self.indices, weights=self.weights)
+        replace(temp_path, file_path)
+
+    def apply(self: 'RegridWeights',
+              data: np.ndarray) -> np.ndarray:
+        """
+        Returns data regridded onto the target grid. The last two axes of
+        data are latitude and longitude on the source grid; any axes before
+        them, such as time or level, are kept, and every slice along them is
+        regridded at once.
+
+        :param data:
+            An array of gridded data, which may include missing values
+        :return:
+            The data on the target grid
+        """
+        data = np.asarray(np.ma.filled(np.ma.asarray(data, dtype=np.float64),
+                                       np.nan))
+        if data.shape[-2:] != self.src_shape:
+            raise ValueError("Data must have latitude and longitude"
+                             " dimensions {} (is {})"
+                             .format(self.src_shape, data.shape[-2:]))
+
+        leading = data.shape[:-2]
+        slices = data.reshape(-1, self.src_shape[0] * self.src_shape[1])
+
+        valid = ~np.isnan(slices)
+        gathered = np.where(valid, slices, 0.0)[:, self.indices]
+        gathered_weights = valid[:, self.indices] * self.weights
+
+        totals = np.add.reduceat(gathered * gathered_weights,
+                                 self.indptr[:-1], axis=1)
+        weight_totals = np.add.reduceat(gathered_weights,
+                                        self.indptr[:-1], axis=1)
+
+        with np.errstate(divide="ignore", invalid="ignore"):
+            regridded = np.where(weight_totals > 0,
+                                 totals / weight_totals, np.nan)
+
+        return regridded.reshape(leading + self.dst_shape)
+
+
+# Weights already computed or loaded by this process, by grid shapes.
+_weights_cache: Dict[Tuple, 'RegridWeights'] = {}
+_weights_lock = Lock()
+
+
+def regrid_weights(src_shape: Tuple[int, int],
+                   dst_shape: Tuple[int, int],
+                   cache_dir: str = REGRID_CACHE_PATH) -> 'RegridWeights':
+    """
+    Returns the conservative regridding weights from grids of shape
+    src_shape to grids of shape dst_shape. The weights are loaded from
+    cache_dir if they have been stored there, and otherwise are computed
+    and stored there for later use.
+
+    :param src_shape:
+        The number of latitude and longitude cells in the source grid
+    :param dst_shape:
+        The number of latitude and longitude cells in the target grid
+    :param cache_dir:
+        The directory in which weights are stored
+    :return:
+        The weights between the two grids
+    """
+    key = (tuple(src_shape), tuple(dst_shape), cache_dir)
+
+    with _weights_lock:
+        if key not in _weights_cache:
+            file_path = path.join(cache_dir, "conservative_{}x{}_{}x{}.npz"
+                                  .format(*src_shape, *dst_shape))
+            try:
+                weights = RegridWeights.load(file_path)
+            except (OSError, ValueError, KeyError):
+                weights = RegridWeights.compute(src_shape, dst_shape)
+                try:
+                    weights.save(file_path)
+                except OSError:
+                    # Weights can always be computed again if they cannot
+                    # be stored.
+                    pass
+
+            _weights_cache[key] = weights
+
+        return _weights_cache[key]
+
+
+def conservative_regrid(data: np.ndarray,
+                        grid: 'GridDimensions') -> np.ndarray:
+    """
+    Returns data regridded conservatively onto the grid with dimensions
+    grid. The last two axes of data are latitude and longitude; all slices
+    along any axes before them are regridded together.
+
+    :param data:
+        An array of gridded data, which may include missing values
+    :param grid:
+        The dimensions of the grid onto which the data is converted
+    :return:
+        The data on the new grid
+    """
+    weights = regrid_weights(data.shape[-2:], grid.dims_by_count())
+    regridded = weights.apply(data)
+
+    if np.issubdtype(data.dtype, np.floating):
+        regridded = regridded.astype(data.dtype, copy=False)
+    return regridded
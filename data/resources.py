@@ -3,10 +3,20 @@ from os import path, environ
 
 
 MAIN_PATH_VAR = "ARRHENIUS_MAIN_PATH"
+# Maximum disk space, in megabytes, used by stored model run output.
+OUTPUT_BUDGET_VAR = "ARRHENIUS_OUTPUT_BUDGET_MB"
+# Maximum memory, in megabytes, used to hold grid data during a model run.
+MEMORY_BUDGET_VAR = "ARRHENIUS_MEMORY_BUDGET_MB"
+# A secret token that must accompany requests to administrative endpoints.
+ADMIN_TOKEN_VAR = "ARRHENIUS_ADMIN_TOKEN"
 
 MAIN_PATH = environ.get(MAIN_PATH_VAR) or Path(".").absolute()
 DATASET_PATH = path.join(MAIN_PATH, 'data', 'models/')
 OUTPUT_REL_PATH = path.join(MAIN_PATH, 'website', 'output/')
+REGRID_CACHE_PATH = path.join(MAIN_PATH, 'data', 'regrid_weights/')
+OUTPUT_BUDGET_MB = environ.get(OUTPUT_BUDGET_VAR)
+MEMORY_BUDGET_MB = environ.get(MEMORY_BUDGET_VAR)
+ADMIN_TOKEN = environ.get(ADMIN_TOKEN_VAR)
 
 DATASETS = {
     'arrhenius': "arrhenius_data.nc",
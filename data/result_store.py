@@ -0,0 +1,379 @@
+import json
+import shutil
+
+from os import path, walk, replace, getpid
+from pathlib import Path
+from time import time
+from typing import Optional, Dict, Iterator
+from contextlib import contextmanager
+from fcntl import flock, LOCK_EX, LOCK_UN
+
+from data.resources import OUTPUT_REL_PATH, OUTPUT_BUDGET_MB
+
+"""
+This module keeps track of model run output stored on disk, so that the
+results of previous model runs can be reused and so that stored output does
+not grow without bound.
+
+Each model run's output lives in its own directory, named after the run ID,
+under a common output directory. An index file in the output directory
+records the size of each run's output, when it was last accessed, and how
+many times it has been reused. When the total size of stored output exceeds
+a disk budget, the least recently used runs are removed.
+
+Runs whose output is being read, for instance while it is sent in a server
+response, are pinned in the index so that they are not removed from under
+their readers. A pin expires after PIN_TIMEOUT seconds, so that runs are
+not held forever by processes that exit without releasing their pins.
+
+The index is shared between all processes that use the same output
+directory, and is only ever read or changed while holding an exclusive lock
+on a lock file beside it.
+"""
+
+
+# Names of bookkeeping files inside the output directory.
+INDEX_FILE_NAME = ".result_index.json"
+LOCK_FILE_NAME = ".result_index.lock"
+
+# Keys in index entries.
+ENTRY_SIZE = "size"
+ENTRY_CREATED = "created"
+ENTRY_LAST_ACCESS = "last_access"
+ENTRY_HITS = "hits"
+ENTRY_PINS = "pins"
+
+# The number of seconds after which a pin on a run's output expires.
+PIN_TIMEOUT = 3600
+
+
+def directory_size(dir_path: str) -> int:
+    """
+    Returns the total size, in bytes, of all files inside the directory
+    given by dir_path, including any subdirectories.
+
+    :param dir_path:
+        A path to a directory
+    :return:
+        The number of bytes occupied by files in the directory
+    """
+    total = 0
+    for parent, _, files in walk(dir_path):
+        for file_name in files:
+            try:
+                total += path.getsize(path.join(parent, file_name))
+            except OSError:
+                # The file was removed while the directory was being read.
+                pass
+
+    return total
+
+
+class ResultStore:
+    """
+    An index over stored model run output, which allows cached results to
+    be found and reused, and enforces a disk budget over all stored output
+    by evicting the least recently used model runs.
+
+    Only runs that have been recorded as complete are considered stored.
+    A directory for a run ID that is not present in the index, for instance
+    one left behind by an interrupted model run, is treated as missing.
+    """
+
+    def __init__(self: 'ResultStore',
+                 root: str = OUTPUT_REL_PATH,
+                 budget: Optional[int] = None) -> None:
+        """
+        Instantiate a new ResultStore over the output directory root.
+
+        The optional budget parameter gives the maximum number of bytes that
+        stored output may occupy. If it is None, no output is ever evicted.
+
+        :param root:
+            The directory containing one output directory per model run
+        :param budget:
+            The disk budget for stored output, in bytes
+        """
+        if budget is not None and budget <= 0:
+            raise ValueError("Disk budget must be positive (is {})"
+                             .format(budget))
+
+        self._root = root
+        self._budget = budget
+        self._index_path = path.join(root, INDEX_FILE_NAME)
+        self._lock_path = path.join(root, LOCK_FILE_NAME)
+
+    @contextmanager
+    def _locked_index(self: 'ResultStore') -> Iterator[Dict]:
+        """
+        Acquire an exclusive lock over the index, shared across processes,
+        and provide the index's contents for the duration of the lock. Any
+        changes made to the contents are written back before the lock is
+        released.
+        """
+        Path(self._root).mkdir(parents=True, exist_ok=True)
+
+        with open(self._lock_path, "a") as lock_file:
+            flock(lock_file, LOCK_EX)
+            try:
+                index = self._read_index()
+                yield index
+                self._write_index(index)
+            finally:
+                flock(lock_file, LOCK_UN)
+
+    def _read_index(self: 'ResultStore') -> Dict:
+        """
+        Returns the contents of the index file, or an empty index if the
+        file does not exist or cannot be parsed.
+
+        Precondition:
+            The index lock is held by this process
+        """
+        try:
+            with open(self._index_path, "r") as index_file:
+                return json.load(index_file)
+        except (OSError, ValueError):
+            return {}
+
+    def _write_index(self: 'ResultStore',
+                     index: Dict) -> None:
+        """
+        Replace the contents of the index file with index. The file is
+        replaced atomically, so that it is never seen partly written.
+
+        Precondition:
+            The index lock is held by this process
+        """
+        temp_path = "{}.{}".format(self._index_path, getpid())
+        with open(temp_path, "w") as index_file:
+            json.dump(index, index_file)
+        replace(temp_path, self._index_path)
+
+    def run_path(self: 'ResultStore',
+                 run_id: str) -> str:
+        """
+        Returns the path to the output directory for the model run run_id,
+        whether or not that run is stored.
+
+        :param run_id:
+            The ID of a model run
+        :return:
+            The path to the run's output directory
+        """
+        return path.join(self._root, run_id)
+
+    def lookup(self: 'ResultStore',
+               run_id: str,
+               pin: Optional[str] = None) -> Optional[str]:
+        """
+        Returns the path to the output directory for the model run run_id if
+        its output is stored, or None otherwise. A successful lookup counts
+        as an access to the run, and as a cache hit.
+
+        If pin is given, a stored run is also pinned under that name in the
+        same step, as described under unpin, so that it cannot be evicted
+        between the lookup and the time its output is read.
+
+        :param run_id:
+            The ID of a model run
+        :param pin:
+            A name, unique to the caller, under which to pin the run
+        :return:
+            The run's output directory, or None if it is not stored
+        """
+        run_path = self.run_path(run_id)
+
+        with self._locked_index() as index:
+            entry = index.get(run_id)
+
+            if entry is None:
+                return None
+            elif not Path(run_path).is_dir():
+                # Output was removed from outside of the store.
+                del index[run_id]
+                return None
+
+            entry[ENTRY_LAST_ACCESS] = time()
+            entry[ENTRY_HITS] += 1
+            if pin is not None:
+                _add_pin(entry, pin)
+
+        return run_path
+
+    def contains(self: 'ResultStore',
+                 run_id: str) -> bool:
+        """
+        Returns True iff the output for the model run run_id is stored.
+        Unlike lookup, this does not count as an access to the run, so it
+        neither protects the run from eviction nor counts as a cache hit.
+
+        :param run_id:
+            The ID of a model run
+        :return:
+            Whether the run's output is stored
+        """
+        with self._locked_index() as index:
+            stored = run_id in index
+
+        return stored and Path(self.run_path(run_id)).is_dir()
+
+    def record(self: 'ResultStore',
+               run_id: str,
+               pin: Optional[str] = None) -> str:
+        """
+        Record that the output for model run run_id is complete and stored
+        in its output directory, or update the recorded size of a run that
+        was already stored, for instance after new image files have been
+        added to it. Returns the path to the run's output directory.
+
+        Afterward, least recently used runs other than run_id are evicted
+        until stored output fits within the disk budget. If pin is given,
+        run_id is pinned under that name, as by lookup.
+
+        :param run_id:
+            The ID of a model run
+        :param pin:
+            A name, unique to the caller, under which to pin the run
+        :return:
+            The run's output directory
+        """
+        run_path = self.run_path(run_id)
+        size = directory_size(run_path)
+        now = time()
+
+        with self._locked_index() as index:
+            if run_id in index:
+                entry = index[run_id]
+            else:
+                entry = {ENTRY_CREATED: now, ENTRY_HITS: 0}
+                index[run_id] = entry
+
+            entry[ENTRY_SIZE] = size
+            entry[ENTRY_LAST_ACCESS] = now
+            if pin is not None:
+                _add_pin(entry, pin)
+
+            self._evict(index, keep=run_id)
+
+        return run_path
+
+    def unpin(self: 'ResultStore',
+              run_id: str,
+              pin: str) -> None:
+        """
+        Release the pin named pin on the model run run_id, which was taken
+        by lookup or record. While a run has any pins that have not expired,
+        its output is never evicted. Releasing a pin that does not exist,
+        or has already expired, has no effect.
+
+        :param run_id:
+            The ID of a model run
+        :param pin:
+            The name under which the run was pinned
+        """
+        with self._locked_index() as index:
+            entry = index.get(run_id)
+            if entry is not None:
+                entry.get(ENTRY_PINS, {}).pop(pin, None)
+
+            # Runs that could not be evicted while pinned may now be.
+            self._evict(index)
+
+    def _evict(self: 'ResultStore',
+               index: Dict,
+               keep: Optional[str] = None) -> None:
+        """
+        Remove the output of the least recently used runs in index, other
+        than keep and any pinned runs, until the total size of stored output
+        is within the disk budget, or until no other runs remain. Expired
+        pins are discarded.
+
+        Precondition:
+            The index lock is held by this process
+
+        :param index:
+            The contents of the index
+        :param keep:
+            The ID of a run that must not be evicted
+        """
+        if self._budget is None:
+            return
+
+        now = time()
+        for entry in index.values():
+            pins = entry.get(ENTRY_PINS, {})
+            for pin in [pin for pin, expiry in pins.items() if expiry <= now]:
+                del pins[pin]
+
+        total = sum(entry[ENTRY_SIZE] for entry in index.values())
+        candidates = sorted((run_id for run_id, entry in index.items()
+                             if run_id != keep and not entry.get(ENTRY_PINS)),
+                            key=lambda run_id:
+                                index[run_id][ENTRY_LAST_ACCESS])
+
+        for run_id in candidates:
+            if total <= self._budget:
+                break
+
+            total -= index[run_id][ENTRY_SIZE]
+            del index[run_id]
+            shutil.rmtree(self.run_path(run_id), ignore_errors=True)
+
+    def stats(self: 'ResultStore') -> Dict[str, Dict]:
+        """
+        Returns a copy of the index, mapping each stored run ID to a
+        dictionary with the size of its output in bytes, the times of its
+        creation and last access, its number of cache hits, and the expiry
+        times of any pins on it.
+
+        :return:
+            Bookkeeping information for every stored run
+        """
+        with self._locked_index() as index:
+            return {run_id: dict(entry) for run_id, entry in index.items()}
+
+    def total_size(self: 'ResultStore') -> int:
+        """
+        Returns the total size, in bytes, of all stored output.
+
+        :return:
+            The disk space occupied by stored runs
+        """
+        return sum(entry[ENTRY_SIZE] for entry in self.stats().values())
+
+
+def _add_pin(entry: Dict,
+             pin: str) -> None:
+    """
+    Pin the run whose index entry is entry under the name pin, until
+    PIN_TIMEOUT seconds from now.
+
+    :param entry:
+        The index entry of a stored run
+    :param pin:
+        A name, unique to the caller, under which to pin the run
+    """
+    entry.setdefault(ENTRY_PINS, {})[pin] = time() + PIN_TIMEOUT
+
+
+_default_store = None
+
+
+def default_result_store() -> 'ResultStore':
+    """
+    Returns a ResultStore over the standard output directory, with the disk
+    budget given in megabytes by the environment variable named in
+    data.resources.OUTPUT_BUDGET_VAR, or no budget if it is not set.
+
+    :return:
+        The result store for standard model output
+    """
+    global _default_store
+
+    if _default_store is None:
+        budget = None if OUTPUT_BUDGET_MB is None \
+            else int(float(OUTPUT_BUDGET_MB) * 1024 * 1024)
+        _default_store = ResultStore(OUTPUT_REL_PATH, budget)
+
+    return _default_store
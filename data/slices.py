@@ -0,0 +1,354 @@
+import numpy as np
+
+from typing import Optional, Tuple, List, Dict, Mapping
+
+from data.grid import band_mean
+from data.reader import NetCDFReader
+
+"""
+This module selects part of one variable from a model run's dataset, so that
+clients that need only a few values do not have to transfer and parse the
+whole dataset.
+
+A slice query selects a range of time segments, and a box of latitudes and
+longitudes given in degrees. A grid cell is selected if its centre lies
+within the box, edges included. Latitudes run from -90 to 90, south to north,
+and longitudes from -180 to 180; a longitude range whose lower bound is
+greater than its upper bound crosses the antimeridian. The selection may
+instead be reduced to a table of latitude bands, holding the mean of each
+selected latitude row over the selected longitudes.
+
+Only the selected part of the variable is read from the dataset. A slice can
+be encoded as JSON, with missing values as null, or as a raw array of
+little-endian numbers, with missing values as NaN, whose shape, type,
+dimensions, and coordinates are described in HTTP headers.
+"""
+
+
+# Encodings for slices.
+FORMAT_JSON = "json"
+FORMAT_BINARY = "binary"
+
+# Names of dimensions in model output datasets.
+DIM_TIME = "time"
+DIM_LAT = "latitude"
+DIM_LON = "longitude"
+
+
+class InvalidSliceError(ValueError):
+    """
+    An exception class indicating that a slice query cannot be answered,
+    because it is malformed, or selects a variable, time segment, or region
+    that is not present in the dataset.
+    """
+    pass
+
+
+def _parse_range(arg: str,
+                 convert: type) -> Tuple[object, object]:
+    """
+    Returns the bounds of a range given in the form "<low>:<high>", or the
+    single value given in the form "<value>" as both bounds, with both
+    bounds converted by convert.
+    """
+    parts = arg.split(":")
+    if len(parts) > 2:
+        raise InvalidSliceError("Range must have the form <low>:<high>"
+                                " (is {})".format(arg))
+
+    try:
+        return convert(parts[0]), convert(parts[-1])
+    except ValueError:
+        raise InvalidSliceError("Range bounds must be of type {}"
+                                " (is {})".format(convert.__name__, arg))
+
+
+class SliceQuery:
+    """
+    A selection of part of one variable from a model run's dataset, along
+    with the encoding in which it is to be returned.
+    """
+
+    def __init__(self: 'SliceQuery',
+                 time: Optional[Tuple[int, int]] = None,
+                 lat: Optional[Tuple[float, float]] = None,
+                 lon: Optional[Tuple[float, float]] = None,
+                 bands: bool = False,
+                 fmt: str = FORMAT_JSON) -> None:
+        """
+        Instantiate a new SliceQuery selecting the time segments with
+        indices from time[0] to time[1], the latitudes from lat[0] to
+        lat[1], and the longitudes from lon[0] to lon[1], all inclusive.
+        Any range that is None selects the whole of its dimension. If bands
+        is True, the selection is reduced to a table of latitude bands.
+
+        :param time:
+            The first and last time segment selected
+        :param lat:
+            The lowest and highest latitude selected, in degrees
+        :param lon:
+            The westernmost and easternmost longitude selected, in degrees
+        :param bands:
+            Whether to take the mean of each latitude band
+        :param fmt:
+            The encoding of the slice, either json or binary
+        """
+        if fmt not in (FORMAT_JSON, FORMAT_BINARY):
+            raise InvalidSliceError("Format must be one of {} or {} (is {})"
+                                    .format(FORMAT_JSON, FORMAT_BINARY, fmt))
+        if time is not None and (time[0] < 0 or time[0] > time[1]):
+            raise InvalidSliceError("Time range must be non-negative and"
+                                    " non-decreasing (is {})".format(time))
+        if lat is not None and lat[0] > lat[1]:
+            raise InvalidSliceError("Latitude range must be non-decreasing"
+                                    " (is {})".format(lat))
+
+        self.time = time
+        self.lat = lat
+        self.lon = lon
+        self.bands = bands
+        self.fmt = fmt
+
+    @classmethod
+    def from_args(cls: type,
+                  args: Mapping[str, str]) -> 'SliceQuery':
+        """
+        Returns a SliceQuery described by args, such as the query string of
+        an HTTP request, with optional entries "time", "lat", and "lon",
+        each in the form "<low>:<high>" or "<value>", "bands", which is
+        true if present with any value other than 0 or false, and "format".
+
+        :param args:
+            A mapping of query parameter names to values
+        :return:
+            The query described by args
+        """
+        time = lat = lon = None
+        if "time" in args:
+            time = _parse_range(args["time"], int)
+        if "lat" in args:
+            lat = _parse_range(args["lat"], float)
+        if "lon" in args:
+            lon = _parse_range(args["lon"], float)
+        bands = "bands" in args \
+            and args["bands"].lower() not in ("0", "false")
+
+        return cls(time, lat, lon, bands, args.get("format", FORMAT_JSON))
+
+
+def cell_centres(count: int,
+                 low: float,
+                 high: float) -> np.ndarray:
+    """
+    Returns the centres of count cells of equal width spanning low to high.
+
+    :param count:
+        The number of cells
+    :param low:
+        The lower edge of the first cell
+    :param high:
+        The upper edge of the last cell
+    :return:
+        The centre of each cell, in order
+    """
+    width = (high - low) / count
+    return low + width * (np.arange(count) + 0.5)
+
+
+def _centre_slices(centres: np.ndarray,
+                   bounds: Optional[Tuple[float, float]],
+                   dim_name: str) -> List[slice]:
+    """
+    Returns slices selecting the cells whose centres lie within bounds, in
+    order; two slices if bounds wraps around the end of the dimension, and
+    one otherwise. Raises an InvalidSliceError if no cell is selected.
+    """
+    if bounds is None:
+        return [slice(None)]
+
+    low, high = bounds
+    if low <= high:
+        selected = [np.flatnonzero((centres >= low) & (centres <= high))]
+    else:
+        selected = [np.flatnonzero(centres >= low),
+                    np.flatnonzero(centres <= high)]
+
+    slices = [slice(indices[0], indices[-1] + 1)
+              for indices in selected if len(indices) > 0]
+    if not slices:
+        raise InvalidSliceError("No {} cell centre lies within {}"
+                                .format(dim_name, bounds))
+    return slices
+
+
+class VariableSlice:
+    """
+    Part of one variable from a model run's dataset, along with the names
+    and coordinates of its dimensions.
+    """
+
+    def __init__(self: 'VariableSlice',
+                 var_name: str,
+                 values: np.ndarray,
+                 dims: Tuple[str, ...],
+                 coords: Dict[str, np.ndarray]) -> None:
+        """
+        Instantiate a new VariableSlice of variable var_name, holding
+        values, an array with one axis per name in dims. coords maps each
+        dimension name to the coordinates of the entries along its axis.
+
+        :param var_name:
+            The name of the variable
+        :param values:
+            The selected values, with missing values as NaN
+        :param dims:
+            The names of the dimensions of values
+        :param coords:
+            The coordinates along each dimension
+        """
+        self.var_name = var_name
+        self.values = values
+        self.dims = dims
+        self.coords = coords
+
+    def to_json(self: 'VariableSlice') -> Dict:
+        """
+        Returns a dictionary holding the slice's variable name, dimensions,
+        shape, coordinates, and values as nested lists, with missing values
+        as None, ready to be encoded as JSON.
+
+        :return:
+            A JSON-compatible representation of the slice
+        """
+        values = np.where(np.isnan(self.values), None, self.values)
+        return {
+            "var": self.var_name,
+            "dims": list(self.dims),
+            "shape": list(self.values.shape),
+            "coords": {dim: self.coords[dim].tolist() for dim in self.dims},
+            "values": values.tolist(),
+        }
+
+    def to_bytes(self: 'VariableSlice') -> bytes:
+        """
+        Returns the slice's values as a C-ordered array of little-endian
+        numbers, with missing values as NaN.
+
+        :return:
+            The raw bytes of the slice's values
+        """
+        little_endian = self.values.dtype.newbyteorder("<")
+        return np.ascontiguousarray(self.values, dtype=little_endian)\
+            .tobytes()
+
+    def headers(self: 'VariableSlice') -> Dict[str, str]:
+        """
+        Returns HTTP headers describing the raw array returned by to_bytes:
+        its shape, numpy type string, dimension names, and the coordinates
+        along each dimension, as comma-separated lists.
+
+        :return:
+            A mapping of header names to values
+        """
+        little_endian = self.values.dtype.newbyteorder("<")
+        headers = {
+            "X-Array-Var": self.var_name,
+            "X-Array-Shape": ",".join(str(n) for n in self.values.shape),
+            "X-Array-Dtype": little_endian.str,
+            "X-Array-Dims": ",".join(self.dims),
+        }
+        for dim in self.dims:
+            headers["X-Array-Coords-" + dim.capitalize()] = \
+                ",".join("{:g}".format(c) for c in self.coords[dim])
+
+        return headers
+
+
+def read_variable_slice(dataset_path: str,
+                        var_name: str,
+                        query: 'SliceQuery') -> 'VariableSlice':
+    """
+    Returns the part of variable var_name selected by query, from the model
+    run dataset at dataset_path. Only the selected part of the variable is
+    read. Raises an InvalidSliceError if the dataset has no such variable,
+    or if the query selects nothing.
+
+    Grid cells are taken to divide the globe evenly. A dataset written by a
+    model run that aggregated latitude bands has a single longitude cell,
+    which covers every longitude, and so is selected by any longitude range.
+
+    :param dataset_path:
+        The path to a model run's NetCDF dataset
+    :param var_name:
+        The name of the variable to select from
+    :param query:
+        The selection to make
+    :return:
+        The selected part of the variable
+    """
+    reader = NetCDFReader(dataset_path)
+    try:
+        try:
+            dims = reader.dimensions(var_name)
+        except KeyError:
+            raise InvalidSliceError("Dataset has no variable {}"
+                                    .format(var_name))
+
+        coords = {dim: np.arange(reader.dimension_size(dim)) for dim in dims}
+        selection = {}
+        lon_slices = [slice(None)]
+
+        if DIM_LAT in dims:
+            coords[DIM_LAT] = cell_centres(len(coords[DIM_LAT]), -90, 90)
+            selection[DIM_LAT] = _centre_slices(coords[DIM_LAT], query.lat,
+                                                DIM_LAT)[0]
+        if DIM_LON in dims:
+            coords[DIM_LON] = cell_centres(len(coords[DIM_LON]), -180, 180)
+            if len(coords[DIM_LON]) > 1:
+                lon_slices = _centre_slices(coords[DIM_LON], query.lon,
+                                            DIM_LON)
+
+        if query.time is not None:
+            time_count = len(coords.get(DIM_TIME, []))
+            if query.time[1] >= time_count:
+                raise InvalidSliceError("Time range must be within 0 to {}"
+                                        " (is {})".format(time_count - 1,
+                                                          query.time))
+            selection[DIM_TIME] = slice(query.time[0], query.time[1] + 1)
+
+        # A longitude range across the antimeridian is read in two parts.
+        parts = []
+        for lon_slice in lon_slices:
+            selection[DIM_LON] = lon_slice
+            index = tuple(selection.get(dim, slice(None)) for dim in dims)
+            parts.append(reader.collect_hyperslab(var_name, index))
+    finally:
+        reader.close()
+
+    dtype = parts[0].dtype if np.issubdtype(parts[0].dtype, np.floating) \
+        else np.float64
+    parts = [np.ma.filled(np.ma.asarray(part).astype(dtype), np.nan)
+             for part in parts]
+
+    if DIM_LON in dims:
+        values = np.concatenate(parts, axis=dims.index(DIM_LON))
+    else:
+        values = parts[0]
+
+    slice_coords = {}
+    for dim in dims:
+        if dim == DIM_LON:
+            slice_coords[dim] = np.concatenate([coords[dim][lon_slice]
+                                                for lon_slice in lon_slices])
+        else:
+            slice_coords[dim] = coords[dim][selection.get(dim, slice(None))]
+
+    if query.bands:
+        if DIM_LON not in dims:
+            raise InvalidSliceError("Variable {} has no longitude dimension"
+                                    " to take band means over"
+                                    .format(var_name))
+        values = band_mean(values, axis=dims.index(DIM_LON)).astype(dtype)
+        dims = tuple(dim for dim in dims if dim != DIM_LON)
+
+    return VariableSlice(var_name, values, dims, slice_coords)
@@ -0,0 +1,168 @@
+import numpy as np
+
+from threading import Lock
+from typing import Callable, Dict, Hashable, List
+
+"""
+This module shares loaded climate data between model runs in the same
+process, so that concurrent model runs on the same data, such as those
+started by separate requests to the web API, hold only one copy of it and
+load it only once.
+
+Data is stored as read-only snapshots, each identified by a key describing
+the data providers, grid, precision, and year from which it was loaded.
+Model runs acquire a snapshot before using it and release it when they are
+finished, and a snapshot is dropped as soon as no model run holds it.
+
+Snapshots are never changed once loaded. Each model run builds its own grid
+cells from a snapshot, copying the values it needs, so that temperatures
+changed by one model run are never seen by another.
+"""
+
+
+def read_only(value: object) -> object:
+    """
+    Returns a read-only view of value if it is an array, so that the data
+    it holds cannot be changed through the view, or value itself otherwise.
+    The original array is left writeable.
+
+    :param value:
+        An array, or any other value
+    :return:
+        A read-only view of the array, or the value unchanged
+    """
+    if not isinstance(value, np.ndarray):
+        return value
+
+    view = value.view()
+    view.flags.writeable = False
+    return view
+
+
+class _Snapshot:
+    """
+    A single entry in a SnapshotRegistry, holding loaded data along with the
+    number of model runs that hold it.
+    """
+
+    def __init__(self: '_Snapshot') -> None:
+        self.data = None
+        self.refs = 0
+        # Held while the data is being loaded, so that other model runs
+        # wait for it instead of loading it again.
+        self.load_lock = Lock()
+
+
+class SnapshotRegistry:
+    """
+    A registry of read-only snapshots of loaded data, shared between all
+    the model runs in a process and safe to use from several threads.
+
+    Each call to acquire must be matched by one call to release with the
+    same key once the data is no longer needed. A snapshot is dropped when
+    its last holder releases it, and is loaded again by the next model run
+    that acquires it.
+    """
+
+    def __init__(self: 'SnapshotRegistry') -> None:
+        """
+        Instantiate a new, empty SnapshotRegistry.
+        """
+        self._lock = Lock()
+        self._snapshots: Dict[Hashable, _Snapshot] = {}
+
+    def acquire(self: 'SnapshotRegistry',
+                key: Hashable,
+                loader: Callable[[], tuple]) -> tuple:
+        """
+        Returns the snapshot identified by key, calling loader to load it if
+        no model run holds it already. Only one caller loads each snapshot;
+        any others acquiring it at the same time wait for it to be loaded.
+        Arrays in the snapshot are read-only.
+
+        If loader raises an exception, the snapshot is released and the
+        exception is raised to the caller.
+
+        :param key:
+            A key identifying the data to be acquired
+        :param loader:
+            A function that loads the data, returning a tuple of values
+        :return:
+            The data, as a tuple of read-only arrays and other values
+        """
+        with self._lock:
+            snapshot = self._snapshots.get(key)
+            if snapshot is None:
+                snapshot = _Snapshot()
+                self._snapshots[key] = snapshot
+            snapshot.refs += 1
+
+        with snapshot.load_lock:
+            if snapshot.data is None:
+                try:
+                    snapshot.data = tuple(read_only(value)
+                                          for value in loader())
+                except BaseException:
+                    self.release(key)
+                    raise
+
+        return snapshot.data
+
+    def release(self: 'SnapshotRegistry',
+                key: Hashable) -> None:
+        """
+        Release a snapshot previously acquired with the same key, dropping
+        it from the registry if no other model run holds it.
+
+        :param key:
+            A key identifying the data to be released
+        """
+        with self._lock:
+            snapshot = self._snapshots[key]
+            snapshot.refs -= 1
+
+            if snapshot.refs == 0:
+                del self._snapshots[key]
+
+    def stats(self: 'SnapshotRegistry') -> List[Dict]:
+        """
+        Returns a description of each snapshot in the registry, as a
+        dictionary with its key, the number of model runs holding it, and
+        the number of bytes taken by its arrays, or 0 if it is still being
+        loaded.
+
+        :return:
+            Bookkeeping information for every snapshot
+        """
+        with self._lock:
+            snapshots = list(self._snapshots.items())
+
+        return [{
+            "key": repr(key),
+            "refs": snapshot.refs,
+            "size": sum(value.nbytes for value in snapshot.data or ()
+                        if isinstance(value, np.ndarray)),
+        } for key, snapshot in snapshots]
+
+    def total_size(self: 'SnapshotRegistry') -> int:
+        """
+        Returns the total size, in bytes, of the arrays in all snapshots.
+
+        :return:
+            The memory taken by shared data
+        """
+        return sum(entry["size"] for entry in self.stats())
+
+
+_default_registry = SnapshotRegistry()
+
+
+def default_snapshot_registry() -> 'SnapshotRegistry':
+    """
+    Returns the registry of snapshots shared by every model run in this
+    process.
+
+    :return:
+        The process-wide snapshot registry
+    """
+    return _default_registry
@@ -5,10 +5,12 @@ grids as tables, and extract interesting statistics from gridded data such
 as sample means.
 """
 
-from typing import List, Tuple, Callable, Union
+from typing import List, Tuple, Callable, Union, Optional
 from math import sqrt, floor, log10, nan, isnan
 import numpy as np
 
+from data.grid import band_mean, latitude_weights
+
 X067_EXPECTED = [[nan, nan, nan, nan],
                  [nan, nan, nan, nan],
                  [nan, nan, nan, nan],
@@ -142,29 +144,13 @@ def convert_grid_data_to_table(data: np.ndarray) -> np.ndarray:
     if data.ndim == 2:
         # Assume the data is already in tabular form.
         return data
-    elif data.ndim == 3:
-        table = []
-
-        # Order of time and latitude dimensions must be switched, in addition
-        # to the aggregating over latitude bands.
-        for lat_band in range(data.shape[1]):
-            row = []
-            for time_seg in range(data.shape[0]):
-                # Find the average for this latitude band
-                data_slice = data[time_seg, lat_band, :]
-                avg = mean(data_slice)
-                row.append(avg)
-            # Build a table from each time-segment row.
-            table.append(row)
-        return np.array(table)
-    else:
-        # No reordering of dimensions needs to happen above the 3rd dimension.
-        table = convert_grid_data_to_table(data[0])
-        for row in data[1:]:
-            # Append the new row to the end of the accumulated array's
-            # second-from-highest dimension.
-            table = np.hstack((table, convert_grid_data_to_table(row)))
-        return table
+
+    # Average over each latitude band, whose cells all have the same area
+    # and so need no weights, then move latitude to the first dimension,
+    # followed by time and any higher dimensions flattened together in
+    # order.
+    band_means = band_mean(data, axis=-1)
+    return np.moveaxis(band_means, -1, 0).reshape(band_means.shape[-1], -1)
 
 
 def _format_row(cell_values: List,
@@ -306,6 +292,9 @@ def sum_table(table: Union[np.ndarray, int],
     None or nan are not considered. If no elements in the whole table are
     valid, then 0 and 0 are returned.
 
+    Elements are summed in double precision, even if table holds single
+    precision values.
+
     :param table:
         An array of numbers, including None and nan values
     :param modifier:
@@ -326,30 +315,42 @@ def sum_table(table: Union[np.ndarray, int],
             num_valid_elems += sub_valid_cells
 
         return total, num_valid_elems
-    elif not isnan(table) and table is not None:
+    elif table is not None and not isnan(table):
         # table is a single number.
-        return modifier(table), 1
+        return modifier(float(table)), 1
     else:
         # table is either None or nan, and thus invalid.
         return 0, 0
 
 
-def mean(data: np.ndarray) -> float:
+def mean(data: np.ndarray,
+         lat_axis: Optional[int] = None) -> float:
     """
     Returns the average value of all valid numeric elements in data.
     An element is valid if it is not None or nan.
 
+    If lat_axis is given, data is gridded, with every latitude band of the
+    grid along that axis, and each element is weighted by the surface area
+    of its band, as given by latitude_weights.
+
     :param data:
         An array of numbers
+    :param lat_axis:
+        The latitude axis of gridded data, or None to weight all elements
+        equally
     :return:
         The average amongst valid numbers
     """
-    try:
-        sum_cells, num_valid_cells = sum_table(data, lambda x: x)
-        smpl_mean = sum_cells / num_valid_cells
-        return smpl_mean
-    except ZeroDivisionError:
-        return nan
+    weights = None
+    if lat_axis is not None:
+        data = np.asarray(data)
+        shape = [1] * data.ndim
+        shape[lat_axis] = -1
+        weights = np.ravel(np.broadcast_to(
+            latitude_weights(data.shape[lat_axis]).reshape(shape),
+            data.shape))
+
+    return float(band_mean(np.ravel(data), axis=0, weights=weights))
 
 
 def variance(data: np.ndarray) -> float:
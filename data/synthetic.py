@@ -0,0 +1,245 @@
+from data.grid import GridDimensions
+from data.resources import DATASET_PATH, DATASETS
+
+import data.provider as prov
+
+from pathlib import Path
+from typing import List
+
+import numpy as np
+
+"""
+Synthetic stand-ins for the providers of datasets that are not shipped with
+the Arrhenius model, such as Berkeley Earth and NCEP/NCAR data. Each stub
+produces smooth data of the same shape as the provider it replaces, so that
+any configuration can be run on a machine without those datasets, for
+instance to measure the model's performance.
+
+Results computed from synthetic data are not real model output, and must
+never be written where the web API serves results from.
+"""
+
+
+# Pressure levels of the NCEP/NCAR Reanalysis I dataset, in millibars.
+NCEP_PRESSURE_LEVELS = np.array([1000, 925, 850, 700, 600, 500, 400, 300,
+                                 250, 200, 150, 100, 70, 50, 30, 20, 10],
+                                dtype=float)
+# Number of levels at which NCEP/NCAR reports relative humidity.
+NCEP_HUMIDITY_LEVELS = 8
+
+
+def _latitude_profile(grid: 'GridDimensions') -> np.ndarray:
+    """
+    Returns a 2-D array on grid, whose values are the cosine of the latitude
+    at the center of each grid cell, and vary slightly in longitude so that
+    no two cells in a row are identical.
+
+    :param grid:
+        The dimensions of the grid on which the array is produced
+    :return:
+        A smooth latitude-dependent field on the grid
+    """
+    lat_count, lon_count = grid.dims_by_count()
+    lats = np.linspace(-90, 90, lat_count, endpoint=False) + 90 / lat_count
+    lons = np.linspace(0, 2 * np.pi, lon_count, endpoint=False)
+
+    profile = np.cos(np.radians(lats))[:, np.newaxis]
+    return profile + 0.05 * np.sin(lons)[np.newaxis, :]
+
+
+def synthetic_temperature_data(grid: 'GridDimensions'
+                               = GridDimensions((10, 20)),
+                               year: int = None) -> np.ndarray:
+    """
+    A stub temperature provider producing twelve months of temperature
+    data at the surface and at each NCEP/NCAR pressure level, in the same
+    shape as ncar_temperature_data. Temperatures decrease away from the
+    equator and with altitude.
+
+    :param grid:
+        The dimensions of the grid on which data is produced
+    :param year:
+        Ignored
+    :return:
+        Synthetic multilayer temperature data
+    """
+    profile = _latitude_profile(grid)
+    surface = -20 + 45 * profile
+
+    levels = len(NCEP_PRESSURE_LEVELS) + 1
+    lapse = np.linspace(0, 60, levels)[:, np.newaxis, np.newaxis]
+    months = np.cos(np.linspace(0, 2 * np.pi, 12, endpoint=False))
+
+    return np.array([surface[np.newaxis, ...] - lapse + 5 * month
+                     for month in months])
+
+
+def synthetic_surface_temperature_data(grid: 'GridDimensions'
+                                       = GridDimensions((10, 20)),
+                                       year: int = None) -> np.ndarray:
+    """
+    A stub temperature provider producing twelve months of surface
+    temperature data, in the same shape as berkeley_temperature_data.
+
+    :param grid:
+        The dimensions of the grid on which data is produced
+    :param year:
+        Ignored
+    :return:
+        Synthetic surface temperature data
+    """
+    return synthetic_temperature_data(grid, year)[:, 0, ...]
+
+
+def synthetic_humidity_data(grid: 'GridDimensions'
+                            = GridDimensions((10, 20)),
+                            year: int = None) -> np.ndarray:
+    """
+    A stub humidity provider producing twelve months of relative humidity
+    data in the same shape as ncar_humidity_data, with five dry levels at
+    the top of the atmosphere.
+
+    :param grid:
+        The dimensions of the grid on which data is produced
+    :param year:
+        Ignored
+    :return:
+        Synthetic multilayer relative humidity data
+    """
+    profile = _latitude_profile(grid)
+    wet_levels = np.linspace(80, 30, NCEP_HUMIDITY_LEVELS)
+    dry_levels = np.zeros(5)
+    levels = np.concatenate((wet_levels, dry_levels))
+
+    layered = levels[:, np.newaxis, np.newaxis] \
+        * (0.75 + 0.25 * profile)[np.newaxis, ...]
+    return np.repeat(layered[np.newaxis, ...], 12, axis=0)
+
+
+def synthetic_pressure_levels() -> np.ndarray:
+    """
+    A stub pressure provider returning the NCEP/NCAR pressure levels.
+
+    :return:
+        Atmospheric pressure levels, in millibars
+    """
+    return NCEP_PRESSURE_LEVELS.copy()
+
+
+def _synthetic_land_fraction(grid: 'GridDimensions') -> np.ndarray:
+    """
+    Returns a synthetic fraction of each grid cell covered by land, standing
+    in for the Berkeley Earth land mask.
+
+    :param grid:
+        The dimensions of the grid on which data is produced
+    :return:
+        Synthetic land fraction of each grid cell
+    """
+    return np.clip(_latitude_profile(grid) - 0.3, 0, 1)
+
+
+def synthetic_albedo_data(temp_data: np.ndarray,
+                          grid: 'GridDimensions'
+                          = GridDimensions((10, 20))) -> np.ndarray:
+    """
+    A stub albedo provider following the scheme of landmask_albedo_data,
+    with a synthetic land fraction in place of the Berkeley Earth land mask.
+
+    :param temp_data:
+        Gridded surface temperature data, on the same grid as the albedo
+    :param grid:
+        The dimensions of the grid on which data is produced
+    :return:
+        Synthetic surface albedo data by Arrhenius' scheme
+    """
+    land_percent = _synthetic_land_fraction(grid)
+    ocean_albedo = 1 - 0.925
+    land_albedo = 1 - 1.0
+    snow_albedo = 1 - 0.5
+
+    if temp_data.ndim == 3:
+        surface_temp = temp_data
+    else:
+        surface_temp = temp_data[:, 0, ...]
+
+    land_albedo = np.where(surface_temp < -15, snow_albedo, land_albedo)
+    return land_percent * land_albedo + (1 - land_percent) * ocean_albedo
+
+
+def synthetic_land_mask_data(grid: 'GridDimensions'
+                             = GridDimensions((10, 20))) -> np.ndarray:
+    """
+    A stub mask provider following land_mask_data, with a synthetic land
+    fraction in place of the Berkeley Earth land mask.
+
+    :param grid:
+        The dimensions of the grid on which data is produced
+    :return:
+        A boolean array by latitude and longitude, True over land
+    """
+    return _synthetic_land_fraction(grid) >= 0.5
+
+
+def synthetic_ocean_mask_data(grid: 'GridDimensions'
+                              = GridDimensions((10, 20))) -> np.ndarray:
+    """
+    A stub mask provider following ocean_mask_data, with a synthetic land
+    fraction in place of the Berkeley Earth land mask.
+
+    :param grid:
+        The dimensions of the grid on which data is produced
+    :return:
+        A boolean array by latitude and longitude, True over ocean
+    """
+    return _synthetic_land_fraction(grid) < 0.5
+
+
+# Providers that require datasets other than Arrhenius' own data, with
+# the dataset file they read and a synthetic replacement.
+SYNTHETIC_PROVIDERS = {
+    ("temperature", "berkeley"):
+        (DATASETS['temperature']['berkeley'],
+         synthetic_surface_temperature_data),
+    ("temperature", "ncar"):
+        (DATASETS['temperature']['NCEP/NCAR'], synthetic_temperature_data),
+    ("humidity", "ncar"):
+        (DATASETS['water']['NCEP/NCAR'], synthetic_humidity_data),
+    ("albedo", "landmask"):
+        (DATASETS['temperature']['berkeley'], synthetic_albedo_data),
+    ("pressure", "ncar"):
+        (DATASETS['temperature']['NCEP/NCAR'], synthetic_pressure_levels),
+    ("mask", "land"):
+        (DATASETS['temperature']['berkeley'], synthetic_land_mask_data),
+    ("mask", "ocean"):
+        (DATASETS['temperature']['berkeley'], synthetic_ocean_mask_data),
+}
+
+
+def use_synthetic_providers(force: bool = False) -> List[str]:
+    """
+    Replace each provider whose dataset is missing from disk with its
+    synthetic equivalent, or replace all such providers if force is True.
+    Returns the names of the providers that were replaced, in the form
+    "<data type>/<provider name>".
+
+    Must be called before any configuration objects are created, since
+    configurations bind their provider functions on creation.
+
+    :param force:
+        Whether to replace providers even when their dataset is present
+    :return:
+        The names of the replaced providers
+    """
+    replaced = []
+
+    for (data_type, name), (file_name, stub) \
+            in SYNTHETIC_PROVIDERS.items():
+        if force or not Path(DATASET_PATH, file_name).is_file():
+            prov.PROVIDERS[data_type][name] = stub
+            replaced.append("{}/{}".format(data_type, name))
+
+            if data_type == "albedo":
+                prov.REQUIRE_TEMP_DATA_INPUT.append(stub)
+
+    return replaced
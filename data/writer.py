@@ -1,6 +1,6 @@
-from netCDF4 import Dataset
-from typing import List, Tuple, Union
+from typing import List, Tuple, Union, Optional
 from numpy import ndarray
+from os import replace, getpid
 
 
 DIM_TYPE_KEY = 'type'
@@ -68,10 +68,18 @@ class NetCDFWriter:
                   dim_name: str,
                   dim_type: type,
                   dim_size: Union[int, None],
-                  dim_bounds: Tuple[int, int] = (-180, 180)) -> 'NetCDFWriter':
+                  dim_bounds: Optional[Tuple[int, int]] = None)\
+            -> 'NetCDFWriter':
         """
         Adds a new variable dimension to the end of the current list
         of dimensions.
+
+        The dimension's values are the centres of dim_size cells of equal
+        width, which together span dim_bounds, or (-180, 180) if no bounds
+        are given. A dimension of unlimited size instead has dim_bounds
+        span only its first index, with every later index one cell width
+        further along; its bounds default to (0, 1).
+
         Preconditions:
             dim_name != ''
             dim_size > 0
@@ -82,6 +90,9 @@ class NetCDFWriter:
         :param dim_size:
             The number of entries in the dimension, or None if the dimension
             is to have unlimited size
+        :param dim_bounds:
+            The lowest and highest values covered by the dimension, or by
+            its first index if it has unlimited size
         :return:
             This NetCDFWriter instance
         """
@@ -110,6 +121,9 @@ class NetCDFWriter:
                 raise ValueError("Dimension size must be greater than 0"
                                  "(is {})".format(dim_size))
 
+        if dim_bounds is None:
+            dim_bounds = (-180, 180) if dim_size is not None else (0, 1)
+
         self._dimensions[dim_name] = {
             DIM_TYPE_KEY: dim_type,
             DIM_SIZE_KEY: dim_size,
@@ -286,8 +300,28 @@ class NetCDFWriter:
                                   "{}".format(variable))
 
         # Create a new NetCDF dataset in memory.
+        from netCDF4 import Dataset
         output_dataset = Dataset(filepath, 'w', format)
+        self._initialize_dataset(output_dataset)
+
+        for var_name in self._variables:
+            var = self._create_variable(output_dataset, var_name)
+            var[:] = self._data[var_name]
 
+        # Finally, write the file to disk.
+        output_dataset.close()
+
+    def _initialize_dataset(self: 'NetCDFWriter',
+                            output_dataset: 'Dataset') -> None:
+        """
+        Load global attributes and all dimensions registered with this
+        writer into output_dataset, including a dimension variable for
+        each dimension. Dimensions of unlimited size are created without
+        any dimension values, which are filled in as data is written.
+
+        :param output_dataset:
+            A newly created, writable NetCDF dataset
+        """
         # Load global attributes.
         for attr_name, attr_val in self._global_attrs.items():
             setattr(output_dataset, attr_name, attr_val)
@@ -302,30 +336,196 @@ class NetCDFWriter:
                                                     (dim_name,))
 
             if dim_size is not None:
-                dim_bounds = self._dimensions[dim_name][DIM_BOUNDS_KEY]
+                dim_var[:] = [self._dimension_value(dim_name, i)
+                              for i in range(dim_size)]
 
-                lower_bound = dim_bounds[0]
-                upper_bound = dim_bounds[1]
-                dim_range = upper_bound - lower_bound
-                cell_width = dim_range / dim_size
+    def _dimension_value(self: 'NetCDFWriter',
+                         dim_name: str,
+                         index: int) -> float:
+        """
+        Returns the value of the registered dimension dim_name at index,
+        which is the centre of the cell at that index within the dimension's
+        bounds.
 
-                dim_var[:] = [cell_width * i + lower_bound + (cell_width / 2)
-                              for i in range(dim_size)]
+        :param dim_name:
+            The name of a registered dimension
+        :param index:
+            An index along the dimension
+        :return:
+            The dimension's value at index
+        """
+        dim_size = self._dimensions[dim_name][DIM_SIZE_KEY]
+        lower_bound, upper_bound = self._dimensions[dim_name][DIM_BOUNDS_KEY]
 
-        for var_name in self._variables:
-            var_type = self._variables[var_name][VAR_TYPE_KEY]
-            var_dims = tuple(self._variables[var_name][VAR_DIMS_KEY])
-            var_attrs = self._variables[var_name][VAR_ATTR_KEY]
+        dim_range = upper_bound - lower_bound
+        cell_width = dim_range if dim_size is None else dim_range / dim_size
 
-            # Load the main variable data into the dataset, using
-            # all dimensions.
-            var = output_dataset.createVariable(var_name, var_type, var_dims)
+        return cell_width * index + lower_bound + (cell_width / 2)
 
-            # Load variable attributes.
-            for attr_name, attr_val in var_attrs.items():
-                setattr(var, attr_name, attr_val)
+    def _create_variable(self: 'NetCDFWriter',
+                         output_dataset: 'Dataset',
+                         var_name: str) -> 'Variable':
+        """
+        Create the variable var_name inside output_dataset, using the type,
+        dimensions and attributes registered for it in this writer. Returns
+        the new variable, which does not yet contain any data.
 
-            var[:] = self._data[var_name]
+        :param output_dataset:
+            A writable NetCDF dataset containing the variable's dimensions
+        :param var_name:
+            The name of a registered variable
+        :return:
+            The newly created dataset variable
+        """
+        var_type = self._variables[var_name][VAR_TYPE_KEY]
+        var_dims = tuple(self._variables[var_name][VAR_DIMS_KEY])
+        var_attrs = self._variables[var_name][VAR_ATTR_KEY]
 
-        # Finally, write the file to disk.
-        output_dataset.close()
+        # Create the main variable in the dataset, using all dimensions.
+        var = output_dataset.createVariable(var_name, var_type, var_dims)
+
+        # Load variable attributes.
+        for attr_name, attr_val in var_attrs.items():
+            setattr(var, attr_name, attr_val)
+
+        return var
+
+
+class StreamingNetCDFWriter(NetCDFWriter):
+    """
+    A NetCDF data writer that appends data to a file incrementally, one
+    record at a time, instead of writing all data in a single call.
+
+    Variables written in this way are expected to have an unlimited first
+    dimension (typically time). Each call to append writes one index along
+    that dimension, so that only a single record needs to be held in memory
+    at once.
+
+    Records are written to a temporary file beside the dataset, named after
+    the writing process, which replaces the dataset atomically once the
+    writer is closed. Other processes never see the dataset partly written,
+    and two processes producing the same dataset do not write into the same
+    file.
+    """
+
+    def __init__(self: 'StreamingNetCDFWriter') -> None:
+        """
+        Create a new StreamingNetCDFWriter instance. No file is created
+        until the open method is called.
+        """
+        super(StreamingNetCDFWriter, self).__init__()
+
+        self._output_dataset = None
+        self._open_variables = {}
+        self._filepath = None
+        self._temp_path = None
+
+    def open(self: 'StreamingNetCDFWriter',
+             filepath: str,
+             format: str = 'NETCDF4') -> 'StreamingNetCDFWriter':
+        """
+        Begin the NetCDF file at filepath, writing all global attributes
+        and dimensions that have been registered so far to its temporary
+        file. Variables may still be registered after the file has been
+        opened, but dimensions may not.
+
+        :param filepath:
+            An absolute or relative path to the NetCDF file to be produced
+        :param format:
+            The file format for the NetCDF file (defaults to NetCDF4)
+        :return:
+            This StreamingNetCDFWriter instance
+        """
+        if self._output_dataset is not None:
+            raise PermissionError("Dataset has already been opened")
+
+        from netCDF4 import Dataset
+        self._filepath = filepath
+        self._temp_path = "{}.{}.tmp".format(filepath, getpid())
+        self._output_dataset = Dataset(self._temp_path, 'w', format)
+        self._initialize_dataset(self._output_dataset)
+        self._open_variables = {}
+
+        return self
+
+    def append(self: 'StreamingNetCDFWriter',
+               var_name: str,
+               record: int,
+               data: ndarray,
+               region: Tuple[slice, ...] = ()) -> None:
+        """
+        Write data into index record of the first dimension of variable
+        var_name. The variable is created in the file on its first append.
+
+        If region is given, data fills only that part of the record, with
+        one slice for each of the variable's remaining dimensions in order.
+        A record may then be written in several pieces, such as a band of
+        rows at a time.
+
+        If the first dimension of the variable is unlimited, its dimension
+        variable is assigned the centre of the record, as for dimensions of
+        fixed size, so that a streamed dataset holds the same dimension
+        values as one written all at once.
+
+        Precondition:
+            var_name has already been registered as a variable
+            The dataset has been opened
+
+        :param var_name:
+            The name of the variable with which the data will be associated
+        :param record:
+            The index along the variable's first dimension to be written
+        :param data:
+            One record's worth of data for the variable, or of the region
+        :param region:
+            Slices selecting part of the record to write, or () for all
+        """
+        if self._output_dataset is None:
+            raise PermissionError("Dataset must be opened before appending")
+        elif var_name not in self._variables:
+            raise KeyError("var_name ({}) has not been registered as a"
+                           "variable".format(var_name))
+        elif record < 0:
+            raise ValueError("Record index must be non-negative"
+                             " (is {})".format(record))
+
+        if var_name not in self._open_variables:
+            self._open_variables[var_name] = \
+                self._create_variable(self._output_dataset, var_name)
+
+        var = self._open_variables[var_name]
+        var[(record,) + tuple(region)] = data
+
+        record_dim = self._variables[var_name][VAR_DIMS_KEY][0]
+        if self._dimensions[record_dim][DIM_SIZE_KEY] is None:
+            self._output_dataset.variables[record_dim][record] = \
+                self._dimension_value(record_dim, record)
+
+    def sync(self: 'StreamingNetCDFWriter') -> None:
+        """
+        Flush all records appended so far to the temporary file on disk,
+        for instance once every variable of a record has been written.
+
+        Precondition:
+            The dataset has been opened
+        """
+        if self._output_dataset is None:
+            raise PermissionError("Dataset must be opened before syncing")
+
+        self._output_dataset.sync()
+
+    def close(self: 'StreamingNetCDFWriter') -> None:
+        """
+        Finish writing the dataset, closing the file and moving it into
+        place at the path it was opened with. Calling this method on a
+        writer that has not been opened, or that is already closed, has no
+        effect.
+        """
+        if self._output_dataset is not None:
+            self._output_dataset.close()
+            replace(self._temp_path, self._filepath)
+
+            self._output_dataset = None
+            self._open_variables = {}
+            self._filepath = None
+            self._temp_path = None
@@ -9,13 +9,12 @@ fi
 # Install dependencies.
 # Note: Some project dependencies are implicit, as they are installed
 #       alongside one of the following packages.
-conda install -c conda-forge pyresample netCDF4 basemap jsonschema frozendict
+conda install -c conda-forge pyresample netCDF4 basemap jsonschema
 
 # Install project packages.
 pip install -e .
 
 # Write environment variables that are used by the project.
-export PYTHONHASHSEED=0
 export ARRHENIUS_MAIN_PATH=`pwd`
 
 # Download data files from remote sources
@@ -0,0 +1,386 @@
+from data.access_log import default_access_log
+from data.display import read_dataset_variable, iter_image_files
+from data.resources import MAIN_PATH
+from data.result_store import default_result_store
+
+import core.configuration as cnf
+import core.output_config as out_cnf
+from core.parameters import parse_parameter, expand_parameters
+from runner import ModelRun
+
+from datetime import datetime
+from multiprocessing import get_context
+from os import path, nice
+from time import perf_counter, time
+from typing import List, Dict, Tuple, Optional
+from sys import argv, exit
+from getopt import gnu_getopt, GetoptError
+from uuid import uuid4
+
+import json
+
+"""
+A precompute service for the Arrhenius model, which fills the result store
+and image cache ahead of requests, so that popular configurations never pay
+for a model run when they are requested.
+
+The configurations to prepare are declared as a slice of the configuration
+space: a JSON object holding a list of base configurations, each given
+inline or as the path to a JSON file relative to the slice file, a mapping
+of dotted parameter keys to the values they take, as used by sweep.py, and
+a list of variables whose images are to be rendered. The default slice in
+core/precompute_slice.json covers the options advertised by the web API's
+/model/help endpoint.
+
+Every configuration in the slice is ranked by the number of times its model
+run has been requested, according to the server's access log, and the most
+popular are prepared first. Model runs whose output is already stored are
+not repeated, and images already on disk are not rendered again. Work is
+done at a lowered scheduling priority, so that it yields to the server.
+
+Precomputation can be started from the command line, or in the background
+by the web API's /admin/precompute endpoint.
+
+Usage:
+    python precompute.py [-s <slice.json>] [-p <key>=<value>[,<value>]...]...
+                         [-n <limit>] [-d <days>] [-o <summary>]
+                         [--nice <increment>]
+"""
+
+
+DEFAULT_SLICE_PATH = path.join(MAIN_PATH, 'core', 'precompute_slice.json')
+DEFAULT_SUMMARY_PATH = path.join(MAIN_PATH, 'precompute_summary.json')
+
+# The increase in scheduling niceness applied while precomputing.
+DEFAULT_NICENESS = 10
+
+# Keys in slice declarations.
+SLICE_CONFIGS = "configs"
+SLICE_PARAMETERS = "parameters"
+SLICE_VARIABLES = "variables"
+SLICE_LIMIT = "limit"
+
+
+def read_slice(slice_path: str = DEFAULT_SLICE_PATH) -> Dict:
+    """
+    Returns the slice declaration in the JSON file slice_path, with any base
+    configurations given by path replaced by the configurations they hold.
+
+    :param slice_path:
+        The path to a slice declaration
+    :return:
+        A slice declaration with inline base configurations
+    """
+    with open(slice_path, "r") as slice_file:
+        slice_options = json.load(slice_file)
+
+    validate_slice(slice_options)
+    return resolve_slice(slice_options, path.dirname(slice_path))
+
+
+def validate_slice(slice_options: object) -> None:
+    """
+    Raises a ValueError describing the problem if slice_options is not a
+    slice declaration: a JSON object whose base configurations are a list
+    of objects or paths, whose parameters map dotted keys to lists of
+    values, whose variables are a list of names, and whose limit, if
+    present, is a non-negative integer. Configurations themselves are
+    validated when the slice is expanded.
+
+    :param slice_options:
+        A slice declaration, as read from JSON
+    """
+    if not isinstance(slice_options, dict):
+        raise ValueError("Slice declaration must be a JSON object")
+
+    configs = slice_options.get(SLICE_CONFIGS, [])
+    if not isinstance(configs, list) \
+            or not all(isinstance(options, (dict, str)) for options in configs):
+        raise ValueError("Slice {} must be a list of configuration objects"
+                         " or paths".format(SLICE_CONFIGS))
+
+    parameters = slice_options.get(SLICE_PARAMETERS, {})
+    if not isinstance(parameters, dict) \
+            or not all(isinstance(values, list) and values
+                       for values in parameters.values()):
+        raise ValueError("Slice {} must map each key to a non-empty list of"
+                         " values".format(SLICE_PARAMETERS))
+
+    variables = slice_options.get(SLICE_VARIABLES, [])
+    if not isinstance(variables, list) \
+            or not all(isinstance(name, str) for name in variables):
+        raise ValueError("Slice {} must be a list of variable names"
+                         .format(SLICE_VARIABLES))
+
+    limit = slice_options.get(SLICE_LIMIT)
+    if limit is not None and (isinstance(limit, bool)
+                              or not isinstance(limit, int) or limit < 0):
+        raise ValueError("Slice {} must be a non-negative integer"
+                         .format(SLICE_LIMIT))
+
+
+def resolve_slice(slice_options: Dict,
+                  base_dir: str = path.dirname(DEFAULT_SLICE_PATH)) -> Dict:
+    """
+    Returns a copy of the slice declaration slice_options, with any base
+    configurations given as paths relative to base_dir replaced by the
+    configurations in those files.
+
+    :param slice_options:
+        A slice declaration
+    :param base_dir:
+        The directory from which configuration paths are resolved
+    :return:
+        A slice declaration with inline base configurations
+    """
+    configs = []
+    for options in slice_options.get(SLICE_CONFIGS, []):
+        if isinstance(options, str):
+            with open(path.join(base_dir, options), "r") as config_file:
+                options = json.load(config_file)
+        configs.append(options)
+
+    resolved = dict(slice_options)
+    resolved[SLICE_CONFIGS] = configs
+    return resolved
+
+
+def slice_configs(slice_options: Dict) -> List[Dict]:
+    """
+    Returns every configuration in the slice declared by slice_options,
+    which must hold its base configurations inline. Configurations that
+    would produce the same run ID and images are listed only once. Every
+    configuration is validated along the way, raising an InvalidConfigError
+    if any is invalid.
+
+    :param slice_options:
+        A slice declaration with inline base configurations
+    :return:
+        A list of configuration options
+    """
+    parameters = list(slice_options.get(SLICE_PARAMETERS, {}).items())
+    expanded = expand_parameters(slice_options.get(SLICE_CONFIGS, []),
+                                 parameters)
+
+    configs = {}
+    for options in expanded:
+        config = cnf.from_json_string(json.dumps(options))
+        configs.setdefault((config.run_id(), tuple(config.colorbar())),
+                           options)
+
+    return list(configs.values())
+
+
+def plan_precompute(configs: List[Dict],
+                    limit: Optional[int] = None,
+                    since: Optional[float] = None,
+                    access_log: Optional['AccessLog'] = None)\
+        -> List[Tuple[Dict, int]]:
+    """
+    Returns the configurations in configs ordered from most to least
+    requested, each paired with its number of requests recorded in the
+    access log since the time since, or over the whole log if since is
+    None. Configurations with equal numbers of requests keep their order.
+    If limit is not None, only that many of the most requested are kept.
+
+    Requests are counted from access_log, or from the server's access log
+    if it is None.
+
+    :param configs:
+        A list of configuration options
+    :param limit:
+        The maximum number of configurations to prepare
+    :param since:
+        The earliest time from which to count requests
+    :param access_log:
+        The log of requests for model run output
+    :return:
+        Configuration options paired with their numbers of requests
+    """
+    if access_log is None:
+        access_log = default_access_log()
+    popularity = access_log.popularity(since)
+
+    ranked = []
+    for options in configs:
+        run_id = cnf.from_json_string(json.dumps(options)).run_id()
+        ranked.append((options, popularity.get(run_id, 0)))
+
+    ranked.sort(key=lambda entry: entry[1], reverse=True)
+    return ranked if limit is None else ranked[:limit]
+
+
+def precompute_config(options: Dict,
+                      var_names: List[str]) -> Dict:
+    """
+    Guarantee that the output of the model run configured by options is in
+    the result store, along with all images of each variable in var_names,
+    and return a summary of the work that was needed.
+
+    :param options:
+        Configuration options for a model run
+    :param var_names:
+        The variables whose images are to be rendered
+    :return:
+        The run ID, whether the model run was created, and the number of
+        images created
+    """
+    config = cnf.from_json_string(json.dumps(options))
+    run_id = config.run_id()
+    store = default_result_store()
+    output_center = out_cnf.default_output_config()
+
+    # The run is pinned while its output is read, so that it cannot be
+    # evicted by model runs recorded concurrently by the server.
+    pin = uuid4().hex
+    run_path = store.lookup(run_id, pin)
+    created = run_path is None
+
+    try:
+        if created:
+            ModelRun(config, output_center).run_model()
+            run_path = store.record(run_id, pin)
+
+        images = 0
+        for var_name in var_names:
+            data = read_dataset_variable(run_path, var_name, config)
+            images += sum(img_created for _, img_created
+                          in iter_image_files(data, run_path, var_name,
+                                              config, output_center))
+
+        if images > 0:
+            # Account for the new image files in the size of stored output.
+            store.record(run_id)
+    finally:
+        store.unpin(run_id, pin)
+
+    return {"run_id": run_id, "model": "created" if created else "hit",
+            "images": images}
+
+
+def run_precompute(plan: List[Tuple[Dict, int]],
+                   var_names: List[str],
+                   niceness: int = DEFAULT_NICENESS,
+                   summary_path: Optional[str] = DEFAULT_SUMMARY_PATH)\
+        -> Dict:
+    """
+    Prepare the output of every configuration in plan, in order, after
+    lowering this process's scheduling priority by niceness, and write a
+    summary of the work to summary_path, unless it is None. A configuration
+    that raises an error is recorded with the error message, and does not
+    stop the rest of the plan. Returns the summary.
+
+    :param plan:
+        Configuration options paired with their numbers of requests
+    :param var_names:
+        The variables whose images are to be rendered
+    :param niceness:
+        The increase in this process's scheduling niceness
+    :param summary_path:
+        The path of the summary file to be written
+    :return:
+        A summary of the precomputation
+    """
+    if niceness > 0:
+        nice(niceness)
+
+    started = datetime.now().isoformat(timespec="seconds")
+    start = perf_counter()
+
+    runs = []
+    for options, requests in plan:
+        run_start = perf_counter()
+        try:
+            result = precompute_config(options, var_names)
+        except Exception as error:
+            result = {"error": "{}: {}".format(type(error).__name__, error)}
+
+        result["options"] = options
+        result["requests"] = requests
+        result["wall"] = perf_counter() - run_start
+        runs.append(result)
+
+        status = "failed" if "error" in result else result["model"]
+        print("[{}/{}] {} {} ({:.2f}s)".format(len(runs), len(plan),
+                                              result.get("run_id", "?"),
+                                              status, result["wall"]))
+
+    summary = {
+        "started": started,
+        "wall": perf_counter() - start,
+        "runs": runs,
+    }
+
+    if summary_path is not None:
+        with open(summary_path, "w") as summary_file:
+            json.dump(summary, summary_file, indent=2)
+
+    return summary
+
+
+def start_precompute(plan: List[Tuple[Dict, int]],
+                     var_names: List[str],
+                     niceness: int = DEFAULT_NICENESS,
+                     summary_path: Optional[str] = DEFAULT_SUMMARY_PATH)\
+        -> 'BaseProcess':
+    """
+    Start preparing the output of every configuration in plan in a new
+    background process, and return the process. Only the new process has
+    its scheduling priority lowered.
+
+    :param plan:
+        Configuration options paired with their numbers of requests
+    :param var_names:
+        The variables whose images are to be rendered
+    :param niceness:
+        The increase in the new process's scheduling niceness
+    :param summary_path:
+        The path of the summary file to be written
+    :return:
+        The process preparing the output
+    """
+    # Processes are spawned rather than forked, since the server may hold
+    # locks in other threads at the time of the fork.
+    process = get_context("spawn").Process(
+        target=run_precompute, args=(plan, var_names, niceness, summary_path),
+        daemon=True)
+    process.start()
+    return process
+
+
+USAGE = "Usage: python precompute.py [-s <slice.json>]" \
+        " [-p <key>=<value>[,<value>]...]... [-n <limit>] [-d <days>]" \
+        " [-o <summary>] [--nice <increment>]"
+
+
+if __name__ == '__main__':
+    try:
+        options, args = gnu_getopt(argv[1:], "s:p:n:d:o:",
+                                   ["nice="])
+        options_map = {}
+        for option, value in options:
+            options_map.setdefault(option, []).append(value)
+
+        slice_options = read_slice(options_map.get("-s",
+                                                   [DEFAULT_SLICE_PATH])[-1])
+        parameters = slice_options.setdefault(SLICE_PARAMETERS, {})
+        for parameter in options_map.get("-p", []):
+            key, values = parse_parameter(parameter)
+            parameters[key] = values
+
+        limit = slice_options.get(SLICE_LIMIT)
+        if "-n" in options_map:
+            limit = int(options_map["-n"][-1])
+        since = None
+        if "-d" in options_map:
+            since = time() - float(options_map["-d"][-1]) * 24 * 60 * 60
+        niceness = int(options_map.get("--nice", [DEFAULT_NICENESS])[-1])
+    except (GetoptError, ValueError):
+        print(USAGE)
+        exit(1)
+
+    precompute_plan = plan_precompute(slice_configs(slice_options),
+                                      limit, since)
+    run_precompute(precompute_plan, slice_options.get(SLICE_VARIABLES, []),
+                   niceness,
+                   options_map.get("-o", [DEFAULT_SUMMARY_PATH])[-1])
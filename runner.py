@@ -1,29 +1,131 @@
 from data.grid import LatLongGrid, GridCell,\
-    extract_multidimensional_grid_variable
+    extract_multidimensional_grid_variable, pressure_thickness,\
+    level_groups, merge_levels, band_mean, latitude_weights
 from data.collector import ClimateDataCollector
-from data.display import write_model_output
+from data.snapshots import default_snapshot_registry
+from data.display import ModelOutputStream, EnsembleOutputStream,\
+    record_output
+from data.resources import MEMORY_BUDGET_MB
 from data.statistics import convert_grid_data_to_table, print_tables,\
     mean, std_dev, variance, X2_EXPECTED
 
 from core.cell_operations import calculate_transparency,\
     calculate_modern_transparency
+from core.ensemble import Perturbation, perturb_members,\
+    ensemble_statistics, DEFAULT_PERCENTILES, PERTURB_TEMPERATURE,\
+    PERTURB_HUMIDITY, PERTURB_ALBEDO
+from core.kernels import table_kernel, weight_mode, TableKernel
+from core.metrics import MetricsRecorder, CellTrace
+from core.solvers import picard
 import core.configuration as cnf
 import core.output_config as out_cnf
+from core.context import RunContext, current_context
 
 import core.multilayer as ml
 import numpy as np
 import math
 
-from typing import Optional, Union, List, Tuple
+from typing import Optional, Union, List, Tuple, Dict, Callable, Iterator,\
+    Sequence
+from time import perf_counter
 from sys import argv
 from getopt import getopt, GetoptError
 
 ATMOSPHERE_HEIGHT = 50.0
 
+# Debug outputs that are produced for every grid cell.
+PER_CELL_DEBUG = [out_cnf.Debug.GRID_CELL_DELTA_TEMP,
+                  out_cnf.Debug.GRID_CELL_DELTA_TRANSPARENCY,
+                  out_cnf.Debug.GRID_CELL_FEEDBACK_PASSES]
+
 
 GriddedData = Union[LatLongGrid, List]
 
 
+class SegmentResult:
+    """
+    The results of a model run over a single time segment, such as a month
+    or a season, as produced by ModelRun.iter_model.
+    """
+
+    def __init__(self: 'SegmentResult',
+                 index: int,
+                 grids: List['LatLongGrid'],
+                 stats: Dict[str, float]) -> None:
+        """
+        Instantiate a new SegmentResult.
+
+        :param index:
+            The position of the time segment within the model run, from 0
+        :param grids:
+            A column of surface and atmospheric grids for the time segment,
+            in order of height, containing the model's results. In a model
+            run under a memory budget, these grids hold only the mean of
+            each latitude band
+        :param stats:
+            Summary statistics for the time segment, keyed by variable name
+        """
+        self.index = index
+        self.grids = grids
+        self.stats = stats
+
+
+class EnsembleResult:
+    """
+    Summary statistics over every member of an ensemble model run for a
+    single time segment, as produced by ModelRun.iter_ensemble.
+    """
+
+    def __init__(self: 'EnsembleResult',
+                 index: int,
+                 statistics: Dict[str, Dict[str, np.ndarray]]) -> None:
+        """
+        Instantiate a new EnsembleResult.
+
+        :param index:
+            The position of the time segment within the model run, from 0
+        :param statistics:
+            Latitude-longitude grids of each statistic over the ensemble
+            members, such as mean or p95, keyed by variable name and then by
+            statistic name
+        """
+        self.index = index
+        self.statistics = statistics
+
+
+class TransientResult(SegmentResult):
+    """
+    The results of a transient model run over a single time segment of one
+    year, as produced by ModelRun.iter_transient.
+    """
+
+    def __init__(self: 'TransientResult',
+                 index: int,
+                 grids: List['LatLongGrid'],
+                 stats: Dict[str, float],
+                 year: int,
+                 co2: float) -> None:
+        """
+        Instantiate a new TransientResult.
+
+        :param index:
+            The position of the time segment within the whole transient
+            model run, from 0, counting the time segments of every year
+        :param grids:
+            A column of surface and atmospheric grids for the time segment,
+            in order of height, containing the model's results
+        :param stats:
+            Summary statistics for the time segment, keyed by variable name
+        :param year:
+            The year from which the time segment's data was taken
+        :param co2:
+            The final CO2 concentration multiplier for the year
+        """
+        super(TransientResult, self).__init__(index, grids, stats)
+        self.year = year
+        self.co2 = co2
+
+
 class ModelRun:
     """
     A class that is used to run the Arrhenius climate model on the given
@@ -34,30 +136,61 @@ class ModelRun:
 
     def __init__(self: 'ModelRun',
                  config: 'ArrheniusConfig',
-                 output_controller: 'OutputController') -> None:
+                 output_controller: 'OutputController',
+                 memory_budget: Optional[float] = None,
+                 collector: Optional['ClimateDataCollector'] = None) -> None:
         """
         Initialize model configuration options to prepare for model runs.
 
+        If a memory budget is given, or is set in megabytes by the
+        environment variable named in data.resources.MEMORY_BUDGET_VAR, the
+        model runs on bands of latitude rows small enough to fit within the
+        budget, instead of on whole grids at once. Results written to disk
+        are the same either way, but the grids kept in memory and returned
+        from the model run then hold only the mean of each latitude band.
+
+        A collector may be given that has already been loaded with the data
+        sources of config, in which case its provider data is reused instead
+        of being loaded again. A collector may be shared in this way by any
+        model runs with the same grid, year, precision, mask, and providers.
+        Otherwise, the model run uses its own collector, which shares data
+        with other model runs in the process through the default snapshot
+        registry for as long as the model run lasts.
+
         :param config:
             A dictionary containing configuration options for the model
         :param output_controller:
             An object that controls which types of outputs are allowed
+        :param memory_budget:
+            The greatest memory, in megabytes, to be used for grid data
+        :param collector:
+            A collector of data for config, which may be shared with other
+            model runs
         """
         self.config = config
         self.output_controller = output_controller
-
-        self.output_controller.register_collection(out_cnf.PRIMARY_OUTPUT,
-                                                   handler=write_model_output)
-
-        self.collector = ClimateDataCollector(config.grid()) \
-            .use_temperature_source(config.temp_provider()) \
-            .use_humidity_source(config.humidity_provider()) \
-            .use_albedo_source(config.albedo_provider())
-
-        try:
-            self.collector.use_pressure_source(config.pressure_provider())
-        except AttributeError:
-            pass
+        # Passed to every stage of the model run that needs the configuration
+        # or output controller, so that the run is not tied to one thread.
+        self.context = RunContext(config, output_controller)
+
+        if memory_budget is None and MEMORY_BUDGET_MB is not None:
+            memory_budget = float(MEMORY_BUDGET_MB)
+        self.memory_budget = memory_budget
+        # Measures time spent in each stage of the model run, which is
+        # reported under the Metrics output category.
+        self.metrics = MetricsRecorder(output_controller)
+
+        # A trace of the grid being computed, if per-cell tracing is enabled,
+        # and the position within it of the cell being computed.
+        self._trace = None
+        self._trace_position = 0
+
+        # A collector made for this model run alone releases its data once
+        # the run is finished, so that shared snapshots can be freed.
+        self._owns_collector = collector is None
+        if collector is None:
+            collector = data_collector(config)
+        self.collector = collector.use_metrics_recorder(self.metrics)
 
     def run_model(self: 'ModelRun',
                   expected: Optional[np.ndarray] = None) -> GriddedData:
@@ -74,59 +207,523 @@ class ModelRun:
         :return:
             The state of the Earth's surface based on the model's calculations
         """
-        cnf.set_configuration(self.config)
-        out_cnf.set_output_center(self.output_controller)
+        self.grids = [segment.grids for segment in self._iter_segments()]
+        ground_layer = [time_seg[0] for time_seg in self.grids]
 
-        year_of_interest = self.config.year()
-        self.grids = self.collector.get_gridded_data(year_of_interest)
+        with self.metrics.time(out_cnf.Metrics.STATISTICS_TIME):
+            print_solo_statistics(ground_layer, self.context)
+            if expected is not None:
+                print_relation_statistics(ground_layer, expected,
+                                          self.context)
 
+        self.metrics.report()
+        return self.grids
+
+    def iter_model(self: 'ModelRun',
+                   cancel: Optional[Callable[[], bool]] = None)\
+            -> Iterator['SegmentResult']:
+        """
+        Calculate Earth's surface temperature change due to a change in
+        CO2 levels given in the model runner's configuration, one time
+        segment at a time.
+
+        Returns a generator that yields a SegmentResult for each time segment
+        as soon as its calculations are complete and its output has been
+        written to disk. Time segments are computed only as the generator is
+        advanced, so a consumer may stop the model run between any two
+        segments by closing the generator or by no longer advancing it.
+
+        The optional cancel parameter is a function that is checked before
+        each time segment is computed. If it returns True, the model run
+        stops without computing any further segments. A threading.Event's
+        is_set method is suitable, for instance.
+
+        Output for any segments computed before the model run stops remains
+        on disk.
+
+        :param cancel:
+            A function that returns True when the model run should stop
+        :return:
+            A generator of results for each time segment
+        """
+        try:
+            yield from self._iter_segments(cancel)
+        finally:
+            self.metrics.report()
+
+    def iter_ensemble(self: 'ModelRun',
+                      perturbations: Sequence['Perturbation'],
+                      percentiles: Sequence[float] = DEFAULT_PERCENTILES,
+                      cancel: Optional[Callable[[], bool]] = None)\
+            -> Iterator['EnsembleResult']:
+        """
+        Calculate Earth's surface temperature change due to a change in
+        CO2 levels, as iter_model does, for an ensemble of model runs whose
+        input data is perturbed by each of perturbations in turn.
+
+        Every member of the ensemble is computed in the same call to a
+        whole-grid kernel, so that a large ensemble costs a small multiple
+        of a single model run. The configured kernel backend is used, or
+        the numpy backend if cells would otherwise be computed one at a
+        time. Ensembles are only supported in table mode, with the picard
+        solver and with weight functions that kernels support.
+
+        Returns a generator that yields an EnsembleResult for each time
+        segment, holding the mean, spread, and the given percentiles of
+        temperature change over the members. The same statistics are
+        written to a NetCDF dataset under the run ID given by the
+        configuration's ensemble_run_id, which is recorded in the result
+        store once every time segment has been written. The results of
+        individual members are not kept.
+        Whole grids are computed at once, whatever the model run's memory
+        budget. The cancel parameter is used as in iter_model.
+
+        :param perturbations:
+            The perturbation of each ensemble member's input data
+        :param percentiles:
+            Percentiles of temperature change to compute, from 0 to 100
+        :param cancel:
+            A function that returns True when the model run should stop
+        :return:
+            A generator of ensemble statistics for each time segment
+        """
+        if len(perturbations) == 0:
+            raise ValueError("Ensemble must have at least one member")
+
+        kernel = self._whole_grid_kernel()
+        if kernel is None:
+            raise ValueError("Ensemble runs are only supported in table mode,"
+                             " with the picard solver and with mean,"
+                             " closest, lowest, or highest weighting")
+
+        self.metrics.reset()
+        output_config = self.config.with_run_id(
+            self.config.ensemble_run_id(perturbations, percentiles))
+        output_stream = EnsembleOutputStream(output_config,
+                                             self.output_controller,
+                                             len(perturbations),
+                                             self.metrics)
+        complete = False
+
+        try:
+            grids = self.collector.get_gridded_data(self.config.year())
+            if self.config.aggregate_latitude() == cnf.AGGREGATE_BEFORE:
+                with self.metrics.time(out_cnf.Metrics.AGGREGATION_TIME):
+                    grids = multigrid_latitude_bands(grids)
+
+            for index, time_seg in enumerate(grids):
+                if not self._start_segment(index, cancel):
+                    return
+
+                with self.metrics.time(out_cnf.Metrics.SEGMENT_TIME):
+                    delta_temps = self.compute_table_ensemble(
+                        kernel, time_seg[0], index, perturbations,
+                        self.config.init_co2(), self.config.final_co2(),
+                        self.config.iterations())
+
+                # Members are averaged over each latitude band before they
+                # are summarized, so that percentiles are those of the
+                # members' band means.
+                if self.config.aggregate_latitude() == cnf.AGGREGATE_AFTER:
+                    with self.metrics.time(out_cnf.Metrics.AGGREGATION_TIME):
+                        delta_temps = band_mean(delta_temps)[..., np.newaxis]
+
+                with self.metrics.time(out_cnf.Metrics.STATISTICS_TIME):
+                    statistics = {
+                        out_cnf.ReportDatatype.REPORT_TEMP_CHANGE.value:
+                            ensemble_statistics(delta_temps, percentiles)
+                    }
+
+                output_stream.write_segment(statistics)
+                yield EnsembleResult(index, statistics)
+
+            complete = True
+        finally:
+            output_stream.close()
+            if complete:
+                record_output(output_config.run_id())
+            if self._owns_collector:
+                self.collector.release_data()
+            self.metrics.report()
+
+    def iter_transient(self: 'ModelRun',
+                       co2_path: Dict[int, float],
+                       cancel: Optional[Callable[[], bool]] = None)\
+            -> Iterator['TransientResult']:
+        """
+        Calculate Earth's surface temperature change over a range of years,
+        in a single transient model run that follows a path of CO2
+        concentrations. co2_path maps each year of the run to the final CO2
+        multiplier for that year, which must be one supported by the model
+        mode; years are run in order, each on its own year of data, in
+        place of the year in the model run's configuration.
+
+        While one year is computed, provider data for the next year is read
+        in the background. In table mode, every year after the first is
+        warm-started: each cell's feedback loop begins from its temperature
+        plus the temperature change found for it in the previous year, so
+        that cells converge in fewer feedback passes when the CO2 path
+        changes gradually. As for ensemble runs, the numpy kernel backend is
+        used if cells would otherwise be computed one at a time. In other
+        modes, each year is computed as iter_model would.
+
+        Returns a generator that yields a TransientResult for each time
+        segment of each year. All time segments are written, in order, to
+        a single NetCDF dataset, which also records the year and CO2
+        multiplier of every segment. The dataset and images are written
+        under the run ID given by the configuration's transient_run_id, so
+        that they are kept apart from the regular model run's output and
+        from transient runs along other CO2 paths, and that run ID is
+        recorded in the result store once every year has been written.
+        Whole grids are computed at once, whatever the model run's memory
+        budget. The cancel parameter is used as in iter_model.
+
+        :param co2_path:
+            The final CO2 concentration multiplier for each year
+        :param cancel:
+            A function that returns True when the model run should stop
+        :return:
+            A generator of results for each time segment of each year
+        """
+        years = sorted(co2_path)
+        if len(years) == 0:
+            raise ValueError("Transient run must cover at least one year")
+
+        kernel = self._whole_grid_kernel()
         init_co2 = self.config.init_co2()
-        final_co2 = self.config.final_co2()
         iterations = self.config.iterations()
+        layers = self.config.layers()
 
-        # Average values over each latitude band before the model run.
-        if self.config.aggregate_latitude() == cnf.AGGREGATE_BEFORE:
-            self.grids = multigrid_latitude_bands(self.grids)
-
-        # Run the body of the model, calculating temperature changes for each
-        # cell in the grid.
-        counter = 1
-        for time_seg in self.grids:
-            place = "th" if (not 1 <= counter % 10 <= 3) \
-                            and (not 10 < counter < 20) \
-                else "st" if counter % 10 == 1 \
-                else "nd" if counter % 10 == 2 \
-                else "rd"
-            report = "Preparing model run on {}{} grid".format(counter, place)
-            self.output_controller.submit_output(out_cnf.Debug.PRINT_NOTICES, report)
-
-            if self.config.model_mode() == cnf.ABS_SRC_MULTILAYER:
-                self.compute_multilayer(time_seg, init_co2,
-                                        final_co2, iterations)
+        self.metrics.reset()
+        output_config = self.config.with_run_id(
+            self.config.transient_run_id(co2_path))
+        output_stream = ModelOutputStream(output_config,
+                                          self.output_controller,
+                                          self.metrics)
+        complete = False
 
-            else:
-                self.compute_single_layer(time_seg[0], init_co2,
-                                          final_co2, iterations)
+        try:
+            index = 0
+            # Temperature changes of each time segment of the previous year.
+            warm_starts = []
+
+            for position, year in enumerate(years):
+                grids = self.collector.get_gridded_data(year)
+                if position + 1 < len(years):
+                    self.collector.prefetch(years[position + 1])
+                else:
+                    # Every earlier year was written in full.
+                    output_stream.expect_segments(index + len(grids))
+
+                if self.config.aggregate_latitude() == cnf.AGGREGATE_BEFORE:
+                    with self.metrics.time(out_cnf.Metrics.AGGREGATION_TIME):
+                        grids = multigrid_latitude_bands(grids)
+                if self.config.aggregate_level() == cnf.AGGREGATE_BEFORE:
+                    with self.metrics.time(out_cnf.Metrics.AGGREGATION_TIME):
+                        grids = multigrid_level_layers(grids, layers)
+
+                columns = []
+                delta_temps = []
+                for segment, time_seg in enumerate(grids):
+                    if not self._start_segment(index + segment, cancel):
+                        break
+
+                    with self.metrics.time(out_cnf.Metrics.SEGMENT_TIME):
+                        if kernel is None:
+                            self.compute_column(time_seg, init_co2,
+                                                co2_path[year], iterations)
+                        else:
+                            warm_start = warm_starts[segment] \
+                                if segment < len(warm_starts) else None
+                            delta_temps.append(self.compute_table_grid(
+                                kernel, time_seg[0], init_co2,
+                                co2_path[year], iterations, warm_start))
+
+                    if self.config.aggregate_latitude() == cnf.AGGREGATE_AFTER:
+                        with self.metrics.time(
+                                out_cnf.Metrics.AGGREGATION_TIME):
+                            time_seg = multigrid_latitude_bands(time_seg)
+                    if self.config.aggregate_level() == cnf.AGGREGATE_AFTER:
+                        with self.metrics.time(
+                                out_cnf.Metrics.AGGREGATION_TIME):
+                            time_seg = multigrid_level_layers(time_seg,
+                                                              layers)
+                    columns.append(time_seg)
+
+                warm_starts = delta_temps
+
+                # NetCDF files may only be used by one thread at a time, so
+                # output waits until the next year's data has been read.
+                self.collector.wait_for_prefetch()
+                for time_seg in columns:
+                    output_stream.write_segment(time_seg[0],
+                                                {"year": year,
+                                                 "co2": co2_path[year]})
+
+                    with self.metrics.time(out_cnf.Metrics.STATISTICS_TIME):
+                        stats = segment_statistics(time_seg[0])
+
+                    yield TransientResult(index, time_seg, stats, year,
+                                          co2_path[year])
+                    index += 1
+
+                if len(columns) < len(grids):
+                    return
+
+            complete = True
+        finally:
+            self.collector.wait_for_prefetch()
+            output_stream.close()
+            if complete:
+                record_output(output_config.run_id())
+            if self._owns_collector:
+                self.collector.release_data()
+            self.metrics.report()
+
+    def _iter_segments(self: 'ModelRun',
+                       cancel: Optional[Callable[[], bool]] = None)\
+            -> Iterator['SegmentResult']:
+        """
+        Returns a generator that computes and yields results for each time
+        segment, as described under iter_model, without reporting metrics
+        for the model run once it finishes.
 
-            counter += 1
+        :param cancel:
+            A function that returns True when the model run should stop
+        :return:
+            A generator of results for each time segment
+        """
+        self.metrics.reset()
 
-        # Average values over each latitude band after the model run.
-        if self.config.aggregate_latitude() == cnf.AGGREGATE_AFTER:
-            self.grids = multigrid_latitude_bands(self.grids)
+        # Output is written to disk one time segment at a time, as soon as
+        # each segment has been computed.
+        output_stream = ModelOutputStream(self.config, self.output_controller,
+                                          self.metrics)
 
-        ground_layer = [time_seg[0] for time_seg in self.grids]
+        try:
+            if self.memory_budget is None:
+                yield from self._iter_whole_segments(output_stream, cancel)
+            else:
+                yield from self._iter_chunked_segments(output_stream, cancel)
+        finally:
+            output_stream.close()
+            if self._owns_collector:
+                self.collector.release_data()
+
+    def _iter_whole_segments(self: 'ModelRun',
+                             output_stream: 'ModelOutputStream',
+                             cancel: Optional[Callable[[], bool]] = None)\
+            -> Iterator['SegmentResult']:
+        """
+        Returns a generator that computes and yields results for each time
+        segment, building grids for every time segment before the first is
+        computed, and writing each segment to output_stream.
+
+        :param output_stream:
+            The output stream to which results are written
+        :param cancel:
+            A function that returns True when the model run should stop
+        :return:
+            A generator of results for each time segment
+        """
+        year_of_interest = self.config.year()
+        grids = self.collector.get_gridded_data(year_of_interest)
+        output_stream.expect_segments(len(grids))
 
-        print_solo_statistics(ground_layer)
-        if expected is not None:
-            print_relation_statistics(ground_layer, expected)
+        init_co2 = self.config.init_co2()
+        final_co2 = self.config.final_co2()
+        iterations = self.config.iterations()
+        layers = self.config.layers()
+
+        # Average values over each latitude band, and merge atmospheric
+        # levels into fewer layers, before the model run.
+        if self.config.aggregate_latitude() == cnf.AGGREGATE_BEFORE:
+            with self.metrics.time(out_cnf.Metrics.AGGREGATION_TIME):
+                grids = multigrid_latitude_bands(grids)
+        if self.config.aggregate_level() == cnf.AGGREGATE_BEFORE:
+            with self.metrics.time(out_cnf.Metrics.AGGREGATION_TIME):
+                grids = multigrid_level_layers(grids, layers)
+
+        # Run the body of the model, calculating temperature changes for
+        # each cell in the grid.
+        for index, time_seg in enumerate(grids):
+            if not self._start_segment(index, cancel):
+                return
+
+            with self.metrics.time(out_cnf.Metrics.SEGMENT_TIME):
+                self.compute_column(time_seg, init_co2, final_co2,
+                                    iterations)
+
+            # Average values over each latitude band, and merge atmospheric
+            # levels into fewer layers, after the model run.
+            if self.config.aggregate_latitude() == cnf.AGGREGATE_AFTER:
+                with self.metrics.time(out_cnf.Metrics.AGGREGATION_TIME):
+                    time_seg = multigrid_latitude_bands(time_seg)
+            if self.config.aggregate_level() == cnf.AGGREGATE_AFTER:
+                with self.metrics.time(out_cnf.Metrics.AGGREGATION_TIME):
+                    time_seg = multigrid_level_layers(time_seg, layers)
+
+            output_stream.write_segment(time_seg[0])
+
+            with self.metrics.time(out_cnf.Metrics.STATISTICS_TIME):
+                stats = segment_statistics(time_seg[0])
+
+            yield SegmentResult(index, time_seg, stats)
+
+    def _iter_chunked_segments(self: 'ModelRun',
+                               output_stream: 'ModelOutputStream',
+                               cancel: Optional[Callable[[], bool]] = None)\
+            -> Iterator['SegmentResult']:
+        """
+        Returns a generator that computes and yields results for each time
+        segment, building grids for only as many latitude rows at a time as
+        fit in the model run's memory budget. Each band of rows is computed
+        and written to output_stream before the next is built. The results
+        yielded hold the mean of each latitude band, gathered as each band
+        of rows is finished.
+
+        :param output_stream:
+            The output stream to which results are written
+        :param cancel:
+            A function that returns True when the model run should stop
+        :return:
+            A generator of results for each time segment
+        """
+        year_of_interest = self.config.year()
+        segments = self.collector.segment_count(year_of_interest)
+        output_stream.expect_segments(segments)
+        chunk_rows = self.collector.chunk_rows(
+            self.memory_budget * 1024 * 1024, year_of_interest)
+        lat_count = self.config.grid().dims_by_count()[0]
 
-        # Finally, write model output to disk.
-        out_cnf.global_output_center().submit_collection_output(
-            out_cnf.PRIMARY_OUTPUT_PATH,
-            ground_layer
-        )
+        init_co2 = self.config.init_co2()
+        final_co2 = self.config.final_co2()
+        iterations = self.config.iterations()
+        aggregation = self.config.aggregate_latitude()
+        level_aggregation = self.config.aggregate_level()
+        layers = self.config.layers()
+
+        for index in range(segments):
+            if not self._start_segment(index, cancel):
+                return
+
+            band_columns = []
+            sums = {}
+            compute_time = 0.0
+
+            for first_row in range(0, lat_count, chunk_rows):
+                rows = slice(first_row, min(first_row + chunk_rows,
+                                            lat_count))
+                column = self.collector.get_gridded_chunk(index, rows,
+                                                          year_of_interest)
+
+                # Rows are whole latitude bands, so aggregating each band
+                # of rows is the same as aggregating the whole grid.
+                if aggregation == cnf.AGGREGATE_BEFORE:
+                    with self.metrics.time(out_cnf.Metrics.AGGREGATION_TIME):
+                        column = multigrid_latitude_bands(column)
+                if level_aggregation == cnf.AGGREGATE_BEFORE:
+                    with self.metrics.time(out_cnf.Metrics.AGGREGATION_TIME):
+                        column = multigrid_level_layers(column, layers)
+
+                start = perf_counter()
+                self.compute_column(column, init_co2, final_co2, iterations)
+                compute_time += perf_counter() - start
+
+                if level_aggregation == cnf.AGGREGATE_AFTER:
+                    with self.metrics.time(out_cnf.Metrics.AGGREGATION_TIME):
+                        column = multigrid_level_layers(column, layers)
+
+                with self.metrics.time(out_cnf.Metrics.AGGREGATION_TIME):
+                    bands = multigrid_latitude_bands(column)
+                if aggregation == cnf.AGGREGATE_AFTER:
+                    column = bands
+
+                output_stream.write_rows(column[0], first_row, lat_count)
+
+                with self.metrics.time(out_cnf.Metrics.STATISTICS_TIME):
+                    for var_name, (total, weight) in \
+                            segment_sums(column[0], first_row,
+                                         lat_count).items():
+                        prev_total, prev_weight = sums.get(var_name,
+                                                           (0.0, 0.0))
+                        sums[var_name] = (prev_total + total,
+                                          prev_weight + weight)
+
+                band_columns.append(bands)
+
+            self.metrics.add_time(out_cnf.Metrics.SEGMENT_TIME, compute_time)
+            output_stream.finish_segment()
+
+            time_seg = [stack_latitude_bands([bands[layer]
+                                              for bands in band_columns])
+                        for layer in range(len(band_columns[0]))]
+            stats = {var_name: total / weight if weight else np.nan
+                     for var_name, (total, weight) in sums.items()}
+
+            yield SegmentResult(index, time_seg, stats)
+
+    def _start_segment(self: 'ModelRun',
+                       index: int,
+                       cancel: Optional[Callable[[], bool]] = None) -> bool:
+        """
+        Prepare to compute the time segment at position index, announcing
+        it unless the model run has been cancelled. Returns False if the
+        model run should stop before the time segment is computed.
+
+        :param index:
+            The position of the time segment within the model run, from 0
+        :param cancel:
+            A function that returns True when the model run should stop
+        :return:
+            Whether the time segment should be computed
+        """
+        counter = index + 1
+        if cancel is not None and cancel():
+            self.output_controller.submit_output(
+                out_cnf.Debug.PRINT_NOTICES,
+                "Model run cancelled after {} grids"
+                .format(counter - 1))
+            return False
+
+        place = "th" if (not 1 <= counter % 10 <= 3) \
+                        and (not 10 < counter < 20) \
+            else "st" if counter % 10 == 1 \
+            else "nd" if counter % 10 == 2 \
+            else "rd"
+        report = "Preparing model run on {}{} grid"\
+            .format(counter, place)
+        self.output_controller.submit_output(out_cnf.Debug.PRINT_NOTICES,
+                                             report)
+        return True
+
+    def compute_column(self: 'ModelRun',
+                       grid_column: List['LatLongGrid'],
+                       init_co2: float,
+                       final_co2: float,
+                       iterations: int = 1) -> None:
+        """
+        Perform the model calculations for one time segment on grid_column,
+        a list of surface and atmosphere grids in order of height, using
+        the model mode given in the model run's configuration. Only the
+        surface grid is used outside of multilayer mode.
 
-        return self.grids
+        :param grid_column:
+            A list of surface and atmosphere data grids, in order of height
+        :param init_co2:
+            A multiplier of atmospheric CO2 concentration for initial state
+        :param final_co2:
+            A multiplier of atmospheric CO2 concentration for final state
+        :param iterations:
+            The number of feedback loop calculated for the effects between
+            humidity and atmospheric temperatures
+        """
+        if self.config.model_mode() == cnf.ABS_SRC_MULTILAYER:
+            self.compute_multilayer(grid_column, init_co2, final_co2,
+                                    iterations)
+        else:
+            self.compute_single_layer(grid_column[0], init_co2, final_co2,
+                                      iterations)
 
     def compute_single_layer(self: 'ModelRun',
                              grid: 'LatLongGrid',
@@ -159,6 +756,12 @@ class ModelRun:
             The number of feedback loop calculated for the effects between
             humidity and atmospheric temperatures
         """
+        kernel = self._table_kernel()
+        if kernel is not None:
+            self.compute_table_grid(kernel, grid, init_co2, final_co2,
+                                    iterations)
+            return
+
         if self.config.model_mode() == cnf.ABS_SRC_TABLE:
             temp_recalculator = self.calculate_arr_cell_temperature
         elif self.config.model_mode() == cnf.ABS_SRC_MODERN:
@@ -168,9 +771,224 @@ class ModelRun:
                              "{}: {}".format(self.config.model_mode(),
                                              self.config.temp_provider()))
 
-        for cell in grid:
+        precision = self.config.precision().type
+        cells = list(grid)
+        valid = grid.valid_cells()
+
+        self._start_trace(grid)
+        # Only cells with valid data are computed. Cells with missing data,
+        # or outside the mask, are given missing results.
+        for index in np.flatnonzero(valid):
+            cell = cells[index]
+            self._trace_position = index
             new_temp = temp_recalculator(init_co2, final_co2, cell, iterations)
-            cell.set_temperature(new_temp)
+            cell.set_temperature(precision(new_temp))
+
+        self.skip_cells([cells[index] for index in np.flatnonzero(~valid)])
+        self._finish_trace()
+
+    def _table_kernel(self: 'ModelRun',
+                      name: Optional[str] = None) -> Optional[TableKernel]:
+        """
+        Returns the whole-grid kernel selected by the model run's
+        configuration, or by name if given, or None if cells are to be
+        computed one at a time. Kernels are only used in table mode, with
+        the picard solver and with weight functions that kernels support.
+
+        :param name:
+            The name of a kernel backend, overriding the configured one
+        :return:
+            The kernel for table-mode grids, or None
+        """
+        if self.config.model_mode() != cnf.ABS_SRC_TABLE \
+                or self.config.solver() is not picard:
+            return None
+
+        co2_weight_func, h2o_weight_func = self.config.table_auxiliaries()
+        if weight_mode(co2_weight_func) is None \
+                or weight_mode(h2o_weight_func) is None:
+            return None
+
+        return table_kernel(self.config.kernel() if name is None else name)
+
+    def _whole_grid_kernel(self: 'ModelRun') -> Optional[TableKernel]:
+        """
+        Returns the whole-grid kernel selected by the model run's
+        configuration, or the numpy kernel if cells would otherwise be
+        computed one at a time. Returns None where _table_kernel would
+        return None for any kernel backend.
+
+        :return:
+            The kernel for table-mode grids, or None
+        """
+        if self.config.kernel() == cnf.KERNEL_PYTHON:
+            return self._table_kernel(cnf.KERNEL_NUMPY)
+        return self._table_kernel()
+
+    def compute_table_grid(self: 'ModelRun',
+                           kernel: TableKernel,
+                           grid: 'LatLongGrid',
+                           init_co2: float,
+                           final_co2: float,
+                           iterations: int = 1,
+                           warm_start: Optional[np.ndarray] = None)\
+            -> np.ndarray:
+        """
+        Perform the table-mode model calculations on the surface data in
+        grid, as compute_single_layer does, but with every valid cell
+        computed by a single call to kernel, one of the kernels from
+        core.kernels.
+
+        If warm_start is given, it holds an estimate of the temperature
+        change of each cell, such as the change found for the same cell in
+        an earlier run, and the feedback loop of each cell starts from its
+        temperature plus this change. Cells with a missing (nan) estimate
+        start from their own temperature.
+
+        Changes are recorded by updating the temperature values for each
+        cell in the grid. The temperature change of each cell is returned,
+        in the order in which the grid is iterated over, with missing (nan)
+        values for cells without valid data.
+
+        :param kernel:
+            A function solving the feedback loop for an array of cells
+        :param grid:
+            A single layer of gridded data containing temperature, humidity,
+            and surface albedo
+        :param init_co2:
+            A multiplier of atmospheric CO2 concentration for initial state
+        :param final_co2:
+            A multiplier of atmospheric CO2 concentration for final state
+        :param iterations:
+            The number of feedback loop calculated for the effects between
+            humidity and atmospheric temperatures
+        :param warm_start:
+            An estimate of the temperature change of each cell, or None
+        :return:
+            The temperature change of each cell
+        """
+        co2_weight_func, h2o_weight_func = self.config.table_auxiliaries()
+        precision = self.config.precision().type
+
+        cells = list(grid)
+        valid = grid.valid_cells()
+        positions = np.flatnonzero(valid)
+        valid_cells = [cells[index] for index in positions]
+
+        def read(getter: Callable) -> np.ndarray:
+            """
+            Returns the value returned by getter for each valid cell.
+            """
+            return np.fromiter((getter(cell) for cell in valid_cells),
+                               np.float64, count=len(valid_cells))
+
+        init_temperatures = read(GridCell.get_temperature) + 273.15
+        start = None
+        if warm_start is not None:
+            start = init_temperatures \
+                + np.nan_to_num(np.ravel(warm_start)[positions])
+
+        temperatures, transparencies, new_transparencies, passes = \
+            kernel(init_co2, final_co2, init_temperatures,
+                   read(GridCell.get_relative_humidity),
+                   read(GridCell.get_albedo),
+                   weight_mode(co2_weight_func), weight_mode(h2o_weight_func),
+                   iterations + 1, self.config.convergence_tolerance(),
+                   start)
+
+        self.metrics.count(out_cnf.Metrics.TRANSPARENCY_CALLS,
+                           int(np.sum(passes + 1)))
+
+        self._start_trace(grid)
+        self.report_cells(valid_cells, positions,
+                          temperatures - init_temperatures,
+                          new_transparencies - transparencies, passes)
+
+        for cell, new_temp in zip(valid_cells, temperatures - 273.15):
+            cell.set_temperature(precision(new_temp))
+
+        self.skip_cells([cells[index] for index in np.flatnonzero(~valid)])
+        self._finish_trace()
+
+        delta_temps = np.full(len(cells), np.nan)
+        delta_temps[positions] = temperatures - init_temperatures
+        return delta_temps
+
+    def compute_table_ensemble(self: 'ModelRun',
+                               kernel: TableKernel,
+                               grid: 'LatLongGrid',
+                               segment: int,
+                               perturbations: Sequence['Perturbation'],
+                               init_co2: float,
+                               final_co2: float,
+                               iterations: int = 1) -> np.ndarray:
+        """
+        Perform the table-mode model calculations on the surface data in
+        grid for every member of an ensemble, each with its input data
+        perturbed by one of perturbations. The valid cells of all members
+        are stacked along an ensemble axis, and computed together by a
+        single call to kernel, one of the kernels from core.kernels.
+
+        The grid itself is left unchanged. Returns the temperature change
+        of every cell for each member, as an array of shape (members,
+        latitude, longitude), with missing (nan) values for cells without
+        valid data.
+
+        :param kernel:
+            A function solving the feedback loop for an array of cells
+        :param grid:
+            A single layer of gridded data containing temperature, humidity,
+            and surface albedo
+        :param segment:
+            The position of the time segment within the model run, from 0
+        :param perturbations:
+            The perturbation of each ensemble member's input data
+        :param init_co2:
+            A multiplier of atmospheric CO2 concentration for initial state
+        :param final_co2:
+            A multiplier of atmospheric CO2 concentration for final state
+        :param iterations:
+            The number of feedback loop calculated for the effects between
+            humidity and atmospheric temperatures
+        :return:
+            The temperature change of every cell for each member
+        """
+        co2_weight_func, h2o_weight_func = self.config.table_auxiliaries()
+
+        cells = list(grid)
+        positions = np.flatnonzero(grid.valid_cells())
+        valid_cells = [cells[index] for index in positions]
+
+        def read(getter: Callable) -> np.ndarray:
+            """
+            Returns the value returned by getter for each valid cell.
+            """
+            return np.fromiter((getter(cell) for cell in valid_cells),
+                               np.float64, count=len(valid_cells))
+
+        members = perturb_members(perturbations, segment, {
+            PERTURB_TEMPERATURE: read(GridCell.get_temperature) + 273.15,
+            PERTURB_HUMIDITY: read(GridCell.get_relative_humidity),
+            PERTURB_ALBEDO: read(GridCell.get_albedo),
+        })
+        init_temperatures = members[PERTURB_TEMPERATURE]
+
+        temperatures, _, _, passes = \
+            kernel(init_co2, final_co2, init_temperatures.ravel(),
+                   members[PERTURB_HUMIDITY].ravel(),
+                   members[PERTURB_ALBEDO].ravel(),
+                   weight_mode(co2_weight_func), weight_mode(h2o_weight_func),
+                   iterations + 1, self.config.convergence_tolerance())
+
+        self.metrics.count(out_cnf.Metrics.TRANSPARENCY_CALLS,
+                           int(np.sum(passes + 1)))
+
+        delta_temps = np.full((len(perturbations), len(cells)), np.nan)
+        delta_temps[:, positions] = \
+            temperatures.reshape(init_temperatures.shape) - init_temperatures
+
+        return delta_temps.reshape((len(perturbations),)
+                                   + grid.dimensions().dims_by_count())
 
     def compute_multilayer(self: 'ModelRun',
                            grid_column: List['LatLongGrid'],
@@ -216,20 +1034,52 @@ class ModelRun:
         # no defined pressure.
         pressures.pop(0)
 
-        # Prepare an iterator over a whole atmospheric column of grid cells.
-        cell_iterator = zip(*iterators)
+        # Prepare a list of whole atmospheric columns of grid cells.
+        columns = list(zip(*iterators))
+        # Only columns with valid data in every layer are computed, since a
+        # missing temperature in any layer leaves the column's radiative
+        # balance undefined.
+        valid = np.logical_and.reduce([grid.valid_cells()
+                                       for grid in grid_column])
 
         layer_dims = pressures_to_layer_dimensions(pressures)
+        precision = self.config.precision().type
+
+        self.skip_cells([cell for index in np.flatnonzero(~valid)
+                         for cell in columns[index]])
 
-        for atm_column in cell_iterator:
+        self._start_trace(grid_column[0])
+        for index in np.flatnonzero(valid):
+            atm_column = columns[index]
+            self._trace_position = index
             new_temps = self.calculate_layered_cell_temperature(init_co2,
                                                                 final_co2,
                                                                 pressures,
                                                                 layer_dims,
                                                                 atm_column,
                                                                 iterations)
+            new_temps = np.asarray(new_temps).astype(precision)
             for cell_num in range(len(atm_column)):
                 atm_column[cell_num].set_temperature(new_temps[cell_num])
+        self._finish_trace()
+
+    def skip_cells(self: 'ModelRun',
+                   cells: List[Optional['GridCell']]) -> None:
+        """
+        Give missing (nan) results to grid cells that are left out of model
+        calculations, because they have no valid data or lie outside the
+        model run's mask. Empty cells are ignored.
+
+        :param cells:
+            The grid cells left out of model calculations
+        """
+        missing = self.config.precision().type(np.nan)
+
+        for cell in cells:
+            if cell is not None:
+                cell.set_temperature(missing)
+
+        self.metrics.count(out_cnf.Metrics.SKIPPED_CELLS, len(cells))
 
     def calculate_arr_cell_temperature(self: 'ModelRun',
                                        init_co2: float,
@@ -268,23 +1118,28 @@ class ModelRun:
                                               co2_weight_func,
                                               h2o_weight_func)
         k = calibrate_constant(init_temperature, albedo, transparency)
-
-        for i in range(iterations + 1):
-            transparency = calculate_transparency(new_co2,
-                                                  temperature,
-                                                  relative_humidity,
-                                                  co2_weight_func,
-                                                  h2o_weight_func)
-            temperature = get_new_temperature(albedo, transparency, k)
-
-        delta_temp_report = "{}  ~~~~  Delta T: {} K" \
-            .format(grid_cell, temperature - init_temperature)
-        delta_trans_report = "{}  ~~~~  Delta Transparency: {} K" \
-            .format(grid_cell, temperature - init_temperature)
-        self.output_controller.submit_output(out_cnf.Debug.GRID_CELL_DELTA_TEMP,
-                                             delta_temp_report)
-        self.output_controller.submit_output(out_cnf.Debug.GRID_CELL_DELTA_TRANSPARENCY,
-                                             delta_trans_report)
+        new_transparency = transparency
+
+        def feedback(cell_temperature: float) -> float:
+            """
+            Returns the cell's temperature after one feedback pass starting
+            from cell_temperature.
+            """
+            nonlocal new_transparency
+            new_transparency = calculate_transparency(new_co2,
+                                                      cell_temperature,
+                                                      relative_humidity,
+                                                      co2_weight_func,
+                                                      h2o_weight_func)
+            return get_new_temperature(albedo, new_transparency, k)
+
+        solver = self.config.solver()
+        temperature, passes = solver(feedback, temperature, iterations + 1,
+                                     self.config.convergence_tolerance())
+
+        self.metrics.count(out_cnf.Metrics.TRANSPARENCY_CALLS, passes + 1)
+        self.report_cell(grid_cell, temperature - init_temperature,
+                         new_transparency - transparency, passes)
 
         return temperature - 273.15
 
@@ -322,23 +1177,28 @@ class ModelRun:
                                                      ATMOSPHERE_HEIGHT / 2,
                                                      ATMOSPHERE_HEIGHT)
         k = calibrate_constant(temperature, albedo, transparency)
+        new_transparency = transparency
+
+        def feedback(cell_temperature: float) -> float:
+            """
+            Returns the cell's temperature after one feedback pass starting
+            from cell_temperature.
+            """
+            nonlocal new_transparency
+            new_transparency = calculate_modern_transparency(new_co2,
+                                                             cell_temperature,
+                                                             relative_humidity,
+                                                             ATMOSPHERE_HEIGHT / 2,
+                                                             ATMOSPHERE_HEIGHT)
+            return get_new_temperature(albedo, new_transparency, k)
 
-        for i in range(iterations + 1):
-            transparency = calculate_modern_transparency(new_co2,
-                                                         temperature,
-                                                         relative_humidity,
-                                                         ATMOSPHERE_HEIGHT / 2,
-                                                         ATMOSPHERE_HEIGHT)
-            temperature = get_new_temperature(albedo, transparency, k)
-
-        delta_temp_report = "{}  ~~~~  Delta T: {} K" \
-            .format(grid_cell, temperature - init_temperature)
-        delta_trans_report = "{}  ~~~~  Delta Transparency: {} K" \
-            .format(grid_cell, temperature - init_temperature)
-        self.output_controller.submit_output(out_cnf.Debug.GRID_CELL_DELTA_TEMP,
-                                             delta_temp_report)
-        self.output_controller.submit_output(out_cnf.Debug.GRID_CELL_DELTA_TRANSPARENCY,
-                                             delta_trans_report)
+        solver = self.config.solver()
+        temperature, passes = solver(feedback, temperature, iterations + 1,
+                                     self.config.convergence_tolerance())
+
+        self.metrics.count(out_cnf.Metrics.LOWTRAN_CALLS, passes + 1)
+        self.report_cell(grid_cell, temperature - init_temperature,
+                         new_transparency - transparency, passes)
         return temperature - 273.15
 
     def calculate_layered_cell_temperature(self: 'ModelRun',
@@ -376,6 +1236,7 @@ class ModelRun:
         temperatures = [surface_cell.get_temperature() + 273.15]
         init_temperature = temperatures[0]
         transparencies = [surface_cell.get_albedo()]
+        lowtran_calls = 0
 
         try:
             for layer_num in range(len(layers) - 1):
@@ -388,39 +1249,169 @@ class ModelRun:
                                                              layer_dims[layer_num][1],
                                                              pressures[layer_num])
                 transparencies.append(transparency)
+            lowtran_calls += len(layers) - 1
             init_transparency = transparencies[1]
 
             atm_matrix = ml.build_multilayer_matrix(np.array(transparencies))
             coefficients = ml.calibrate_multilayer_matrix(atm_matrix,
                                                           np.array(temperatures))
 
-            for i in range(iterations + 1):
+            def feedback(column_temperatures: np.ndarray) -> np.ndarray:
+                """
+                Returns the column's temperatures after one feedback pass
+                starting from column_temperatures.
+                """
+                nonlocal transparencies, lowtran_calls
+
                 transparencies = [surface_cell.get_albedo()]
                 for layer_num in range(len(layers) - 1):
                     relative_humidity = layers[layer_num + 1].get_relative_humidity()
                     transparency = calculate_modern_transparency(new_co2,
-                                                                 temperatures[layer_num + 1],
+                                                                 column_temperatures[layer_num + 1],
                                                                  relative_humidity,
                                                                  layer_dims[layer_num][0],
                                                                  layer_dims[layer_num][1],
                                                                  pressures[layer_num])
                     transparencies.append(transparency)
+                lowtran_calls += len(layers) - 1
                 atm_matrix = ml.build_multilayer_matrix(np.array(transparencies))
-                temperatures = ml.solve_multilayer_matrix(atm_matrix, coefficients)
-
-            delta_temp_report = "{}  ~~~~  Delta T: {} K" \
-                .format(layers[0], temperatures[0] - init_temperature)
-            delta_trans_report = "{}  ~~~~  Delta Transparency: {} K" \
-                .format(layers[1], transparencies[1] - init_transparency)
-            self.output_controller.submit_output(out_cnf.Debug.GRID_CELL_DELTA_TEMP,
-                                                 delta_temp_report)
-            self.output_controller.submit_output(out_cnf.Debug.GRID_CELL_DELTA_TRANSPARENCY,
-                                                 delta_trans_report)
+                return ml.solve_multilayer_matrix(atm_matrix, coefficients)
+
+            solver = self.config.solver()
+            temperatures, passes = \
+                solver(feedback, np.array(temperatures), iterations + 1,
+                       self.config.convergence_tolerance())
+
+            self.report_cell(layers[0], temperatures[0] - init_temperature,
+                             transparencies[1] - init_transparency, passes)
         except np.linalg.LinAlgError:
+            # The column's temperatures are left unchanged, without any
+            # feedback passes.
             temperatures = np.array([init_temperature] * len(temperatures))
+            self.report_cell(layers[0], 0.0, 0.0, 0)
 
+        self.metrics.count(out_cnf.Metrics.LOWTRAN_CALLS, lowtran_calls)
         return temperatures - 273.15
 
+    def report_feedback_passes(self: 'ModelRun',
+                               grid_cell: 'GridCell',
+                               passes: int) -> None:
+        """
+        Record that the feedback calculation for grid_cell, or for the
+        atmospheric column above it, finished after the given number of
+        passes.
+
+        :param grid_cell:
+            The grid cell whose temperature was calculated
+        :param passes:
+            The number of feedback passes used for the grid cell
+        """
+        self.metrics.count(out_cnf.Metrics.FEEDBACK_PASSES, label=str(passes))
+
+        if self.output_controller.is_enabled(
+                out_cnf.Debug.GRID_CELL_FEEDBACK_PASSES):
+            passes_report = "{}  ~~~~  Feedback passes: {}" \
+                .format(grid_cell, passes)
+            self.output_controller.submit_output(
+                out_cnf.Debug.GRID_CELL_FEEDBACK_PASSES, passes_report)
+
+    def report_cell(self: 'ModelRun',
+                    grid_cell: 'GridCell',
+                    delta_temp: float,
+                    delta_transparency: float,
+                    passes: int) -> None:
+        """
+        Record the results of the calculation for grid_cell, or for the
+        atmospheric column above it, in the trace of the grid being
+        computed and in any per-cell debug output that is enabled. Reports
+        are only formatted for output types that are enabled.
+
+        :param grid_cell:
+            The grid cell whose temperature was calculated
+        :param delta_temp:
+            The change in the cell's temperature
+        :param delta_transparency:
+            The change in transparency of the atmosphere over the cell
+        :param passes:
+            The number of feedback passes used for the grid cell
+        """
+        self.report_feedback_passes(grid_cell, passes)
+
+        if self._trace is not None:
+            self._trace.record(self._trace_position, delta_temp,
+                               delta_transparency, passes)
+
+        output_center = self.output_controller
+        if output_center.is_enabled(out_cnf.Debug.GRID_CELL_DELTA_TEMP):
+            output_center.submit_output(
+                out_cnf.Debug.GRID_CELL_DELTA_TEMP,
+                "{}  ~~~~  Delta T: {} K".format(grid_cell, delta_temp))
+        if output_center.is_enabled(
+                out_cnf.Debug.GRID_CELL_DELTA_TRANSPARENCY):
+            output_center.submit_output(
+                out_cnf.Debug.GRID_CELL_DELTA_TRANSPARENCY,
+                "{}  ~~~~  Delta Transparency: {}"
+                .format(grid_cell, delta_transparency))
+
+    def report_cells(self: 'ModelRun',
+                     grid_cells: List['GridCell'],
+                     positions: np.ndarray,
+                     delta_temps: np.ndarray,
+                     delta_transparencies: np.ndarray,
+                     passes: np.ndarray) -> None:
+        """
+        Record the results of the calculations for many grid cells at once,
+        as report_cell does for one. Cells are only reported one at a time
+        if the grid is being traced or per-cell debug output is enabled;
+        otherwise their feedback passes are counted together.
+
+        :param grid_cells:
+            The grid cells whose temperatures were calculated
+        :param positions:
+            The position of each cell within its grid
+        :param delta_temps:
+            The change in each cell's temperature
+        :param delta_transparencies:
+            The change in transparency of the atmosphere over each cell
+        :param passes:
+            The number of feedback passes used for each cell
+        """
+        if self._trace is not None \
+                or any(self.output_controller.is_enabled(output)
+                       for output in PER_CELL_DEBUG):
+            for index, grid_cell in enumerate(grid_cells):
+                self._trace_position = positions[index]
+                self.report_cell(grid_cell, delta_temps[index],
+                                 delta_transparencies[index],
+                                 int(passes[index]))
+            return
+
+        for cell_passes, count in zip(*np.unique(passes, return_counts=True)):
+            self.metrics.count(out_cnf.Metrics.FEEDBACK_PASSES, int(count),
+                               label=str(cell_passes))
+
+    def _start_trace(self: 'ModelRun',
+                     grid: 'LatLongGrid') -> None:
+        """
+        Prepare a trace of the calculations for every cell in grid, if
+        per-cell tracing is enabled in the output controller.
+
+        :param grid:
+            The surface grid about to be computed
+        """
+        if self.output_controller.is_enabled(out_cnf.Debug.GRID_CELL_TRACE):
+            self._trace = CellTrace(grid.dimensions().dims_by_count())
+
+    def _finish_trace(self: 'ModelRun') -> None:
+        """
+        Submit the trace of the grid that has just been computed, if per-cell
+        tracing is enabled.
+        """
+        if self._trace is not None:
+            self.output_controller.submit_output(
+                out_cnf.Debug.GRID_CELL_TRACE, self._trace)
+            self._trace = None
+
 
 def pressures_to_layer_dimensions(pressures: List[float]) -> List[List[float]]:
     """
@@ -455,6 +1446,55 @@ def pressures_to_layer_dimensions(pressures: List[float]) -> List[List[float]]:
     return layer_dimensions[1:]
 
 
+def data_collector(config: 'ArrheniusConfig') -> 'ClimateDataCollector':
+    """
+    Returns a collector loaded with the grid, precision, mask, and data
+    providers of config, ready to supply data for a model run. Data is
+    shared with other collectors in the process through the default
+    snapshot registry.
+
+    :param config:
+        Configuration options for the model run
+    :return:
+        A collector of data for the model run
+    """
+    collector = ClimateDataCollector(config.grid()) \
+        .use_temperature_source(config.temp_provider()) \
+        .use_humidity_source(config.humidity_provider()) \
+        .use_albedo_source(config.albedo_provider()) \
+        .use_precision(config.precision()) \
+        .use_mask_source(config.mask_provider()) \
+        .use_snapshot_registry(default_snapshot_registry())
+
+    try:
+        collector.use_pressure_source(config.pressure_provider())
+    except AttributeError:
+        pass
+
+    return collector
+
+
+def run_in_context(context: 'RunContext',
+                   memory_budget: Optional[float] = None)\
+        -> List[Dict[str, float]]:
+    """
+    Run the model under the configuration and output controller of context,
+    and return the statistics of each time segment, as given by
+    segment_statistics. Both the context and the results can be pickled, so
+    this function may be submitted to a pool of worker processes to run many
+    models at once.
+
+    :param context:
+        The context of the model run
+    :param memory_budget:
+        The greatest memory, in megabytes, to be used for grid data
+    :return:
+        Statistics for each time segment of the model run
+    """
+    run = ModelRun(context.config, context.output_center, memory_budget)
+    return [segment.stats for segment in run.iter_model()]
+
+
 def calibrate_constant(temperature: float,
                        albedo: float,
                        transparency: float) -> float:
@@ -517,14 +1557,145 @@ def multigrid_latitude_bands(grids: GriddedData) -> GriddedData:
         return compressed_grids
 
 
-def print_solo_statistics(data: GriddedData) -> None:
+def multigrid_level_layers(grids: GriddedData,
+                           layers: int) -> GriddedData:
+    """
+    Returns a nested list of grid objects, arranged in the same way as
+    the parameter grids, except with the atmospheric levels of each column
+    of grids merged into at most layers layers. A column is a list of
+    grids for the surface followed by each atmospheric level in order of
+    height; the surface grid is kept as it is, and adjacent levels are
+    merged in groups given by level_groups.
+
+    Values in each merged layer are means over its levels, weighted by the
+    pressure thickness of each level, as described under merge_levels.
+    Levels without pressures, or groups with no thickness, are weighted
+    equally.
+
+    :param grids:
+        A nested list of grid columns
+    :param layers:
+        The greatest number of atmospheric layers in each column
+    :return:
+        A parallel nested list of columns with merged levels
+    """
+    if len(grids) == 0 or not isinstance(grids[0], LatLongGrid):
+        return [multigrid_level_layers(column, layers) for column in grids]
+
+    levels = grids[1:]
+    if len(levels) <= layers:
+        return grids
+
+    pressures = [grid.get_pressure() for grid in levels]
+    if None in pressures:
+        thickness = np.ones(len(levels))
+    else:
+        thickness = pressure_thickness(pressures)
+
+    merged = [grids[0]]
+    for group in level_groups(len(levels), layers):
+        weights = thickness[group]
+        if not np.any(weights > 0):
+            weights = np.ones(len(weights))
+        merged.append(merge_levels(levels[group], weights))
+
+    return merged
+
+
+def segment_statistics(grid: 'LatLongGrid') -> Dict[str, float]:
+    """
+    Returns a dictionary mapping the name of each primary output variable to
+    its mean value over the valid cells of grid, which is typically the
+    surface grid of a single time segment of model results. Cells are
+    weighted by the surface area of their latitude bands.
+
+    :param grid:
+        A grid containing model run results
+    :return:
+        The mean of each variable within the grid
+    """
+    stats = {}
+
+    for output_type in out_cnf.ReportDatatype:
+        var_name = output_type.value
+        stats[var_name] = mean(grid.extract_datapoint(var_name), lat_axis=0)
+
+    return stats
+
+
+def segment_sums(grid: 'LatLongGrid',
+                 first_row: int = 0,
+                 lat_count: Optional[int] = None) \
+        -> Dict[str, Tuple[float, float]]:
+    """
+    Returns a dictionary mapping the name of each primary output variable to
+    its sum over the valid cells of grid, along with the total weight of the
+    valid cells, so that segment statistics can be gathered from part of a
+    grid at a time. Cells are weighted by the surface area of their latitude
+    bands, as in segment_statistics.
+
+    :param grid:
+        A grid containing model run results, which may be a band of rows
+        from a larger grid
+    :param first_row:
+        The row of the larger grid at which grid starts
+    :param lat_count:
+        The number of rows in the larger grid, or None if grid is whole
+    :return:
+        The weighted sum and total weight of each variable within the grid
+    """
+    sums = {}
+
+    for output_type in out_cnf.ReportDatatype:
+        var_name = output_type.value
+        data = np.asarray(grid.extract_datapoint(var_name), dtype=np.float64)
+        row_weights = latitude_weights(lat_count or data.shape[0])[
+            first_row:first_row + data.shape[0], np.newaxis]
+        weights = np.where(np.isnan(data), 0.0, row_weights)
+        sums[var_name] = (float(np.sum(np.nan_to_num(data) * weights)),
+                          float(np.sum(weights)))
+
+    return sums
+
+
+def stack_latitude_bands(grids: List['LatLongGrid']) -> 'LatLongGrid':
+    """
+    Returns a single grid made of the rows of each grid in grids, in order
+    from south to north, with the pressure of the first grid. Used to join
+    bands of rows computed separately back into one grid.
+
+    :param grids:
+        A list of grids with equal numbers of columns
+    :return:
+        A grid of every row in grids
+    """
+    rows = []
+    for grid in grids:
+        cells = list(grid)
+        lon_count = grid.dimensions().dims_by_count()[1]
+        rows.extend(cells[i:i + lon_count]
+                    for i in range(0, len(cells), lon_count))
+
+    stacked = LatLongGrid(rows)
+    stacked.set_pressure(grids[0].get_pressure())
+    return stacked
+
+
+def print_solo_statistics(data: GriddedData,
+                          context: Optional['RunContext'] = None) -> None:
     """
     Display a series of tables and statistics based on model run results.
-    Which outputs are displayed is determined by the current output
-    controller, and its settings under the SpecialReportDatatype and
+    Which outputs are displayed is determined by the output controller of
+    the model run's context, or the thread's global output controller if no
+    context is given, and its settings under the SpecialReportDatatype and
     ReportDatatype categories.
+
+    :param data:
+        A nested list of model run results
+    :param context:
+        The context of the model run
     """
-    output_center = out_cnf.global_output_center()
+    output_center = (context or current_context()).output_center
 
     # Prepare data tables.
     temp_name = out_cnf.ReportDatatype.REPORT_TEMP.value
@@ -549,7 +1720,8 @@ def print_solo_statistics(data: GriddedData) -> None:
 
 
 def print_relation_statistics(data: GriddedData,
-                              expected: np.ndarray) -> None:
+                              expected: np.ndarray,
+                              context: Optional['RunContext'] = None) -> None:
     """
     Print a series of tables and statistics based on the relation between
     model run results, given by data, and an array of expected results for
@@ -564,13 +1736,15 @@ def print_relation_statistics(data: GriddedData,
         A nested list of model run results
     :param expected:
         An array of expected temperature change values for the model run
+    :param context:
+        The context of the model run, or None to use the thread's globals
     """
     delta_t_name = out_cnf.ReportDatatype.REPORT_TEMP_CHANGE.value
     delta_temp_data = \
         extract_multidimensional_grid_variable(data, delta_t_name)
     delta_temp_table = convert_grid_data_to_table(delta_temp_data)
 
-    output_center = out_cnf.global_output_center()
+    output_center = (context or current_context()).output_center
     diff = expected - delta_temp_table
 
     output_center.submit_output(
@@ -598,24 +1772,30 @@ if __name__ == '__main__':
     if len(argv) > 1:
         try:
             # Command-line arguments must consist of a -c followed by the
-            # JSON filename containing configuration options.
-            options, args = getopt(argv[1:], "c:")
+            # JSON filename containing configuration options, optionally
+            # with a -m followed by a memory budget in megabytes.
+            options, args = getopt(argv[1:], "c:m:")
             options_map = {op[0]: op[1] for op in options}
 
-            # Parse config options from file.
             json_filepath = options_map["-c"]
-
-            with open(json_filepath, "r") as json_file:
-                conf = cnf.from_json_string(json_file.read())
-        except (KeyError, GetoptError):
+            budget = options_map.get("-m")
+            budget = None if budget is None else float(budget)
+            if budget is not None and not budget > 0:
+                raise ValueError("Memory budget must be positive")
+        except (KeyError, GetoptError, ValueError):
             # Only catch errors resulting from improper argument passing:
             # Invalid config errors should propagate.
-            print("Usage: python runner.py -c <config_file>")
+            print("Usage: python runner.py -c <config_file> [-m <memory_mb>]")
             exit(1)
 
+        # Parse config options from file.
+        with open(json_filepath, "r") as json_file:
+            conf = cnf.from_json_string(json_file.read())
+
     else:
         # If no arguments are given, use default config.
         conf = cnf.default_config()
+        budget = None
 
     title = "arrhenius_x2"
     conf.set_run_id(title)
@@ -634,5 +1814,5 @@ if __name__ == '__main__':
     out_cont.enable_output_type(out_cnf.AccuracyMetrics.TEMP_DELTA_STD_DEVIATION)
     out_cont.enable_output_type(out_cnf.AccuracyMetrics.TEMP_DELTA_VARIANCE)
 
-    model = ModelRun(conf, out_cont)
+    model = ModelRun(conf, out_cont, budget)
     grids = model.run_model()
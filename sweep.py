@@ -0,0 +1,312 @@
+from data.display import output_directory
+from data.resources import MAIN_PATH
+from data.synthetic import use_synthetic_providers
+
+import core.configuration as cnf
+import core.output_config as out_cnf
+from core.metrics import stage_times
+from core.parameters import parse_parameter, expand_parameters
+import runner
+
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import datetime
+from os import path, listdir
+from pathlib import Path
+from time import perf_counter
+from typing import List, Dict, Tuple, Iterator
+from sys import argv, exit
+from getopt import gnu_getopt, GetoptError
+
+import json
+import warnings
+
+"""
+A sweep runner for the Arrhenius model, which runs many configurations in
+one command and writes a single summary of their results and timings.
+
+Configurations are read from a directory of JSON files, from a JSON-lines
+file with one configuration per line, or from a single JSON file, and may
+be expanded over a parameter grid. Each parameter is a dotted path into
+the configuration, such as co2.to, with a list of values; the sweep runs
+every combination of values for every configuration read.
+
+Loading and regridding data is usually the most expensive part of a small
+model run, and is the same for any configurations that share a grid, year,
+precision, mask, and data providers. Configurations are grouped on those
+options, and each group runs in a single worker process sharing one data
+collector, so that data is loaded only once per group. Groups run in
+parallel on a pool of worker processes.
+
+Each model run writes its usual output directory, under a sweep output
+directory kept apart from the web API's stored results, since sweep runs
+may use synthetic data and are not recorded in the result store. The
+summary file lists, for every run, its configuration, run ID, wall time,
+time per stage, and the mean of each output variable over its time
+segments, or the error that stopped it.
+
+Usage:
+    python sweep.py [-c <config_dir|config.json|configs.jsonl>]...
+                    [-p <key>=<value>[,<value>]...]... [-w <workers>]
+                    [-o <summary>] [-d <output_dir>] [--synthetic]
+"""
+
+
+DEFAULT_SUMMARY_PATH = path.join(MAIN_PATH, 'sweep_summary.json')
+DEFAULT_OUTPUT_PATH = path.join(MAIN_PATH, 'sweep_output')
+
+
+def read_configs(source: str) -> List[Dict]:
+    """
+    Returns the configuration options read from source, which is either a
+    directory of JSON configuration files, read in order of file name, a
+    JSON-lines file with one configuration on each non-blank line, or a
+    single JSON configuration file.
+
+    :param source:
+        The path to a directory, JSON-lines file, or JSON file
+    :return:
+        A list of configuration options
+    """
+    if path.isdir(source):
+        return [read_configs(path.join(source, file_name))[0]
+                for file_name in sorted(listdir(source))
+                if file_name.endswith(".json")]
+
+    with open(source, "r") as source_file:
+        if source.endswith(".jsonl"):
+            return [json.loads(line) for line in source_file if line.strip()]
+        else:
+            return [json.load(source_file)]
+
+
+def data_key(config: 'ArrheniusConfig') -> Tuple:
+    """
+    Returns a key identifying the data used by a model run under config.
+    Model runs with equal keys load and regrid the same data, and so may
+    share one data collector.
+
+    :param config:
+        Configuration options for a model run
+    :return:
+        A hashable key for the model run's data
+    """
+    try:
+        pressure = config.pressure_provider()
+    except AttributeError:
+        pressure = None
+
+    return (config.grid().dims_by_count(), config.year(), config.precision(),
+            config.temp_provider(), config.humidity_provider(),
+            config.albedo_provider(), pressure, config.mask_provider())
+
+
+def group_configs(configs: List[Dict]) -> List[List[Dict]]:
+    """
+    Returns configs divided into groups that use the same data, in the
+    order in which each group first appears. Every configuration is
+    validated along the way, raising an InvalidConfigError if any is
+    invalid.
+
+    :param configs:
+        A list of configuration options
+    :return:
+        Lists of configuration options that use the same data
+    """
+    groups = {}
+
+    for options in configs:
+        config = cnf.from_json_string(json.dumps(options))
+        groups.setdefault(data_key(config), []).append(options)
+
+    return list(groups.values())
+
+
+def run_group(group: List[Dict],
+              synthetic: bool = False,
+              output_root: str = DEFAULT_OUTPUT_PATH) -> List[Dict]:
+    """
+    Run the model under each configuration in group, sharing one data
+    collector between all the model runs, and return a summary of each.
+    A model run that raises an error is recorded with the error message,
+    and does not stop the rest of the group. Output is written under the
+    directory output_root.
+
+    :param group:
+        A list of configuration options that use the same data
+    :param synthetic:
+        Whether to replace providers of missing datasets with synthetic data
+    :param output_root:
+        The directory in which model run output is written
+    :return:
+        A summary of each model run
+    """
+    warnings.simplefilter("ignore", FutureWarning)
+    if synthetic:
+        use_synthetic_providers()
+
+    collector = None
+    results = []
+    Path(output_root).mkdir(parents=True, exist_ok=True)
+
+    with output_directory(output_root):
+        for options in group:
+            result = {"options": options}
+            start = perf_counter()
+
+            try:
+                config = cnf.from_json_string(json.dumps(options))
+                result["run_id"] = config.run_id()
+
+                if collector is None:
+                    collector = runner.data_collector(config)
+
+                output_center = out_cnf.default_output_config()
+                summaries = []
+                output_center.enable_output_type(out_cnf.Metrics.RUN_SUMMARY,
+                                                 handler=summaries.append)
+
+                model = runner.ModelRun(config, output_center,
+                                        collector=collector)
+                segments = list(model.iter_model())
+
+                result["stats"] = {
+                    var_name: sum(segment.stats[var_name]
+                                  for segment in segments) / len(segments)
+                    for var_name in segments[0].stats
+                }
+                result["stages"] = stage_times(summaries[-1])
+                result["metrics"] = summaries[-1]
+                result["output"] = path.join(output_root, config.run_id())
+            except Exception as error:
+                result["error"] = "{}: {}".format(type(error).__name__, error)
+
+            result["wall"] = perf_counter() - start
+            results.append(result)
+
+    if collector is not None:
+        collector.release_data()
+    return results
+
+
+def iter_sweep(groups: List[List[Dict]],
+               workers: int = 1,
+               synthetic: bool = False,
+               output_root: str = DEFAULT_OUTPUT_PATH) -> Iterator[Dict]:
+    """
+    Returns a generator that runs each group of configurations, and yields
+    a summary of every model run as soon as its group finishes. With more
+    than one worker, groups run in parallel on a pool of worker processes,
+    and are yielded in the order in which they finish.
+
+    :param groups:
+        Lists of configuration options that use the same data
+    :param workers:
+        The number of worker processes
+    :param synthetic:
+        Whether to replace providers of missing datasets with synthetic data
+    :param output_root:
+        The directory in which model run output is written
+    :return:
+        A generator of model run summaries
+    """
+    if workers <= 1:
+        for index, group in enumerate(groups):
+            for result in run_group(group, synthetic, output_root):
+                result["group"] = index
+                yield result
+        return
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = {executor.submit(run_group, group, synthetic,
+                                   output_root): index
+                   for index, group in enumerate(groups)}
+
+        for future in as_completed(futures):
+            for result in future.result():
+                result["group"] = futures[future]
+                yield result
+
+
+def run_sweep(configs: List[Dict],
+              workers: int = 1,
+              summary_path: str = DEFAULT_SUMMARY_PATH,
+              synthetic: bool = False,
+              output_root: str = DEFAULT_OUTPUT_PATH) -> Dict:
+    """
+    Run the model under every configuration in configs, grouping those that
+    use the same data, and write a summary of the sweep to summary_path.
+    Returns the summary, which holds the sweep's start time, worker count,
+    number of groups, total wall time, and a summary of each model run.
+
+    :param configs:
+        A list of configuration options
+    :param workers:
+        The number of worker processes
+    :param summary_path:
+        The path of the summary file to be written
+    :param synthetic:
+        Whether to replace providers of missing datasets with synthetic data
+    :param output_root:
+        The directory in which model run output is written
+    :return:
+        A summary of the sweep
+    """
+    if synthetic:
+        use_synthetic_providers()
+
+    started = datetime.now().isoformat(timespec="seconds")
+    start = perf_counter()
+    groups = group_configs(configs)
+
+    runs = []
+    for result in iter_sweep(groups, workers, synthetic, output_root):
+        status = "failed" if "error" in result else "done"
+        print("[{}/{}] {} {} ({:.2f}s)".format(len(runs) + 1, len(configs),
+                                              result.get("run_id", "?"),
+                                              status, result["wall"]))
+        runs.append(result)
+
+    summary = {
+        "started": started,
+        "workers": workers,
+        "groups": len(groups),
+        "wall": perf_counter() - start,
+        "runs": runs,
+    }
+
+    with open(summary_path, "w") as summary_file:
+        json.dump(summary, summary_file, indent=2)
+
+    return summary
+
+
+USAGE = "Usage: python sweep.py" \
+        " [-c <config_dir|config.json|configs.jsonl>]..." \
+        " [-p <key>=<value>[,<value>]...]... [-w <workers>]" \
+        " [-o <summary>] [-d <output_dir>] [--synthetic]"
+
+
+if __name__ == '__main__':
+    try:
+        options, args = gnu_getopt(argv[1:], "c:p:w:o:d:",
+                                   ["synthetic"])
+        options_map = {}
+        for option, value in options:
+            options_map.setdefault(option, []).append(value)
+
+        sources = options_map.get("-c", [cnf.JSON_DEFAULT])
+        parameters = [parse_parameter(parameter)
+                      for parameter in options_map.get("-p", [])]
+        workers = int(options_map.get("-w", [1])[-1])
+    except (GetoptError, ValueError):
+        print(USAGE)
+        exit(1)
+
+    base_configs = [options for source in sources
+                    for options in read_configs(source)]
+    sweep_configs = expand_parameters(base_configs, parameters)
+
+    run_sweep(sweep_configs, workers,
+              options_map.get("-o", [DEFAULT_SUMMARY_PATH])[-1],
+              "--synthetic" in options_map,
+              options_map.get("-d", [DEFAULT_OUTPUT_PATH])[-1])
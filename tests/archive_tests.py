@@ -0,0 +1,110 @@
+import io
+import json
+import unittest
+
+from os import path
+from pathlib import Path
+from shutil import rmtree
+from zipfile import ZipFile, ZIP_STORED
+
+from core.configuration import from_json_string
+from data.archive import iter_zip
+from data.display import get_image_directory, image_path
+from data.result_store import default_result_store
+from tests.helpers import coarse_options, TempOutputMixin
+
+import api
+
+# A directory in which files for these tests are written.
+ARCHIVE_DIR = "archive_test_files"
+
+
+class StreamingZipTest(unittest.TestCase):
+    """
+    A test class for zip archives written as a stream of bytes.
+    """
+
+    def setUp(self):
+        Path(ARCHIVE_DIR).mkdir(exist_ok=True)
+        self.paths = []
+        for index in range(3):
+            file_path = path.join(ARCHIVE_DIR, "{}.bin".format(index))
+            with open(file_path, "wb") as file:
+                file.write(bytes([index]) * 1000)
+            self.paths.append(file_path)
+
+    def tearDown(self):
+        rmtree(ARCHIVE_DIR)
+
+    def test_archive_contents(self):
+        archive = b"".join(iter_zip((file_path, path.basename(file_path))
+                                    for file_path in self.paths))
+
+        with ZipFile(io.BytesIO(archive)) as zip_file:
+            self.assertEqual(zip_file.namelist(),
+                             ["0.bin", "1.bin", "2.bin"])
+            self.assertEqual(zip_file.read("2.bin"), bytes([2]) * 1000)
+            for info in zip_file.infolist():
+                self.assertEqual(info.compress_type, ZIP_STORED)
+
+    def test_entries_consumed_lazily(self):
+        requested = []
+
+        def entries():
+            for file_path in self.paths:
+                requested.append(file_path)
+                yield file_path, path.basename(file_path)
+
+        chunks = iter_zip(entries())
+        first = next(chunks)
+
+        # The first file is sent before the second is requested.
+        self.assertIn(bytes([0]) * 1000, first)
+        self.assertEqual(requested, self.paths[:1])
+
+
+class MultiImageEndpointTest(TempOutputMixin, unittest.TestCase):
+    """
+    A test class for the API endpoint that returns every image of a
+    variable in a zip archive.
+    """
+
+    def setUp(self):
+        super().setUp()
+        self.client = api.app.test_client()
+
+        self.options = json.dumps(coarse_options((20, 40),
+                                                 aggregate_lat="before"))
+        self.run_id = from_json_string(self.options).run_id()
+
+    def test_streamed_archive(self):
+        self.client.post("/model/dataset", data=self.options)
+
+        # Place images for the average and for each of the four time
+        # segments, as they would have been rendered by an earlier request.
+        config = from_json_string(self.options)
+        run_path = default_result_store().run_path(self.run_id)
+        img_dir = get_image_directory(run_path, self.run_id, "delta_t",
+                                      config.colorbar())
+        for index in range(5):
+            with open(image_path(img_dir, "delta_t", index, config),
+                      "wb") as image_file:
+                image_file.write(bytes([index]) * 100)
+
+        response = self.client.post("/model/delta_t", data=self.options)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.content_type, "application/zip")
+
+        with ZipFile(io.BytesIO(response.get_data())) as zip_file:
+            names = zip_file.namelist()
+            self.assertEqual(len(names), 5)
+            self.assertEqual(zip_file.read(names[3]), bytes([3]) * 100)
+            self.assertTrue(all(info.compress_type == ZIP_STORED
+                                for info in zip_file.infolist()))
+
+        # No archive is left on disk.
+        self.assertEqual(list(Path(run_path).rglob("*.zip")), [])
+
+if __name__ == '__main__':
+    unittest.main()
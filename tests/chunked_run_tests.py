@@ -0,0 +1,132 @@
+import unittest
+
+import numpy as np
+
+from os import path
+from netCDF4 import Dataset
+
+from core.output_config import default_output_config
+from data.collector import ClimateDataCollector, GRID_CELL_BYTES
+from data.grid import GridDimensions
+from runner import ModelRun
+from tests.helpers import coarse_config, TempOutputMixin
+
+# Run IDs for model runs made by these tests, over whole grids and in bands
+# of latitude rows.
+WHOLE_RUN_ID = "whole_grid_test_run"
+CHUNKED_RUN_ID = "chunked_grid_test_run"
+
+# A memory budget, in megabytes, small enough that the model runs on a
+# single latitude row at a time.
+SMALL_BUDGET = 0.01
+
+
+def uniform_collector(grid: 'GridDimensions',
+                      segments: int = 2) -> 'ClimateDataCollector':
+    """
+    Returns a collector whose providers give uniform surface data on grid,
+    for the given number of time segments.
+    """
+    def temperature(dims, year):
+        return np.full((segments,) + dims.dims_by_count(), 15.0)
+
+    def humidity(dims, year):
+        return np.full((segments,) + dims.dims_by_count(), 50.0)
+
+    def albedo(dims):
+        return np.full((segments,) + dims.dims_by_count(), 0.3)
+
+    return ClimateDataCollector(grid) \
+        .use_temperature_source(temperature) \
+        .use_humidity_source(humidity) \
+        .use_albedo_source(albedo)
+
+
+class CollectorChunkTest(unittest.TestCase):
+    """
+    A test class for building grids one band of latitude rows at a time.
+    """
+
+    def test_chunk_matches_whole_grid(self):
+        collector = uniform_collector(GridDimensions((30, 60)))
+
+        def temperature(dims, year):
+            return np.arange(2 * 6 * 6, dtype=float).reshape((2, 6, 6))
+
+        collector.use_temperature_source(temperature)
+        whole = collector.get_gridded_data()
+        chunk = collector.get_gridded_chunk(1, slice(2, 4))
+
+        self.assertEqual(collector.segment_count(), 2)
+        self.assertEqual(chunk[0].dimensions().dims_by_count(), (2, 6))
+        np.testing.assert_array_equal(
+            chunk[0].extract_datapoint("temperature"),
+            whole[1][0].extract_datapoint("temperature")[2:4])
+
+    def test_chunk_rows(self):
+        collector = uniform_collector(GridDimensions((1, 1)))
+        provider_bytes = 3 * 2 * 180 * 360 * 8
+        row_bytes = 360 * GRID_CELL_BYTES
+
+        self.assertEqual(collector.chunk_rows(provider_bytes + 10 * row_bytes),
+                         10)
+        # At least one row, and at most the whole grid, is built at once.
+        self.assertEqual(collector.chunk_rows(0), 1)
+        self.assertEqual(collector.chunk_rows(1e12), 180)
+
+
+class ChunkedModelRunTest(TempOutputMixin, unittest.TestCase):
+    """
+    A test class for model runs under a memory budget, which compute and
+    write grids one band of latitude rows at a time.
+    """
+
+    def run_model(self: 'ChunkedModelRunTest',
+                  run_id: str,
+                  aggregation: str,
+                  memory_budget: float = None) -> list:
+        """
+        Run the model under the default configuration on a coarse grid,
+        with the given latitude aggregation and memory budget, and return
+        the results of each time segment along with the output dataset's
+        temperature changes.
+        """
+        config = coarse_config(aggregate_lat=aggregation)
+        config.set_run_id(run_id)
+
+        run = ModelRun(config, default_output_config(), memory_budget)
+        segments = list(run.iter_model())
+
+        dataset_path = path.join(self.output_dir, run_id, run_id + ".nc")
+        with Dataset(dataset_path) as dataset:
+            delta_t = np.array(dataset.variables["delta_t"][:])
+
+        return segments, delta_t
+
+    def test_same_output(self):
+        for aggregation in ["none", "before", "after"]:
+            whole, whole_delta_t = \
+                self.run_model(WHOLE_RUN_ID, aggregation)
+            chunked, chunked_delta_t = \
+                self.run_model(CHUNKED_RUN_ID, aggregation, SMALL_BUDGET)
+
+            np.testing.assert_array_equal(chunked_delta_t, whole_delta_t,
+                                          err_msg=aggregation)
+            self.assertEqual(len(chunked), len(whole))
+
+            for whole_seg, chunked_seg in zip(whole, chunked):
+                for var_name, value in whole_seg.stats.items():
+                    self.assertAlmostEqual(chunked_seg.stats[var_name],
+                                           value, places=9)
+
+                # Results kept in memory hold only latitude band means.
+                bands = whole_seg.grids[0].latitude_bands()
+                np.testing.assert_allclose(
+                    chunked_seg.grids[0].extract_datapoint("delta_t")
+                    .astype(float),
+                    bands.extract_datapoint("delta_t").astype(float),
+                    err_msg=aggregation)
+
+
+if __name__ == '__main__':
+    unittest.main()
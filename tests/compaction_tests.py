@@ -0,0 +1,157 @@
+import unittest
+
+import numpy as np
+
+from unittest import mock
+
+from core.configuration import InvalidConfigError
+from core.output_config import empty_output_config
+from data.collector import ClimateDataCollector
+from data.grid import GridCell, LatLongGrid, GridDimensions
+from runner import ModelRun
+from tests.helpers import coarse_config, TempOutputMixin
+
+# The cell widths of the default grid, on which Arrhenius' data has no
+# values over much of the polar regions.
+DEFAULT_DIMS = (10, 20)
+
+
+def northern_mask(grid: 'GridDimensions') -> np.ndarray:
+    """
+    A mask provider selecting the northern hemisphere.
+    """
+    lat_count, lon_count = grid.dims_by_count()
+    mask = np.zeros((lat_count, lon_count), dtype=bool)
+    mask[lat_count // 2:] = True
+    return mask
+
+
+class ValidCellsTest(unittest.TestCase):
+    """
+    A test class for finding the grid cells with valid data.
+    """
+
+    def test_valid_cells(self):
+        grid = LatLongGrid([[GridCell(10.0, 50.0, 0.3),
+                             GridCell(np.nan, 50.0, 0.3)],
+                            [None, GridCell(np.float32(5.0), 50.0, 0.3)]])
+
+        self.assertEqual(grid.valid_cells().tolist(),
+                         [True, False, False, True])
+
+
+class MaskConfigTest(unittest.TestCase):
+    """
+    A test class for the mask configuration option.
+    """
+
+    def test_default_mask(self):
+        self.assertIsNone(coarse_config(DEFAULT_DIMS).mask_provider())
+
+    def test_invalid_mask(self):
+        with self.assertRaises(InvalidConfigError):
+            coarse_config(DEFAULT_DIMS, mask_src="mountains")
+
+    def test_collector_mask(self):
+        def temperature(grid, year):
+            return np.full((2,) + grid.dims_by_count(), 15.0)
+
+        def albedo(grid):
+            return np.full((2,) + grid.dims_by_count(), 0.3)
+
+        grids = ClimateDataCollector(GridDimensions((30, 60))) \
+            .use_temperature_source(temperature) \
+            .use_humidity_source(temperature) \
+            .use_albedo_source(albedo) \
+            .use_mask_source(northern_mask) \
+            .get_gridded_data()
+
+        temps = grids[1][0].extract_datapoint("temperature")
+        self.assertTrue(np.isnan(temps[:3]).all())
+        self.assertTrue((temps[3:] == 15.0).all())
+
+
+class CompactedModelRunTest(TempOutputMixin, unittest.TestCase):
+    """
+    A test class for model runs that compute only cells with valid data.
+    """
+
+    @staticmethod
+    def run_model(mask=None) -> 'ModelRun':
+        """
+        Run the model under the default configuration, with an optional
+        mask provider, and return the finished model run.
+        """
+        run = ModelRun(coarse_config(DEFAULT_DIMS), empty_output_config())
+        if mask is not None:
+            run.collector.use_mask_source(mask)
+        run.run_model()
+        return run
+
+    @staticmethod
+    def results(run: 'ModelRun') -> np.ndarray:
+        """
+        Returns the final temperature and temperature change of every
+        surface cell after run.
+        """
+        return np.array([[(cell.get_temperature(),
+                           cell.get_temperature_change())
+                          for cell in grids[0]] for grids in run.grids],
+                        dtype=float)
+
+    def test_missing_cells_skipped(self):
+        run = self.run_model()
+        results = self.results(run)
+        counts = run.metrics.summary()["counts"]
+
+        missing = np.isnan(results[..., 0])
+        # Arrhenius' data has no values over much of the polar regions.
+        self.assertTrue(missing.any())
+        self.assertTrue(np.isnan(results[missing]).all())
+        self.assertEqual(counts["skipped_cells"], missing.sum())
+
+        # Each computed cell makes one transparency calculation for its
+        # initial state, and one for each feedback pass.
+        iterations = run.config.iterations()
+        self.assertEqual(counts["transparency_calls"],
+                         (~missing).sum() * (iterations + 2))
+
+    def test_masked_layer_skipped(self):
+        def layer(temperature: float) -> 'LatLongGrid':
+            return LatLongGrid([[GridCell(10.0, 50.0, 0.3),
+                                 GridCell(temperature, 50.0, 0.3)]])
+
+        column = [layer(12.0), layer(np.nan), layer(2.0)]
+        for pressure, grid in zip([1000, 850, 500], column):
+            grid.set_pressure(pressure)
+
+        run = ModelRun(coarse_config(DEFAULT_DIMS), empty_output_config())
+        with mock.patch.object(run, "calculate_layered_cell_temperature",
+                               return_value=[11.0, 9.0, 1.0]) as calculate:
+            run.compute_multilayer(column, 1, 2)
+
+        # The second column is masked in one layer only, but is left out
+        # along with every one of its layers.
+        calculate.assert_called_once()
+        self.assertEqual(list(calculate.call_args[0][4]),
+                         [next(iter(grid)) for grid in column])
+        self.assertEqual([grid.extract_datapoint("temperature")[0, 0]
+                          for grid in column], [11.0, 9.0, 1.0])
+        self.assertTrue(all(np.isnan(grid.extract_datapoint(
+            "temperature")[0, 1]) for grid in column))
+        self.assertEqual(run.metrics.summary()["counts"]["skipped_cells"], 3)
+
+    def test_masked_cells_skipped(self):
+        full = self.results(self.run_model())
+        masked = self.results(self.run_model(northern_mask))
+
+        # Cells are ordered from south to north.
+        southern = np.arange(len(full[0])) < len(full[0]) // 2
+
+        self.assertTrue(np.isnan(masked[:, southern]).all())
+        np.testing.assert_array_equal(masked[:, ~southern],
+                                      full[:, ~southern])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,114 @@
+import pickle
+import threading
+import unittest
+
+from concurrent.futures import ProcessPoolExecutor
+from os import path
+
+import core.configuration as cnf
+import core.output_config as out_cnf
+from core.context import RunContext, current_context
+from data.display import write_model_output
+from netCDF4 import Dataset
+from runner import ModelRun, run_in_context, print_solo_statistics
+from tests.helpers import TempOutputMixin
+
+# Run IDs for model runs made by these tests.
+TEST_RUN_IDS = ["context_test_run_0", "context_test_run_1"]
+
+
+def make_context(run_id: str) -> 'RunContext':
+    """
+    Returns a context with the default configuration under run_id, and an
+    output controller that writes only the dataset.
+    """
+    config = cnf.default_config()
+    config.set_run_id(run_id)
+    return RunContext(config, out_cnf.default_output_config())
+
+
+class RunContextTest(TempOutputMixin, unittest.TestCase):
+    """
+    A test class for model runs given an explicit context instead of the
+    thread's global configuration and output controller.
+    """
+
+    def test_pickle(self):
+        context = make_context(TEST_RUN_IDS[0])
+        copy = pickle.loads(pickle.dumps(context))
+
+        self.assertEqual(copy.config.run_id(), TEST_RUN_IDS[0])
+        self.assertEqual(copy.config.temp_provider(),
+                         context.config.temp_provider())
+        self.assertEqual(copy.output_center._output_tree.keys(),
+                         context.output_center._output_tree.keys())
+
+    def test_globals_untouched(self):
+        config = cnf.default_config()
+        output_center = out_cnf.empty_output_config()
+        cnf.set_configuration(config)
+        out_cnf.set_output_center(output_center)
+
+        context = make_context(TEST_RUN_IDS[0])
+        ModelRun(context.config, context.output_center).run_model()
+
+        self.assertIs(current_context().config, config)
+        self.assertIs(current_context().output_center, output_center)
+
+    def test_statistics_output(self):
+        tables = []
+        output_center = out_cnf.empty_output_config()
+        output_center.enable_output_type(out_cnf.ReportDatatype.REPORT_TEMP,
+                                         handler=tables.append)
+
+        run = ModelRun(make_context(TEST_RUN_IDS[0]).config,
+                       out_cnf.empty_output_config())
+        grids = [segment.grids[0] for segment in run.iter_model()]
+        print_solo_statistics(grids,
+                              RunContext(run.config, output_center))
+
+        self.assertEqual(len(tables), 1)
+
+    def test_write_output_fresh_thread(self):
+        context = make_context(TEST_RUN_IDS[0])
+        run = ModelRun(context.config, out_cnf.empty_output_config())
+        grids = [segment.grids[0] for segment in run.iter_model()]
+
+        output_center = out_cnf.default_output_config()\
+            .collection_controller(out_cnf.PRIMARY_OUTPUT_PATH)
+        errors = []
+        globals_set = []
+
+        def write():
+            try:
+                write_model_output(grids,
+                                   RunContext(context.config, output_center))
+            except Exception as e:
+                errors.append(e)
+            globals_set.append(hasattr(cnf.globals, "output"))
+
+        thread = threading.Thread(target=write)
+        thread.start()
+        thread.join()
+
+        self.assertEqual(errors, [])
+        self.assertEqual(globals_set, [False])
+
+        dataset_path = path.join(self.output_dir, TEST_RUN_IDS[0],
+                                 TEST_RUN_IDS[0] + ".nc")
+        with Dataset(dataset_path) as dataset:
+            for output_type in out_cnf.ReportDatatype:
+                self.assertIn(output_type.value, dataset.variables)
+
+    def test_process_pool(self):
+        contexts = [make_context(run_id) for run_id in TEST_RUN_IDS]
+        expected = run_in_context(contexts[0])
+
+        with ProcessPoolExecutor(max_workers=2) as executor:
+            results = list(executor.map(run_in_context, contexts))
+
+        self.assertEqual(results, [expected, expected])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,149 @@
+import unittest
+
+import numpy as np
+
+from unittest import mock
+
+from core.configuration import InvalidConfigError
+from core.output_config import empty_output_config
+from core.solvers import has_converged
+from data.grid import GridCell
+from runner import ModelRun
+from tests.helpers import coarse_config, TempOutputMixin
+
+
+class ConvergenceConfigTest(unittest.TestCase):
+    """
+    A test class for the feedback iteration configuration options.
+    """
+
+    def test_fixed_iterations(self):
+        config = coarse_config(iters=4)
+
+        self.assertEqual(config.iterations(), 4)
+        self.assertIsNone(config.convergence_tolerance())
+
+    def test_tolerance(self):
+        config = coarse_config(iters={"max": 12, "tol": 1e-3})
+
+        self.assertEqual(config.iterations(), 12)
+        self.assertEqual(config.convergence_tolerance(), 1e-3)
+
+    def test_invalid_tolerance(self):
+        with self.assertRaises(InvalidConfigError):
+            coarse_config(iters={"max": 12, "tol": 0})
+
+    def test_missing_max(self):
+        with self.assertRaises(InvalidConfigError):
+            coarse_config(iters={"tol": 1e-3})
+
+    def test_run_id_depends_on_tolerance(self):
+        fixed = coarse_config(iters=8)
+        tolerant = coarse_config(iters={"max": 8, "tol": 1e-3})
+
+        self.assertNotEqual(fixed.run_id(), tolerant.run_id())
+
+
+class HasConvergedTest(unittest.TestCase):
+    """
+    A test class for the convergence check between feedback passes.
+    """
+
+    def test_no_tolerance(self):
+        self.assertFalse(has_converged(280.0, 280.0, None))
+
+    def test_single_cell(self):
+        self.assertTrue(has_converged(280.0, 280.00001, 1e-4))
+        self.assertFalse(has_converged(280.0, 280.001, 1e-4))
+
+    def test_column(self):
+        previous = np.array([280.0, 250.0, 230.0])
+
+        self.assertTrue(has_converged(previous, previous + 1e-5, 1e-4))
+        self.assertFalse(has_converged(previous,
+                                       previous + [0, 1e-3, 0], 1e-4))
+
+    def test_missing_values(self):
+        self.assertTrue(has_converged(np.nan, np.nan, 1e-4))
+        self.assertTrue(has_converged(np.array([np.nan, 280.0]),
+                                      np.array([np.nan, 280.0]), 1e-4))
+
+
+class ConvergedModelRunTest(TempOutputMixin, unittest.TestCase):
+    """
+    A test class for model runs whose feedback iterations stop once each
+    grid cell converges.
+    """
+
+    def run_model(self: 'ConvergedModelRunTest',
+                  iters: object) -> 'ModelRun':
+        """
+        Run the model under the default configuration with iters as the
+        feedback iteration setting, and return the finished model run.
+        """
+        run = ModelRun(coarse_config(iters=iters), empty_output_config())
+        run.run_model()
+        return run
+
+    def test_matches_fixed_iterations(self):
+        fixed = self.run_model(30)
+        converged = self.run_model({"max": 30, "tol": 1e-4})
+
+        fixed_temps = np.array([cell.get_temperature()
+                                for grids in fixed.grids
+                                for cell in grids[0]])
+        converged_temps = np.array([cell.get_temperature()
+                                    for grids in converged.grids
+                                    for cell in grids[0]])
+        np.testing.assert_allclose(converged_temps, fixed_temps, atol=1e-3)
+
+        fixed_calls = fixed.metrics.summary()["counts"]["transparency_calls"]
+        converged_calls = \
+            converged.metrics.summary()["counts"]["transparency_calls"]
+        self.assertLess(converged_calls, fixed_calls)
+
+    def test_passes_reported(self):
+        run = self.run_model({"max": 30, "tol": 1e-4})
+        counts = run.metrics.summary()["counts"]
+
+        passes = {int(key.split(".")[1]): count
+                  for key, count in counts.items()
+                  if key.startswith("feedback_passes.")}
+        # Every cell with valid data in each of the four seasonal grids
+        # reports once.
+        self.assertEqual(sum(passes.values()),
+                         6 * 6 * 4 - counts["skipped_cells"])
+        self.assertLessEqual(max(passes), 31)
+        # Each cell makes one transparency calculation for its initial
+        # state, and one for each feedback pass.
+        self.assertEqual(counts["transparency_calls"],
+                         sum((num + 1) * count
+                             for num, count in passes.items()))
+
+
+class SingularColumnTest(unittest.TestCase):
+    """
+    A test class for multi-layer columns whose atmosphere matrix cannot be
+    solved, which keep their temperatures.
+    """
+
+    def test_passes_reported(self):
+        run = ModelRun(coarse_config(), empty_output_config())
+        column = (GridCell(10.0, 50.0, 0.3), GridCell(2.0, 50.0, 0.3),
+                  GridCell(-20.0, 40.0, 0.3))
+
+        with mock.patch("runner.calculate_modern_transparency",
+                        return_value=0.5), \
+                mock.patch("core.multilayer.calibrate_multilayer_matrix",
+                           side_effect=np.linalg.LinAlgError):
+            temperatures = run.calculate_layered_cell_temperature(
+                1, 2, [1000, 850], [[0, 1], [1, 2]], column, 3)
+
+        np.testing.assert_allclose(temperatures, [10.0] * 3)
+        # The column is still reported, after no feedback passes.
+        self.assertEqual(run.metrics.summary()["counts"]["feedback_passes.0"],
+                         1)
+
+
+if __name__ == '__main__':
+    unittest.main()
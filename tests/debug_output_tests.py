@@ -0,0 +1,103 @@
+import unittest
+
+import numpy as np
+
+from core.metrics import CellTrace
+from core.output_config import Debug, empty_output_config
+from runner import ModelRun
+from tests.helpers import coarse_config, TempOutputMixin
+
+# The cell widths of the default grid.
+DEFAULT_DIMS = (10, 20)
+
+
+class LazyOutputTest(unittest.TestCase):
+    """
+    A test class for output that is only produced when its type is enabled.
+    """
+
+    def setUp(self):
+        self.output_controller = empty_output_config()
+        self.produced = 0
+        self.received = []
+
+    def producer(self) -> str:
+        """
+        Produces a report, counting the number of reports produced.
+        """
+        self.produced += 1
+        return "report"
+
+    def test_is_enabled(self):
+        self.assertFalse(self.output_controller.is_enabled(
+            Debug.GRID_CELL_DELTA_TEMP))
+
+        self.output_controller.enable_output_type(Debug.GRID_CELL_DELTA_TEMP,
+                                                  handler=self.received.append)
+        self.assertTrue(self.output_controller.is_enabled(
+            Debug.GRID_CELL_DELTA_TEMP))
+
+    def test_lazy_output_disabled(self):
+        self.output_controller.submit_lazy_output(Debug.GRID_CELL_DELTA_TEMP,
+                                                  self.producer)
+
+        self.assertEqual(self.produced, 0)
+
+    def test_lazy_output_enabled(self):
+        self.output_controller.enable_output_type(Debug.GRID_CELL_DELTA_TEMP,
+                                                  handler=self.received.append)
+        self.output_controller.submit_lazy_output(Debug.GRID_CELL_DELTA_TEMP,
+                                                  self.producer)
+
+        self.assertEqual(self.produced, 1)
+        self.assertEqual(self.received, ["report"])
+
+
+class CellTraceTest(TempOutputMixin, unittest.TestCase):
+    """
+    A test class for per-cell traces of model runs.
+    """
+
+    def test_record(self):
+        trace = CellTrace((2, 3))
+        trace.record(4, 1.5, -0.01, 3)
+
+        self.assertEqual(trace.field("delta_t")[1, 1], 1.5)
+        self.assertEqual(trace.field("passes")[1, 1], 3)
+        self.assertEqual(trace.field("passes")[0, 0], -1)
+        self.assertTrue(np.isnan(trace.field("delta_transparency")[0, 0]))
+
+    def test_model_run_trace(self):
+        config = coarse_config(DEFAULT_DIMS)
+
+        traces = []
+        reports = []
+        output_controller = empty_output_config()
+        output_controller.enable_output_type(Debug.GRID_CELL_TRACE,
+                                             handler=traces.append)
+        output_controller.enable_output_type(Debug.GRID_CELL_DELTA_TEMP,
+                                             handler=reports.append)
+
+        run = ModelRun(config, output_controller)
+        run.run_model()
+
+        self.assertEqual(len(traces), len(run.grids))
+        for trace, grids in zip(traces, run.grids):
+            delta_t = np.array([cell.get_temperature_change()
+                                for cell in grids[0]], dtype=float)
+            traced = trace.records["delta_t"]
+
+            computed = ~np.isnan(traced)
+            np.testing.assert_allclose(traced[computed], delta_t[computed])
+            self.assertTrue((trace.records["passes"][computed] > 0).all())
+            # Raising CO2 lowers the transparency of the atmosphere.
+            self.assertTrue(
+                (trace.records["delta_transparency"][computed] < 0).all())
+
+        # One report is formatted for each computed cell.
+        self.assertEqual(len(reports), sum(
+            (~np.isnan(trace.records["delta_t"])).sum() for trace in traces))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,228 @@
+import unittest
+
+import numpy as np
+
+from os import path
+
+import core.configuration as cnf
+from core.ensemble import Perturbation, ensemble_members, perturb_members,\
+    ensemble_statistics, percentile_name, PERTURB_TEMPERATURE,\
+    PERTURB_HUMIDITY, PERTURB_ALBEDO
+from core.output_config import default_output_config
+from data.collector import ClimateDataCollector
+from data.result_store import default_result_store
+from runner import ModelRun
+from tests.helpers import coarse_config, TempOutputMixin
+
+# Run IDs for model runs made by these tests.
+SINGLE_RUN_ID = "single_ensemble_test_run"
+ENSEMBLE_RUN_ID = "ensemble_test_run"
+
+
+def cell_values(count: int,
+                seed: int = 0) -> dict:
+    """
+    Returns temperatures, in Kelvin, relative humidities, and albedos for
+    count grid cells, keyed by the name of each perturbed variable.
+    """
+    rng = np.random.default_rng(seed)
+    return {PERTURB_TEMPERATURE: rng.uniform(230, 320, count),
+            PERTURB_HUMIDITY: rng.uniform(0, 100, count),
+            PERTURB_ALBEDO: rng.uniform(0, 0.8, count)}
+
+
+class PerturbationTest(unittest.TestCase):
+    """
+    A test class for adding noise to the input data of ensemble members.
+    """
+
+    def test_no_noise(self):
+        values = cell_values(50)
+        perturbed = Perturbation(3).apply(0, values)
+
+        for var_name, data in values.items():
+            np.testing.assert_array_equal(perturbed[var_name], data)
+
+    def test_reproducible(self):
+        values = cell_values(50)
+        perturbation = Perturbation(3, temperature=1, humidity=5, albedo=0.1)
+
+        first = perturbation.apply(2, values)
+        second = Perturbation(3, temperature=1, humidity=5,
+                              albedo=0.1).apply(2, values)
+        other_segment = perturbation.apply(1, values)
+
+        for var_name in values:
+            np.testing.assert_array_equal(first[var_name], second[var_name])
+            self.assertFalse(np.array_equal(first[var_name],
+                                            other_segment[var_name]))
+
+    def test_bounds(self):
+        values = cell_values(500)
+        perturbed = Perturbation(0, temperature=10, humidity=50,
+                                 albedo=1).apply(0, values)
+
+        self.assertTrue(np.all(perturbed[PERTURB_HUMIDITY] >= 0))
+        self.assertTrue(np.all(perturbed[PERTURB_HUMIDITY] <= 100))
+        self.assertTrue(np.all(perturbed[PERTURB_ALBEDO] >= 0))
+        self.assertTrue(np.all(perturbed[PERTURB_ALBEDO] <= 1))
+        self.assertLess(np.min(perturbed[PERTURB_TEMPERATURE]), 230)
+
+    def test_invalid_scales(self):
+        with self.assertRaises(ValueError):
+            Perturbation(0, humidity=-1)
+        with self.assertRaises(ValueError):
+            ensemble_members(0)
+
+    def test_members(self):
+        members = ensemble_members(4, seed=10, temperature=0.5)
+
+        self.assertEqual([member.seed for member in members],
+                         [10, 11, 12, 13])
+        self.assertTrue(all(member.scales[PERTURB_TEMPERATURE] == 0.5
+                            for member in members))
+
+        stacked = perturb_members(members, 0, cell_values(20))
+        self.assertEqual(stacked[PERTURB_TEMPERATURE].shape, (4, 20))
+        np.testing.assert_array_equal(
+            stacked[PERTURB_TEMPERATURE][2],
+            members[2].apply(0, cell_values(20))[PERTURB_TEMPERATURE])
+
+
+class EnsembleStatisticsTest(unittest.TestCase):
+    """
+    A test class for summarizing ensemble results over their members.
+    """
+
+    def test_statistics(self):
+        results = np.arange(11, dtype=float)[:, np.newaxis] * [1, 2]
+        statistics = ensemble_statistics(results, (10, 50, 97.5))
+
+        self.assertEqual(list(statistics),
+                         ["mean", "spread", "p10", "p50", "p97.5"])
+        np.testing.assert_allclose(statistics["mean"], [5, 10])
+        np.testing.assert_allclose(statistics["spread"],
+                                   np.std(results, axis=0, ddof=1))
+        np.testing.assert_allclose(statistics["p10"], [1, 2])
+        np.testing.assert_allclose(statistics["p97.5"], [9.75, 19.5])
+
+    def test_one_member(self):
+        statistics = ensemble_statistics(np.array([[1.0, np.nan]]), ())
+
+        np.testing.assert_array_equal(statistics["spread"], [0, np.nan])
+        self.assertEqual(percentile_name(5), "p5")
+
+
+class EnsembleModelRunTest(TempOutputMixin, unittest.TestCase):
+    """
+    A test class for ensemble model runs.
+    """
+
+    @staticmethod
+    def model_run(run_id: str,
+                  **options) -> 'ModelRun':
+        """
+        Returns a model run on a coarse grid, with any of its options
+        replaced by options, on varied surface data.
+        """
+        options.setdefault("iters", {"max": 10, "tol": 0.001})
+        config = coarse_config((20, 40), **options)
+        config.set_run_id(run_id)
+
+        def temperature(dims, year):
+            temps = cell_values(2 * 9 * 9)[PERTURB_TEMPERATURE]\
+                .reshape(2, 9, 9) - 273.15
+            temps[0, 0, 0] = np.nan
+            return temps
+
+        def humidity(dims, year):
+            return cell_values(2 * 9 * 9)[PERTURB_HUMIDITY].reshape(2, 9, 9)
+
+        def albedo(dims):
+            return cell_values(2 * 9 * 9)[PERTURB_ALBEDO].reshape(2, 9, 9)
+
+        collector = ClimateDataCollector(config.grid()) \
+            .use_temperature_source(temperature) \
+            .use_humidity_source(humidity) \
+            .use_albedo_source(albedo)
+
+        return ModelRun(config, default_output_config(), collector=collector)
+
+    def test_unperturbed_member(self):
+        single_run = list(self.model_run(SINGLE_RUN_ID).iter_model())
+        ensemble_run = list(self.model_run(ENSEMBLE_RUN_ID)
+                            .iter_ensemble([Perturbation(0)] * 3))
+
+        self.assertEqual(len(ensemble_run), len(single_run))
+        for single_seg, ensemble_seg in zip(single_run, ensemble_run):
+            statistics = ensemble_seg.statistics["delta_t"]
+            expected = single_seg.grids[0].extract_datapoint("delta_t")\
+                .astype(float)
+
+            np.testing.assert_allclose(statistics["mean"], expected,
+                                       rtol=1e-5)
+            np.testing.assert_allclose(statistics["p50"], expected,
+                                       rtol=1e-5)
+            np.testing.assert_allclose(statistics["spread"],
+                                       np.where(np.isnan(expected),
+                                                np.nan, 0), atol=1e-12)
+
+    def test_perturbed_members(self):
+        run = self.model_run(ENSEMBLE_RUN_ID)
+        members = ensemble_members(20, temperature=2, humidity=10)
+        results = list(run.iter_ensemble(members, percentiles=(5, 95)))
+        statistics = results[0].statistics["delta_t"]
+
+        self.assertEqual(list(statistics), ["mean", "spread", "p5", "p95"])
+        self.assertEqual(statistics["mean"].shape, (9, 9))
+        self.assertTrue(np.isnan(statistics["mean"][0, 0]))
+
+        valid = ~np.isnan(statistics["mean"])
+        self.assertTrue(np.all(statistics["spread"][valid] > 0))
+        self.assertTrue(np.all(statistics["p5"][valid]
+                               <= statistics["mean"][valid]))
+        self.assertTrue(np.all(statistics["mean"][valid]
+                               <= statistics["p95"][valid]))
+
+        from netCDF4 import Dataset
+        run_id = run.config.ensemble_run_id(members, (5, 95))
+        self.assertTrue(default_result_store().contains(run_id))
+        dataset_path = path.join(self.output_dir, run_id,
+                                 run_id + "_ensemble.nc")
+        with Dataset(dataset_path) as dataset:
+            self.assertEqual(dataset["delta_t_spread"].shape,
+                             (len(results), 9, 9))
+            np.testing.assert_allclose(dataset["delta_t_p95"][0],
+                                       statistics["p95"], rtol=1e-5)
+
+    def test_run_ids(self):
+        config = self.model_run(ENSEMBLE_RUN_ID).config
+        members = ensemble_members(3, humidity=10)
+        run_id = config.ensemble_run_id(members, (5, 95))
+
+        self.assertEqual(run_id, config.ensemble_run_id(
+            ensemble_members(3, humidity=10.0), [5.0, 95.0]))
+        self.assertNotEqual(run_id, config.ensemble_run_id(
+            ensemble_members(3, seed=1, humidity=10), (5, 95)))
+        self.assertNotEqual(run_id, config.ensemble_run_id(
+            ensemble_members(3, humidity=5), (5, 95)))
+        self.assertNotEqual(run_id, config.ensemble_run_id(members, (50,)))
+        self.assertNotEqual(run_id, config.run_id())
+
+    def test_latitude_bands(self):
+        run = self.model_run(ENSEMBLE_RUN_ID, aggregate_lat="after")
+        results = list(run.iter_ensemble(ensemble_members(5, humidity=10)))
+
+        self.assertEqual(results[0].statistics["delta_t"]["p50"].shape,
+                         (9, 1))
+
+    def test_unsupported_mode(self):
+        run = self.model_run(ENSEMBLE_RUN_ID, kernel=cnf.KERNEL_NUMPY,
+                             solver="aitken")
+
+        with self.assertRaises(ValueError):
+            next(run.iter_ensemble(ensemble_members(2)))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,6 +1,8 @@
 import unittest
+import numpy as np
 from data.grid import GridDimensions, GridCell, LatLongGrid,\
-    extract_multidimensional_grid_variable
+    extract_multidimensional_grid_variable, band_mean, latitude_weights
+from data.statistics import convert_grid_data_to_table, mean
 
 
 class GridDimensionsTest(unittest.TestCase):
@@ -711,3 +713,112 @@ class GridObjectTest(unittest.TestCase):
                                  grid0_temp_expected[i][j])
                 self.assertEqual(temp_data[1][i][j],
                                  grid1_temp_expected[i][j])
+
+
+class BandMeanTest(unittest.TestCase):
+    """
+    A test class for reductions over latitude bands and other grid axes.
+    Ensures that missing values are ignored, and that weights and axes are
+    applied correctly.
+    """
+
+    def test_mean_along_longitude(self):
+        data = np.array([[1.0, 2.0, 3.0],
+                         [4.0, 6.0, 8.0]])
+
+        np.testing.assert_allclose(band_mean(data), [2.0, 6.0])
+
+    def test_missing_values_ignored(self):
+        data = np.array([[1.0, np.nan, 3.0],
+                         [None, 6.0, None],
+                         [np.nan, np.nan, np.nan]], dtype=object)
+
+        np.testing.assert_allclose(band_mean(data), [2.0, 6.0, np.nan])
+
+    def test_masked_values_ignored(self):
+        data = np.ma.masked_array([[1.0, 100.0, 3.0]],
+                                  mask=[[False, True, False]])
+
+        np.testing.assert_allclose(band_mean(data), [2.0])
+
+    def test_any_axis(self):
+        data = np.arange(2 * 3 * 4 * 5, dtype=float).reshape((2, 3, 4, 5))
+
+        for axis in range(data.ndim):
+            np.testing.assert_allclose(band_mean(data, axis=axis),
+                                       data.mean(axis=axis))
+
+    def test_weights(self):
+        data = np.array([[1.0, 3.0],
+                         [np.nan, 5.0]])
+
+        np.testing.assert_allclose(band_mean(data, axis=0,
+                                             weights=[1.0, 3.0]),
+                                   [1.0, 4.5])
+
+    def test_latitude_weights(self):
+        weights = latitude_weights(4)
+
+        np.testing.assert_allclose(weights,
+                                   np.cos(np.radians([-67.5, -22.5,
+                                                      22.5, 67.5])))
+
+    def test_area_weighted_mean(self):
+        # Polar bands cover less of the surface than equatorial bands.
+        data = np.array([[1.0, 1.0], [3.0, np.nan],
+                         [3.0, 3.0], [1.0, None]])
+        weights = latitude_weights(4)
+        expected = (2 * weights[0] + 3 * weights[1] + 6 * weights[2]
+                    + weights[3]) / (2 * weights[0] + weights[1]
+                                     + 2 * weights[2] + weights[3])
+
+        self.assertAlmostEqual(mean(data, lat_axis=0), expected)
+        self.assertAlmostEqual(mean(data.T, lat_axis=1), expected)
+        self.assertAlmostEqual(mean(data), 2.0)
+
+    def test_latitude_bands(self):
+        cells = [[GridCell(10, 20, 0.2), GridCell(20, 40, 0.4),
+                  GridCell(np.nan, 90, 0.9)],
+                 [GridCell(5, 50, 0.1), None, GridCell(15, 70, 0.3)]]
+        for row in cells:
+            for cell in row:
+                if cell is not None:
+                    cell.set_temperature(cell.get_temperature() + 2)
+
+        bands = LatLongGrid(cells, 500.0).latitude_bands()
+        south = bands.get_coord(0, 0)
+        north = bands.get_coord(1, 0)
+
+        self.assertEqual(bands.dimensions().dims_by_count(), (2, 1))
+        self.assertEqual(bands.get_pressure(), 500.0)
+        self.assertAlmostEqual(south.get_temperature(), 17)
+        self.assertAlmostEqual(south.get_temperature_change(), 2)
+        self.assertAlmostEqual(south.get_relative_humidity(), 30)
+        self.assertAlmostEqual(south.get_albedo(), 0.3)
+        self.assertAlmostEqual(north.get_temperature(), 12)
+        self.assertAlmostEqual(north.get_relative_humidity(), 60)
+
+    def test_latitude_bands_missing_variables(self):
+        cells = [[GridCell(10, None, 0.2), GridCell(20, None, 0.4)],
+                 [GridCell(np.nan, None, 0.1), GridCell(np.nan, None, 0.1)],
+                 [None, None]]
+
+        bands = LatLongGrid(cells).latitude_bands()
+
+        self.assertIsNone(bands.get_coord(0, 0).get_relative_humidity())
+        self.assertAlmostEqual(bands.get_coord(0, 0).get_albedo(), 0.3)
+        self.assertTrue(np.isnan(bands.get_coord(1, 0).get_temperature()))
+        self.assertIsNone(bands.get_coord(2, 0))
+
+    def test_table_matches_band_means(self):
+        data = np.random.default_rng(0).normal(size=(2, 3, 4, 5))
+        data[data > 1] = np.nan
+
+        table = convert_grid_data_to_table(data)
+
+        self.assertEqual(table.shape, (4, 6))
+        for outer in range(2):
+            for time_seg in range(3):
+                np.testing.assert_allclose(
+                    table[:, outer * 3 + time_seg],
+                    np.nanmean(data[outer, time_seg], axis=-1))
@@ -1,7 +1,101 @@
-from typing import List
+import json
+
+from contextlib import contextmanager
+from typing import List, Iterator, Tuple
 from math import floor, log10
+from shutil import rmtree
+from tempfile import mkdtemp
+from unittest import mock
 import numpy as np
 
+from core.configuration import from_json_string, JSON_DEFAULT
+from data.access_log import AccessLog
+from data.result_store import ResultStore
+
+# The number of latitude and longitude cells in grids for test model runs,
+# which are coarse enough to compute quickly.
+COARSE_DIMS = (30, 60)
+
+
+def coarse_options(dims: Tuple[int, int] = COARSE_DIMS,
+                   **overrides) -> dict:
+    """
+    Returns the options of the default configuration, on a grid with cells
+    of the widths given by dims and without latitude aggregation, with any
+    options replaced by those given as keyword arguments.
+
+    :param dims:
+        The width of grid cells in degrees of latitude and longitude
+    :param overrides:
+        Configuration options that replace the defaults
+    :return:
+        A dictionary of configuration options
+    """
+    with open(JSON_DEFAULT, "r") as default_file:
+        options = json.load(default_file)
+
+    options["grid"] = {"dims": {"lat": dims[0], "lon": dims[1]},
+                       "repr": "width"}
+    options["aggregate_lat"] = "none"
+    options.update(overrides)
+
+    return options
+
+
+def coarse_config(dims: Tuple[int, int] = COARSE_DIMS,
+                  **overrides) -> 'ArrheniusConfig':
+    """
+    Returns a configuration built from coarse_options, given the same
+    arguments.
+
+    :param dims:
+        The width of grid cells in degrees of latitude and longitude
+    :param overrides:
+        Configuration options that replace the defaults
+    :return:
+        A configuration for a quick model run
+    """
+    return from_json_string(json.dumps(coarse_options(dims, **overrides)))
+
+
+@contextmanager
+def temp_output() -> Iterator[str]:
+    """
+    Direct model output, the result store, and the access log to a new
+    temporary directory for the duration of the context, instead of the
+    standard output directory. The directory and everything written to it
+    are removed once the context exits.
+
+    :return:
+        The path to the temporary output directory
+    """
+    output_dir = mkdtemp(prefix="arrhenius_output_")
+
+    try:
+        with mock.patch("data.display.OUTPUT_FULL_PATH", output_dir), \
+                mock.patch("data.result_store._default_store",
+                           ResultStore(output_dir)), \
+                mock.patch("data.access_log._default_log",
+                           AccessLog(output_dir)):
+            yield output_dir
+    finally:
+        rmtree(output_dir, ignore_errors=True)
+
+
+class TempOutputMixin:
+    """
+    A mixin for test cases that run the model, which writes the output of
+    each test to its own temporary directory through temp_output. The
+    directory's path is available as output_dir.
+    """
+
+    def setUp(self) -> None:
+        super().setUp()
+
+        context = temp_output()
+        self.output_dir = context.__enter__()
+        self.addCleanup(context.__exit__, None, None, None)
+
 
 def latitude_band_avg(grid: 'LatLongGrid',
                       lat: int) -> None:
@@ -0,0 +1,48 @@
+import json
+import subprocess
+import unittest
+
+from sys import executable
+
+from data.resources import MAIN_PATH
+
+# Slow-loading dependencies that should only be imported when first used.
+DEFERRED_MODULES = ["netCDF4", "pyresample", "matplotlib",
+                    "mpl_toolkits.basemap", "lowtran", "jsonschema", "numba"]
+
+
+def loaded_after(statement: str) -> list:
+    """
+    Returns the names of deferred modules that have been loaded after
+    executing statement in a fresh Python process.
+    """
+    check = "import sys, json; {}; " \
+            "print(json.dumps([name for name in {} if name in sys.modules]))"\
+        .format(statement, json.dumps(DEFERRED_MODULES))
+    completed = subprocess.run([executable, "-c", check], cwd=MAIN_PATH,
+                               stdout=subprocess.PIPE, check=True,
+                               universal_newlines=True)
+    return json.loads(completed.stdout.splitlines()[-1])
+
+
+class DeferredImportTest(unittest.TestCase):
+    """
+    A test class to ensure that importing the model's entry points does not
+    load slow dependencies that are not yet needed.
+    """
+
+    def test_runner(self):
+        self.assertEqual(loaded_after("import runner"), [])
+
+    def test_api(self):
+        self.assertEqual(loaded_after("import api"), [])
+
+    def test_deferred_import_on_use(self):
+        loaded = loaded_after(
+            "import core.configuration as cnf; "
+            "cnf.from_json_string(open(cnf.JSON_DEFAULT).read())")
+        self.assertEqual(loaded, ["jsonschema"])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,263 @@
+import unittest
+
+import numpy as np
+
+from importlib.util import find_spec
+
+import core.configuration as cnf
+import core.kernels as kernels
+from core.cell_operations import calculate_transparency
+from core.output_config import default_output_config
+from core.solvers import picard
+from data.collector import ClimateDataCollector
+from runner import ModelRun, calibrate_constant, get_new_temperature
+from tests.helpers import coarse_config, TempOutputMixin
+
+# Weight functions, with the name of each in configuration files.
+WEIGHT_FUNCS = {
+    cnf.WEIGHT_BY_PROXIMITY: cnf.weight_by_mean,
+    cnf.WEIGHT_TO_CLOSEST: cnf.weight_by_closest,
+    cnf.WEIGHT_TO_LOWEST: cnf.weight_by_lowest,
+    cnf.WEIGHT_TO_HIGHEST: cnf.weight_by_highest,
+}
+
+
+def random_cells(count: int,
+                 seed: int = 0) -> tuple:
+    """
+    Returns temperatures, in Kelvin, relative humidities, and albedos for
+    count grid cells, spanning the range of Earth's surface conditions.
+    """
+    rng = np.random.default_rng(seed)
+    return rng.uniform(230, 320, count), rng.uniform(0, 100, count), \
+        rng.uniform(0, 0.8, count)
+
+
+def scalar_feedback(init_co2: float,
+                    new_co2: float,
+                    temperature: float,
+                    relative_humidity: float,
+                    albedo: float,
+                    co2_weight_func: 'WeightFunc',
+                    h2o_weight_func: 'WeightFunc',
+                    max_passes: int,
+                    tolerance: float = None,
+                    start: float = None) -> tuple:
+    """
+    Solve the feedback loop for one cell with the scalar functions, as
+    calculate_arr_cell_temperature does, starting from start if given, and
+    return the final temperature, the initial and final transparencies,
+    and the number of passes.
+    """
+    transparency = calculate_transparency(init_co2, temperature,
+                                          relative_humidity,
+                                          co2_weight_func, h2o_weight_func)
+    k = calibrate_constant(temperature, albedo, transparency)
+    new_transparency = transparency
+
+    def feedback(cell_temperature):
+        nonlocal new_transparency
+        new_transparency = calculate_transparency(new_co2, cell_temperature,
+                                                  relative_humidity,
+                                                  co2_weight_func,
+                                                  h2o_weight_func)
+        return get_new_temperature(albedo, new_transparency, k)
+
+    final, passes = picard(feedback,
+                           temperature if start is None else start,
+                           max_passes, tolerance)
+    return final, transparency, new_transparency, passes
+
+
+class KernelEquivalenceTest(unittest.TestCase):
+    """
+    A test class ensuring that each kernel backend gives the same results
+    as the scalar cell functions.
+    """
+
+    def backends(self) -> dict:
+        """
+        Returns each kernel backend that can run here, by name. The loop
+        behind the numba backend is tested as plain Python if numba is not
+        installed.
+        """
+        def loop(init_co2, new_co2, temperature, relative_humidity, albedo,
+                 co2_mode, h2o_mode, max_passes, tolerance=None, start=None):
+            *result, valid = kernels._loop_table_feedback(
+                init_co2, new_co2, kernels.mean_path_row(init_co2),
+                kernels.mean_path_row(new_co2), temperature,
+                relative_humidity, albedo,
+                temperature if start is None else start, co2_mode, h2o_mode,
+                max_passes,
+                np.nan if tolerance is None else tolerance,
+                kernels.TABLE_CO2, kernels.TABLE_H2O, kernels.TABLE_VALUES,
+                kernels.MEAN_PATH_H2O)
+            if not valid:
+                raise AttributeError
+            return tuple(result)
+
+        backends = {"numpy": kernels.numpy_table_feedback, "loop": loop}
+        if find_spec("numba") is not None:
+            backends["numba"] = kernels.numba_table_feedback
+        return backends
+
+    def assert_equivalent(self, init_co2, new_co2, cells, co2_weight,
+                          h2o_weight, max_passes, tolerance=None):
+        temperature, relative_humidity, albedo = cells
+        co2_weight_func = WEIGHT_FUNCS[co2_weight]
+        h2o_weight_func = WEIGHT_FUNCS[h2o_weight]
+
+        expected = [scalar_feedback(init_co2, new_co2, *cell,
+                                    co2_weight_func, h2o_weight_func,
+                                    max_passes, tolerance)
+                    for cell in zip(*cells)]
+        expected = [np.array(values) for values in zip(*expected)]
+
+        for name, backend in self.backends().items():
+            result = backend(init_co2, new_co2, temperature,
+                             relative_humidity, albedo,
+                             kernels.weight_mode(co2_weight_func),
+                             kernels.weight_mode(h2o_weight_func),
+                             max_passes, tolerance)
+
+            message = "{} backend, {}/{} weights".format(name, co2_weight,
+                                                         h2o_weight)
+            for values, expected_values in zip(result[:3], expected[:3]):
+                np.testing.assert_allclose(values, expected_values,
+                                           rtol=1e-12, err_msg=message)
+            np.testing.assert_array_equal(result[3], expected[3],
+                                          err_msg=message)
+
+    def test_weight_functions(self):
+        cells = random_cells(200)
+        for co2_weight in WEIGHT_FUNCS:
+            for h2o_weight in WEIGHT_FUNCS:
+                self.assert_equivalent(1.0, 2.0, cells, co2_weight,
+                                       h2o_weight, 4)
+
+    def test_convergence(self):
+        cells = random_cells(200, seed=1)
+        for tolerance in [1e-6, 0.05, 10.0]:
+            self.assert_equivalent(1.0, 3.0, cells, cnf.WEIGHT_BY_PROXIMITY,
+                                   cnf.WEIGHT_BY_PROXIMITY, 30, tolerance)
+
+    def test_table_edges(self):
+        # Dry, cold cells fall below the tables, and humid, hot cells
+        # above them.
+        cells = (np.array([230.0, 250.0, 320.0, 330.0, 300.0]),
+                 np.array([0.0, 1.0, 100.0, 100.0, 50.0]),
+                 np.array([0.0, 0.5, 0.1, 1.0, 0.3]))
+        for co2 in [0.67, 1.5, 3.0]:
+            self.assert_equivalent(1.0, co2, cells, cnf.WEIGHT_BY_PROXIMITY,
+                                   cnf.WEIGHT_TO_CLOSEST, 3)
+
+    def test_warm_start(self):
+        temperature, relative_humidity, albedo = random_cells(100, seed=2)
+        start = temperature + 1.5
+        co2_func = WEIGHT_FUNCS[cnf.WEIGHT_BY_PROXIMITY]
+
+        expected = [scalar_feedback(1.0, 2.0, *cell, co2_func, co2_func, 30,
+                                    1e-6, cell_start)
+                    for *cell, cell_start in zip(temperature,
+                                                 relative_humidity, albedo,
+                                                 start)]
+        expected = [np.array(values) for values in zip(*expected)]
+
+        for name, backend in self.backends().items():
+            result = backend(1.0, 2.0, temperature, relative_humidity,
+                             albedo, kernels.WEIGHT_MEAN, kernels.WEIGHT_MEAN,
+                             30, 1e-6, start)
+            np.testing.assert_allclose(result[0], expected[0], rtol=1e-12,
+                                       err_msg=name)
+            np.testing.assert_array_equal(result[3], expected[3],
+                                          err_msg=name)
+
+            # Starting from converged temperatures takes a single pass.
+            # Some cells alternate between table entries, and never
+            # converge.
+            converged = result[3] < 30
+            warm = backend(1.0, 2.0, temperature, relative_humidity, albedo,
+                           kernels.WEIGHT_MEAN, kernels.WEIGHT_MEAN, 30,
+                           1e-6, result[0])
+            np.testing.assert_allclose(warm[0][converged],
+                                       result[0][converged], atol=1e-5,
+                                       err_msg=name)
+            self.assertTrue(np.all(warm[3][converged] == 1), msg=name)
+
+    def test_invalid_input(self):
+        temperature, relative_humidity, albedo = random_cells(10)
+        relative_humidity[3] = 120
+
+        for name, backend in self.backends().items():
+            with self.assertRaises(AttributeError, msg=name):
+                backend(1.0, 2.0, temperature, relative_humidity, albedo,
+                        kernels.WEIGHT_MEAN, kernels.WEIGHT_MEAN, 2)
+            with self.assertRaises(AttributeError, msg=name):
+                backend(1.0, 1.44, *random_cells(10),
+                        kernels.WEIGHT_MEAN, kernels.WEIGHT_MEAN, 2)
+
+    def test_table_kernel(self):
+        self.assertIsNone(kernels.table_kernel(cnf.KERNEL_PYTHON))
+        self.assertIs(kernels.table_kernel(cnf.KERNEL_NUMPY),
+                      kernels.numpy_table_feedback)
+
+        expected = kernels.numpy_table_feedback \
+            if find_spec("numba") is None else kernels.numba_table_feedback
+        self.assertIs(kernels.table_kernel(cnf.KERNEL_NUMBA), expected)
+
+
+class KernelModelRunTest(TempOutputMixin, unittest.TestCase):
+    """
+    A test class ensuring that model runs give the same results under the
+    python and numpy kernel backends.
+    """
+
+    @staticmethod
+    def run_model(kernel: str) -> list:
+        """
+        Run the model under the default configuration with the given kernel
+        backend, on varied surface data, and return the results of each
+        time segment.
+        """
+        config = coarse_config((20, 40), iters={"max": 10, "tol": 0.001},
+                               kernel=kernel)
+
+        def temperature(dims, year):
+            temps = random_cells(2 * 9 * 9)[0].reshape(2, 9, 9) - 273.15
+            temps[0, 0, 0] = np.nan
+            return temps
+
+        def humidity(dims, year):
+            return random_cells(2 * 9 * 9)[1].reshape(2, 9, 9)
+
+        def albedo(dims):
+            return random_cells(2 * 9 * 9)[2].reshape(2, 9, 9)
+
+        collector = ClimateDataCollector(config.grid()) \
+            .use_temperature_source(temperature) \
+            .use_humidity_source(humidity) \
+            .use_albedo_source(albedo)
+
+        run = ModelRun(config, default_output_config(), collector=collector)
+        return list(run.iter_model())
+
+    def test_same_results(self):
+        python_run = self.run_model(cnf.KERNEL_PYTHON)
+        numpy_run = self.run_model(cnf.KERNEL_NUMPY)
+
+        self.assertEqual(len(numpy_run), len(python_run))
+        for python_seg, numpy_seg in zip(python_run, numpy_run):
+            for var_name in ["temperature", "delta_t"]:
+                np.testing.assert_allclose(
+                    numpy_seg.grids[0].extract_datapoint(var_name)
+                    .astype(float),
+                    python_seg.grids[0].extract_datapoint(var_name)
+                    .astype(float), rtol=1e-9, err_msg=var_name)
+
+    def test_run_id_unchanged(self):
+        self.assertEqual(coarse_config(kernel=cnf.KERNEL_NUMBA).run_id(),
+                         coarse_config().run_id())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,130 @@
+import unittest
+
+import numpy as np
+
+from data.grid import GridCell, LatLongGrid, level_groups, \
+    pressure_thickness, merge_levels
+from runner import multigrid_level_layers
+
+
+def level_grid(temps: list,
+               r_hum: float,
+               pressure: float,
+               delta_t: float = 0.0) -> 'LatLongGrid':
+    """
+    Returns a grid with one row holding a cell for each temperature in
+    temps, all with relative humidity r_hum, at the given pressure. Each
+    cell's temperature is then raised by delta_t.
+    """
+    cells = [GridCell(temp, r_hum, None) for temp in temps]
+    for cell in cells:
+        cell.set_temperature(cell.get_temperature() + delta_t)
+
+    return LatLongGrid([cells], pressure)
+
+
+class LevelGroupTest(unittest.TestCase):
+    """
+    A test class for dividing atmospheric levels into layers.
+    """
+
+    def test_groups(self):
+        groups = level_groups(13, 4)
+
+        self.assertEqual([group.stop - group.start for group in groups],
+                         [4, 3, 3, 3])
+        self.assertEqual(groups[0].start, 0)
+        self.assertEqual(groups[-1].stop, 13)
+
+    def test_fewer_levels_than_layers(self):
+        self.assertEqual(level_groups(3, 5),
+                         [slice(0, 1), slice(1, 2), slice(2, 3)])
+
+    def test_pressure_thickness(self):
+        np.testing.assert_allclose(pressure_thickness([1000, 900, 500, 500]),
+                                   [13.25, 100, 400, 0])
+
+
+class MergeLevelsTest(unittest.TestCase):
+    """
+    A test class for merging grids of adjacent atmospheric levels.
+    """
+
+    def test_weighted_means(self):
+        grids = [level_grid([10, 0], 60, 900, delta_t=1),
+                 level_grid([-20, -30], 20, 500, delta_t=4)]
+
+        merged = merge_levels(grids, [1, 3])
+        cell = merged.get_coord(0, 0)
+
+        self.assertEqual(merged.get_pressure(), 500)
+        self.assertEqual(merged.dimensions().dims_by_count(), (1, 2))
+        self.assertAlmostEqual(cell.get_temperature(), -9.25)
+        self.assertAlmostEqual(cell.get_temperature_change(), 3.25)
+        self.assertAlmostEqual(cell.get_relative_humidity(), 30)
+        self.assertIsNone(cell.get_albedo())
+
+    def test_missing_values(self):
+        grids = [level_grid([np.nan, np.nan, 5], 50, 900),
+                 level_grid([-10, np.nan, 5], 10, 500)]
+        grids[0].set_coord(0, 2, None)
+        grids[1].set_coord(0, 2, None)
+
+        merged = merge_levels(grids, [1, 1])
+
+        self.assertAlmostEqual(merged.get_coord(0, 0).get_temperature(), -10)
+        self.assertAlmostEqual(
+            merged.get_coord(0, 0).get_relative_humidity(), 10)
+        self.assertTrue(np.isnan(merged.get_coord(0, 1).get_temperature()))
+        self.assertIsNone(merged.get_coord(0, 2))
+
+    def test_keeps_precision(self):
+        grids = [level_grid([np.float32(10)], 50, 900),
+                 level_grid([np.float32(20)], 50, 800)]
+
+        merged = merge_levels(grids, [1, 1])
+
+        self.assertIsInstance(merged.get_coord(0, 0).get_temperature(),
+                              np.float32)
+
+
+class LevelLayersTest(unittest.TestCase):
+    """
+    A test class for merging the levels of columns of grids into layers.
+    """
+
+    def setUp(self):
+        self.pressures = [1000, 850, 700, 500, 300]
+        self.surface = level_grid([15], None, None)
+        self.column = [self.surface] + \
+            [level_grid([10 - 10 * i], 50 - 10 * i, pressure)
+             for i, pressure in enumerate(self.pressures)]
+
+    def test_layers(self):
+        merged = multigrid_level_layers(self.column, 2)
+
+        self.assertEqual(len(merged), 3)
+        self.assertIs(merged[0], self.surface)
+        self.assertEqual([grid.get_pressure() for grid in merged[1:]],
+                         [700, 300])
+
+        # The lower layer's levels are 13.25, 150, and 150 mb thick.
+        expected = (13.25 * 10 + 150 * 0 + 150 * -10) / 313.25
+        self.assertAlmostEqual(merged[1].get_coord(0, 0).get_temperature(),
+                               expected)
+        self.assertAlmostEqual(merged[2].get_coord(0, 0).get_temperature(),
+                               -25)
+
+    def test_time_segments(self):
+        merged = multigrid_level_layers([self.column, self.column], 3)
+
+        self.assertEqual([len(column) for column in merged], [4, 4])
+
+    def test_enough_layers(self):
+        self.assertIs(multigrid_level_layers(self.column, 5), self.column)
+        self.assertEqual(multigrid_level_layers([[self.surface]], 1),
+                         [[self.surface]])
+
+
+if __name__ == '__main__':
+    unittest.main()
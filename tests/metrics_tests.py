@@ -0,0 +1,127 @@
+import unittest
+
+from core.output_config import Metrics, empty_output_config, \
+    default_output_config
+from core.metrics import MetricsRecorder
+from runner import ModelRun
+from tests.helpers import coarse_config, TempOutputMixin
+
+
+class MetricsRecorderTest(unittest.TestCase):
+    """
+    A test class for MetricsRecorder. Uses an output controller whose
+    handlers store submitted measurements, to ensure that measurements are
+    accumulated and reported under the right output types.
+    """
+
+    def setUp(self):
+        self.output_controller = empty_output_config()
+        self.received = []
+
+        for metric in Metrics:
+            self.output_controller.enable_output_type(
+                metric, handler=self.receive_metric(metric))
+
+    def receive_metric(self: 'MetricsRecorderTest',
+                       metric: 'Metrics'):
+        """
+        Returns a handler function that records output of type metric.
+        """
+        def handler(data: object, label: str = None) -> None:
+            self.received.append((metric, data, label))
+
+        return handler
+
+    def test_time_submits_immediately(self):
+        recorder = MetricsRecorder(self.output_controller)
+
+        with recorder.time(Metrics.PROVIDER_TIME, "temperature"):
+            pass
+
+        self.assertEqual(len(self.received), 1)
+        metric, elapsed, label = self.received[0]
+        self.assertEqual(metric, Metrics.PROVIDER_TIME)
+        self.assertEqual(label, "provider_time.temperature")
+        self.assertGreaterEqual(elapsed, 0)
+
+    def test_time_accumulates(self):
+        recorder = MetricsRecorder(self.output_controller)
+
+        recorder.add_time(Metrics.SEGMENT_TIME, 1.5)
+        recorder.add_time(Metrics.SEGMENT_TIME, 2.0)
+
+        timings = recorder.summary()["timings"]
+        self.assertEqual(timings["segment_time"], 3.5)
+
+    def test_counts_reported_once(self):
+        recorder = MetricsRecorder(self.output_controller)
+
+        recorder.count(Metrics.TRANSPARENCY_CALLS, 3)
+        recorder.count(Metrics.TRANSPARENCY_CALLS)
+        # Counts are held until the report.
+        self.assertEqual(self.received, [])
+
+        summary = recorder.report()
+        self.assertEqual(summary["counts"]["transparency_calls"], 4)
+        self.assertIn((Metrics.TRANSPARENCY_CALLS, 4, "transparency_calls"),
+                      self.received)
+        self.assertEqual(self.received[-1][0], Metrics.RUN_SUMMARY)
+        self.assertIn("run_time", summary["timings"])
+
+    def test_reset(self):
+        recorder = MetricsRecorder(self.output_controller)
+        recorder.add_time(Metrics.SEGMENT_TIME, 1.0)
+        recorder.count(Metrics.LOWTRAN_CALLS, 2)
+
+        recorder.reset()
+
+        summary = recorder.summary()
+        self.assertEqual(summary["counts"], {})
+        self.assertEqual(list(summary["timings"]), ["run_time"])
+
+    def test_disabled_metrics_ignored(self):
+        recorder = MetricsRecorder(empty_output_config())
+
+        with recorder.time(Metrics.GRID_BUILD_TIME):
+            pass
+        recorder.count(Metrics.LOWTRAN_CALLS)
+        summary = recorder.report()
+
+        self.assertEqual(self.received, [])
+        self.assertIn("grid_build_time", summary["timings"])
+
+
+class ModelRunMetricsTest(TempOutputMixin, unittest.TestCase):
+    """
+    A test class for metrics reported by model runs.
+    """
+
+    def test_run_summary(self):
+        config = coarse_config()
+
+        summaries = []
+        output_controller = default_output_config()
+        output_controller.enable_output_type(Metrics.RUN_SUMMARY,
+                                             handler=summaries.append)
+
+        ModelRun(config, output_controller).run_model()
+
+        self.assertEqual(len(summaries), 1)
+        timings = summaries[0]["timings"]
+        counts = summaries[0]["counts"]
+
+        for key in ["provider_time.temperature", "provider_time.humidity",
+                    "provider_time.albedo", "grid_build_time",
+                    "segment_time", "dataset_write_time",
+                    "statistics_time", "run_time"]:
+            self.assertIn(key, timings)
+
+        # Each cell with valid data calculates transparency once for the
+        # initial state, and once more for each iteration plus one.
+        cells = 6 * 6 * 4 - counts["skipped_cells"]
+        self.assertEqual(counts["transparency_calls"],
+                         cells * (config.iterations() + 2))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,13 +1,13 @@
 import unittest
 import numpy as np
 
-from os import path, remove
+from os import path, remove, listdir
 from pathlib import Path
 from shutil import rmtree
 from netCDF4 import Dataset
 
 from data.reader import NetCDFReader, TimeboundNetCDFReader
-from data.writer import NetCDFWriter
+from data.writer import NetCDFWriter, StreamingNetCDFWriter
 
 # Directory for test datasets for file reading.
 READ_INPUT_DIR = "read_in"
@@ -931,3 +931,176 @@ class NetCDFWriterTest(unittest.TestCase):
         self.assertEqual(0, len(vars(no_attrs)))
 
         ds.close()
+
+
+class StreamingNetCDFWriterTest(unittest.TestCase):
+    """
+    A test class for StreamingNetCDFWriter. Ensures that records appended one
+    at a time along an unlimited dimension are written to a temporary file,
+    and can be read back in full once the file is closed.
+    """
+
+    @classmethod
+    def setUpClass(cls):
+        """
+        Create a temporary directory to store output files for testing.
+        """
+        out_path = Path(WRITE_OUTPUT_DIR)
+        out_path.mkdir(exist_ok=True)
+
+    @classmethod
+    def tearDownClass(cls):
+        """
+        Remove the temporary testing directory, and any test datasets inside.
+        """
+        rmtree(WRITE_OUTPUT_DIR)
+
+    def test_append_requires_open(self):
+        """
+        Test that an error is raised when data is appended before the
+        dataset file has been opened.
+        """
+        writer = StreamingNetCDFWriter()
+        writer.dimension("time", np.int32, None)
+        writer.variable("series", np.int32, ["time"])
+
+        with self.assertRaises(PermissionError):
+            writer.append("series", 0, np.array(1))
+
+    def test_append_requires_variable(self):
+        """
+        Test that an error is raised when data is appended to a variable
+        that has not been registered.
+        """
+        writer = StreamingNetCDFWriter()
+        writer.dimension("time", np.int32, None)
+        writer.open(path.join(WRITE_OUTPUT_DIR, "stream_no_var.nc"))
+
+        with self.assertRaises(KeyError):
+            writer.append("series", 0, np.array(1))
+
+        writer.close()
+
+    def test_replaced_on_close(self):
+        """
+        Test that the dataset file only appears once the writer is closed,
+        with no temporary file left beside it.
+        """
+        filepath = path.join(WRITE_OUTPUT_DIR, "stream_partial.nc")
+
+        writer = StreamingNetCDFWriter()
+        writer.dimension("time", np.int32, None)
+        writer.dimension("x", np.int32, 3)
+        writer.variable("grid", np.int32, ["time", "x"])
+        writer.open(filepath)
+
+        writer.append("grid", 0, np.array([1, 2, 3]))
+        writer.sync()
+        self.assertFalse(path.exists(filepath))
+
+        writer.close()
+        self.assertEqual(["stream_partial.nc"],
+                         [name for name in listdir(WRITE_OUTPUT_DIR)
+                          if name.startswith("stream_partial")])
+
+        ds = Dataset(filepath)
+        self.assertEqual(1, len(ds.dimensions["time"]))
+        self.assertEqual([1, 2, 3], list(ds.variables["grid"][0]))
+        ds.close()
+
+    def test_appended_records(self):
+        """
+        Test that a series of appended records is read back in the order
+        written, and that the unlimited dimension's variable holds the
+        record indices.
+        """
+        filepath = path.join(WRITE_OUTPUT_DIR, "stream_records.nc")
+
+        writer = StreamingNetCDFWriter()
+        writer.global_attribute("description", "Streamed dataset")
+        writer.dimension("time", np.int32, None)
+        writer.dimension("x", np.int32, 2)
+        writer.dimension("y", np.int32, 2)
+        writer.variable("plane", np.int32, ["time", "x", "y"])
+        writer.variable_attribute("plane", "units", "meters")
+        writer.open(filepath)
+
+        for i in range(4):
+            writer.append("plane", i, np.full((2, 2), i))
+        writer.close()
+
+        ds = Dataset(filepath)
+        self.assertEqual("Streamed dataset", ds.description)
+        self.assertEqual(4, len(ds.dimensions["time"]))
+        self.assertTrue(ds.dimensions["time"].isunlimited())
+        self.assertEqual([0, 1, 2, 3], list(ds.variables["time"][:]))
+        self.assertEqual("meters", ds.variables["plane"].units)
+
+        for i in range(4):
+            self.assertTrue((ds.variables["plane"][i] == i).all())
+
+        ds.close()
+
+    def test_same_as_whole_dataset(self):
+        """
+        Test that a dataset streamed one record at a time holds the same
+        dimension values and data as the same dataset written all at once,
+        including the mid-record values of the time dimension.
+        """
+        whole_path = path.join(WRITE_OUTPUT_DIR, "whole_times.nc")
+        stream_path = path.join(WRITE_OUTPUT_DIR, "stream_times.nc")
+        data = np.arange(12, dtype=np.float32).reshape(3, 4)
+
+        for time_type in [np.int32, np.float32]:
+            whole = NetCDFWriter()
+            whole.dimension("time", time_type, 3, (0, 3))
+            whole.dimension("x", np.int32, 4, (-180, 180))
+            whole.variable("series", np.float32, ["time", "x"])
+            whole.data("series", data)
+            whole.write(whole_path)
+
+            stream = StreamingNetCDFWriter()
+            stream.dimension("time", time_type, None)
+            stream.dimension("x", np.int32, 4, (-180, 180))
+            stream.variable("series", np.float32, ["time", "x"])
+            stream.open(stream_path)
+            for i in range(3):
+                stream.append("series", i, data[i])
+            stream.close()
+
+            with Dataset(whole_path) as whole_ds, \
+                    Dataset(stream_path) as stream_ds:
+                expected_times = np.array([0.5, 1.5, 2.5]).astype(time_type)
+                self.assertEqual(expected_times.tolist(),
+                                 whole_ds.variables["time"][:].tolist())
+                self.assertEqual(expected_times.tolist(),
+                                 stream_ds.variables["time"][:].tolist())
+                self.assertEqual(whole_ds.variables["x"][:].tolist(),
+                                 stream_ds.variables["x"][:].tolist())
+                self.assertTrue((whole_ds.variables["series"][:]
+                                 == stream_ds.variables["series"][:]).all())
+
+    def test_append_region(self):
+        """
+        Test that a record written in several regions, one band of rows at
+        a time, is read back whole.
+        """
+        filepath = path.join(WRITE_OUTPUT_DIR, "stream_regions.nc")
+
+        writer = StreamingNetCDFWriter()
+        writer.dimension("time", np.int32, None)
+        writer.dimension("x", np.int32, 3)
+        writer.dimension("y", np.int32, 2)
+        writer.variable("plane", np.int32, ["time", "x", "y"])
+        writer.open(filepath)
+
+        for row in range(3):
+            writer.append("plane", 0, np.full((1, 2), row),
+                          (slice(row, row + 1),))
+        writer.close()
+
+        ds = Dataset(filepath)
+        self.assertEqual(1, len(ds.dimensions["time"]))
+        self.assertEqual([[0, 0], [1, 1], [2, 2]],
+                         ds.variables["plane"][0].tolist())
+        ds.close()
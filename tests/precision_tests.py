@@ -0,0 +1,99 @@
+import unittest
+
+import numpy as np
+
+from core.configuration import from_json_string, JSON_DEFAULT, \
+    InvalidConfigError
+from core.output_config import empty_output_config
+from data.collector import ClimateDataCollector
+from data.grid import GridDimensions
+from data.statistics import mean
+from runner import ModelRun
+from tests.helpers import coarse_config, TempOutputMixin
+
+
+class PrecisionConfigTest(unittest.TestCase):
+    """
+    A test class for the precision configuration option.
+    """
+
+    def test_default_precision(self):
+        with open(JSON_DEFAULT, "r") as default_file:
+            config = from_json_string(default_file.read())
+
+        self.assertEqual(config.precision(), np.float64)
+
+    def test_single_precision(self):
+        self.assertEqual(coarse_config(precision="float32").precision(), np.float32)
+
+    def test_invalid_precision(self):
+        with self.assertRaises(InvalidConfigError):
+            coarse_config(precision="float16")
+
+
+class CollectorPrecisionTest(unittest.TestCase):
+    """
+    A test class for the floating-point type of collected grid data.
+    """
+
+    def test_cells_in_precision(self):
+        def temperature(grid, year):
+            return np.full((2,) + grid.dims_by_count(), 15.0)
+
+        def humidity(grid, year):
+            return np.full((2,) + grid.dims_by_count(), 50.0)
+
+        def albedo(grid):
+            return np.full((2,) + grid.dims_by_count(), 0.3)
+
+        for dtype in [np.float32, np.float64]:
+            grids = ClimateDataCollector(GridDimensions((30, 60))) \
+                .use_temperature_source(temperature) \
+                .use_humidity_source(humidity) \
+                .use_albedo_source(albedo) \
+                .use_precision(dtype) \
+                .get_gridded_data()
+
+            for cell in grids[0][0]:
+                self.assertIsInstance(cell.get_temperature(), dtype)
+                self.assertIsInstance(cell.get_relative_humidity(), dtype)
+                self.assertIsInstance(cell.get_albedo(), dtype)
+
+    def test_statistics_accumulate_in_double(self):
+        data = np.full((100, 100), 0.1, dtype=np.float32)
+
+        self.assertAlmostEqual(mean(data), float(np.float32(0.1)),
+                               places=12)
+
+
+class PrecisionModelRunTest(TempOutputMixin, unittest.TestCase):
+    """
+    A test class for model runs in single precision.
+    """
+
+    @staticmethod
+    def results(precision: str) -> np.ndarray:
+        """
+        Run the model with grid data in the given precision, and return the
+        final temperatures and temperature changes of every surface cell.
+        """
+        run = ModelRun(coarse_config(precision=precision),
+                       empty_output_config())
+        run.run_model()
+
+        return np.array([[(cell.get_temperature(),
+                           cell.get_temperature_change())
+                          for cell in grids[0]] for grids in run.grids])
+
+    def test_results_bounded(self):
+        double = self.results("float64")
+        single = self.results("float32")
+
+        self.assertEqual(single.dtype, np.float32)
+        # Differences come only from rounding input data and results to
+        # single precision.
+        np.testing.assert_allclose(single, double, atol=1e-4)
+
+
+if __name__ == '__main__':
+    unittest.main()
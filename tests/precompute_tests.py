@@ -0,0 +1,225 @@
+import json
+import multiprocessing
+import unittest
+
+from os import path, remove
+from shutil import rmtree
+from time import time
+from unittest import mock
+
+from core.configuration import from_json_string
+from data.access_log import AccessLog, LOG_FILE_NAME
+from data.result_store import default_result_store
+from precompute import read_slice, slice_configs, plan_precompute, \
+    precompute_config, DEFAULT_SUMMARY_PATH
+from tests.helpers import coarse_options, TempOutputMixin
+
+import data.resources as resources
+import api
+
+# A directory in which files for these tests are written.
+LOG_DIR = "access_log_out"
+
+
+def co2_options(co2_to: float) -> dict:
+    """
+    Returns the default configuration options on a very coarse grid, with
+    the final CO2 level co2_to.
+    """
+    return coarse_options((45, 90), aggregate_lat="before",
+                          co2={"from": 1, "to": co2_to})
+
+
+def run_id(options: dict) -> str:
+    """
+    Returns the run ID of a model run configured by options.
+    """
+    return from_json_string(json.dumps(options)).run_id()
+
+
+class AccessLogTest(unittest.TestCase):
+    """
+    A test class for the log of requests for model run output.
+    """
+
+    def setUp(self):
+        self.log = AccessLog(LOG_DIR)
+
+    def tearDown(self):
+        rmtree(LOG_DIR, ignore_errors=True)
+
+    def test_popularity(self):
+        self.assertEqual(self.log.popularity(), {})
+
+        self.log.record("a")
+        self.log.record("b", "delta_t")
+        self.log.record("a", "delta_t")
+
+        self.assertEqual(self.log.popularity(), {"a": 2, "b": 1})
+        self.assertEqual(self.log.popularity(since=time() + 60), {})
+
+    def test_partial_line_skipped(self):
+        self.log.record("a")
+        with open(path.join(LOG_DIR, LOG_FILE_NAME), "a") as log_file:
+            log_file.write('{"time": 1, "run')
+
+        self.assertEqual(self.log.popularity(), {"a": 1})
+
+    def test_prune(self):
+        self.log.record("a")
+        cutoff = time()
+        self.log.record("b")
+
+        self.log.prune(cutoff)
+
+        self.assertEqual(self.log.popularity(), {"b": 1})
+
+
+class PrecomputePlanTest(unittest.TestCase):
+    """
+    A test class for enumerating and ranking the configurations to prepare.
+    """
+
+    def tearDown(self):
+        rmtree(LOG_DIR, ignore_errors=True)
+
+    def test_default_slice(self):
+        slice_options = read_slice()
+        configs = slice_configs(slice_options)
+
+        self.assertEqual(len(configs), len(api.example_config["co2"]["to"])
+                         * len(api.example_config["absorbance_src"]))
+        self.assertEqual({options["co2"]["to"] for options in configs},
+                         set(api.example_config["co2"]["to"]))
+        self.assertIn("delta_t", slice_options["variables"])
+
+    def test_duplicates_removed(self):
+        options = co2_options(1.5)
+        slice_options = {"configs": [options, dict(options)],
+                         "parameters": {"co2.to": [1.5, 1.5, 3]}}
+
+        self.assertEqual(len(slice_configs(slice_options)), 2)
+
+    def test_ranked_by_requests(self):
+        log = AccessLog(LOG_DIR)
+        configs = [co2_options(co2_to) for co2_to in [1.5, 2.5, 3.0]]
+        for _ in range(3):
+            log.record(run_id(configs[2]))
+        log.record(run_id(configs[1]), "delta_t")
+
+        plan = plan_precompute(configs, access_log=log)
+
+        self.assertEqual([options for options, _ in plan],
+                         [configs[2], configs[1], configs[0]])
+        self.assertEqual([requests for _, requests in plan], [3, 1, 0])
+        self.assertEqual(len(plan_precompute(configs, limit=1,
+                                             access_log=log)), 1)
+
+
+class PrecomputeRunTest(TempOutputMixin, unittest.TestCase):
+    """
+    A test class for preparing model results ahead of requests.
+    """
+
+    def setUp(self):
+        super().setUp()
+        self.options = co2_options(2.5)
+        self.run_id = run_id(self.options)
+        self.token = resources.ADMIN_TOKEN
+
+    def tearDown(self):
+        resources.ADMIN_TOKEN = self.token
+        if path.isfile(DEFAULT_SUMMARY_PATH):
+            remove(DEFAULT_SUMMARY_PATH)
+
+    def test_precompute_config(self):
+        first = precompute_config(self.options, [])
+        second = precompute_config(self.options, [])
+
+        self.assertEqual(first["model"], "created")
+        self.assertEqual(second["model"], "hit")
+        self.assertTrue(default_result_store().contains(self.run_id))
+
+    def test_pinned_while_rendering(self):
+        precompute_config(self.options, [])
+        pins = []
+
+        def record_pins(*args, **kwargs):
+            stats = default_result_store().stats()[self.run_id]
+            pins.append(len(stats.get("pins", {})))
+            return []
+
+        with mock.patch("precompute.iter_image_files", record_pins):
+            precompute_config(self.options, ["delta_t"])
+
+        # The run was pinned while its images were rendered, and released
+        # afterward.
+        self.assertEqual(pins, [1])
+        stats = default_result_store().stats()[self.run_id]
+        self.assertEqual(stats.get("pins", {}), {})
+
+    def test_admin_endpoint_forbidden(self):
+        client = api.app.test_client()
+        resources.ADMIN_TOKEN = None
+        self.assertEqual(client.post("/admin/precompute").status_code, 403)
+
+        resources.ADMIN_TOKEN = "secret"
+        job = api.precompute_job
+        for headers in [{}, {"Authorization": "Bearer wrong"},
+                        {"Authorization": "Bearer"},
+                        {"Authorization": "secret"}]:
+            response = client.post("/admin/precompute", headers=headers,
+                                   data=json.dumps({"configs": []}))
+            self.assertEqual(response.status_code, 403, msg=headers)
+        self.assertIs(api.precompute_job, job)
+
+    def test_admin_endpoint_malformed(self):
+        client = api.app.test_client()
+        resources.ADMIN_TOKEN = "secret"
+        headers = {"Authorization": "Bearer secret"}
+        job = api.precompute_job
+
+        for body in [b"{\"configs\": [", b"\xff", b"null", b"[]",
+                     b"{\"configs\": {}}", b"{\"configs\": [1]}",
+                     b"{\"parameters\": {\"co2.to\": 2}}",
+                     b"{\"variables\": \"delta_t\"}",
+                     b"{\"limit\": -1}",
+                     b"{\"configs\": [\"missing.json\"]}"]:
+            response = client.post("/admin/precompute", headers=headers,
+                                   data=body)
+            self.assertEqual(response.status_code, 400, msg=body)
+            self.assertIn("Invalid Slice Declaration",
+                          response.get_data(as_text=True), msg=body)
+
+        self.assertIs(api.precompute_job, job)
+
+    def test_admin_endpoint(self):
+        client = api.app.test_client()
+        resources.ADMIN_TOKEN = "secret"
+        headers = {"Authorization": "Bearer secret"}
+        slice_options = {"configs": [self.options], "variables": []}
+
+        # A forked job, unlike a spawned one, inherits this test's
+        # temporary result store.
+        with mock.patch("precompute.get_context",
+                        lambda method: multiprocessing.get_context("fork")):
+            response = client.post("/admin/precompute", headers=headers,
+                                   data=json.dumps(slice_options))
+        self.assertEqual(response.status_code, 202)
+        self.assertEqual(response.get_json()["plan"][0]["run_id"],
+                         self.run_id)
+
+        process, _ = api.precompute_job
+        process.join(timeout=300)
+
+        status = client.get("/admin/precompute", headers=headers).get_json()
+        self.assertFalse(status["running"])
+        self.assertEqual(status["exitcode"], 0)
+        self.assertTrue(default_result_store().contains(self.run_id))
+        # The request was not counted as a hit on the stored results.
+        self.assertEqual(default_result_store().stats()[self.run_id]["hits"],
+                         0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,134 @@
+import json
+import unittest
+
+from core.configuration import from_json_string
+from tests.helpers import coarse_options, TempOutputMixin
+from website.prometheus import Registry, Counter, Gauge, Histogram
+
+import api
+
+
+class RegistryTest(unittest.TestCase):
+    """
+    A test class for metrics and their text exposition format.
+    """
+
+    def test_counter(self):
+        registry = Registry()
+        counter = registry.register(Counter("hits_total", "Hits.",
+                                            ("cache",)))
+        counter.inc(cache="model")
+        counter.inc(2, cache="model")
+        counter.inc(cache="image")
+
+        self.assertEqual(counter.value(cache="model"), 3)
+        exposition = registry.expose()
+        self.assertIn("# TYPE hits_total counter", exposition)
+        self.assertIn("hits_total{cache=\"model\"} 3", exposition)
+        self.assertIn("hits_total{cache=\"image\"} 1", exposition)
+
+    def test_counter_rejects_decrease(self):
+        counter = Counter("hits_total", "Hits.")
+        with self.assertRaises(ValueError):
+            counter.inc(-1)
+
+    def test_labels_must_match(self):
+        counter = Counter("hits_total", "Hits.", ("cache",))
+        with self.assertRaises(ValueError):
+            counter.inc(route="/")
+
+    def test_gauge(self):
+        registry = Registry()
+        gauge = registry.register(Gauge("waiting", "Waiting requests."))
+        gauge.inc()
+        gauge.inc()
+        gauge.dec()
+
+        self.assertEqual(gauge.value(), 1)
+        self.assertIn("waiting 1\n", registry.expose())
+
+    def test_gauge_callback(self):
+        registry = Registry()
+        registry.register(Gauge("disk_bytes", "Disk usage.",
+                                callback=lambda: 1024))
+        self.assertIn("disk_bytes 1024\n", registry.expose())
+
+    def test_histogram(self):
+        registry = Registry()
+        histogram = registry.register(Histogram("latency_seconds",
+                                                "Latency.", ("route",),
+                                                buckets=(0.1, 1.0)))
+        histogram.observe(0.05, route="/a")
+        histogram.observe(0.5, route="/a")
+        histogram.observe(5, route="/a")
+
+        exposition = registry.expose()
+        self.assertIn("latency_seconds_bucket{route=\"/a\",le=\"0.1\"} 1",
+                      exposition)
+        self.assertIn("latency_seconds_bucket{route=\"/a\",le=\"1\"} 2",
+                      exposition)
+        self.assertIn("latency_seconds_bucket{route=\"/a\",le=\"+Inf\"} 3",
+                      exposition)
+        self.assertIn("latency_seconds_sum{route=\"/a\"} 5.55", exposition)
+        self.assertIn("latency_seconds_count{route=\"/a\"} 3", exposition)
+
+    def test_label_escaping(self):
+        registry = Registry()
+        counter = registry.register(Counter("c", "C.", ("name",)))
+        counter.inc(name="a\"b\\c\nd")
+
+        self.assertIn("c{name=\"a\\\"b\\\\c\\nd\"} 1", registry.expose())
+
+    def test_duplicate_registration(self):
+        registry = Registry()
+        registry.register(Counter("c", "C."))
+        with self.assertRaises(ValueError):
+            registry.register(Gauge("c", "C."))
+
+
+class MetricsEndpointTest(TempOutputMixin, unittest.TestCase):
+    """
+    A test class for the API's /metrics endpoint.
+    """
+
+    def setUp(self):
+        super().setUp()
+        self.client = api.app.test_client()
+        self.options = json.dumps(coarse_options())
+
+    def test_request_latency(self):
+        self.client.get("/model/help")
+        response = self.client.get("/metrics")
+
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.content_type.startswith("text/plain"))
+
+        body = response.get_data(as_text=True)
+        self.assertIn("arrhenius_http_request_duration_seconds_count{"
+                      "route=\"/model/help\",method=\"GET\",status=\"200\"}",
+                      body)
+        self.assertIn("arrhenius_output_disk_bytes", body)
+
+    def test_model_run_metrics(self):
+        lookups = api.cache_lookups
+        created_before = lookups.value(cache="model", result="created")
+        hits_before = lookups.value(cache="model", result="hit")
+        config = from_json_string(self.options)
+        runs_before = api.model_run_duration.count(
+            absorbance_src=config.model_mode(), grid="6x6")
+
+        first = self.client.post("/model/dataset", data=self.options)
+        second = self.client.post("/model/dataset", data=self.options)
+
+        self.assertEqual(first.status_code, 201)
+        self.assertEqual(second.status_code, 200)
+        self.assertEqual(lookups.value(cache="model", result="created"),
+                         created_before + 1)
+        self.assertEqual(lookups.value(cache="model", result="hit"),
+                         hits_before + 1)
+        self.assertEqual(api.model_run_duration.count(
+            absorbance_src=config.model_mode(), grid="6x6"), runs_before + 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,93 @@
+import unittest
+
+import numpy as np
+
+from os import path
+from shutil import rmtree
+
+from data.grid import GridDimensions, latitude_weights
+from data.regrid import RegridWeights, regrid_weights, conservative_regrid
+
+# A directory in which regridding weights for these tests are stored.
+WEIGHTS_DIR = "regrid_test_weights"
+
+
+def global_mean(data: np.ndarray) -> np.ndarray:
+    """
+    Returns the area-weighted mean of each latitude-longitude slice of data.
+    """
+    weights = latitude_weights(data.shape[-2])[:, np.newaxis]
+    return np.sum(data * weights, axis=(-2, -1)) \
+        / (np.sum(weights) * data.shape[-1])
+
+
+class ConservativeRegridTest(unittest.TestCase):
+    """
+    A test class for area-conservative regridding.
+    """
+
+    def setUp(self):
+        self.data = np.random.default_rng(0).normal(size=(3, 36, 72))
+
+    def tearDown(self):
+        rmtree(WEIGHTS_DIR, ignore_errors=True)
+
+    def test_identity(self):
+        regridded = conservative_regrid(self.data, GridDimensions((36, 72),
+                                                                  "count"))
+
+        np.testing.assert_allclose(regridded, self.data)
+
+    def test_conserves_global_mean(self):
+        for shape in [(18, 36), (7, 13), (50, 100)]:
+            regridded = conservative_regrid(self.data,
+                                            GridDimensions(shape, "count"))
+
+            self.assertEqual(regridded.shape, (3,) + shape)
+            np.testing.assert_allclose(global_mean(regridded),
+                                       global_mean(self.data))
+
+    def test_block_mean(self):
+        regridded = conservative_regrid(self.data,
+                                        GridDimensions((36, 24), "count"))
+
+        # Longitude blocks of three cells are averaged with equal weights.
+        np.testing.assert_allclose(
+            regridded, self.data.reshape(3, 36, 24, 3).mean(axis=-1))
+
+    def test_slices_regridded_together(self):
+        layered = self.data.reshape(3, 1, 36, 72).repeat(2, axis=1)
+        grid = GridDimensions((10, 20), "count")
+
+        regridded = conservative_regrid(layered, grid)
+
+        self.assertEqual(regridded.shape, (3, 2, 10, 20))
+        np.testing.assert_allclose(regridded[1, 1],
+                                   conservative_regrid(self.data[1], grid))
+
+    def test_missing_values(self):
+        data = np.ones((4, 4))
+        data[:2, :2] = np.nan
+        data[2, 2] = 3
+
+        regridded = conservative_regrid(np.ma.masked_invalid(data),
+                                        GridDimensions((2, 2), "count"))
+
+        self.assertTrue(np.isnan(regridded[0, 0]))
+        self.assertEqual(regridded[0, 1], 1)
+        self.assertGreater(regridded[1, 1], 1)
+
+    def test_weights_stored(self):
+        weights = regrid_weights((36, 72), (7, 13), WEIGHTS_DIR)
+        file_path = path.join(WEIGHTS_DIR, "conservative_36x72_7x13.npz")
+        self.assertTrue(path.isfile(file_path))
+
+        loaded = RegridWeights.load(file_path)
+        np.testing.assert_allclose(loaded.apply(self.data),
+                                   weights.apply(self.data))
+        self.assertIs(regrid_weights((36, 72), (7, 13), WEIGHTS_DIR),
+                      weights)
+
+
+if __name__ == '__main__':
+    unittest.main()
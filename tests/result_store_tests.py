@@ -0,0 +1,264 @@
+import json
+import unittest
+import subprocess
+import sys
+
+from os import path, environ
+from pathlib import Path
+from shutil import rmtree
+from time import sleep
+from unittest import mock
+
+from core.configuration import from_json_string, JSON_DEFAULT, \
+    RUN_ID_LENGTH
+from data.result_store import ResultStore, directory_size, PIN_TIMEOUT,\
+    default_result_store
+from tests.helpers import coarse_options, TempOutputMixin
+
+# Directory under which test output is stored.
+STORE_DIR = "store_out"
+
+# The run ID of the default configuration.
+DEFAULT_RUN_ID = "99efe1b658d16fa5"
+
+
+def default_options() -> dict:
+    """
+    Returns the configuration dictionary for the default model run.
+    """
+    with open(JSON_DEFAULT, "r") as default_file:
+        return json.load(default_file)
+
+
+class RunIDTest(unittest.TestCase):
+    """
+    A test class for content-addressed model run IDs.
+    """
+
+    def test_id_equal_for_equal_options(self):
+        options = default_options()
+        reordered = dict(reversed(list(options.items())))
+
+        first = from_json_string(json.dumps(options)).run_id()
+        second = from_json_string(json.dumps(reordered)).run_id()
+
+        self.assertEqual(first, second)
+        self.assertEqual(len(first), RUN_ID_LENGTH)
+
+    def test_id_ignores_colorbar(self):
+        options = default_options()
+        scaled = dict(options, scale=[-4, 4])
+
+        first = from_json_string(json.dumps(options)).run_id()
+        second = from_json_string(json.dumps(scaled)).run_id()
+
+        self.assertEqual(first, second)
+
+    def test_id_changes_with_options(self):
+        options = default_options()
+        changed = dict(options, layers=options.get("layers", 1) + 1)
+
+        first = from_json_string(json.dumps(options)).run_id()
+        second = from_json_string(json.dumps(changed)).run_id()
+
+        self.assertNotEqual(first, second)
+
+    def test_default_id_pinned(self):
+        # Stored results are found by run ID, so the ID of an unchanged
+        # configuration must not change when new options are added.
+        options = default_options()
+        self.assertEqual(from_json_string(json.dumps(options)).run_id(),
+                         DEFAULT_RUN_ID)
+
+        explicit = dict(options, solver="picard", precision="float64",
+                        kernel="numpy", mask_src="none")
+        self.assertEqual(from_json_string(json.dumps(explicit)).run_id(),
+                         DEFAULT_RUN_ID)
+
+        changed = dict(options, precision="float32")
+        self.assertNotEqual(from_json_string(json.dumps(changed)).run_id(),
+                            DEFAULT_RUN_ID)
+
+    def test_id_stable_across_processes(self):
+        script = "from core.configuration import default_config; " \
+                 "print(default_config().run_id())"
+        run_ids = set()
+
+        for seed in ["1", "2"]:
+            env = dict(environ, PYTHONHASHSEED=seed)
+            result = subprocess.run([sys.executable, "-c", script],
+                                    env=env, stdout=subprocess.PIPE,
+                                    check=True)
+            run_ids.add(result.stdout.strip())
+
+        self.assertEqual(len(run_ids), 1)
+
+
+class ResultStoreTest(unittest.TestCase):
+    """
+    A test class for ResultStore lookup, bookkeeping, and eviction.
+    """
+
+    def setUp(self):
+        Path(STORE_DIR).mkdir(exist_ok=True)
+
+    def tearDown(self):
+        rmtree(STORE_DIR)
+
+    def write_run(self: 'ResultStoreTest',
+                  store: 'ResultStore',
+                  run_id: str,
+                  size: int) -> None:
+        """
+        Write a fake model run's output of size bytes under run_id,
+        and record it in store.
+        """
+        run_path = store.run_path(run_id)
+        Path(run_path).mkdir()
+        with open(path.join(run_path, run_id + ".nc"), "wb") as out_file:
+            out_file.write(b"\0" * size)
+
+        store.record(run_id)
+
+    def test_lookup_unrecorded(self):
+        store = ResultStore(STORE_DIR)
+        # A directory that was never recorded is not considered stored.
+        Path(store.run_path("partial")).mkdir()
+
+        self.assertIsNone(store.lookup("partial"))
+        self.assertIsNone(store.lookup("missing"))
+
+    def test_lookup_counts_hits(self):
+        store = ResultStore(STORE_DIR)
+        self.write_run(store, "run", 100)
+
+        self.assertEqual(store.lookup("run"), store.run_path("run"))
+        store.lookup("run")
+
+        entry = store.stats()["run"]
+        self.assertEqual(entry["hits"], 2)
+        self.assertEqual(entry["size"], 100)
+
+    def test_lookup_removed_output(self):
+        store = ResultStore(STORE_DIR)
+        self.write_run(store, "run", 100)
+        rmtree(store.run_path("run"))
+
+        self.assertIsNone(store.lookup("run"))
+        self.assertNotIn("run", store.stats())
+
+    def test_record_updates_size(self):
+        store = ResultStore(STORE_DIR)
+        self.write_run(store, "run", 100)
+
+        with open(path.join(store.run_path("run"), "img.png"), "wb") as img:
+            img.write(b"\0" * 50)
+        store.record("run")
+
+        self.assertEqual(store.total_size(), 150)
+        self.assertEqual(directory_size(store.run_path("run")), 150)
+
+    def test_evicts_least_recently_used(self):
+        store = ResultStore(STORE_DIR, budget=250)
+
+        self.write_run(store, "first", 100)
+        sleep(0.01)
+        self.write_run(store, "second", 100)
+        sleep(0.01)
+        # Accessing the first run makes the second least recently used.
+        store.lookup("first")
+        sleep(0.01)
+        self.write_run(store, "third", 100)
+
+        self.assertEqual(set(store.stats()), {"first", "third"})
+        self.assertFalse(Path(store.run_path("second")).exists())
+        self.assertLessEqual(store.total_size(), 250)
+
+    def test_keeps_run_over_budget(self):
+        store = ResultStore(STORE_DIR, budget=50)
+
+        self.write_run(store, "first", 100)
+        self.write_run(store, "second", 100)
+
+        # The most recently recorded run is kept even if it alone
+        # exceeds the budget.
+        self.assertEqual(set(store.stats()), {"second"})
+        self.assertEqual(store.lookup("second"), store.run_path("second"))
+
+    def test_keeps_pinned_run(self):
+        store = ResultStore(STORE_DIR, budget=150)
+
+        self.write_run(store, "first", 100)
+        self.assertEqual(store.lookup("first", pin="request"),
+                         store.run_path("first"))
+        sleep(0.01)
+        self.write_run(store, "second", 100)
+
+        # The first run is being read, so it is kept over the budget.
+        self.assertEqual(set(store.stats()), {"first", "second"})
+        self.assertTrue(Path(store.run_path("first")).is_dir())
+
+        # Once released, it is evicted as the least recently used run.
+        store.unpin("first", "request")
+        self.assertEqual(set(store.stats()), {"second"})
+        self.assertFalse(Path(store.run_path("first")).exists())
+
+    def test_pin_on_record(self):
+        store = ResultStore(STORE_DIR, budget=150)
+
+        run_path = store.run_path("first")
+        Path(run_path).mkdir()
+        with open(path.join(run_path, "first.nc"), "wb") as out_file:
+            out_file.write(b"\0" * 100)
+        store.record("first", pin="request")
+        sleep(0.01)
+        self.write_run(store, "second", 100)
+
+        self.assertIn("first", store.stats())
+        store.unpin("first", "other_request")
+        self.assertIn("first", store.stats())
+
+    def test_pin_expires(self):
+        store = ResultStore(STORE_DIR, budget=150)
+
+        self.write_run(store, "first", 100)
+        store.lookup("first", pin="request")
+        sleep(0.01)
+
+        # A pin left by a process that never released it stops protecting
+        # the run once it expires.
+        with mock.patch("data.result_store.time",
+                        return_value=store.stats()["first"]["last_access"]
+                        + PIN_TIMEOUT + 1):
+            self.write_run(store, "second", 100)
+
+        self.assertEqual(set(store.stats()), {"second"})
+
+    def test_invalid_budget(self):
+        with self.assertRaises(ValueError):
+            ResultStore(STORE_DIR, budget=0)
+
+
+class PinnedResponseTest(TempOutputMixin, unittest.TestCase):
+    """
+    A test class for pinning stored output while the API sends it.
+    """
+
+    def test_pinned_until_sent(self):
+        import api
+
+        options = json.dumps(coarse_options((20, 40)))
+        run_id = from_json_string(options).run_id()
+
+        response = api.app.test_client().post("/model/dataset", data=options)
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(len(default_result_store().stats()[run_id]["pins"]),
+                         1)
+
+        response.get_data()
+        response.close()
+        self.assertEqual(default_result_store().stats()[run_id]["pins"], {})
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,167 @@
+import unittest
+
+from os import path
+from typing import List
+from unittest import mock
+
+from core.output_config import default_output_config, ReportDatatype,\
+    IMAGES_PATH
+from data.display import ModelOutputStream, get_image_directory, image_path
+from runner import ModelRun, data_collector
+from tests.helpers import coarse_config, TempOutputMixin
+
+# A run ID for model runs made by these tests.
+TEST_RUN_ID = "runner_test_run"
+
+
+class EmptyImageRenderer:
+    """
+    An image renderer that writes an empty file in place of each image, so
+    that the names of image files can be checked without drawing maps.
+    """
+
+    def __init__(self, data) -> None:
+        self.data = data
+
+    @staticmethod
+    def save_image(img_path, scale) -> None:
+        open(img_path, "wb").close()
+
+
+class IterModelTest(TempOutputMixin, unittest.TestCase):
+    """
+    A test class for running the model one time segment at a time, and for
+    stopping model runs partway through.
+    """
+
+    def model_run(self: 'IterModelTest',
+                  memory_budget: float = None) -> 'ModelRun':
+        """
+        Returns a model run on a coarse grid, whose collector's release_data
+        method is replaced by a mock that records its calls.
+        """
+        config = coarse_config()
+        config.set_run_id(TEST_RUN_ID)
+
+        run = ModelRun(config, default_output_config(), memory_budget)
+        release = mock.patch.object(run.collector, "release_data",
+                                    wraps=run.collector.release_data)
+        self.release_data = release.start()
+        self.addCleanup(release.stop)
+
+        return run
+
+    def dataset_records(self: 'IterModelTest') -> int:
+        """
+        Returns the number of time segments in the model run's dataset.
+        """
+        from netCDF4 import Dataset
+        dataset_path = path.join(self.output_dir, TEST_RUN_ID,
+                                 TEST_RUN_ID + ".nc")
+        with Dataset(dataset_path) as dataset:
+            return len(dataset.dimensions["time"])
+
+    def test_all_segments(self):
+        results = list(self.model_run().iter_model())
+
+        self.assertEqual([result.index for result in results], [0, 1, 2, 3])
+        self.assertEqual(self.dataset_records(), 4)
+        self.release_data.assert_called_once_with()
+
+    def test_cancel(self):
+        checks = []
+
+        def cancel():
+            checks.append(True)
+            return len(checks) > 2
+
+        with mock.patch.object(ModelOutputStream, "close", autospec=True,
+                               side_effect=ModelOutputStream.close) as close:
+            results = list(self.model_run().iter_model(cancel=cancel))
+
+        # Time segments computed before the run stops are still returned,
+        # and their output kept.
+        self.assertEqual([result.index for result in results], [0, 1])
+        self.assertEqual(len(checks), 3)
+        self.assertEqual(self.dataset_records(), 2)
+        close.assert_called_once()
+        self.release_data.assert_called_once_with()
+
+    def test_cancel_then_rerun_images(self):
+        var_name = ReportDatatype.REPORT_TEMP_CHANGE.value
+
+        def images(run: 'ModelRun') -> List[bool]:
+            image_dir = get_image_directory(
+                path.join(self.output_dir, TEST_RUN_ID), TEST_RUN_ID,
+                var_name, run.config.colorbar())
+            return [path.isfile(image_path(image_dir, var_name, index,
+                                           run.config))
+                    for index in range(5)]
+
+        run = self.model_run()
+        run.output_controller.enable_output_type(
+            ReportDatatype.REPORT_TEMP_CHANGE, IMAGES_PATH)
+        checks = []
+
+        def cancel():
+            checks.append(True)
+            return len(checks) > 2
+
+        with mock.patch("data.display.ModelImageRenderer",
+                        EmptyImageRenderer):
+            list(run.iter_model(cancel=cancel))
+
+            # No annual average is rendered from only some time segments,
+            # where a later complete run would find it already on disk.
+            self.assertEqual(images(run), [False, True, True, False, False])
+
+            run = self.model_run()
+            run.output_controller.enable_output_type(
+                ReportDatatype.REPORT_TEMP_CHANGE, IMAGES_PATH)
+            list(run.iter_model())
+
+        self.assertEqual(images(run), [True] * 5)
+
+    def test_cancel_chunked(self):
+        run = self.model_run(memory_budget=0.001)
+        results = list(run.iter_model(cancel=lambda: True))
+
+        self.assertEqual(results, [])
+        self.release_data.assert_called_once_with()
+
+    def test_close_early(self):
+        with mock.patch.object(ModelOutputStream, "close", autospec=True,
+                               side_effect=ModelOutputStream.close) as close:
+            segments = self.model_run().iter_model()
+            first = next(segments)
+
+            close.assert_not_called()
+            self.release_data.assert_not_called()
+
+            segments.close()
+
+        self.assertEqual(first.index, 0)
+        self.assertEqual(self.dataset_records(), 1)
+        close.assert_called_once()
+        self.release_data.assert_called_once_with()
+
+    def test_shared_collector_kept(self):
+        config = coarse_config()
+        config.set_run_id(TEST_RUN_ID)
+        collector = data_collector(config)
+        self.addCleanup(collector.release_data)
+
+        with mock.patch.object(collector, "release_data") as release:
+            run = ModelRun(config, default_output_config(),
+                           collector=collector)
+            segments = run.iter_model()
+            next(segments)
+            segments.close()
+
+        # A collector given to the model run may be used by other runs, so
+        # it keeps its data.
+        release.assert_not_called()
+
+
+if __name__ == '__main__':
+    unittest.main()
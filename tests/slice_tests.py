@@ -0,0 +1,151 @@
+import json
+import unittest
+
+import numpy as np
+
+from os import path
+
+from core.configuration import from_json_string
+from data.display import read_dataset_variable
+from data.result_store import default_result_store
+from data.slices import SliceQuery, InvalidSliceError, cell_centres, \
+    read_variable_slice
+from tests.helpers import coarse_options, temp_output
+
+import api
+
+# The cell widths of a grid of 6 latitude rows and 12 longitude columns.
+SLICE_DIMS = (30, 30)
+
+
+class SliceQueryTest(unittest.TestCase):
+    """
+    A test class for parsing selections of part of a variable.
+    """
+
+    def test_from_args(self):
+        query = SliceQuery.from_args({"time": "1:2", "lat": "-30:30",
+                                      "lon": "170:-170", "bands": "1",
+                                      "format": "binary"})
+
+        self.assertEqual(query.time, (1, 2))
+        self.assertEqual(query.lat, (-30.0, 30.0))
+        self.assertEqual(query.lon, (170.0, -170.0))
+        self.assertTrue(query.bands)
+        self.assertEqual(query.fmt, "binary")
+
+    def test_single_value(self):
+        query = SliceQuery.from_args({"time": "3", "bands": "false"})
+
+        self.assertEqual(query.time, (3, 3))
+        self.assertIsNone(query.lat)
+        self.assertFalse(query.bands)
+
+    def test_invalid(self):
+        for args in [{"time": "a:b"}, {"time": "2:1"}, {"lat": "10:-10"},
+                     {"lon": "1:2:3"}, {"format": "xml"}]:
+            with self.assertRaises(InvalidSliceError):
+                SliceQuery.from_args(args)
+
+
+class VariableSliceTest(unittest.TestCase):
+    """
+    A test class for reading part of a variable from a model run's dataset.
+    """
+
+    @classmethod
+    def setUpClass(cls):
+        context = temp_output()
+        context.__enter__()
+        cls.addClassCleanup(context.__exit__, None, None, None)
+
+        cls.options = coarse_options(SLICE_DIMS)
+        cls.config = from_json_string(json.dumps(cls.options))
+        cls.run_id = cls.config.run_id()
+        api.app.test_client().post("/model/dataset",
+                                   data=json.dumps(cls.options))
+
+        cls.run_path = default_result_store().run_path(cls.run_id)
+        cls.dataset_path = path.join(cls.run_path, cls.run_id + ".nc")
+        cls.full = np.ma.filled(read_dataset_variable(cls.run_path, "delta_t",
+                                                      cls.config)
+                                .astype(float), np.nan)
+
+    def read(self, **kwargs):
+        return read_variable_slice(self.dataset_path, "delta_t",
+                                   SliceQuery(**kwargs))
+
+    def test_box(self):
+        variable_slice = self.read(time=(1, 2), lat=(-30, 30), lon=(0, 90))
+
+        lats = cell_centres(6, -90, 90)
+        lons = cell_centres(12, -180, 180)
+        rows = (lats >= -30) & (lats <= 30)
+        cols = (lons >= 0) & (lons <= 90)
+
+        self.assertEqual(variable_slice.dims,
+                         ("time", "latitude", "longitude"))
+        np.testing.assert_array_equal(variable_slice.values,
+                                      self.full[1:3][:, rows][:, :, cols])
+        np.testing.assert_array_equal(variable_slice.coords["latitude"],
+                                      lats[rows])
+
+    def test_antimeridian(self):
+        variable_slice = self.read(lon=(150, -150))
+
+        np.testing.assert_array_equal(variable_slice.coords["longitude"],
+                                      [165, -165])
+        np.testing.assert_array_equal(variable_slice.values,
+                                      self.full[:, :, [11, 0]])
+
+    def test_bands(self):
+        variable_slice = self.read(bands=True)
+
+        self.assertEqual(variable_slice.dims, ("time", "latitude"))
+        np.testing.assert_allclose(variable_slice.values,
+                                   np.nanmean(self.full, axis=-1))
+
+    def test_binary(self):
+        variable_slice = self.read(time=(0, 0), lat=(0, 90))
+        headers = variable_slice.headers()
+
+        shape = tuple(int(n) for n in headers["X-Array-Shape"].split(","))
+        values = np.frombuffer(variable_slice.to_bytes(),
+                               dtype=headers["X-Array-Dtype"])\
+            .reshape(shape)
+
+        self.assertEqual(shape, (1, 3, 12))
+        np.testing.assert_array_equal(values, self.full[0:1, 3:])
+
+    def test_invalid_selection(self):
+        with self.assertRaises(InvalidSliceError):
+            self.read(time=(0, 100))
+        with self.assertRaises(InvalidSliceError):
+            self.read(lat=(1, 2))
+        with self.assertRaises(InvalidSliceError):
+            read_variable_slice(self.dataset_path, "no_such_variable",
+                                SliceQuery())
+
+    def test_endpoint(self):
+        client = api.app.test_client()
+        response = client.post("/model/delta_t/slice?time=2&bands=1",
+                               data=json.dumps(self.options))
+
+        self.assertEqual(response.status_code, 200)
+        body = response.get_json()
+        self.assertEqual(body["shape"], [1, 6])
+        np.testing.assert_allclose(np.array(body["values"][0], dtype=float),
+                                   np.nanmean(self.full[2], axis=-1))
+
+        response = client.post("/model/delta_t/slice?format=binary&lat=60:90",
+                               data=json.dumps(self.options))
+        self.assertEqual(response.mimetype, "application/octet-stream")
+        self.assertEqual(response.headers["X-Array-Coords-Latitude"], "75")
+
+        response = client.post("/model/delta_t/slice?time=x",
+                               data=json.dumps(self.options))
+        self.assertEqual(response.status_code, 400)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,160 @@
+import unittest
+
+import numpy as np
+
+from threading import Thread, Event
+from time import sleep
+
+from core.configuration import from_json_string, JSON_DEFAULT
+from core.output_config import empty_output_config
+from data.collector import ClimateDataCollector
+from data.grid import GridDimensions
+from data.snapshots import SnapshotRegistry, default_snapshot_registry
+from runner import ModelRun
+from tests.helpers import TempOutputMixin
+
+
+class SnapshotRegistryTest(unittest.TestCase):
+    """
+    A test class for sharing read-only data snapshots between model runs.
+    """
+
+    def setUp(self):
+        self.registry = SnapshotRegistry()
+        self.loads = 0
+
+    def loader(self) -> tuple:
+        """
+        Loads a small snapshot, counting the number of loads.
+        """
+        self.loads += 1
+        return np.arange(4.0), None, 1
+
+    def test_shared_until_released(self):
+        first = self.registry.acquire("key", self.loader)
+        second = self.registry.acquire("key", self.loader)
+
+        self.assertIs(first[0], second[0])
+        self.assertEqual(self.loads, 1)
+        self.assertEqual(self.registry.stats()[0]["refs"], 2)
+        self.assertEqual(self.registry.total_size(), 32)
+
+        self.registry.release("key")
+        self.registry.release("key")
+        self.assertEqual(self.registry.stats(), [])
+
+        self.registry.acquire("key", self.loader)
+        self.assertEqual(self.loads, 2)
+
+    def test_read_only(self):
+        source = np.arange(4.0)
+        data, = self.registry.acquire("key", lambda: (source,))
+
+        with self.assertRaises(ValueError):
+            data[0] = 10.0
+
+        # The loader's own array is left writeable.
+        source[0] = 10.0
+        self.assertEqual(data[0], 10.0)
+
+    def test_failed_load(self):
+        def failing_loader():
+            raise OSError("Dataset not found")
+
+        with self.assertRaises(OSError):
+            self.registry.acquire("key", failing_loader)
+        self.assertEqual(self.registry.stats(), [])
+
+    def test_concurrent_load(self):
+        loading = Event()
+
+        def slow_loader():
+            loading.set()
+            sleep(0.1)
+            return self.loader()
+
+        results = []
+        threads = [Thread(target=lambda: results.append(
+                       self.registry.acquire("key", slow_loader)))
+                   for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertTrue(loading.is_set())
+        self.assertEqual(self.loads, 1)
+        self.assertEqual(len({id(result[0]) for result in results}), 1)
+
+
+class SharedCollectorTest(TempOutputMixin, unittest.TestCase):
+    """
+    A test class for collectors and model runs that share data snapshots.
+    """
+
+    def setUp(self):
+        super().setUp()
+        self.registry = SnapshotRegistry()
+        self.loads = 0
+
+    def temperature(self, grid, year):
+        self.loads += 1
+        return np.full((2,) + grid.dims_by_count(), 15.0)
+
+    @staticmethod
+    def albedo(grid):
+        return np.full((2,) + grid.dims_by_count(), 0.3)
+
+    def collector(self, grid=(30, 60)) -> 'ClimateDataCollector':
+        """
+        Returns a collector of constant data that shares its data through
+        this test's registry.
+        """
+        return ClimateDataCollector(GridDimensions(grid)) \
+            .use_temperature_source(self.temperature) \
+            .use_humidity_source(self.temperature) \
+            .use_albedo_source(self.albedo) \
+            .use_snapshot_registry(self.registry)
+
+    def test_collectors_share_data(self):
+        first = self.collector()
+        second = self.collector()
+        other_grid = self.collector((10, 20))
+
+        first_grids = first.get_gridded_data()
+        second_grids = second.get_gridded_data()
+        other_grid.get_gridded_data()
+
+        # Temperature and humidity are loaded once for each grid.
+        self.assertEqual(self.loads, 4)
+        self.assertEqual(len(self.registry.stats()), 2)
+
+        # Grids built from the same snapshot are independent.
+        first_grids[0][0].get_coord(0, 0).set_temperature(20.0)
+        self.assertEqual(second_grids[0][0].get_coord(0, 0).get_temperature(),
+                         15.0)
+
+        first.release_data()
+        second.release_data()
+        self.assertEqual(len(self.registry.stats()), 1)
+
+    def test_source_change_releases(self):
+        collector = self.collector()
+        collector.get_gridded_data()
+
+        collector.use_albedo_source(lambda grid: self.albedo(grid))
+        self.assertEqual(self.registry.stats(), [])
+
+    def test_model_run_releases(self):
+        with open(JSON_DEFAULT, "r") as default_file:
+            config = from_json_string(default_file.read())
+
+        registry = default_snapshot_registry()
+        before = len(registry.stats())
+
+        ModelRun(config, empty_output_config()).run_model()
+        self.assertEqual(len(registry.stats()), before)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,219 @@
+import math
+import unittest
+
+from typing import Optional, List
+import numpy as np
+
+from core.configuration import InvalidConfigError
+from core.output_config import empty_output_config, Debug
+from core.solvers import SOLVERS, picard, aitken, secant, anderson
+from runner import ModelRun
+from tests.helpers import coarse_config, TempOutputMixin
+
+# The fixed point of the cosine function.
+DOTTIE_NUMBER = 0.7390851332151607
+
+
+class CountingFeedback:
+    """
+    A feedback function that counts how many times it is called.
+    """
+
+    def __init__(self: 'CountingFeedback',
+                 func) -> None:
+        self.func = func
+        self.calls = 0
+
+    def __call__(self: 'CountingFeedback',
+                 value):
+        self.calls += 1
+        return self.func(value)
+
+
+class SolverTest(unittest.TestCase):
+    """
+    A test class for the fixed-point solvers in core.solvers.
+    """
+
+    def test_picard_without_tolerance(self):
+        feedback = CountingFeedback(math.cos)
+        result, passes = picard(feedback, 1.0, 5)
+
+        expected = 1.0
+        for _ in range(5):
+            expected = math.cos(expected)
+
+        self.assertEqual(result, expected)
+        self.assertEqual(passes, 5)
+        self.assertEqual(feedback.calls, 5)
+
+    def test_all_solvers_converge(self):
+        for name, solver in SOLVERS.items():
+            feedback = CountingFeedback(math.cos)
+            result, passes = solver(feedback, 1.0, 100, 1e-10)
+
+            self.assertAlmostEqual(result, DOTTIE_NUMBER, places=9, msg=name)
+            self.assertEqual(passes, feedback.calls, msg=name)
+            self.assertLess(passes, 100, msg=name)
+
+    def test_acceleration(self):
+        _, picard_passes = picard(math.cos, 1.0, 100, 1e-10)
+        _, aitken_passes = aitken(math.cos, 1.0, 100, 1e-10)
+        _, secant_passes = secant(math.cos, 1.0, 100, 1e-10)
+        _, anderson_passes = anderson(math.cos, 1.0, 100, 1e-10)
+
+        self.assertLess(aitken_passes, picard_passes)
+        self.assertLess(secant_passes, picard_passes)
+        self.assertLess(anderson_passes, picard_passes)
+
+    def test_without_tolerance(self):
+        for name, solver in SOLVERS.items():
+            result, passes = solver(math.cos, 1.0, 5)
+            self.assertEqual((result, passes), picard(math.cos, 1.0, 5),
+                             msg=name)
+
+    def test_no_fixed_point(self):
+        # A step in the feedback, like one between table entries, that
+        # leaves no fixed point for any solver to converge to.
+        def feedback(value: float) -> float:
+            return 1.0 if value < 0.5 else 0.2
+
+        for name, solver in SOLVERS.items():
+            feedback_calls = CountingFeedback(feedback)
+            result, passes = solver(feedback_calls, 0.4, 9, 1e-6)
+
+            self.assertIn(result, [1.0, 0.2], msg=name)
+            self.assertLessEqual(passes, 9, msg=name)
+            self.assertEqual(passes, feedback_calls.calls, msg=name)
+
+    def test_oscillating(self):
+        # A feedback that overshoots its fixed point by more every pass,
+        # so that no solver converges within max_passes.
+        def feedback(value: float) -> float:
+            return -1.5 * value
+
+        for name, solver in SOLVERS.items():
+            feedback_calls = CountingFeedback(feedback)
+            _, passes = solver(feedback_calls, 1.0, 9, 1e-6)
+
+            self.assertLessEqual(passes, 9, msg=name)
+            self.assertEqual(passes, feedback_calls.calls, msg=name)
+
+    def test_coupled_arrays(self):
+        # Layers of a column whose temperatures depend on each other.
+        def feedback(values: np.ndarray) -> np.ndarray:
+            return np.array([0.6 * values[1] + 1, 0.9 * values[0]])
+
+        expected = np.linalg.solve([[1, -0.6], [-0.9, 1]], [1, 0])
+        for name, solver in SOLVERS.items():
+            result, _ = solver(feedback, np.zeros(2), 200, 1e-10)
+            np.testing.assert_allclose(result, expected, atol=1e-8,
+                                       err_msg=name)
+
+        # Only Anderson acceleration accounts for the coupling.
+        _, picard_passes = picard(feedback, np.zeros(2), 200, 1e-10)
+        _, anderson_passes = anderson(feedback, np.zeros(2), 200, 1e-10)
+        self.assertLess(anderson_passes, picard_passes)
+
+    def test_max_passes(self):
+        for name, solver in SOLVERS.items():
+            feedback = CountingFeedback(math.cos)
+            _, passes = solver(feedback, 1.0, 3)
+
+            self.assertEqual(passes, 3, msg=name)
+            self.assertEqual(feedback.calls, 3, msg=name)
+
+    def test_arrays(self):
+        def feedback(values: np.ndarray) -> np.ndarray:
+            return np.array([math.cos(values[0]), 0.5 * values[1] + 1])
+
+        for name, solver in SOLVERS.items():
+            result, _ = solver(feedback, np.array([1.0, 0.0]), 100, 1e-10)
+            np.testing.assert_allclose(result, [DOTTIE_NUMBER, 2.0],
+                                       atol=1e-9, err_msg=name)
+
+    def test_missing_values(self):
+        def feedback(values: np.ndarray) -> np.ndarray:
+            return np.array([np.nan, math.cos(values[1])])
+
+        for name, solver in SOLVERS.items():
+            result, _ = solver(feedback, np.array([np.nan, 1.0]), 100, 1e-10)
+
+            self.assertTrue(np.isnan(result[0]), msg=name)
+            self.assertAlmostEqual(result[1], DOTTIE_NUMBER, places=9,
+                                   msg=name)
+
+
+class SolverModelRunTest(TempOutputMixin, unittest.TestCase):
+    """
+    A test class for model runs using each feedback solver.
+    """
+
+    def run_model(self: 'SolverModelRunTest',
+                  solver: str,
+                  iters: object,
+                  traces: Optional[List['CellTrace']] = None) -> 'ModelRun':
+        """
+        Run the model under the default configuration on a coarse grid with
+        the given feedback solver and iteration setting, and return the
+        finished model run. The trace of every grid is appended to traces,
+        if given.
+        """
+        output_controller = empty_output_config()
+        if traces is not None:
+            output_controller.enable_output_type(Debug.GRID_CELL_TRACE,
+                                                 handler=traces.append)
+
+        run = ModelRun(coarse_config(iters=iters, solver=solver),
+                       output_controller)
+        run.run_model()
+        return run
+
+    @staticmethod
+    def temperatures(run: 'ModelRun') -> np.ndarray:
+        """
+        Returns the surface temperatures of every cell after run.
+        """
+        return np.array([cell.get_temperature() for grids in run.grids
+                         for cell in grids[0]])
+
+    def test_invalid_solver(self):
+        with self.assertRaises(InvalidConfigError):
+            self.run_model("newton", 1)
+
+    def test_solvers_agree(self):
+        iters = {"max": 40, "tol": 1e-4}
+        traces = []
+        picard_run = self.run_model("picard", iters, traces)
+        reference = self.temperatures(picard_run)
+        picard_calls = picard_run.metrics.summary()["counts"][
+            "transparency_calls"]
+
+        # Picard iteration alternates between table entries in a few cells
+        # without converging, where the final temperatures depend on where
+        # iteration stops, so only the cells that converge are compared.
+        passes = np.concatenate([trace.records["passes"]
+                                 for trace in traces])
+        converged = passes < iters["max"]
+
+        for solver in SOLVERS:
+            run = self.run_model(solver, iters)
+
+            np.testing.assert_allclose(self.temperatures(run)[converged],
+                                       reference[converged],
+                                       atol=iters["tol"], rtol=0,
+                                       err_msg=solver)
+            calls = run.metrics.summary()["counts"]["transparency_calls"]
+            self.assertLessEqual(calls, picard_calls, msg=solver)
+
+    def test_fixed_passes_agree(self):
+        reference = self.temperatures(self.run_model("picard", 8))
+
+        for solver in SOLVERS:
+            np.testing.assert_array_equal(
+                self.temperatures(self.run_model(solver, 8)), reference,
+                err_msg=solver)
+
+
+if __name__ == '__main__':
+    unittest.main()
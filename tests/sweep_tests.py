@@ -0,0 +1,151 @@
+import json
+import unittest
+
+from os import path
+from pathlib import Path
+from shutil import rmtree
+
+from core.configuration import InvalidConfigError
+from data.result_store import default_result_store
+from sweep import read_configs, parse_parameter, expand_parameters, \
+    group_configs, run_group, run_sweep
+from tests.helpers import coarse_options, TempOutputMixin
+
+# A directory in which files for these tests are written.
+SWEEP_DIR = "sweep_test_files"
+
+
+class SweepConfigTest(unittest.TestCase):
+    """
+    A test class for reading and expanding the configurations of a sweep.
+    """
+
+    @classmethod
+    def setUpClass(cls):
+        Path(SWEEP_DIR).mkdir(exist_ok=True)
+
+    @classmethod
+    def tearDownClass(cls):
+        rmtree(SWEEP_DIR)
+
+    def test_read_jsonl(self):
+        lines_path = path.join(SWEEP_DIR, "configs.jsonl")
+        with open(lines_path, "w") as lines_file:
+            lines_file.write(json.dumps({"iters": 1}) + "\n\n")
+            lines_file.write(json.dumps({"iters": 2}) + "\n")
+
+        self.assertEqual(read_configs(lines_path),
+                         [{"iters": 1}, {"iters": 2}])
+
+    def test_read_directory(self):
+        config_dir = path.join(SWEEP_DIR, "configs")
+        Path(config_dir).mkdir(exist_ok=True)
+        for iters in [2, 1]:
+            with open(path.join(config_dir, "{}.json".format(iters)),
+                      "w") as config_file:
+                json.dump({"iters": iters}, config_file)
+
+        self.assertEqual(read_configs(config_dir),
+                         [{"iters": 1}, {"iters": 2}])
+
+    def test_parse_parameter(self):
+        self.assertEqual(parse_parameter("co2.to=1.5,2"),
+                         ("co2.to", [1.5, 2]))
+        self.assertEqual(parse_parameter("solver=picard,aitken"),
+                         ("solver", ["picard", "aitken"]))
+
+        key, values = parse_parameter("grid=10x20")
+        self.assertEqual(values[0]["dims"], {"lat": 10.0, "lon": 20.0})
+
+    def test_expand_parameters(self):
+        base = {"co2": {"from": 1, "to": 2}, "iters": 1, "run_id": "base"}
+        expanded = expand_parameters([base], [("co2.to", [1.5, 3]),
+                                              ("iters", [1, 4, 8])])
+
+        self.assertEqual(len(expanded), 6)
+        self.assertEqual(expanded[-1], {"co2": {"from": 1, "to": 3},
+                                        "iters": 8})
+        # The original configuration is unchanged.
+        self.assertEqual(base["co2"]["to"], 2)
+
+    def test_group_configs(self):
+        configs = expand_parameters([coarse_options()],
+                                    [("co2.to", [1.5, 3]),
+                                     ("grid", [parse_parameter(
+                                         "grid=30x60")[1][0],
+                                         parse_parameter(
+                                             "grid=10x20")[1][0]])])
+        groups = group_configs(configs)
+
+        self.assertEqual([len(group) for group in groups], [2, 2])
+        self.assertEqual(groups[0][0]["grid"], groups[0][1]["grid"])
+
+    def test_invalid_config(self):
+        options = coarse_options()
+        options["solver"] = "newton"
+
+        with self.assertRaises(InvalidConfigError):
+            group_configs([options])
+
+
+class SweepRunTest(TempOutputMixin, unittest.TestCase):
+    """
+    A test class for running the model over a sweep of configurations.
+    """
+
+    def setUp(self):
+        super().setUp()
+        self.configs = expand_parameters([coarse_options()],
+                                         [("co2.to", [1.5, 3])])
+        self.sweep_dir = path.join(self.output_dir, "sweep")
+
+    def test_data_loaded_once(self):
+        results = run_group(self.configs, output_root=self.sweep_dir)
+
+        loads = [[key for key in result["metrics"]["timings"]
+                  if key.startswith("provider_time")]
+                 for result in results]
+        self.assertNotEqual(loads[0], [])
+        self.assertEqual(loads[1], [])
+
+        # Doubling CO2 warms more than raising it by half.
+        self.assertLess(results[0]["stats"]["delta_t"],
+                        results[1]["stats"]["delta_t"])
+
+    def test_separate_output(self):
+        results = run_group(self.configs, output_root=self.sweep_dir)
+
+        # Sweep output is neither written to nor recorded in the result
+        # store that the web API serves from.
+        for result in results:
+            self.assertTrue(path.isdir(result["output"]))
+            self.assertEqual(path.dirname(result["output"]), self.sweep_dir)
+            self.assertFalse(path.exists(path.join(self.output_dir,
+                                                   result["run_id"])))
+        self.assertEqual(default_result_store().stats(), {})
+
+    def test_failed_run_recorded(self):
+        self.configs[1]["year"] = "never"
+        results = run_group(self.configs, output_root=self.sweep_dir)
+
+        self.assertNotIn("error", results[0])
+        self.assertIn("error", results[1])
+
+    def test_summary_file(self):
+        summary_path = "sweep_test_summary.json"
+        try:
+            summary = run_sweep(self.configs, 1, summary_path,
+                                output_root=self.sweep_dir)
+            with open(summary_path, "r") as summary_file:
+                written = json.load(summary_file)
+        finally:
+            Path(summary_path).unlink(missing_ok=True)
+
+        self.assertEqual(summary["groups"], 1)
+        self.assertEqual(len(written["runs"]), 2)
+        self.assertEqual({run["group"] for run in written["runs"]}, {0})
+        self.assertIn("compute", written["runs"][0]["stages"])
+
+
+if __name__ == '__main__':
+    unittest.main()
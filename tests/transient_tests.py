@@ -0,0 +1,284 @@
+import unittest
+
+import numpy as np
+
+from os import path, walk
+from threading import current_thread, main_thread
+from unittest import mock
+
+from core.output_config import default_output_config, Metrics, \
+    ReportDatatype, IMAGES_PATH
+from data.collector import ClimateDataCollector
+from data.grid import GridDimensions
+from data.result_store import default_result_store
+from runner import ModelRun
+from tests.helpers import coarse_config, TempOutputMixin
+
+# Run IDs for model runs made by these tests.
+TRANSIENT_RUN_ID = "transient_test_run"
+SINGLE_RUN_ID = "single_transient_test_run"
+
+# The final CO2 multiplier for each year of the transient model runs.
+CO2_PATH = {2000: 2.0, 2001: 2.0, 2002: 3.0}
+
+
+def year_data(year: int,
+              seed: int) -> np.ndarray:
+    """
+    Returns uniform random values for two time segments of a 9x9 grid,
+    which change a little from one year to the next.
+    """
+    base = np.random.default_rng(seed).uniform(0, 1, (2, 9, 9))
+    shift = np.random.default_rng([seed, year]).uniform(-0.02, 0.02,
+                                                        (2, 9, 9))
+    return np.clip(base + shift, 0, 1)
+
+
+class CountingCollector:
+    """
+    Data providers for a collector that differ by year, and that record the
+    years for which they are called, and by which threads.
+    """
+
+    def __init__(self) -> None:
+        self.years = []
+        self.threads = []
+
+    def temperature(self, dims, year):
+        self.years.append(year)
+        self.threads.append(current_thread())
+        return 230 + 80 * year_data(year, 0) - 273.15
+
+    @staticmethod
+    def humidity(dims, year):
+        return 100 * year_data(year, 1)
+
+    @staticmethod
+    def albedo(dims):
+        return 0.8 * year_data(0, 2)
+
+    def collector(self, grid: 'GridDimensions') -> 'ClimateDataCollector':
+        return ClimateDataCollector(grid) \
+            .use_temperature_source(self.temperature) \
+            .use_humidity_source(self.humidity) \
+            .use_albedo_source(self.albedo)
+
+
+class PrefetchTest(unittest.TestCase):
+    """
+    A test class for loading provider data for a later year in the
+    background.
+    """
+
+    def setUp(self):
+        self.providers = CountingCollector()
+        self.collector = self.providers.collector(
+            GridDimensions((9, 9), "count"))
+
+    def test_prefetched_year(self):
+        self.collector.get_gridded_data(2000)
+        self.collector.prefetch(2001)
+        self.collector.wait_for_prefetch()
+
+        grids = self.collector.get_gridded_data(2001)
+
+        self.assertEqual(self.providers.years, [2000, 2001])
+        self.assertIsNot(self.providers.threads[1], main_thread())
+
+        expected = CountingCollector().collector(
+            GridDimensions((9, 9), "count")).get_gridded_data(2001)
+        np.testing.assert_array_equal(
+            grids[1][0].extract_datapoint("temperature"),
+            expected[1][0].extract_datapoint("temperature"))
+
+    def test_other_year(self):
+        self.collector.prefetch(2001)
+        self.collector.get_gridded_data(2002)
+        self.collector.get_gridded_data(2001)
+
+        self.assertEqual(self.providers.years, [2001, 2002, 2001])
+
+    def test_released(self):
+        self.collector.prefetch(2001)
+        self.collector.release_data()
+        self.collector.get_gridded_data(2001)
+
+        self.assertEqual(self.providers.years, [2001, 2001])
+
+    def test_errors(self):
+        def failing(dims, year):
+            raise FileNotFoundError(year)
+
+        self.collector.use_temperature_source(failing).prefetch(2001)
+        self.collector.wait_for_prefetch()
+
+        with self.assertRaises(FileNotFoundError):
+            self.collector.get_gridded_data(2001)
+
+
+class EmptyImageRenderer:
+    """
+    An image renderer that writes an empty file in place of each image, so
+    that the names of image files can be checked without drawing maps.
+    """
+
+    def __init__(self, data) -> None:
+        self.data = data
+
+    @staticmethod
+    def save_image(img_path, scale) -> None:
+        open(img_path, "wb").close()
+
+
+class TransientRunTest(TempOutputMixin, unittest.TestCase):
+    """
+    A test class for transient model runs over several years.
+    """
+
+    def setUp(self):
+        super().setUp()
+        self.providers = CountingCollector()
+
+    def model_run(self,
+                  run_id: str,
+                  images: bool = False,
+                  **options) -> 'ModelRun':
+        """
+        Returns a model run under the default configuration, with any of
+        its options replaced by options, on data that differs by year. If
+        images is True, images of temperature change are rendered along
+        with the dataset.
+        """
+        options.setdefault("iters", {"max": 40, "tol": 1e-6})
+        options.setdefault("kernel", "numpy")
+        config = coarse_config((20, 40), **options)
+        config.set_run_id(run_id)
+
+        output_config = default_output_config()
+        if images:
+            output_config.enable_output_type(
+                ReportDatatype.REPORT_TEMP_CHANGE, IMAGES_PATH)
+
+        return ModelRun(config, output_config,
+                        collector=self.providers.collector(config.grid()))
+
+    def test_same_results(self):
+        transient_run = self.model_run(TRANSIENT_RUN_ID)
+        results = list(transient_run.iter_transient(CO2_PATH))
+        transient_calls = transient_run.metrics.summary()["counts"][
+            Metrics.TRANSPARENCY_CALLS.value]
+
+        self.assertEqual([(result.index, result.year, result.co2)
+                          for result in results],
+                         [(0, 2000, 2.0), (1, 2000, 2.0), (2, 2001, 2.0),
+                          (3, 2001, 2.0), (4, 2002, 3.0), (5, 2002, 3.0)])
+
+        cold_calls = 0
+        for year, co2 in CO2_PATH.items():
+            single_run = self.model_run(SINGLE_RUN_ID, year=year,
+                                        co2={"from": 1, "to": co2})
+            single_results = list(single_run.iter_model())
+            cold_calls += single_run.metrics.summary()["counts"][
+                Metrics.TRANSPARENCY_CALLS.value]
+
+            year_results = [result for result in results
+                            if result.year == year]
+            for single_seg, transient_seg in zip(single_results,
+                                                 year_results):
+                single = single_seg.grids[0].extract_datapoint("delta_t")\
+                    .astype(float)
+                transient = transient_seg.grids[0]\
+                    .extract_datapoint("delta_t").astype(float)
+
+                # Cells that alternate between table entries without
+                # converging may stop on either side, so only nearly every
+                # cell is the same.
+                close = np.isclose(transient, single, atol=1e-4) \
+                    | (np.isnan(transient) & np.isnan(single))
+                self.assertGreater(np.mean(close), 0.95)
+
+        self.assertLess(transient_calls, cold_calls)
+
+    def output_files(self,
+                     run_id: str) -> set:
+        """
+        Returns the paths of every file in the output directory for run_id,
+        relative to the directory holding all model output.
+        """
+        return {path.relpath(path.join(parent, name), self.output_dir)
+                for parent, _, names in walk(path.join(self.output_dir,
+                                                       run_id))
+                for name in names}
+
+    def test_dataset(self):
+        run = self.model_run(TRANSIENT_RUN_ID)
+        results = list(run.iter_transient(CO2_PATH))
+
+        from netCDF4 import Dataset
+        run_id = run.config.transient_run_id(CO2_PATH)
+        self.assertTrue(default_result_store().contains(run_id))
+        dataset_path = path.join(self.output_dir, run_id, run_id + ".nc")
+        with Dataset(dataset_path) as dataset:
+            np.testing.assert_array_equal(dataset["year"][:],
+                                          [2000, 2000, 2001, 2001, 2002,
+                                           2002])
+            np.testing.assert_allclose(dataset["co2"][:],
+                                       [2, 2, 2, 2, 3, 3])
+            np.testing.assert_allclose(
+                dataset["delta_t"][5],
+                results[5].grids[0].extract_datapoint("delta_t")
+                .astype(np.float32))
+
+    def test_separate_output(self):
+        other_path = {**CO2_PATH, 2002: 2.5}
+        run = self.model_run(TRANSIENT_RUN_ID, images=True)
+        transient_ids = [run.config.transient_run_id(co2_path)
+                         for co2_path in [CO2_PATH, other_path]]
+
+        with mock.patch("data.display.ModelImageRenderer",
+                        EmptyImageRenderer):
+            list(run.iter_transient(CO2_PATH))
+            list(self.model_run(TRANSIENT_RUN_ID, images=True)
+                 .iter_transient(other_path))
+            list(self.model_run(TRANSIENT_RUN_ID, images=True).iter_model())
+
+        # Transient runs along different paths, and the regular model run
+        # of the same configuration, each write their own dataset and
+        # images.
+        outputs = [self.output_files(run_id)
+                   for run_id in transient_ids + [TRANSIENT_RUN_ID]]
+        for files in outputs:
+            self.assertTrue(any(name.endswith(".nc") for name in files))
+            self.assertTrue(any(name.endswith(".png") for name in files))
+        self.assertEqual(sum(len(files) for files in outputs),
+                         len(set.union(*outputs)))
+
+        self.assertNotEqual(transient_ids[0], transient_ids[1])
+        self.assertEqual(transient_ids[0], run.config.transient_run_id(
+            {year: float(co2) for year, co2 in reversed(CO2_PATH.items())}))
+
+    def test_cancel(self):
+        checks = []
+
+        def cancel():
+            checks.append(True)
+            return len(checks) > 3
+
+        run = self.model_run(TRANSIENT_RUN_ID)
+        results = list(run.iter_transient(CO2_PATH, cancel=cancel))
+
+        # Time segments computed before the run stops are still returned.
+        self.assertEqual([result.year for result in results],
+                         [2000, 2000, 2001])
+
+        # Incomplete output is not recorded in the result store.
+        self.assertFalse(default_result_store().contains(
+            run.config.transient_run_id(CO2_PATH)))
+
+    def test_empty_path(self):
+        with self.assertRaises(ValueError):
+            next(self.model_run(TRANSIENT_RUN_ID).iter_transient({}))
+
+
+if __name__ == '__main__':
+    unittest.main()
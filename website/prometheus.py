@@ -0,0 +1,373 @@
+from threading import Lock
+from typing import Optional, List, Dict, Tuple, Callable, Iterable
+
+"""
+A minimal, in-process registry of operational metrics for the web API,
+rendered in the Prometheus text exposition format.
+
+Metrics are held in the memory of the server process that records them, so
+each process of a multi-process deployment reports its own values. Every
+metric is safe to update from multiple threads.
+"""
+
+
+# The content type of the text exposition format.
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# Default upper bounds of histogram buckets, in seconds.
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5,
+                   1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+LabelValues = Tuple[str, ...]
+
+
+def _escape(value: str) -> str:
+    """
+    Returns value with backslashes, double quotes, and newlines escaped, as
+    required for label values in the text exposition format.
+    """
+    return value.replace("\\", "\\\\").replace("\"", "\\\"")\
+        .replace("\n", "\\n")
+
+
+def _format_value(value: float) -> str:
+    """
+    Returns the text exposition representation of a sample value.
+    """
+    if value == float("inf"):
+        return "+Inf"
+    elif float(value).is_integer():
+        return str(int(value))
+    else:
+        return repr(float(value))
+
+
+def _format_labels(names: Iterable[str],
+                   values: Iterable[str]) -> str:
+    """
+    Returns a set of label names and values in the form {name="value",...},
+    or an empty string if there are no labels.
+    """
+    pairs = ["{}=\"{}\"".format(name, _escape(str(value)))
+             for name, value in zip(names, values)]
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class Metric:
+    """
+    A named metric, which may be divided into several time series by a fixed
+    set of label names. Subclasses define how values are recorded and how
+    their samples are rendered.
+    """
+
+    metric_type = "untyped"
+
+    def __init__(self: 'Metric',
+                 name: str,
+                 description: str,
+                 label_names: Tuple[str, ...] = ()) -> None:
+        """
+        Instantiate a new metric.
+
+        :param name:
+            The metric's name, as it will appear in the exposition
+        :param description:
+            A short description of what the metric measures
+        :param label_names:
+            The names of labels that distinguish time series of the metric
+        """
+        self.name = name
+        self.description = description
+        self.label_names = label_names
+        self._lock = Lock()
+
+    def _label_values(self: 'Metric',
+                      labels: Dict[str, str]) -> LabelValues:
+        """
+        Returns the values of labels in the order of this metric's label
+        names. Raises ValueError if the labels do not match the label names.
+        """
+        if set(labels) != set(self.label_names):
+            raise ValueError("Metric {} requires labels {} (given {})"
+                             .format(self.name, list(self.label_names),
+                                     list(labels)))
+
+        return tuple(str(labels[name]) for name in self.label_names)
+
+    def samples(self: 'Metric') -> List[str]:
+        """
+        Returns the lines of the exposition that report this metric's
+        current values, not including its HELP and TYPE lines.
+        """
+        raise NotImplementedError
+
+    def expose(self: 'Metric') -> str:
+        """
+        Returns the full exposition of this metric, including its HELP and
+        TYPE lines.
+        """
+        lines = ["# HELP {} {}".format(self.name, self.description),
+                 "# TYPE {} {}".format(self.name, self.metric_type)]
+        lines.extend(self.samples())
+        return "\n".join(lines)
+
+
+class Counter(Metric):
+    """
+    A metric whose values only ever increase, such as a number of requests.
+    """
+
+    metric_type = "counter"
+
+    def __init__(self: 'Counter',
+                 name: str,
+                 description: str,
+                 label_names: Tuple[str, ...] = ()) -> None:
+        super(Counter, self).__init__(name, description, label_names)
+        self._values = {}
+
+    def inc(self: 'Counter',
+            amount: float = 1,
+            **labels: str) -> None:
+        """
+        Increase the value of the time series given by labels by amount.
+
+        :param amount:
+            A non-negative amount to add to the counter
+        :param labels:
+            Values for each of the counter's label names
+        """
+        if amount < 0:
+            raise ValueError("Counters can only be increased (given {})"
+                             .format(amount))
+
+        key = self._label_values(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self: 'Counter',
+              **labels: str) -> float:
+        """
+        Returns the current value of the time series given by labels.
+        """
+        with self._lock:
+            return self._values.get(self._label_values(labels), 0)
+
+    def samples(self: 'Counter') -> List[str]:
+        with self._lock:
+            values = sorted(self._values.items())
+
+        return ["{}{} {}".format(self.name,
+                                 _format_labels(self.label_names, key),
+                                 _format_value(value))
+                for key, value in values]
+
+
+class Gauge(Metric):
+    """
+    A metric whose values may go up or down, such as a queue length. A gauge
+    may instead be given a function that computes its value whenever the
+    metric is exposed.
+    """
+
+    metric_type = "gauge"
+
+    def __init__(self: 'Gauge',
+                 name: str,
+                 description: str,
+                 label_names: Tuple[str, ...] = (),
+                 callback: Optional[Callable[[], float]] = None) -> None:
+        """
+        Instantiate a new gauge. If callback is given, the gauge has no
+        labels and its value is always the result of calling callback.
+
+        :param name:
+            The metric's name, as it will appear in the exposition
+        :param description:
+            A short description of what the metric measures
+        :param label_names:
+            The names of labels that distinguish time series of the metric
+        :param callback:
+            A function that returns the gauge's current value
+        """
+        super(Gauge, self).__init__(name, description, label_names)
+        self._values = {}
+        self._callback = callback
+
+    def set(self: 'Gauge',
+            value: float,
+            **labels: str) -> None:
+        """
+        Set the value of the time series given by labels.
+        """
+        key = self._label_values(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def inc(self: 'Gauge',
+            amount: float = 1,
+            **labels: str) -> None:
+        """
+        Increase the value of the time series given by labels by amount,
+        which may be negative.
+        """
+        key = self._label_values(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self: 'Gauge',
+            amount: float = 1,
+            **labels: str) -> None:
+        """
+        Decrease the value of the time series given by labels by amount.
+        """
+        self.inc(-amount, **labels)
+
+    def value(self: 'Gauge',
+              **labels: str) -> float:
+        """
+        Returns the current value of the time series given by labels.
+        """
+        if self._callback is not None:
+            return self._callback()
+
+        with self._lock:
+            return self._values.get(self._label_values(labels), 0)
+
+    def samples(self: 'Gauge') -> List[str]:
+        if self._callback is not None:
+            values = [((), self._callback())]
+        else:
+            with self._lock:
+                values = sorted(self._values.items())
+
+        return ["{}{} {}".format(self.name,
+                                 _format_labels(self.label_names, key),
+                                 _format_value(value))
+                for key, value in values]
+
+
+class Histogram(Metric):
+    """
+    A metric that counts observations, such as request durations, in a
+    series of cumulative buckets, and records their count and sum.
+    """
+
+    metric_type = "histogram"
+
+    def __init__(self: 'Histogram',
+                 name: str,
+                 description: str,
+                 label_names: Tuple[str, ...] = (),
+                 buckets: Tuple[float, ...] = DEFAULT_BUCKETS) -> None:
+        """
+        Instantiate a new histogram, whose buckets have the given upper
+        bounds. A final bucket with no upper bound is always added.
+
+        :param name:
+            The metric's name, as it will appear in the exposition
+        :param description:
+            A short description of what the metric measures
+        :param label_names:
+            The names of labels that distinguish time series of the metric
+        :param buckets:
+            Upper bounds of buckets, in increasing order
+        """
+        if "le" in label_names:
+            raise ValueError("Histograms may not use the label name \"le\"")
+
+        super(Histogram, self).__init__(name, description, label_names)
+        self._bounds = tuple(sorted(buckets)) + (float("inf"),)
+        # Map label values to bucket counts, then total count and sum.
+        self._values = {}
+
+    def observe(self: 'Histogram',
+                value: float,
+                **labels: str) -> None:
+        """
+        Record one observation of value in the time series given by labels.
+        """
+        key = self._label_values(labels)
+
+        with self._lock:
+            if key not in self._values:
+                self._values[key] = [[0] * len(self._bounds), 0, 0.0]
+            series = self._values[key]
+
+            for i, bound in enumerate(self._bounds):
+                if value <= bound:
+                    series[0][i] += 1
+            series[1] += 1
+            series[2] += value
+
+    def count(self: 'Histogram',
+              **labels: str) -> int:
+        """
+        Returns the number of observations in the time series given by
+        labels.
+        """
+        with self._lock:
+            series = self._values.get(self._label_values(labels))
+            return 0 if series is None else series[1]
+
+    def samples(self: 'Histogram') -> List[str]:
+        with self._lock:
+            values = sorted((key, ([*series[0]], series[1], series[2]))
+                            for key, series in self._values.items())
+
+        lines = []
+        for key, (buckets, count, total) in values:
+            for bound, bucket_count in zip(self._bounds, buckets):
+                labels = _format_labels(self.label_names + ("le",),
+                                        key + (_format_value(bound),))
+                lines.append("{}_bucket{} {}".format(self.name, labels,
+                                                     bucket_count))
+
+            labels = _format_labels(self.label_names, key)
+            lines.append("{}_sum{} {}".format(self.name, labels,
+                                              _format_value(total)))
+            lines.append("{}_count{} {}".format(self.name, labels, count))
+
+        return lines
+
+
+class Registry:
+    """
+    A collection of metrics that are exposed together.
+    """
+
+    def __init__(self: 'Registry') -> None:
+        self._metrics = []
+        self._lock = Lock()
+
+    def register(self: 'Registry',
+                 metric: 'Metric') -> 'Metric':
+        """
+        Add metric to the registry, and return it. Raises ValueError if a
+        metric with the same name is already registered.
+
+        :param metric:
+            A new metric
+        :return:
+            The same metric
+        """
+        with self._lock:
+            if any(other.name == metric.name for other in self._metrics):
+                raise ValueError("Metric {} is already registered"
+                                 .format(metric.name))
+            self._metrics.append(metric)
+
+        return metric
+
+    def expose(self: 'Registry') -> str:
+        """
+        Returns the current values of every registered metric, in the text
+        exposition format.
+
+        :return:
+            The exposition of all metrics
+        """
+        with self._lock:
+            metrics = list(self._metrics)
+
+        return "\n".join(metric.expose() for metric in metrics) + "\n"